@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_asgi_application()
+
+# Pré-carrega os modelos de IA em segundo plano se GALLERY_PRELOAD_MODELS estiver ativo
+from gallery.modelos_ia import preload_models_if_configured  # noqa: E402
+
+preload_models_if_configured()
+
@@ -22,6 +22,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "gallery.middleware.RequestTimingMiddleware",  # primeiro: mede o request inteiro
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     'corsheaders.middleware.CorsMiddleware',
@@ -55,6 +56,9 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Vários processos escrevendo (workers da fila, reprocess): espera o lock em vez de falhar
+        # e abre as transações já com o lock de escrita (sem deadlock ao promover uma leitura)
+        "OPTIONS": {"timeout": 20, "transaction_mode": "IMMEDIATE"},
     }
 }
 
@@ -92,4 +96,96 @@ CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
     'http://localhost:5174',
     'http://localhost:5175',
-]
\ No newline at end of file
+]
+
+# Fila de processamento de IA (worker: python manage.py process_queue)
+GALLERY_ASYNC_INGESTION = True  # False = processa no próprio request (comportamento antigo)
+GALLERY_QUEUE_WORKERS = 2
+GALLERY_QUEUE_BATCH_SIZE = 4  # jobs por lote de inferência (caption, objetos e rostos)
+GALLERY_QUEUE_MAX_ATTEMPTS = 3
+GALLERY_QUEUE_RETRY_DELAY = 10  # segundos, dobra a cada tentativa
+GALLERY_QUEUE_STALE_SECONDS = 600  # job em execução há mais tempo que isso é considerado abandonado
+GALLERY_QUEUE_INDEX_CHECK_INTERVAL = 60  # segundos entre verificações do índice da busca semântica (reconstrução)
+
+# Cache dos resultados de IA do preview, reaproveitados no upload da mesma imagem
+GALLERY_INFERENCE_CACHE_SIZE = 256  # entradas (LRU)
+GALLERY_INFERENCE_CACHE_TTL = 1800  # segundos
+
+# Modelos de IA são carregados no primeiro uso; True pré-carrega em segundo plano ao subir o servidor
+# (também pode ser ativado pela variável de ambiente GALLERY_PRELOAD_MODELS=1)
+GALLERY_PRELOAD_MODELS = False
+
+# Miniaturas geradas na ingestão (backfill: python manage.py generate_thumbnails)
+GALLERY_THUMBNAIL_WIDTHS = (200, 400, 800)
+GALLERY_THUMBNAIL_QUALITY = 80
+
+# Paginação por cursor das listagens de fotos (?page_size= e ?cursor=)
+GALLERY_PAGE_SIZE = 50
+GALLERY_MAX_PAGE_SIZE = 200
+
+# Filtro ?color= das listagens: fração mínima dos pixels na cor pedida
+GALLERY_COLOR_FILTER_MIN_SHARE = 0.2
+
+# Busca semântica: embedding CLIP de cada foto calculado na ingestão (backfill: python manage.py build_embeddings)
+GALLERY_SEMANTIC_SEARCH = True
+GALLERY_SEMANTIC_ENCODER = 'clip'  # 'stub' = encoder determinístico sem modelo (testes)
+GALLERY_SEMANTIC_MODEL = 'openai/clip-vit-base-patch32'
+GALLERY_SEMANTIC_DTYPE = 'float16'  # ou 'float32'
+GALLERY_SEMANTIC_TRANSLATE_QUERIES = True  # consultas em português são traduzidas para o CLIP (inglês)
+GALLERY_SEMANTIC_TRANSLATE_TIMEOUT = 1.0  # espera máxima pela tradução da consulta; depois busca com o texto original
+GALLERY_SEMANTIC_ANN_MIN_PHOTOS = 50000  # a partir daqui usa índice aproximado HNSW, se o faiss estiver instalado
+GALLERY_SEMANTIC_INLINE_CHECK_INTERVAL = 60  # sem fila: segundos entre verificações do índice após gravar embeddings
+GALLERY_EMBEDDINGS_DIR = BASE_DIR / 'embeddings'
+
+# Detecção de duplicatas: SHA-256 (cópia exata) + dHash (cópia redimensionada/recomprimida)
+GALLERY_DUPLICATE_DETECTION = True  # upload de foto repetida devolve a existente (allow_duplicates=1 força)
+GALLERY_DUPLICATE_UPLOAD_DISTANCE = 3  # bits de diferença no dHash para o upload considerar duplicata
+GALLERY_DUPLICATE_MAX_DISTANCE = 6  # distância máxima do índice e padrão de /api/photos/duplicates/
+
+# Tradução das legendas (inglês -> português)
+GALLERY_TRANSLATION_BACKEND = 'google'  # 'marian' = modelo local, sem rede; 'stub' = tradução falsa (testes)
+GALLERY_TRANSLATION_MARIAN_MODEL = 'Helsinki-NLP/opus-mt-tc-big-en-pt'
+GALLERY_TRANSLATION_BATCH_SIZE = 32  # legendas por chamada ao backend
+GALLERY_TRANSLATION_TIMEOUT = 10  # segundos de espera pelo backend
+GALLERY_TRANSLATION_PREVIEW_TIMEOUT = 2  # no preview espera menos; a tradução termina em segundo plano
+GALLERY_TRANSLATION_WORKERS = 2
+GALLERY_TRANSLATION_DEFERRED = GALLERY_ASYNC_INGESTION  # legendas fora do cache viram jobs da fila
+
+# Reconhecimento facial: perfil de detecção 'fast' (HOG em 640px), 'balanced' (CNN em 1024px)
+# ou 'accurate' (CNN na imagem inteira); comparar com python manage.py benchmark_faces <pasta>
+GALLERY_FACE_PROFILE = 'balanced'
+# Reagrupamento offline dos rostos (python manage.py recluster_faces / POST /api/persons/recluster/)
+GALLERY_FACE_CLUSTER_THRESHOLD = 0.5  # distância máxima entre rostos vizinhos
+GALLERY_FACE_CLUSTER_NEIGHBORS = 32  # vizinhos guardados por rosto (limita a memória do grafo)
+GALLERY_FACE_CLUSTER_MIN_SHARE = 0.5  # fração dos rostos de uma pessoa no grupo para ela ser fundida
+
+# Etapas independentes de cada foto (caption, objetos, rostos, embedding) rodam em paralelo
+GALLERY_STAGE_WORKERS = 3  # threads do pool compartilhado; 1 = uma etapa por vez
+GALLERY_STAGE_INTRA_OP_THREADS = None  # threads do torch por etapa; None = núcleos / GALLERY_STAGE_WORKERS
+
+# Backend de inferência do caption e da detecção de objetos em CPU: 'torch' (fp32), 'int8'
+# (quantização dinâmica) ou 'onnx' (ONNX Runtime); comparar com python manage.py evaluate_backends <pasta>
+GALLERY_INFERENCE_BACKEND = 'torch'
+GALLERY_INFERENCE_CAPTIONER_BACKEND = None  # None = GALLERY_INFERENCE_BACKEND
+GALLERY_INFERENCE_OBJECT_DETECTOR_BACKEND = None
+GALLERY_INFERENCE_ONNX_DIR = BASE_DIR / 'onnx_models'  # modelos exportados no primeiro uso
+
+# Níveis de qualidade (ver gallery/niveis_qualidade.py): 'fast' no preview, 'full' na ingestão
+GALLERY_QUALITY_PREVIEW_TIER = 'fast'
+GALLERY_QUALITY_TIERS = {}  # ex: {'fast': {'max_size': 768, 'budget_ms': 1500}}
+GALLERY_QUALITY_REFINE_LATER = False  # ingestão reaproveita o preview e o worker da fila refina depois
+
+# Métricas (texto do Prometheus) em /metrics e, no worker da fila, em process_queue --metrics-port
+GALLERY_METRICS_SERVER_TIMING = DEBUG  # cabeçalho Server-Timing com o tempo de cada etapa do request
+GALLERY_METRICS_SLOW_REQUEST_SECONDS = 2.0  # requests mais lentos que isso são detalhados no log
+GALLERY_METRICS_ALLOW_REMOTE = False  # /metrics só responde a 127.0.0.1 / ::1
+
+# Servidor de modelos (python manage.py serve_models): com a URL, web e fila usam os modelos
+# dele em vez de carregar uma cópia por processo; None = modelos no próprio processo
+GALLERY_MODEL_SERVER_URL = None  # ex: 'unix:///run/user/1000/gallery/models.sock' ou 'http://127.0.0.1:8765'
+GALLERY_MODEL_SERVER_TOKEN = None  # segredo compartilhado entre servidor e clientes; obrigatório com o servidor
+GALLERY_MODEL_SERVER_MODELS = None  # modelos servidos; None = todos (os demais carregam no processo)
+GALLERY_MODEL_SERVER_QUEUE_SIZE = 64  # chamadas esperando por modelo; acima disso responde 503
+GALLERY_MODEL_SERVER_BATCH_SIZE = 8  # chamadas compatíveis executadas juntas
+GALLERY_MODEL_SERVER_BATCH_WAIT_MS = 5  # espera máxima pelas outras chamadas do lote
+GALLERY_MODEL_SERVER_TIMEOUT = 120  # segundos de espera por uma chamada
@@ -1,6 +1,10 @@
 from django.contrib import admin
-from .models import Photo, Tag, Person
+from .models import FaceObservation, Photo, Tag, Person, ProcessingJob, StageResult, TranslationCache
 
 admin.site.register(Photo)
 admin.site.register(Tag)
-admin.site.register(Person)
\ No newline at end of file
+admin.site.register(Person)
+admin.site.register(ProcessingJob)
+admin.site.register(TranslationCache)
+admin.site.register(FaceObservation)
+admin.site.register(StageResult)
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""Reagrupamento offline de todos os rostos da biblioteca (chinese whispers sobre um grafo de vizinhos)
+
+A ingestão atribui cada rosto à pessoa mais próxima na hora do upload e cria uma
+"Pessoa N" quando nada está dentro da tolerância, o que espalha uma mesma pessoa em
+várias pessoas de uma foto só. Aqui todos os encodings das FaceObservation são
+comparados de uma vez:
+
+1. grafo de vizinhos: distâncias calculadas em blocos de linhas (matriz x matriz em
+   float32, memória limitada) e, para cada rosto, no máximo `neighbors` arestas abaixo
+   do limiar;
+2. chinese whispers: cada rosto adota o rótulo de maior peso entre os vizinhos, com as
+   atualizações vetorizadas sobre todas as arestas a cada rodada;
+3. propostas: em cada grupo, as pessoas automáticas cuja maioria dos rostos caiu nele
+   são fundidas na pessoa com nome (ou na maior), aplicadas em transações em lote.
+"""
+
+import re
+
+import numpy as np
+from django.db import transaction
+
+from .deteccao_rostos import face_setting
+from .indice_rostos import ENCODING_SIZE, face_index, unpack_encoding
+from .models import FaceObservation, Person, Photo
+
+# Nomes dados automaticamente pela ingestão (ver create_person_for_face)
+AUTO_NAME = re.compile(r'^Pessoa( Desconhecida)? \d+( \((HD|Distante)\))?$')
+
+# Memória (bytes) da matriz de distâncias de cada bloco de linhas
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def is_auto_named(person):
+    return not person.is_manually_added and bool(AUTO_NAME.match(person.name))
+
+
+# ============================================================================
+# AGRUPAMENTO
+# ============================================================================
+
+def load_face_matrix():
+    """(ids das observações, ids das pessoas (-1 = sem pessoa), matriz float32 de encodings)"""
+    rows = FaceObservation.objects.order_by('id').values_list('id', 'person_id', 'encoding')
+    count = rows.count()
+    ids = np.empty(count, dtype=np.int64)
+    person_ids = np.empty(count, dtype=np.int64)
+    encodings = np.empty((count, ENCODING_SIZE), dtype=np.float32)
+
+    size = 0
+    for observation_id, person_id, encoding in rows.iterator(chunk_size=5000):
+        if size == count:
+            break  # Rostos inseridos durante a leitura ficam para a próxima execução
+        ids[size] = observation_id
+        person_ids[size] = -1 if person_id is None else person_id
+        encodings[size] = unpack_encoding(encoding)
+        size += 1
+    return ids[:size], person_ids[:size], encodings[:size]
+
+
+def true_positions(mask):
+    """(linhas, colunas) dos True de uma matriz booleana quase toda False
+
+    Procura primeiro as palavras de 8 bytes não nulas e só depois os bytes dentro
+    delas: bem mais rápido que np.nonzero quando quase nada passa do limiar.
+    """
+    flat = mask.reshape(-1)
+    padding = -len(flat) % 8
+    if padding:
+        flat = np.concatenate([flat, np.zeros(padding, dtype=bool)])
+    words = np.flatnonzero(flat.view(np.uint64))
+    positions = (words[:, None] * 8 + np.arange(8)).reshape(-1)
+    positions = positions[flat[positions]]
+    return np.divmod(positions, mask.shape[1])
+
+
+def neighbor_graph(encodings, threshold, neighbors):
+    """Arestas (origem, destino, peso) entre rostos a menos de `threshold`, nos dois sentidos
+
+    Cada rosto guarda só os `neighbors` vizinhos mais próximos, o que limita o grafo a
+    n * neighbors arestas mesmo quando uma pessoa tem milhares de rostos.
+    """
+    count = len(encodings)
+    sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+    limit = threshold * threshold
+    block = max(1, BLOCK_BYTES // (4 * max(count, 1)))
+
+    sources, targets, distances = [], [], []
+    for start in range(0, count, block):
+        chunk = encodings[start:start + block]
+        # |a - b|² = |a|² + |b|² - 2 a·b, com operações no próprio bloco (sem temporários)
+        squared = chunk @ encodings.T
+        squared *= -2.0
+        squared += sq_norms[None, :]
+        squared += sq_norms[start:start + block, None]
+        # O próprio rosto não conta como vizinho
+        squared[np.arange(len(chunk)), np.arange(start, start + len(chunk))] = np.inf
+
+        rows, columns = true_positions(squared < limit)
+        values = squared[rows, columns]
+
+        # Mantém os `neighbors` mais próximos de cada linha
+        order = np.lexsort((values, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+        first = np.searchsorted(rows, rows, side='left')
+        keep = (np.arange(len(rows)) - first) < neighbors
+
+        sources.append(rows[keep] + start)
+        targets.append(columns[keep])
+        distances.append(np.sqrt(np.maximum(values[keep], 0.0)))
+
+    if not sources:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    weights = 1.0 - np.concatenate(distances) / threshold
+
+    # Grafo não direcionado: a aresta vale nos dois sentidos (uma vez só)
+    sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+    weights = np.concatenate([weights, weights])
+    keys, first = np.unique(sources * count + targets, return_index=True)
+    return keys // count, keys % count, weights[first].astype(np.float32)
+
+
+def chinese_whispers(count, sources, targets, weights, iterations=20, seed=0):
+    """Rótulo de grupo de cada nó; a cada rodada metade dos nós (sorteada) adota o rótulo
+    de maior peso entre os vizinhos (atualizar todos juntos faz os rótulos oscilarem)
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.arange(count, dtype=np.int64)
+    if len(sources) == 0:
+        return labels
+
+    for _ in range(iterations):
+        # Peso total de cada rótulo vizinho, por nó
+        keys, inverse = np.unique(sources * count + labels[targets], return_inverse=True)
+        totals = np.bincount(inverse, weights=weights)
+        nodes, candidate_labels = keys // count, keys % count
+
+        # Melhor rótulo de cada nó (maior peso; empate fica com o menor rótulo)
+        order = np.lexsort((candidate_labels, -totals, nodes))
+        nodes, candidate_labels = nodes[order], candidate_labels[order]
+        is_first = np.ones(len(nodes), dtype=bool)
+        is_first[1:] = nodes[1:] != nodes[:-1]
+        nodes, best = nodes[is_first], candidate_labels[is_first]
+
+        pending = labels[nodes] != best
+        if not pending.any():
+            break
+        update = pending & (rng.random(len(nodes)) < 0.5)
+        labels[nodes[update]] = best[update]
+    return labels
+
+
+def cluster_faces(threshold=None, neighbors=None, iterations=20):
+    """Agrupa todos os rostos da biblioteca; retorna (ids das observações, ids das pessoas, rótulos)"""
+    threshold = threshold or face_setting('CLUSTER_THRESHOLD', 0.5)
+    neighbors = neighbors or face_setting('CLUSTER_NEIGHBORS', 32)
+
+    ids, person_ids, encodings = load_face_matrix()
+    sources, targets, weights = neighbor_graph(encodings, threshold, neighbors)
+    labels = chinese_whispers(len(ids), sources, targets, weights, iterations)
+    return ids, person_ids, labels
+
+
+# ============================================================================
+# PROPOSTAS DE FUSÃO
+# ============================================================================
+
+class MergeProposal:
+    """Fundir as pessoas `sources` na pessoa `target` (rostos do mesmo grupo)"""
+
+    def __init__(self, target, sources, faces):
+        self.target = target
+        self.sources = sources  # [(pessoa, rostos dela no grupo)]
+        self.faces = faces  # rostos do grupo
+
+    def as_dict(self):
+        return {
+            "target": {"id": self.target.id, "name": self.target.name},
+            "sources": [{"id": person.id, "name": person.name, "faces": faces} for person, faces in self.sources],
+            "faces": self.faces,
+        }
+
+
+def merge_proposals(person_ids, labels, min_share=None):
+    """Propostas de fusão a partir dos grupos de rostos
+
+    Uma pessoa só entra como origem se for automática ("Pessoa N") e pelo menos
+    `min_share` dos seus rostos estiverem no grupo; pessoas com nome nunca são fundidas
+    entre si. O destino é a pessoa com nome com mais rostos no grupo ou, se não houver,
+    a pessoa com mais rostos.
+    """
+    min_share = face_setting('CLUSTER_MIN_SHARE', 0.5) if min_share is None else min_share
+    assigned = person_ids >= 0
+    person_ids, labels = person_ids[assigned], labels[assigned]
+    if len(person_ids) == 0:
+        return []
+
+    # Rostos por (grupo, pessoa) e total de rostos de cada pessoa
+    pairs, pair_counts = np.unique(np.stack([labels, person_ids], axis=1), axis=0, return_counts=True)
+    totals = dict(zip(*np.unique(person_ids, return_counts=True)))
+    cluster_sizes = dict(zip(*np.unique(labels, return_counts=True)))
+
+    groups = {}
+    for (label, person_id), faces in zip(pairs.tolist(), pair_counts.tolist()):
+        groups.setdefault(label, []).append((person_id, faces))
+    groups = {label: members for label, members in groups.items() if len(members) > 1}
+
+    persons = Person.objects.defer('centroid').in_bulk(
+        {person_id for members in groups.values() for person_id, _ in members}
+    )
+
+    proposals = []
+    for label, members in groups.items():
+        members = [(persons[pid], faces) for pid, faces in members if pid in persons]
+        named = [(person, faces) for person, faces in members if not is_auto_named(person)]
+        target = max(named or members, key=lambda member: (member[1], -member[0].id))[0]
+
+        sources = [
+            (person, faces) for person, faces in members
+            if person.id != target.id and is_auto_named(person) and faces / totals[person.id] >= min_share
+        ]
+        if sources:
+            proposals.append(MergeProposal(target, sources, int(cluster_sizes[label])))
+
+    return sorted(proposals, key=lambda proposal: (-proposal.faces, proposal.target.id))
+
+
+def merge_persons(target, source_ids):
+    """Funde as pessoas `source_ids` em `target`: rostos, fotos e foto principal; apaga as origens
+
+    Tudo numa transação, com updates e inserts em lote (sem laço por foto).
+    """
+    from .funcoes_ia import recompute_person_centroids
+
+    source_ids = [pid for pid in source_ids if pid != target.id]
+    if not source_ids:
+        return 0
+
+    PhotoPersons = Photo.persons.through
+    with transaction.atomic(), face_index.lock:
+        FaceObservation.objects.filter(person_id__in=source_ids).update(person=target)
+
+        photo_ids = set(
+            PhotoPersons.objects.filter(person_id__in=source_ids).values_list('photo_id', flat=True)
+        )
+        PhotoPersons.objects.bulk_create(
+            [PhotoPersons(photo_id=photo_id, person_id=target.id) for photo_id in photo_ids],
+            ignore_conflicts=True, batch_size=1000,
+        )
+
+        if not target.photo_principal_id:
+            principal = (
+                Person.objects.filter(id__in=source_ids, photo_principal__isnull=False)
+                .values_list('photo_principal_id', flat=True).first()
+            )
+            if principal:
+                Person.objects.filter(pk=target.pk).update(photo_principal_id=principal)
+
+        PhotoPersons.objects.filter(person_id__in=source_ids).delete()
+        Person.objects.filter(id__in=source_ids).delete()
+
+        for person_id in source_ids:
+            face_index.remove(person_id)
+        recompute_person_centroids([target.id])
+
+    return len(source_ids)
+
+
+def apply_proposals(proposals):
+    """Aplica as propostas (uma transação por destino); retorna o número de pessoas fundidas"""
+    return sum(
+        merge_persons(proposal.target, [person.id for person, _ in proposal.sources])
+        for proposal in proposals
+    )
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class GalleryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gallery"
+
+    def ready(self):
+        # Com GALLERY_MODEL_SERVER_URL, os modelos vêm do servidor de modelos (ver servidor_modelos.py)
+        from .servidor_modelos import connect_model_server
+        connect_model_server()
@@ -0,0 +1,170 @@
+"""Utilitários dos comandos de benchmark: banco descartável, biblioteca sintética e medição por etapa"""
+
+import random
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .indice_rostos import ENCODING_SIZE
+from .models import Person, Photo, Tag
+
+# Vocabulário das legendas sintéticas (pares inglês/português, com acentos)
+VOCABULARY = [
+    ('beach', 'praia'), ('family', 'família'), ('dog', 'cachorro'), ('cat', 'gato'),
+    ('birthday', 'aniversário'), ('sunset', 'pôr do sol'), ('mountain', 'montanha'),
+    ('city', 'cidade'), ('car', 'carro'), ('children', 'crianças'), ('food', 'comida'),
+    ('party', 'festa'), ('heart', 'coração'), ('river', 'rio'), ('snow', 'neve'),
+    ('garden', 'jardim'), ('bicycle', 'bicicleta'), ('wedding', 'casamento'),
+    ('church', 'igreja'), ('island', 'ilha'), ('forest', 'floresta'), ('bridge', 'ponte'),
+    ('music', 'música'), ('school', 'escola'), ('football', 'futebol'), ('boat', 'barco'),
+    ('grandmother', 'avó'), ('lunch', 'almoço'), ('flowers', 'flores'), ('rain', 'chuva'),
+]
+
+
+@contextmanager
+def throwaway_database():
+    """Cria um banco de teste temporário (como o `manage.py test`) e o remove ao final
+
+    Os benchmarks nunca tocam no banco de desenvolvimento; com SQLite o banco de teste
+    fica em memória.
+    """
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    setup_test_environment()
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+
+def build_synthetic_library(photos=500, persons=100, tags=50, persons_per_photo=2, tags_per_photo=4):
+    """Popula o banco com fotos, pessoas e tags fictícias (sem arquivos de imagem)
+
+    As relações são criadas com bulk_create na tabela intermediária, então montar
+    milhares de fotos leva poucos segundos. As legendas sorteiam palavras de VOCABULARY
+    com semente fixa, então duas execuções geram a mesma biblioteca.
+    """
+    rng = random.Random(42)
+    tag_objs = Tag.objects.bulk_create([Tag(name=f"tag{i}") for i in range(tags)])
+    person_objs = Person.objects.bulk_create([
+        Person(name=f"Pessoa {i}", centroid=bytes(4 * ENCODING_SIZE), is_manually_added=(i % 10 == 5))
+        for i in range(persons)
+    ])
+    photo_list = []
+    for i in range(photos):
+        words = rng.sample(VOCABULARY, 4)
+        photo_list.append(Photo(
+            image=f"photos/bench_{i}.jpg",
+            text=f"Foto sintética {i}",
+            caption="a synthetic photo with " + ", ".join(en for en, _ in words),
+            caption_pt="uma foto sintética com " + ", ".join(pt for _, pt in words),
+            is_favorite=(i % 3 == 0),
+            derivatives={"400": f"photos/derivatives/bench_{i}_400.webp"},
+        ))
+    photo_objs = Photo.objects.bulk_create(photo_list, batch_size=2000)
+
+    # Um décimo das pessoas aparece numa única foto (lista de pessoas ocultas)
+    hidden = person_objs[:len(person_objs) // 10]
+    visible = person_objs[len(hidden):] or person_objs
+
+    PhotoTags = Photo.tags.through
+    PhotoPersons = Photo.persons.through
+    photo_tags, photo_persons = [], []
+    for i, photo in enumerate(photo_objs):
+        for j in range(min(tags_per_photo, len(tag_objs))):
+            photo_tags.append(PhotoTags(photo_id=photo.pk, tag_id=tag_objs[(i + j) % len(tag_objs)].pk))
+        for j in range(min(persons_per_photo, len(visible))):
+            photo_persons.append(PhotoPersons(photo_id=photo.pk, person_id=visible[(i + j) % len(visible)].pk))
+    for person, photo in zip(hidden, photo_objs):
+        photo_persons.append(PhotoPersons(photo_id=photo.pk, person_id=person.pk))
+    PhotoTags.objects.bulk_create(photo_tags, batch_size=2000)
+    PhotoPersons.objects.bulk_create(photo_persons, batch_size=2000)
+
+    # Metade das pessoas com foto principal definida
+    for person in person_objs[::2]:
+        person.photo_principal = photo_objs[person.pk % len(photo_objs)] if photo_objs else None
+    Person.objects.bulk_update(person_objs[::2], ['photo_principal'])
+
+    return photo_objs, person_objs, tag_objs
+
+
+class StageTimer:
+    """Tempo acumulado e número de chamadas por etapa (seguro entre threads)
+
+    Etapas em threads diferentes se sobrepõem, então a soma dos tempos pode passar do
+    tempo total; `busy_seconds` é o tempo de relógio com pelo menos um modelo rodando.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = {}
+        self.calls = {}
+        self.busy_seconds = 0.0
+        self._active = 0
+        self._busy_since = None
+
+    def start(self):
+        """Marca o início de uma chamada; retorna o instante para o record()"""
+        now = time.perf_counter()
+        with self._lock:
+            if self._active == 0:
+                self._busy_since = now
+            self._active += 1
+        return now
+
+    def record(self, stage, seconds):
+        now = time.perf_counter()
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+            self._active -= 1
+            if self._active == 0:
+                self.busy_seconds += now - self._busy_since
+
+    def reset(self):
+        with self._lock:
+            self.seconds.clear()
+            self.calls.clear()
+            self.busy_seconds = 0.0
+            self._busy_since = time.perf_counter() if self._active else None
+
+
+class TimedModel:
+    """Proxy que mede o tempo de cada chamada ao modelo (ou aos métodos dele) na etapa `stage`"""
+
+    def __init__(self, model, stage, timer):
+        self._model = model
+        self._stage = stage
+        self._timer = timer
+
+    def _timed(self, func):
+        def wrapper(*args, **kwargs):
+            start = self._timer.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._timer.record(self._stage, time.perf_counter() - start)
+        return wrapper
+
+    def __call__(self, *args, **kwargs):
+        return self._timed(self._model)(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        value = getattr(self._model, attr)
+        return self._timed(value) if callable(value) and not isinstance(value, type) else value
+
+
+def timed_runs(func, repeat=5):
+    """Executa `func` `repeat` vezes; retorna (mediana, máximo) em milissegundos e o último resultado"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings), result
@@ -0,0 +1,543 @@
+"""Busca semântica: um embedding de imagem por foto e busca top-k por similaridade com o texto
+
+O encoder (CLIP por padrão) projeta imagens e textos no mesmo espaço, então consultas e
+vocabulário novos só passam pelo encoder de texto: as imagens nunca são reprocessadas.
+
+Os vetores ficam na tabela PhotoEmbedding (fonte da verdade, segura entre o servidor e os
+workers da fila). O processo que atende a busca mantém uma cópia compacta em disco
+(matriz float16 .npy aberta com memmap) e consulta no banco só as linhas mais novas que
+ela; quando essa diferença cresce, o worker da fila (ou, sem fila, quem grava os
+embeddings) reconstrói a matriz numa nova versão.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from PIL import Image
+
+from .metricas import span
+from .miniaturas import open_original
+from .modelos_ia import model_registry
+from .models import PhotoEmbedding
+from .traducao import QUERY_SOURCE_LANGUAGE, QUERY_TARGET_LANGUAGE, translate_text
+
+
+def semantic_setting(name, default):
+    """Lê configuração da busca semântica no settings (GALLERY_SEMANTIC_*)"""
+    return getattr(settings, f'GALLERY_SEMANTIC_{name}', default)
+
+
+def semantic_search_enabled():
+    return semantic_setting('SEARCH', True)
+
+
+def normalize(matrix):
+    """Normaliza as linhas (norma L2 = 1): o produto escalar vira similaridade de cosseno"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ============================================================================
+# ENCODERS
+# ============================================================================
+
+class ClipEncoder:
+    """Encoder CLIP local (transformers): imagens e textos (em inglês) no mesmo espaço"""
+
+    language = 'en'
+
+    def __init__(self, model_name):
+        import torch
+        from transformers import CLIPModel, CLIPProcessor
+
+        self.torch = torch
+        self.name = model_name
+        self.model = CLIPModel.from_pretrained(model_name).eval()
+        self.processor = CLIPProcessor.from_pretrained(model_name)
+        self.dim = self.model.config.projection_dim
+
+    def encode_images(self, pil_images):
+        inputs = self.processor(images=list(pil_images), return_tensors='pt')
+        with self.torch.no_grad():
+            features = self.model.get_image_features(**inputs)
+        return normalize(features.cpu().numpy())
+
+    def encode_texts(self, texts):
+        inputs = self.processor(text=list(texts), return_tensors='pt', padding=True, truncation=True)
+        with self.torch.no_grad():
+            features = self.model.get_text_features(**inputs)
+        return normalize(features.cpu().numpy())
+
+
+class StubEncoder:
+    """Encoder determinístico e sem dependências, para testes e benchmarks
+
+    Não tem semântica nenhuma: imagens viram uma projeção fixa de uma miniatura 4x4 e
+    textos a soma de vetores pseudoaleatórios por palavra.
+    """
+
+    language = None
+
+    def __init__(self, dim=64):
+        self.name = f'stub-{dim}'
+        self.dim = dim
+        self._projection = np.random.default_rng(0).standard_normal((48, dim)).astype(np.float32)
+
+    def encode_images(self, pil_images):
+        pixels = [
+            np.asarray(image.convert('RGB').resize((4, 4)), dtype=np.float32).reshape(-1) / 255.0
+            for image in pil_images
+        ]
+        return normalize(np.stack(pixels) @ self._projection)
+
+    def encode_texts(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', text.lower()):
+                vectors[row] += np.random.default_rng(zlib.crc32(word.encode('utf-8'))).standard_normal(self.dim)
+        return normalize(vectors)
+
+
+def build_encoder():
+    """Encoder configurado em GALLERY_SEMANTIC_ENCODER ('clip' ou 'stub')"""
+    if semantic_setting('ENCODER', 'clip') == 'stub':
+        return StubEncoder()
+    return ClipEncoder(semantic_setting('MODEL', 'openai/clip-vit-base-patch32'))
+
+
+def translate_query_to_english(query):
+    """Consultas em português para encoders treinados em inglês (sem tradução, usa o texto original)
+
+    Passa pela camada de tradução (backend de GALLERY_TRANSLATION_BACKEND e cache no banco)
+    esperando no máximo GALLERY_SEMANTIC_TRANSLATE_TIMEOUT. Só traduções de verdade ficam em
+    cache: se o tradutor falhar ou demorar, a próxima busca tenta de novo.
+    """
+    translated = translate_text(
+        query, semantic_setting('TRANSLATE_TIMEOUT', 1.0), QUERY_SOURCE_LANGUAGE, QUERY_TARGET_LANGUAGE
+    )
+    return translated or query
+
+
+# ============================================================================
+# EMBEDDINGS DAS FOTOS
+# ============================================================================
+
+def storage_dtype():
+    return np.dtype(semantic_setting('DTYPE', 'float16'))
+
+
+def unpack_vector(blob, dim):
+    """Vetor float32 a partir dos bytes salvos (float16 ou float32, deduzido do tamanho)"""
+    dtype = np.float16 if len(blob) == 2 * dim else np.float32
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32)
+
+
+def load_image_for_embedding(photo):
+    """Menor miniatura com pelo menos 224px (resolução do CLIP) ou a imagem original"""
+    from django.core.files.storage import default_storage
+
+    widths = sorted(int(width) for width in (photo.derivatives or {}))
+    for width in widths:
+        if width >= 224:
+            with default_storage.open(photo.derivatives[str(width)], 'rb') as fh:
+                return Image.open(fh).convert('RGB')
+    return open_original(photo)
+
+
+def encode_photo_images(pil_images):
+    """Embeddings (normalizados) de várias imagens numa chamada do encoder"""
+    encoder = model_registry.get('semantic_encoder')
+    with span('embedding', len(pil_images)):
+        return encoder.encode_images(pil_images)
+
+
+def store_photo_embedding(photo, pil_image=None, vector=None):
+    """Calcula (se preciso) e salva o embedding da foto para o encoder atual"""
+    encoder = model_registry.get('semantic_encoder')
+    if vector is None:
+        with span('embedding'):
+            vector = encoder.encode_images([pil_image])[0]
+
+    vector = np.asarray(vector, dtype=storage_dtype())
+    PhotoEmbedding.objects.update_or_create(
+        photo=photo,
+        defaults={'model': encoder.name, 'dim': vector.shape[0], 'vector': vector.tobytes()},
+    )
+
+    # Sem o worker da fila (ingestão síncrona), quem grava os embeddings mantém o índice
+    if not getattr(settings, 'GALLERY_ASYNC_INGESTION', True):
+        maintain_search_index(min_interval=semantic_setting('INLINE_CHECK_INTERVAL', 60))
+
+
+# ============================================================================
+# ÍNDICE EM DISCO
+# ============================================================================
+
+class EmbeddingIndex:
+    """Matriz de embeddings de um encoder, em disco (.npy + memmap), com busca top-k
+
+    Arquivos em GALLERY_EMBEDDINGS_DIR/<modelo>/: `state.json` aponta para a versão atual
+    de `vectors-<versão>.npy`, `ids-<versão>.npy` e (bibliotecas grandes) `ann-<versão>.faiss`.
+    Cada reconstrução grava uma versão nova e troca o state.json de forma atômica, então
+    leitores em outros processos nunca veem arquivos pela metade.
+
+    A busca só troca para versões prontas: quem reconstrói é o worker da fila
+    (maintain_search_index), a ingestão síncrona (sem fila) ou o comando build_embeddings.
+    """
+
+    REBUILD_MIN_ROWS = 256      # diferença mínima (linhas novas ou removidas) para reconstruir
+    REBUILD_FRACTION = 0.1      # ... ou 10% da matriz
+    KEEP_OLD_SECONDS = 300      # versões substituídas ficam esse tempo para quem acabou de ler o state.json
+    KEEP_PARTIAL_SECONDS = 86400  # arquivos de uma reconstrução interrompida
+    FULL_REFRESH_SECONDS = 30   # contagem (fotos removidas) e delta inteiro refeitos no máximo a cada
+    DELTA_OVERLAP = timedelta(seconds=5)  # linhas gravadas pouco antes da última leitura e confirmadas depois
+
+    VERSION_FILE = re.compile(r'^(?:vectors|ids|ann)-(\d{20}-[0-9a-f]{6})\.(?:npy|faiss)$')
+
+    def __init__(self, model_name, directory):
+        self.model_name = model_name
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._version = None
+        self._built_at = None
+        self._vectors = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_vectors = None
+        self._stale = 0
+        self._ann = None
+        self._latest = None      # max(updated_at) do encoder na última leitura do delta
+        self._checked_at = None  # time.monotonic() da última leitura completa
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.directory, 'state.json')
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as fh:
+                state = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+        return state if state.get('model') == self.model_name else None
+
+    def _open(self, state, ann=None):
+        """Passa a usar a versão do state (só troca depois de abrir todos os arquivos)"""
+        vectors, ids = None, np.empty(0, dtype=np.int64)
+        count = state['count']
+        if count:
+            vectors = np.load(os.path.join(self.directory, state['vectors']), mmap_mode='r')[:count]
+            ids = np.load(os.path.join(self.directory, state['ids']))[:count]
+            if ann is None and state.get('ann'):
+                ann = self._read_ann(os.path.join(self.directory, state['ann']))
+
+        self._vectors, self._ids, self._ann = vectors, ids, ann
+        self._version = state['version']
+        self._built_at = parse_datetime(state['built_at'])
+
+    @staticmethod
+    def _build_ann(vectors):
+        """Índice aproximado (HNSW do faiss) para bibliotecas grandes, se o faiss estiver instalado"""
+        if len(vectors) < semantic_setting('ANN_MIN_PHOTOS', 50000):
+            return None
+        try:
+            import faiss
+        except ImportError:
+            return None
+
+        ann = faiss.IndexHNSWFlat(vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        for start in range(0, len(vectors), 65536):
+            ann.add(np.ascontiguousarray(vectors[start:start + 65536], dtype=np.float32))
+        return ann
+
+    @staticmethod
+    def _read_ann(path):
+        try:
+            import faiss
+        except ImportError:
+            return None  # sem faiss neste processo: busca exata na matriz
+        return faiss.read_index(path)
+
+    def rebuild(self):
+        """Grava uma nova versão da matriz (e do HNSW) com todos os embeddings do encoder
+
+        Os arquivos são gravados com nomes temporários e só viram uma versão (nome com a
+        data, em ordem cronológica) quando estão completos.
+        """
+        rows = PhotoEmbedding.objects.filter(model=self.model_name).order_by('photo_id')
+        built_at = timezone.now()  # linhas salvas durante a reconstrução entram no delta
+        total = rows.count()
+        dim = rows.values_list('dim', flat=True).first() or 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        partial = os.path.join(self.directory, f"partial-{uuid.uuid4().hex[:12]}")
+        files = {}
+
+        count = 0
+        ann = None
+        if total:
+            files['vectors'] = f"{partial}-vectors.npy"
+            vectors = np.lib.format.open_memmap(files['vectors'], mode='w+', dtype=storage_dtype(), shape=(total, dim))
+            ids = np.empty(total, dtype=np.int64)
+            for photo_id, row_dim, blob in rows.values_list('photo_id', 'dim', 'vector').iterator(chunk_size=2000):
+                if count >= total:
+                    break
+                if row_dim != dim:
+                    continue
+                vectors[count] = unpack_vector(bytes(blob), dim)
+                ids[count] = photo_id
+                count += 1
+            vectors.flush()
+
+            files['ids'] = f"{partial}-ids.npy"
+            np.save(files['ids'], ids[:count])
+            ann = self._build_ann(vectors[:count])
+            del vectors
+            if ann is not None:
+                import faiss
+                files['ann'] = f"{partial}-ann.faiss"
+                faiss.write_index(ann, files['ann'])
+
+        version = f"{timezone.now():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        state = {
+            "model": self.model_name,
+            "version": version,
+            "built_at": built_at.isoformat(),
+            "dim": dim,
+            "dtype": storage_dtype().name,
+            "count": count,
+            "vectors": None,
+            "ids": None,
+            "ann": None,
+        }
+        for kind, path in files.items():
+            if count:
+                state[kind] = f"{kind}-{version}{os.path.splitext(path)[1]}"
+                os.replace(path, os.path.join(self.directory, state[kind]))
+            else:
+                os.remove(path)
+
+        temp_path = f"{partial}-state.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as fh:
+            json.dump(state, fh)
+        os.replace(temp_path, self.state_path)
+
+        with self.lock:
+            self._open(state, ann)
+            self._delta_ids, self._delta_vectors, self._stale = np.empty(0, dtype=np.int64), None, 0
+            self._latest = self._checked_at = None  # linhas salvas durante a reconstrução
+        self._remove_old_versions()
+
+    def _remove_old_versions(self):
+        """Apaga as versões anteriores à carregada e os restos de reconstruções interrompidas
+
+        Versões mais novas (de uma reconstrução em outro processo) nunca são apagadas, e as
+        antigas só depois de KEEP_OLD_SECONDS, para quem acabou de ler o state.json.
+        """
+        now = time.time()
+        for name in os.listdir(self.directory):
+            match = self.VERSION_FILE.match(name)
+            if match:
+                if match.group(1) >= self._version:
+                    continue
+                keep_seconds = self.KEEP_OLD_SECONDS
+            elif name.startswith('partial-'):
+                keep_seconds = self.KEEP_PARTIAL_SECONDS
+            else:
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > keep_seconds:
+                    os.remove(path)
+            except OSError:
+                pass  # ainda aberto por outro processo (Windows); sai na próxima reconstrução
+
+    def refresh(self, full=False):
+        """Troca para a versão mais nova em disco e carrega do banco os embeddings mais novos que ela
+
+        A cada chamada só confere o max(updated_at) do encoder: sem gravação nova nada é lido,
+        e com gravação nova vêm só as linhas a partir da última vista. A contagem (fotos
+        removidas) e o delta inteiro são refeitos numa versão nova, com `full` ou a cada
+        FULL_REFRESH_SECONDS. Nunca reconstrói: sem versão em disco, todos os embeddings do
+        encoder ficam no delta.
+        """
+        state = self._read_state()
+        if state is not None and state['version'] != self._version:
+            try:
+                self._open(state)
+                full = True
+            except (OSError, RuntimeError) as e:
+                # Versão apagada depois de lermos o state.json: continua na atual
+                print(f"Erro ao abrir a versão {state['version']} do índice semântico: {e}")
+
+        embeddings = PhotoEmbedding.objects.filter(model=self.model_name)
+        latest = embeddings.aggregate(latest=Max('updated_at'))['latest']
+        now = time.monotonic()
+        full = full or self._checked_at is None or now - self._checked_at > self.FULL_REFRESH_SECONDS
+        if not full and latest == self._latest:
+            return
+
+        if full:
+            delta = embeddings if self._built_at is None else embeddings.filter(updated_at__gte=self._built_at)
+            delta_ids, delta_vectors = self._read_rows(delta)
+            total = embeddings.count()
+            new_rows = int((~np.isin(delta_ids, self._ids)).sum())
+            self._stale = max(0, len(self._ids) + new_rows - total)  # fotos removidas que ainda estão na matriz
+            self._checked_at = now
+        else:
+            since = self._latest - self.DELTA_OVERLAP if self._latest else self._built_at
+            newer = embeddings if since is None else embeddings.filter(updated_at__gte=since)
+            delta_ids, delta_vectors = self._read_rows(newer)
+            if self._delta_vectors is not None:
+                # Fotos lidas de novo valem pela versão mais nova
+                keep = ~np.isin(self._delta_ids, delta_ids)
+                delta_ids = np.concatenate([self._delta_ids[keep], delta_ids])
+                delta_vectors = np.vstack([self._delta_vectors[keep], delta_vectors]) if len(delta_ids) else None
+
+        self._delta_ids, self._delta_vectors = delta_ids, delta_vectors
+        self._latest = latest
+
+    @staticmethod
+    def _read_rows(queryset):
+        """(ids, vetores normalizados ou None) das linhas do queryset"""
+        rows = list(queryset.values_list('photo_id', 'dim', 'vector'))
+        ids = np.array([photo_id for photo_id, _, _ in rows], dtype=np.int64)
+        vectors = normalize([unpack_vector(bytes(blob), dim) for _, dim, blob in rows]) if rows else None
+        return ids, vectors
+
+    def needs_rebuild(self):
+        """Sem versão em disco, ou com o delta (ou as fotos removidas) grande demais (depois de refresh)"""
+        threshold = max(self.REBUILD_MIN_ROWS, self.REBUILD_FRACTION * len(self._ids))
+        return self._version is None or len(self._delta_ids) > threshold or self._stale > threshold
+
+    def _base_scores(self, query):
+        """Similaridade com todas as linhas da matriz, em blocos (o memmap float16 não é lido inteiro)"""
+        scores = np.empty(len(self._ids), dtype=np.float32)
+        for start in range(0, len(self._ids), 65536):
+            block = np.asarray(self._vectors[start:start + 65536], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        return scores
+
+    def search(self, query_vector, k=20):
+        """Lista de (photo_id, score) em ordem decrescente de similaridade
+
+        Pode trazer até `k + fotos removidas` resultados: quem chama descarta os IDs que
+        não existem mais.
+        """
+        query = normalize([query_vector])[0]
+
+        with self.lock:
+            self.refresh()
+            limit = k + self._stale
+            candidate_ids, candidate_scores = [], []
+
+            if len(self._ids):
+                if self._ann is not None:
+                    scores, rows = self._ann.search(query[None, :], limit + len(self._delta_ids))
+                    valid = rows[0] >= 0
+                    ids, scores = self._ids[rows[0][valid]], scores[0][valid]
+                else:
+                    scores = self._base_scores(query)
+                    top = min(limit + len(self._delta_ids), len(scores))
+                    rows = np.argpartition(-scores, top - 1)[:top]
+                    ids, scores = self._ids[rows], scores[rows]
+
+                # Fotos reprocessadas depois da reconstrução valem pela versão do delta
+                keep = ~np.isin(ids, self._delta_ids)
+                candidate_ids.append(ids[keep])
+                candidate_scores.append(scores[keep])
+
+            if self._delta_vectors is not None:
+                candidate_ids.append(self._delta_ids)
+                candidate_scores.append(self._delta_vectors @ query)
+
+        if not candidate_ids:
+            return []
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores)[:limit]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(model_name):
+    """Índice (um por processo) dos embeddings do encoder informado"""
+    with _indexes_lock:
+        index = _indexes.get(model_name)
+        if index is None:
+            directory = os.path.join(
+                str(getattr(settings, 'GALLERY_EMBEDDINGS_DIR', os.path.join(settings.MEDIA_ROOT, 'embeddings'))),
+                slugify(model_name.replace('/', '-')),
+            )
+            index = _indexes[model_name] = EmbeddingIndex(model_name, directory)
+        return index
+
+
+_maintenance_lock = threading.Lock()
+_last_maintenance = 0.0
+
+
+def maintain_search_index(min_interval=0):
+    """Reconstrói o índice do encoder atual quando a diferença para o banco passa do limite
+
+    Chamado periodicamente pelo worker da fila e, sem fila, depois de gravar embeddings (no
+    máximo a cada `min_interval` segundos); nunca pela busca. Retorna True se reconstruiu.
+    """
+    global _last_maintenance
+
+    # Um worker por vez no processo; os outros seguem com os jobs
+    if not semantic_search_enabled() or time.monotonic() - _last_maintenance < min_interval:
+        return False
+    if not _maintenance_lock.acquire(blocking=False):
+        return False
+    try:
+        _last_maintenance = time.monotonic()
+        index = get_index(model_registry.get('semantic_encoder').name)
+        with index.lock:
+            index.refresh(full=True)
+            needed = index.needs_rebuild()
+        if needed:
+            index.rebuild()
+        return needed
+    except Exception as e:
+        print(f"Erro ao reconstruir o índice da busca semântica: {e}")
+        return False
+    finally:
+        _maintenance_lock.release()
+
+
+def semantic_search(query, k=20):
+    """Top-k (photo_id, score) das fotos mais parecidas com o texto da consulta"""
+    encoder = model_registry.get('semantic_encoder')
+
+    text = query
+    if encoder.language == 'en' and semantic_setting('TRANSLATE_QUERIES', True):
+        text = translate_query_to_english(query)
+
+    with span('query_encode'):
+        query_vector = encoder.encode_texts([text])[0]
+    index = get_index(encoder.name)
+    with span('index_search'):
+        return index.search(query_vector, k)
@@ -0,0 +1,167 @@
+"""Busca textual das fotos com índice SQLite FTS5 (texto, captions, tags e nomes das pessoas)
+
+O índice `gallery_photo_fts` é criado pela migração 0007 e mantido por triggers no próprio
+banco: inserir/editar fotos, adicionar/remover tags e pessoas ou renomear uma tag/pessoa
+atualiza os documentos afetados, inclusive em `bulk_create` e `QuerySet.update()`.
+Em bancos sem FTS5 a busca volta para o `icontains` antigo.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Photo
+from .paginacao import InvalidCursor, decode_token, encode_token
+
+FTS_TABLE = 'gallery_photo_fts'
+
+# Pesos do bm25 por coluna, na ordem: text, caption, caption_pt, tags, persons
+COLUMN_WEIGHTS = (2.0, 1.0, 1.0, 2.0, 3.0)
+
+# Termos com pelo menos esse tamanho também casam por prefixo ("prai" -> "praia")
+MIN_PREFIX_LENGTH = 2
+
+# Documento indexado de cada foto (os triggers da migração 0007 usam a mesma consulta)
+DOCUMENT_SELECT = """
+    SELECT p.id,
+           COALESCE(p.text, ''),
+           COALESCE(p.caption, ''),
+           COALESCE(p.caption_pt, ''),
+           COALESCE((SELECT group_concat(t.name, ' ') FROM gallery_photo_tags pt
+                     JOIN gallery_tag t ON t.id = pt.tag_id WHERE pt.photo_id = p.id), ''),
+           COALESCE((SELECT group_concat(pe.name, ' ') FROM gallery_photo_persons pp
+                     JOIN gallery_person pe ON pe.id = pp.person_id WHERE pp.photo_id = p.id), '')
+    FROM gallery_photo p
+"""
+
+_fts_ready = False
+
+
+def fts_available():
+    """True se o banco é SQLite e a tabela FTS5 existe"""
+    global _fts_ready
+    if _fts_ready:
+        return True
+    if connection.vendor != 'sqlite':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        _fts_ready = cursor.fetchone() is not None
+    return _fts_ready
+
+
+def build_match_query(query):
+    """Converte o texto digitado numa expressão MATCH do FTS5 (termos entre aspas, OR, prefixo)
+
+    Acentos e caixa são tratados pelo tokenizer (unicode61 remove_diacritics 2), então
+    "familia" encontra "família". Retorna '' se não houver nenhum termo.
+    """
+    terms = []
+    for word in re.findall(r'\w+', query.lower()):
+        term = f'"{word}"'
+        if len(word) >= MIN_PREFIX_LENGTH:
+            term += '*'
+        if term not in terms:
+            terms.append(term)
+    return ' OR '.join(terms)
+
+
+def search_photo_ids(query, limit, after=None):
+    """IDs das fotos que casam com `query`, do mais para o menos relevante (bm25)
+
+    Retorna uma lista de (photo_id, score); empates de score saem por id. Com `after`
+    (score, id) da última foto já vista, continua o ranking depois dela.
+
+    O bm25 depende das estatísticas do índice inteiro (número de fotos, tamanho médio
+    dos documentos), então qualquer foto nova muda o score de todas. Por isso o keyset
+    compara com o score *atual* da última foto vista, calculado na mesma consulta; o
+    score guardado no cursor só vale se ela não casar mais com a busca.
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    ranked = f"""
+        SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score
+        FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+    """
+    if after is None:
+        sql = f"SELECT rowid, score FROM ({ranked}) ORDER BY score, rowid LIMIT %s"
+        params = [match, limit]
+    else:
+        score, photo_id = after
+        sql = f"""
+            WITH last(score) AS (SELECT COALESCE(
+                (SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE}
+                 WHERE {FTS_TABLE} MATCH %s AND rowid = %s), %s
+            ))
+            SELECT r.rowid, r.score FROM ({ranked}) r, last
+            WHERE r.score > last.score OR (r.score = last.score AND r.rowid > %s)
+            ORDER BY r.score, r.rowid LIMIT %s
+        """
+        params = [match, photo_id, score, match, photo_id, limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def decode_search_cursor(token):
+    """(score, id) da última foto da página anterior ou InvalidCursor"""
+    score, photo_id = decode_token(token, 2)
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not isinstance(photo_id, int):
+        raise InvalidCursor(token)
+    return float(score), photo_id
+
+
+def search_page(query, page_size, cursor=None):
+    """Uma página da busca ranqueada: (fotos na ordem de relevância, próximo cursor ou None)
+
+    O cursor guarda (score, id) da última foto da página, como o keyset das listagens
+    (paginacao.py): a página seguinte começa depois dela no ranking (ver
+    search_photo_ids). Fotos novas só aparecem se ficarem depois do cursor, sem
+    deslocar nem repetir as já vistas, e nenhuma página percorre as anteriores com OFFSET.
+    """
+    after = decode_search_cursor(cursor) if cursor else None
+
+    rows = search_photo_ids(query, page_size + 1, after)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    photos_by_id = Photo.objects.for_listing().in_bulk([photo_id for photo_id, _ in rows])
+    photos = [photos_by_id[photo_id] for photo_id, _ in rows if photo_id in photos_by_id]
+
+    next_cursor = None
+    if has_more:
+        last_id, last_score = rows[-1]
+        next_cursor = encode_token([last_score, last_id])
+    return photos, next_cursor
+
+
+def legacy_search_queryset(query):
+    """Busca antiga por icontains (bancos sem FTS5): qualquer palavra em qualquer campo"""
+    q_objects = Q()
+    for word in query.lower().split():
+        q_objects |= (
+            Q(text__icontains=word) |
+            Q(caption__icontains=word) |
+            Q(caption_pt__icontains=word) |
+            Q(tags__name__icontains=word) |
+            Q(persons__name__icontains=word)
+        )
+    return Photo.objects.filter(q_objects).distinct()
+
+
+def rebuild_index():
+    """Recria todos os documentos do índice a partir das tabelas (ex: após restaurar um backup)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, text, caption, caption_pt, tags, persons) {DOCUMENT_SELECT}"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
@@ -0,0 +1,82 @@
+"""Cache em memória dos resultados de inferência do preview, indexado pelo hash do conteúdo da imagem"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def content_hash(image_file):
+    """SHA-256 do conteúdo do arquivo enviado (volta o ponteiro para o início)"""
+    digest = hashlib.sha256()
+
+    if hasattr(image_file, 'chunks'):
+        for chunk in image_file.chunks():
+            digest.update(chunk)
+    else:
+        for chunk in iter(lambda: image_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    image_file.seek(0)
+    return digest.hexdigest()
+
+
+class InferenceResultCache:
+    """Cache LRU com expiração (TTL), seguro entre threads
+
+    É local ao processo: com vários workers web, o upload só reaproveita o preview
+    quando cai no mesmo processo; caso contrário a IA roda normalmente.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=1800):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+inference_cache = InferenceResultCache(
+    max_entries=getattr(settings, 'GALLERY_INFERENCE_CACHE_SIZE', 256),
+    ttl_seconds=getattr(settings, 'GALLERY_INFERENCE_CACHE_TTL', 1800),
+)
@@ -0,0 +1,98 @@
+"""Características visuais da imagem (cores, brilho, contraste, orientação) extraídas numa única passada
+
+Uma redução para FEATURE_SIZE x FEATURE_SIZE alimenta todas as estatísticas (vetorizadas
+com numpy); descrição, tags e filtros da galeria usam o mesmo resultado, que fica salvo
+em colunas da foto para filtrar sem reabrir as imagens.
+"""
+
+import numpy as np
+
+from .metricas import timed
+
+FEATURE_SIZE = 128
+
+# Cores nomeadas por faixa de matiz (graus); pixels pouco saturados ou escuros viram tons neutros
+HUE_EDGES = [15, 45, 70, 165, 195, 255, 290, 345]
+HUE_NAMES = ['red', 'orange', 'yellow', 'green', 'cyan', 'blue', 'purple', 'pink', 'red']
+NEUTRAL_NAMES = ['white', 'gray', 'black']
+COLOR_NAMES = ['red', 'orange', 'yellow', 'green', 'cyan', 'blue', 'purple', 'pink'] + NEUTRAL_NAMES
+
+MIN_SATURATION = 0.2  # abaixo disso o pixel é neutro
+MIN_VALUE = 0.2
+
+ORIENTATIONS = ['landscape', 'portrait', 'square']
+
+# Limiares de brilho (0-255) do filtro ?light= da galeria (os mesmos das tags 'bright' e 'dark')
+BRIGHT_THRESHOLD = 180
+DARK_THRESHOLD = 80
+
+
+def orientation_for(width, height):
+    """'landscape', 'portrait' ou 'square' (tolerância de 5%)"""
+    aspect_ratio = width / height
+    if 0.95 < aspect_ratio < 1.05:
+        return 'square'
+    return 'landscape' if aspect_ratio > 1 else 'portrait'
+
+
+class ImageFeatures:
+    """Estatísticas de cor e forma de uma imagem (ver extract_image_features)"""
+
+    def __init__(self, width, height, avg_color, std_color, saturation, color_histogram):
+        self.aspect_ratio = width / height
+        self.orientation = orientation_for(width, height)
+        self.avg_color = avg_color  # média por canal RGB
+        self.std_color = std_color  # desvio padrão por canal RGB
+        self.brightness = float(avg_color.mean())
+        self.contrast = float(std_color.mean())
+        self.saturation = saturation  # saturação média (HSV), de 0 a 1
+        self.color_histogram = color_histogram  # {cor: fração dos pixels}
+        self.dominant_color = max(color_histogram, key=color_histogram.get)
+
+    def model_fields(self):
+        """Valores das colunas de características da foto"""
+        return {
+            'aspect_ratio': round(self.aspect_ratio, 4),
+            'orientation': self.orientation,
+            'brightness': round(self.brightness, 2),
+            'contrast': round(self.contrast, 2),
+            'saturation': round(self.saturation, 4),
+            'dominant_color': self.dominant_color,
+            'color_histogram': self.color_histogram,
+        }
+
+
+def color_histogram(hsv):
+    """Fração dos pixels de cada cor nomeada, a partir da imagem em HSV (valores 0-1)"""
+    hue, saturation, value = hsv[..., 0] * 360, hsv[..., 1], hsv[..., 2]
+
+    colored = (saturation >= MIN_SATURATION) & (value >= MIN_VALUE)
+    # Neutros: claro, médio ou escuro
+    neutral = len(HUE_NAMES) + np.select([value >= 0.8, value >= 0.3], [0, 1], default=2)
+    labels = np.where(colored, np.digitize(hue, HUE_EDGES), neutral)
+    counts = np.bincount(labels.ravel(), minlength=len(HUE_NAMES) + len(NEUTRAL_NAMES)) / labels.size
+
+    histogram = dict.fromkeys(COLOR_NAMES, 0.0)
+    for index, name in enumerate(HUE_NAMES + NEUTRAL_NAMES):
+        histogram[name] += float(counts[index])
+    return {name: round(share, 3) for name, share in histogram.items()}
+
+
+@timed('features')
+def extract_image_features(pil_image):
+    """Extrai as características da imagem com uma única redução de tamanho"""
+    # reducing_gap reduz primeiro por fator inteiro (rápido) e só refina no fim
+    rgb_image = pil_image if pil_image.mode == 'RGB' else pil_image.convert('RGB')  # convert sempre copia
+    sample = rgb_image.resize((FEATURE_SIZE, FEATURE_SIZE), reducing_gap=3.0)
+
+    rgb = np.asarray(sample, dtype=np.float32)
+    hsv = np.asarray(sample.convert('HSV'), dtype=np.float32) / 255.0
+
+    return ImageFeatures(
+        width=pil_image.width,
+        height=pil_image.height,
+        avg_color=rgb.mean(axis=(0, 1)),
+        std_color=rgb.std(axis=(0, 1)),
+        saturation=float(hsv[..., 1].mean()),
+        color_histogram=color_histogram(hsv),
+    )
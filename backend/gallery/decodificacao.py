@@ -0,0 +1,97 @@
+"""Decodificação única das fotos para a IA: resolução de trabalho direto do JPEG e orientação do EXIF
+
+Uma foto de celular de 48MP decodificada inteira ocupa ~150MB em RGB e leva centenas
+de ms antes de qualquer modelo rodar. Aqui o JPEG já é decodificado reduzido (draft: o
+decoder aplica a escala 1/2, 1/4 ou 1/8 na própria DCT) para a menor escala que ainda
+cobre a resolução de trabalho; a orientação do EXIF é aplicada e só então a imagem é
+reduzida com LANCZOS até o tamanho final. Outros formatos são decodificados inteiros.
+
+Cada foto é decodificada uma vez por request (ou job): o DecodedImage guarda a imagem
+RGB, o array numpy dela (rostos) e uma cópia reduzida (características, embedding,
+miniaturas), criados no primeiro uso e compartilhados por todas as etapas. As etapas
+só leem: o array é somente leitura e a imagem nunca é alterada depois de decodificada.
+"""
+
+import math
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .metricas import timed
+
+# Maior lado da cópia reduzida (detecção de rostos, características, CLIP e miniaturas usam menos que isso)
+SMALL_SIZE = 1024
+
+
+def draft_size(size, max_size):
+    """Tamanho (mesma proporção) que a decodificação reduzida ainda precisa cobrir"""
+    width, height = size
+    scale = max_size / max(width, height)
+    if scale >= 1:
+        return size
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def fit_size(size, max_size):
+    """Tamanho com o maior lado limitado a `max_size` (mesma proporção)"""
+    width, height = size
+    scale = max_size / max(width, height)
+    if scale >= 1:
+        return size
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class DecodedImage:
+    """Foto decodificada uma vez: RGB na resolução de trabalho, array numpy e cópia reduzida"""
+
+    def __init__(self, image, original_size):
+        self.image = image
+        self.original_size = original_size  # tamanho do arquivo, antes da redução (sem rotação)
+        self._array = None
+        self._small = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def array(self):
+        """Pixels em numpy (somente leitura), para as etapas que trabalham com arrays (rostos)"""
+        if self._array is None:
+            with self._lock:
+                if self._array is None:
+                    self._array = np.asarray(self.image)
+        return self._array
+
+    @property
+    def small(self):
+        """Cópia com o maior lado em SMALL_SIZE (a própria imagem, se já for menor)"""
+        if self._small is None:
+            with self._lock:
+                if self._small is None:
+                    size = fit_size(self.image.size, SMALL_SIZE)
+                    self._small = (
+                        self.image if size == self.image.size
+                        else self.image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+                    )
+        return self._small
+
+
+@timed('decode')
+def decode_image(image_file, max_size):
+    """Abre a foto (caminho ou arquivo) em RGB, orientada pelo EXIF, com o maior lado limitado a `max_size`"""
+    image = Image.open(image_file)
+    original_size = image.size
+
+    # Só JPEG: escolhe a escala da DCT antes de decodificar (nos demais formatos não faz nada)
+    image.draft('RGB', draft_size(original_size, max_size))
+    image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    ImageOps.exif_transpose(image, in_place=True)
+
+    if max(image.size) > max_size:
+        image = image.resize(fit_size(image.size, max_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return DecodedImage(image, original_size)
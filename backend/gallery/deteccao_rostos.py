@@ -0,0 +1,213 @@
+"""Perfis de detecção de rostos: detecta numa cópia reduzida e calcula os encodings em resolução cheia
+
+O detector (HOG ou CNN do dlib) é a etapa cara do reconhecimento facial e o custo cresce
+com a área da imagem. Cada perfil define até que tamanho a imagem é reduzida antes da
+detecção; as caixas encontradas são levadas de volta para a imagem original e só o
+recorte em volta de cada rosto é passado ao encoder, com os detalhes da resolução cheia.
+
+Upsample e jitter se adaptam ao tamanho dos rostos: a detecção só é refeita com mais
+upsample quando a primeira passada acha rostos perto do tamanho mínimo do detector (sinal
+de grupo com rostos ainda menores), e rostos grandes, que já geram um encoding estável,
+usam menos jitters que os pequenos.
+"""
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .metricas import timed
+from .modelos_ia import LazyModel, model_registry
+
+face_recognition = LazyModel(model_registry, 'face_recognition')
+
+# Menor rosto (px) que cada detector encontra sem upsample
+DETECTOR_MIN_FACE = {'hog': 80, 'cnn': 40}
+
+# Margem (fração do lado do rosto) do recorte passado ao encoder: o preditor de pontos
+# faciais precisa enxergar um pouco além da caixa
+CROP_MARGIN = 0.5
+
+FACE_DETECTION_PROFILES = {
+    # Só HOG numa cópia pequena: rostos a partir de ~1/8 do lado da imagem
+    'fast': {
+        'detect_size': 640,
+        'model': 'hog',
+        'upsample': 0,
+        'max_upsample': 0,
+        'jitters': 1,
+        'large_face_jitters': 1,
+    },
+    # CNN numa cópia de 1024px; refaz com upsample quando acha rostos pequenos
+    'balanced': {
+        'detect_size': 1024,
+        'model': 'cnn',
+        'upsample': 0,
+        'max_upsample': 1,
+        'jitters': 2,
+        'large_face_jitters': 1,
+    },
+    # CNN na imagem inteira com upsample, como antes, e mais jitters
+    'accurate': {
+        'detect_size': 2048,
+        'model': 'cnn',
+        'upsample': 1,
+        'max_upsample': 1,
+        'jitters': 4,
+        'large_face_jitters': 2,
+    },
+}
+
+# Rosto a partir deste lado (px, na imagem original) usa `large_face_jitters`
+LARGE_FACE_SIZE = 160
+
+
+def face_setting(name, default):
+    """Lê configuração do reconhecimento facial no settings (GALLERY_FACE_*)"""
+    return getattr(settings, f'GALLERY_FACE_{name}', default)
+
+
+def get_profile(name=None):
+    """Perfil de detecção pelo nome (padrão: GALLERY_FACE_PROFILE)"""
+    name = name or face_setting('PROFILE', 'balanced')
+    if name not in FACE_DETECTION_PROFILES:
+        raise ValueError(f"Perfil de detecção de rostos desconhecido: {name}")
+    return FACE_DETECTION_PROFILES[name]
+
+
+# ============================================================================
+# DETECÇÃO
+# ============================================================================
+
+def downscale_for_detection(img_array, detect_size):
+    """Cópia reduzida para o maior lado caber em `detect_size`; retorna (imagem, escala original/reduzida)"""
+    height, width = img_array.shape[:2]
+    scale = max(height, width) / detect_size
+    if scale <= 1:
+        return img_array, 1.0
+
+    size = (max(1, round(width / scale)), max(1, round(height / scale)))
+    small = Image.fromarray(img_array).resize(size, Image.BILINEAR, reducing_gap=2.0)
+    return np.asarray(small), scale
+
+
+def scale_locations(face_locations, scale, img_shape):
+    """Leva as caixas (top, right, bottom, left) da cópia reduzida para a imagem original"""
+    height, width = img_shape[:2]
+    return [
+        (
+            max(0, int(top * scale)),
+            min(width, int(round(right * scale))),
+            min(height, int(round(bottom * scale))),
+            max(0, int(left * scale)),
+        )
+        for top, right, bottom, left in face_locations
+    ]
+
+
+def needs_more_upsample(face_locations, profile, upsample):
+    """Algum rosto achado está perto do tamanho mínimo do detector (provavelmente há menores)?"""
+    if upsample >= profile['max_upsample'] or not face_locations:
+        return False
+    min_face = DETECTOR_MIN_FACE[profile['model']] / (2 ** upsample)
+    smallest = min(min(bottom - top, right - left) for top, right, bottom, left in face_locations)
+    return smallest < 1.5 * min_face
+
+
+def refine_locations(small, locations, profile):
+    """Refaz a detecção com mais upsample enquanto os rostos achados forem pequenos"""
+    upsample = profile['upsample']
+    while needs_more_upsample(locations, profile, upsample):
+        upsample += 1
+        locations = face_recognition.face_locations(
+            small, number_of_times_to_upsample=upsample, model=profile['model']
+        )
+    return locations
+
+
+@timed('face_detect')
+def locate_faces(img_array, profile=None):
+    """Caixas dos rostos (coordenadas da imagem original) detectados na cópia reduzida"""
+    profile = profile or get_profile()
+    small, scale = downscale_for_detection(img_array, profile['detect_size'])
+    locations = face_recognition.face_locations(
+        small, number_of_times_to_upsample=profile['upsample'], model=profile['model']
+    )
+    locations = refine_locations(small, locations, profile)
+    return scale_locations(locations, scale, img_array.shape)
+
+
+@timed('face_detect')
+def batch_locate_faces(img_arrays, profile=None):
+    """Como locate_faces para várias imagens; cópias CNN de mesmo tamanho vão numa única chamada"""
+    profile = profile or get_profile()
+    downscaled = [downscale_for_detection(img_array, profile['detect_size']) for img_array in img_arrays]
+    locations = [None] * len(img_arrays)
+
+    # face_recognition só faz batch com CNN e imagens do mesmo tamanho
+    if profile['model'] == 'cnn':
+        groups = {}
+        for idx, (small, _) in enumerate(downscaled):
+            groups.setdefault(small.shape, []).append(idx)
+
+        for indices in groups.values():
+            if len(indices) > 1:
+                batch = [downscaled[i][0] for i in indices]
+                results = face_recognition.batch_face_locations(
+                    batch, number_of_times_to_upsample=profile['upsample'], batch_size=len(batch)
+                )
+                for i, result in zip(indices, results):
+                    locations[i] = result
+
+    for idx, (small, _) in enumerate(downscaled):
+        if locations[idx] is None:
+            locations[idx] = face_recognition.face_locations(
+                small, number_of_times_to_upsample=profile['upsample'], model=profile['model']
+            )
+
+    return [
+        scale_locations(refine_locations(small, found, profile), scale, img_array.shape)
+        for img_array, (small, scale), found in zip(img_arrays, downscaled, locations)
+    ]
+
+
+# ============================================================================
+# ENCODINGS
+# ============================================================================
+
+def jitters_for(face_location, profile):
+    top, right, bottom, left = face_location
+    if min(bottom - top, right - left) >= LARGE_FACE_SIZE:
+        return profile['large_face_jitters']
+    return profile['jitters']
+
+
+def face_crop(img_array, face_location):
+    """Recorte com margem em volta do rosto e a caixa nas coordenadas do recorte"""
+    height, width = img_array.shape[:2]
+    top, right, bottom, left = face_location
+    margin = int(max(bottom - top, right - left) * CROP_MARGIN)
+
+    y0, x0 = max(0, top - margin), max(0, left - margin)
+    y1, x1 = min(height, bottom + margin), min(width, right + margin)
+    crop = np.ascontiguousarray(img_array[y0:y1, x0:x1])
+    return crop, (top - y0, right - x0, bottom - y0, left - x0)
+
+
+@timed('face_encode')
+def encode_faces(img_array, face_locations, profile=None):
+    """Encodings dos rostos, calculados só sobre o recorte de cada um na resolução original"""
+    profile = profile or get_profile()
+    encodings = []
+    for face_location in face_locations:
+        crop, location = face_crop(img_array, face_location)
+        encodings.extend(face_recognition.face_encodings(
+            crop, [location], num_jitters=jitters_for(face_location, profile)
+        ))
+    return encodings
+
+
+def detect_and_encode_faces(img_array, profile=None):
+    """(caixas, encodings) dos rostos da imagem usando o perfil de detecção"""
+    profile = profile or get_profile()
+    face_locations = locate_faces(img_array, profile)
+    return face_locations, encode_faces(img_array, face_locations, profile)
@@ -0,0 +1,309 @@
+"""Detecção de fotos duplicadas: SHA-256 (cópia exata) e dHash (cópia redimensionada ou recomprimida)
+
+O índice de hashes perceptuais é uma tabela multi-índice: os 64 bits do dHash são
+divididos em max_distance + 1 segmentos e, pelo princípio da casa dos pombos, duas fotos
+a no máximo max_distance bits de distância têm pelo menos um segmento idêntico. Cada
+segmento é um array ordenado (busca binária), então uma consulta só compara a foto com
+os candidatos que compartilham algum segmento, e não com a biblioteca inteira.
+"""
+
+import threading
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .cache_resultados import content_hash
+from .metricas import timed
+from .models import Photo
+
+HASH_SIZE = 8  # dHash 8x8 = 64 bits
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# Imagens praticamente uniformes (tudo preto, tela branca...) têm dHash sem informação
+MIN_PIXEL_RANGE = 8
+
+# Linhas por bloco ao comparar todos os pares de um segmento (limita a memória)
+PAIRS_BLOCK_SIZE = 1024
+
+
+def duplicate_setting(name, default):
+    """Lê configuração da detecção de duplicatas no settings (GALLERY_DUPLICATE_*)"""
+    return getattr(settings, f'GALLERY_DUPLICATE_{name}', default)
+
+
+def duplicate_detection_enabled():
+    return duplicate_setting('DETECTION', True)
+
+
+# ============================================================================
+# HASHES
+# ============================================================================
+
+def dhash(pil_image):
+    """dHash de 64 bits (int): brilho de cada pixel comparado com o vizinho, na imagem reduzida a 9x8
+
+    Retorna None para imagens praticamente uniformes, em que o hash seria só ruído.
+    """
+    small = pil_image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.int16)
+    if pixels.max() - pixels.min() < MIN_PIXEL_RANGE:
+        return None
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hash_to_hex(value):
+    return None if value is None else f"{value:016x}"
+
+
+def perceptual_hash(pil_image):
+    """dHash em hexadecimal (como fica salvo na foto) ou None"""
+    return hash_to_hex(dhash(pil_image))
+
+
+def perceptual_hash_of_file(image_file):
+    """dHash do arquivo; JPEGs são decodificados direto em escala reduzida (draft), bem mais rápido
+
+    A orientação do EXIF é aplicada, como na imagem que a IA recebe (ver decodificacao.py).
+    """
+    try:
+        image = Image.open(image_file)
+        image.draft('L', (64, 64))
+        return perceptual_hash(ImageOps.exif_transpose(image))
+    except Exception as e:
+        print(f"Erro ao calcular hash perceptual: {e}")
+        return None
+    finally:
+        image_file.seek(0)
+
+
+@timed('fingerprint')
+def fingerprint(image_file):
+    """(SHA-256, dHash em hex) do arquivo enviado"""
+    return content_hash(image_file), perceptual_hash_of_file(image_file)
+
+
+def hamming_distances(hashes, value):
+    """Bits diferentes entre cada hash (array uint64) e `value`"""
+    return np.bitwise_count(hashes ^ np.uint64(value))
+
+
+# ============================================================================
+# ÍNDICE MULTI-SEGMENTO
+# ============================================================================
+
+class PerceptualHashIndex:
+    """Consultas por raio de Hamming sobre os dHashes da biblioteca
+
+    A parte principal fica em arrays numpy ordenados por segmento; fotos novas entram num
+    delta (comparado por força bruta) que é incorporado quando passa de 10% do índice.
+    Fotos removidas ficam marcadas até a próxima reconstrução.
+    """
+
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        self.lock = threading.RLock()
+        self.loaded = False
+
+        # max_distance + 1 segmentos de larguras quase iguais cobrindo os 64 bits
+        count = max_distance + 1
+        widths = [HASH_BITS // count + (1 if i < HASH_BITS % count else 0) for i in range(count)]
+        self._segments = []
+        shift = 0
+        for width in widths:
+            self._segments.append((np.uint64(shift), np.uint64((1 << width) - 1)))
+            shift += width
+
+        self._ids = np.empty(0, dtype=np.int64)
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._tables = []  # por segmento: (chaves ordenadas, linhas correspondentes)
+        self._delta = {}  # photo_id -> hash, ainda fora das tabelas
+        self._removed = set()
+        self._last_id = 0
+
+    def __len__(self):
+        return len(self._ids) - len(self._removed) + len(self._delta)
+
+    # ------------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------------
+
+    def _segment_keys(self, hashes):
+        return [(hashes >> shift) & mask for shift, mask in self._segments]
+
+    def _build(self, items):
+        items = sorted(items)
+        self._ids = np.array([photo_id for photo_id, _ in items], dtype=np.int64)
+        self._hashes = np.array([value for _, value in items], dtype=np.uint64)
+        self._tables = []
+        for keys in self._segment_keys(self._hashes):
+            order = np.argsort(keys, kind='stable')
+            self._tables.append((keys[order], order))
+        self._delta = {}
+        self._removed = set()
+
+    def _live_items(self):
+        items = [
+            (int(photo_id), int(value)) for photo_id, value in zip(self._ids, self._hashes)
+            if int(photo_id) not in self._removed
+        ]
+        return items + list(self._delta.items())
+
+    def load(self, items):
+        """Recarrega o índice a partir de pares (photo_id, dHash em hex)"""
+        with self.lock:
+            parsed = [(photo_id, int(value, 16)) for photo_id, value in items if value]
+            self._build(parsed)
+            self._last_id = max((photo_id for photo_id, _ in parsed), default=0)
+            self.loaded = True
+
+    def add(self, photo_id, value):
+        """Indexa o dHash (hex) de uma foto"""
+        if not value:
+            return
+        with self.lock:
+            self._removed.discard(photo_id)
+            self._delta[photo_id] = int(value, 16)
+            self._last_id = max(self._last_id, photo_id)
+            if len(self._delta) > max(1024, len(self._ids) // 10):
+                self._build(self._live_items())
+
+    def remove(self, photo_id):
+        with self.lock:
+            if self._delta.pop(photo_id, None) is not None:
+                return
+            # _ids é ordenado (ver _build)
+            row = np.searchsorted(self._ids, photo_id)
+            if row < len(self._ids) and self._ids[row] == photo_id:
+                self._removed.add(photo_id)
+
+    def sync(self):
+        """Acompanha o banco: indexa fotos novas e recarrega tudo se outro processo mudou os hashes"""
+        hashed = Photo.objects.filter(perceptual_hash__isnull=False)
+        with self.lock:
+            if not self.loaded:
+                self.load(hashed.values_list('id', 'perceptual_hash'))
+                return
+
+            for photo_id, value in hashed.filter(id__gt=self._last_id).values_list('id', 'perceptual_hash'):
+                self.add(photo_id, value)
+
+            # Hashes calculados ou fotos apagadas em outro processo (worker, backfill)
+            if hashed.count() != len(self):
+                self.load(hashed.values_list('id', 'perceptual_hash'))
+
+    # ------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------
+
+    def query(self, value, max_distance=None):
+        """Lista de (photo_id, distância) a no máximo `max_distance` bits de `value` (hex), mais próximas primeiro"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"Distância máxima do índice é {self.max_distance}")
+        value = int(value, 16)
+
+        with self.lock:
+            rows = [
+                order[np.searchsorted(keys, key, 'left'):np.searchsorted(keys, key, 'right')]
+                for (keys, order), key in zip(self._tables, self._segment_keys(np.uint64(value)))
+            ]
+            rows = np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+
+            distances = hamming_distances(self._hashes[rows], value)
+            matches = [
+                (int(photo_id), int(distance))
+                for photo_id, distance in zip(self._ids[rows], distances)
+                if distance <= max_distance and int(photo_id) not in self._removed
+            ]
+
+            if self._delta:
+                delta_ids = np.fromiter(self._delta.keys(), dtype=np.int64, count=len(self._delta))
+                delta_hashes = np.fromiter(self._delta.values(), dtype=np.uint64, count=len(self._delta))
+                distances = hamming_distances(delta_hashes, value)
+                matches.extend(
+                    (int(photo_id), int(distance))
+                    for photo_id, distance in zip(delta_ids, distances) if distance <= max_distance
+                )
+
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def pairs_within(self, max_distance=None):
+        """Pares (photo_id, photo_id) a no máximo `max_distance` bits, comparando só dentro de cada segmento"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"Distância máxima do índice é {self.max_distance}")
+
+        with self.lock:
+            if self._delta or self._removed:
+                self._build(self._live_items())
+            ids, hashes, tables = self._ids, self._hashes, self._tables
+
+        pairs = set()
+        for keys, order in tables:
+            boundaries = np.flatnonzero(np.diff(keys)) + 1
+            for bucket in np.split(order, boundaries):
+                if len(bucket) < 2:
+                    continue
+                bucket_hashes = hashes[bucket]
+                for start in range(0, len(bucket), PAIRS_BLOCK_SIZE):
+                    block = bucket_hashes[start:start + PAIRS_BLOCK_SIZE]
+                    distances = np.bitwise_count(block[:, None] ^ bucket_hashes[None, :])
+                    rows, columns = np.nonzero(distances <= max_distance)
+                    keep = columns > rows + start
+                    for a, b in zip(bucket[rows[keep] + start], bucket[columns[keep]]):
+                        pairs.add((int(ids[a]), int(ids[b])))
+        return pairs
+
+
+# Índice global compartilhado pelo processo (views e workers da fila)
+duplicate_index = PerceptualHashIndex(max_distance=duplicate_setting('MAX_DISTANCE', 6))
+
+
+# ============================================================================
+# CONSULTAS
+# ============================================================================
+
+def find_duplicate(sha256, phash, max_distance=None):
+    """Foto já existente igual (mesmo SHA-256) ou quase igual (dHash próximo)
+
+    Retorna (foto, 'exact' | 'near', distância) ou None.
+    """
+    if sha256:
+        photo = Photo.objects.filter(content_hash=sha256).order_by('id').first()
+        if photo:
+            return photo, 'exact', 0
+
+    if phash:
+        max_distance = duplicate_setting('UPLOAD_DISTANCE', 2) if max_distance is None else max_distance
+        duplicate_index.sync()
+        for photo_id, distance in duplicate_index.query(phash, max_distance):
+            photo = Photo.objects.filter(pk=photo_id).first()
+            if photo:
+                return photo, 'near', distance
+    return None
+
+
+def duplicate_clusters(max_distance=None):
+    """Grupos de IDs de fotos quase iguais (componentes conexas dos pares próximos), maiores primeiro"""
+    duplicate_index.sync()
+    parent = {}
+
+    def root(photo_id):
+        parent.setdefault(photo_id, photo_id)
+        while parent[photo_id] != photo_id:
+            parent[photo_id] = parent[parent[photo_id]]
+            photo_id = parent[photo_id]
+        return photo_id
+
+    for a, b in duplicate_index.pairs_within(max_distance):
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    groups = {}
+    for photo_id in parent:
+        groups.setdefault(root(photo_id), []).append(photo_id)
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
@@ -0,0 +1,398 @@
+"""Fila de processamento assíncrono de fotos, persistida no banco de dados"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Photo, ProcessingJob
+
+
+def queue_setting(name, default):
+    """Lê configuração da fila no settings (GALLERY_QUEUE_*)"""
+    return getattr(settings, f'GALLERY_QUEUE_{name}', default)
+
+
+# ============================================================================
+# PRODUTOR
+# ============================================================================
+
+def enqueue_photo(photo, payload=None):
+    """Marca a foto como pendente e cria o job correspondente"""
+    photo.status = Photo.Status.PENDING
+    photo.save(update_fields=['status'])
+
+    return ProcessingJob.objects.create(
+        photo=photo,
+        payload=payload or {},
+        max_attempts=queue_setting('MAX_ATTEMPTS', 3),
+    )
+
+
+def enqueue_secondary_job(photo, kind):
+    """Cria um job que não mexe no status da foto (um só por foto e tipo enquanto estiver pendente)"""
+    open_jobs = photo.jobs.filter(
+        kind=kind,
+        status__in=[ProcessingJob.Status.PENDING, ProcessingJob.Status.RUNNING],
+    )
+    if open_jobs.exists():
+        return None
+
+    return ProcessingJob.objects.create(
+        photo=photo,
+        kind=kind,
+        max_attempts=queue_setting('MAX_ATTEMPTS', 3),
+    )
+
+
+def enqueue_translation(photo):
+    """Cria o job de tradução da legenda"""
+    return enqueue_secondary_job(photo, ProcessingJob.Kind.TRANSLATE)
+
+
+def enqueue_refinement(photo):
+    """Cria o job que refaz caption e objetos da foto no nível 'full' (ver niveis_qualidade.py)"""
+    return enqueue_secondary_job(photo, ProcessingJob.Kind.REFINE)
+
+
+def enqueue_recluster(params):
+    """Cria o job de reagrupamento dos rostos (ou devolve o que ainda está na fila ou rodando)"""
+    open_job = ProcessingJob.objects.filter(
+        kind=ProcessingJob.Kind.RECLUSTER,
+        status__in=[ProcessingJob.Status.PENDING, ProcessingJob.Status.RUNNING],
+    ).order_by('id').first()
+    if open_job is not None:
+        return open_job
+
+    return ProcessingJob.objects.create(
+        kind=ProcessingJob.Kind.RECLUSTER,
+        payload=params,
+        max_attempts=queue_setting('MAX_ATTEMPTS', 3),
+    )
+
+
+def latest_job_for(photo):
+    """Retorna o job de ingestão mais recente da foto (ou None)"""
+    return photo.jobs.filter(kind=ProcessingJob.Kind.INGEST).order_by('-created_at', '-id').first()
+
+
+# ============================================================================
+# CONSUMIDOR
+# ============================================================================
+
+def claim_jobs(worker_id, limit=1, kind=ProcessingJob.Kind.INGEST):
+    """Reserva até `limit` jobs disponíveis; o UPDATE condicional evita que dois workers peguem o mesmo job"""
+    now = timezone.now()
+    candidate_ids = list(
+        ProcessingJob.objects
+        .filter(kind=kind, status=ProcessingJob.Status.PENDING, available_at__lte=now)
+        .order_by('available_at', 'id')
+        .values_list('id', flat=True)[:limit * 4]
+    )
+
+    claimed_ids = []
+    for job_id in candidate_ids:
+        updated = ProcessingJob.objects.filter(id=job_id, status=ProcessingJob.Status.PENDING).update(
+            status=ProcessingJob.Status.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed_ids.append(job_id)
+        if len(claimed_ids) >= limit:
+            break
+
+    if not claimed_ids:
+        return []
+
+    jobs = ProcessingJob.objects.filter(id__in=claimed_ids).select_related('photo').order_by('id')
+    if kind == ProcessingJob.Kind.INGEST:
+        Photo.objects.filter(jobs__in=claimed_ids).update(status=Photo.Status.PROCESSING)
+    return list(jobs)
+
+
+def complete_job(job, result=None):
+    """Marca job e foto como concluídos (só a ingestão mexe no status da foto)"""
+    ProcessingJob.objects.filter(pk=job.pk).update(
+        status=ProcessingJob.Status.DONE, locked_by='', locked_at=None, last_error='', updated_at=timezone.now(),
+        result=result,
+    )
+    if job.kind == ProcessingJob.Kind.INGEST:
+        Photo.objects.filter(pk=job.photo_id).update(status=Photo.Status.DONE)
+
+
+def fail_job(job, error):
+    """Registra a falha: reagenda com backoff exponencial ou desiste após o limite de tentativas"""
+    error_text = ''.join(traceback.format_exception(type(error), error, error.__traceback__))[-4000:]
+    now = timezone.now()
+    photo = Photo.objects.filter(pk=job.photo_id)
+
+    if job.attempts < job.max_attempts:
+        delay = queue_setting('RETRY_DELAY', 10) * (2 ** (job.attempts - 1))
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status=ProcessingJob.Status.PENDING,
+            available_at=now + timedelta(seconds=delay),
+            locked_by='', locked_at=None, last_error=error_text, updated_at=now,
+        )
+        if job.kind == ProcessingJob.Kind.INGEST:
+            photo.update(status=Photo.Status.PENDING)
+    else:
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status=ProcessingJob.Status.FAILED, locked_by='', locked_at=None, last_error=error_text, updated_at=now
+        )
+        if job.kind == ProcessingJob.Kind.INGEST:
+            photo.update(status=Photo.Status.FAILED)
+            photo.filter(caption__isnull=True).update(caption="Image uploaded")
+        elif job.kind == ProcessingJob.Kind.TRANSLATE:
+            # Sem tradução: a legenda em português fica igual à original
+            photo.filter(caption_pt__isnull=True).update(caption_pt=F('caption'))
+
+
+def run_job(job):
+    """Executa um job; retorna True se concluído com sucesso"""
+    from .funcoes_ia import ingest_photo
+
+    try:
+        ingest_photo(job.photo, job.payload, raise_errors=True)
+    except Exception as e:
+        print(f"Erro no job {job.pk} (tentativa {job.attempts}/{job.max_attempts}): {e}")
+        fail_job(job, e)
+        return False
+
+    complete_job(job)
+    return True
+
+
+def run_jobs_batch(jobs):
+    """Executa vários jobs com inferência em lote; retorna quantos foram concluídos"""
+    from .funcoes_ia import ingest_photos_batch
+
+    photos = [job.photo for job in jobs]
+    try:
+        errors = ingest_photos_batch(photos, [job.payload for job in jobs], batch_size=len(jobs), raise_errors=True)
+    except Exception as e:
+        errors = {photo.pk: e for photo in photos}
+
+    completed = 0
+    for job in jobs:
+        error = errors.get(job.photo_id)
+        if error is None:
+            complete_job(job)
+            completed += 1
+        else:
+            print(f"Erro no job {job.pk} (tentativa {job.attempts}/{job.max_attempts}): {error}")
+            fail_job(job, error)
+    return completed
+
+
+def run_translation_jobs(jobs):
+    """Traduz as legendas de vários jobs numa chamada ao backend; retorna quantos foram concluídos"""
+    from .traducao import translate_texts
+
+    try:
+        captions = {job.pk: job.photo.caption for job in jobs}
+        translations = translate_texts([caption for caption in captions.values() if caption])
+    except Exception as e:
+        # Ex: banco travado ao consultar o cache; os jobs voltam para a fila com backoff
+        for job in jobs:
+            print(f"Erro no job de tradução {job.pk} (tentativa {job.attempts}/{job.max_attempts}): {e}")
+            fail_job(job, e)
+        return 0
+
+    completed = 0
+    for job in jobs:
+        caption = captions[job.pk]
+        translated = translations.get(caption) if caption else None
+        if caption and not translated:
+            fail_job(job, RuntimeError("Tradução indisponível no momento"))
+            continue
+
+        if caption:
+            try:
+                # Só grava se a legenda não mudou enquanto o job esperava na fila
+                Photo.objects.filter(pk=job.photo_id, caption=caption).update(caption_pt=translated)
+            except Exception as e:
+                print(f"Erro no job de tradução {job.pk} (tentativa {job.attempts}/{job.max_attempts}): {e}")
+                fail_job(job, e)
+                continue
+        complete_job(job)
+        completed += 1
+    return completed
+
+
+def run_refine_jobs(jobs):
+    """Roda caption e objetos no nível 'full' para as fotos ingeridas com o preview; retorna quantos foram concluídos
+
+    A foto já está pronta na galeria: descrição, tags e tradução são refeitas a partir
+    das novas saídas (ver reprocessamento.py).
+    """
+    from .niveis_qualidade import get_tier, tier_budget
+    from .reprocessamento import expand_stages, reprocess_chunk
+
+    tier = get_tier()
+    try:
+        with tier_budget(tier, 'refine'):
+            _, errors = reprocess_chunk([job.photo_id for job in jobs], expand_stages({'caption', 'objects'}))
+    except Exception as e:
+        errors = {job.photo_id: e for job in jobs}
+
+    completed = 0
+    for job in jobs:
+        error = errors.get(job.photo_id)
+        if error is None:
+            complete_job(job)
+            completed += 1
+        else:
+            print(f"Erro no refinamento do job {job.pk} (tentativa {job.attempts}/{job.max_attempts}): {error}")
+            fail_job(job, error if isinstance(error, Exception) else RuntimeError(error))
+    return completed
+
+
+def run_recluster_job(job):
+    """Reagrupa todos os rostos e propõe (ou aplica, com apply) as fusões; o resultado fica no job"""
+    from .agrupamento_rostos import apply_proposals, cluster_faces, merge_proposals
+
+    params = job.payload
+    try:
+        ids, person_ids, labels = cluster_faces(params.get('threshold'))
+        proposals = merge_proposals(person_ids, labels, params.get('min_share'))
+        merged = apply_proposals(proposals) if params.get('apply') else 0
+    except Exception as e:
+        print(f"Erro no reagrupamento do job {job.pk} (tentativa {job.attempts}/{job.max_attempts}): {e}")
+        fail_job(job, e)
+        return False
+
+    complete_job(job, {
+        "faces": len(ids),
+        "clusters": len(set(labels.tolist())),
+        "proposals": [proposal.as_dict() for proposal in proposals],
+        "merged": merged,
+    })
+    return True
+
+
+def recover_stale_jobs(stale_seconds=None):
+    """Devolve à fila jobs presos em execução (worker que morreu no meio do processamento)"""
+    stale_seconds = stale_seconds if stale_seconds is not None else queue_setting('STALE_SECONDS', 600)
+    limit = timezone.now() - timedelta(seconds=stale_seconds)
+
+    stale_jobs = ProcessingJob.objects.filter(status=ProcessingJob.Status.RUNNING, locked_at__lt=limit)
+    recovered = 0
+    for job in stale_jobs:
+        error = RuntimeError(f"Job abandonado pelo worker {job.locked_by or 'desconhecido'}")
+        fail_job(job, error)
+        recovered += 1
+    return recovered
+
+
+def retry_failed_jobs():
+    """Recoloca na fila todos os jobs que esgotaram as tentativas"""
+    failed = ProcessingJob.objects.filter(status=ProcessingJob.Status.FAILED)
+    photo_ids = list(failed.filter(kind=ProcessingJob.Kind.INGEST).values_list('photo_id', flat=True))
+    count = failed.update(status=ProcessingJob.Status.PENDING, attempts=0, available_at=timezone.now())
+    Photo.objects.filter(pk__in=photo_ids).update(status=Photo.Status.PENDING)
+    return count
+
+
+# ============================================================================
+# POOL DE WORKERS
+# ============================================================================
+
+def make_worker_id(index):
+    """Identificador único do worker: host, processo e thread"""
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def worker_loop(worker_id, stop_event, poll_interval=2.0, drain=False, batch_size=1):
+    """Loop de um worker: reserva jobs (em lotes) e processa até receber sinal de parada"""
+    from .busca_semantica import maintain_search_index
+
+    processed = 0
+    last_recovery = 0.0
+    last_index_check = 0.0
+    translation_batch_size = getattr(settings, 'GALLERY_TRANSLATION_BATCH_SIZE', 32)
+
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+
+            if time.monotonic() - last_recovery > 60:
+                recover_stale_jobs()
+                last_recovery = time.monotonic()
+
+            # Reconstrução do índice da busca semântica: aqui, fora das requisições de busca
+            if time.monotonic() - last_index_check > queue_setting('INDEX_CHECK_INTERVAL', 60):
+                maintain_search_index()
+                last_index_check = time.monotonic()
+
+            # Traduções são baratas e em lote: saem antes das ingestões
+            translation_jobs = claim_jobs(worker_id, translation_batch_size, kind=ProcessingJob.Kind.TRANSLATE)
+            if translation_jobs:
+                run_translation_jobs(translation_jobs)
+                processed += len(translation_jobs)
+
+            jobs = claim_jobs(worker_id, batch_size)
+            if not jobs:
+                # Refinamentos e reagrupamentos só quando não há fotos esperando a ingestão
+                refine_jobs = claim_jobs(worker_id, batch_size, kind=ProcessingJob.Kind.REFINE)
+                if refine_jobs:
+                    run_refine_jobs(refine_jobs)
+                    processed += len(refine_jobs)
+                    continue
+                recluster_jobs = claim_jobs(worker_id, kind=ProcessingJob.Kind.RECLUSTER)
+                if recluster_jobs:
+                    run_recluster_job(recluster_jobs[0])
+                    processed += 1
+                    continue
+                if translation_jobs:
+                    continue
+                if drain:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+
+            if len(jobs) > 1:
+                run_jobs_batch(jobs)
+            else:
+                run_job(jobs[0])
+            processed += len(jobs)
+    finally:
+        connection.close()
+
+    return processed
+
+
+def run_worker_pool(workers=None, poll_interval=2.0, drain=False, stop_event=None, batch_size=None):
+    """Inicia `workers` threads consumindo a fila; bloqueia até todas terminarem"""
+    workers = workers or queue_setting('WORKERS', 2)
+    batch_size = batch_size or queue_setting('BATCH_SIZE', 4)
+    stop_event = stop_event or threading.Event()
+    results = {}
+
+    recover_stale_jobs()
+
+    def target(index):
+        results[index] = worker_loop(make_worker_id(index), stop_event, poll_interval, drain, batch_size)
+
+    threads = [threading.Thread(target=target, args=(i,), name=f"gallery-worker-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+    return sum(results.values())
@@ -3,115 +3,157 @@
 import os
 import warnings
 import numpy as np
-import face_recognition
 from collections import Counter
-from PIL import Image, ImageEnhance, ImageStat
-from transformers import pipeline
-
-from .models import Photo, Tag, Person
+from datetime import timedelta
+from django.db.models import Count, Max
+from django.utils import timezone
+from PIL import ImageEnhance, ImageStat
+
+from .busca_semantica import encode_photo_images, semantic_search_enabled, store_photo_embedding
+from .cache_resultados import inference_cache
+from .caracteristicas import extract_image_features
+from .decodificacao import decode_image
+from .deteccao_rostos import batch_locate_faces, detect_and_encode_faces, encode_faces
+from .duplicatas import duplicate_index, perceptual_hash
+from .fila import enqueue_refinement, enqueue_translation
+from .grafo_etapas import StageGraph
+from .indice_rostos import face_centroid, face_index, pack_encoding, unpack_encoding
+from .metricas import FALLBACKS, span, timed
+from .miniaturas import delete_derivatives, generate_derivatives
+from .models import FaceObservation, Photo, Tag, Person
+from .niveis_qualidade import FULL_TIER, get_tier, preview_tier, refine_later, tier_budget
+from .resultados_etapas import (
+    MODEL_INPUT,
+    current_provenances,
+    save_stage_results,
+    serialize_objects,
+    stage_outputs,
+)
+from .traducao import cached_translation, translate_text, translation_deferred, translation_setting
 
 # Configuração
 warnings.filterwarnings("ignore", category=UserWarning, module='torch.nn.modules.module')
 warnings.filterwarnings("ignore", category=FutureWarning, module='transformers.models.auto.modeling_auto')
 
-# Modelos de IA
-captioner = pipeline("image-to-text", model="Salesforce/blip-image-captioning-large")
-object_detector = pipeline("object-detection", model="facebook/detr-resnet-101")
+# Modelos de IA da ingestão (carregados no primeiro uso; ver modelos_ia.py e niveis_qualidade.py)
+captioner = get_tier(FULL_TIER).captioner
+object_detector = get_tier(FULL_TIER).object_detector
 
-# Cache global de rostos
-known_face_encodings = []
-known_face_names = []
 
 
 # ============================================================================
-# CACHE DE ROSTOS
+# ÍNDICE DE ROSTOS
 # ============================================================================
 
-def inicializar_cache_rostos():
-    """Carrega rostos conhecidos do banco para o cache"""
-    global known_face_encodings, known_face_names
-    known_face_encodings.clear()
-    known_face_names.clear()
+# Centroides gravados um pouco antes da última leitura podem ter sido confirmados depois dela
+FACE_INDEX_SYNC_OVERLAP = timedelta(seconds=5)
 
-    for person in Person.objects.all():
-        known_face_encodings.append(person.encoding)
-        known_face_names.append(person.name)
 
+def indexed_persons():
+    return Person.objects.filter(centroid__isnull=False)
 
-def update_face_cache_after_delete(person_name):
-    """Remove pessoa do cache após deleção"""
-    global known_face_encodings, known_face_names
-    try:
-        index = known_face_names.index(person_name)
-        known_face_encodings.pop(index)
-        known_face_names.pop(index)
-    except (ValueError, IndexError):
-        pass
 
+def face_index_state():
+    """Quantidade, maior id e última alteração de centroide das pessoas indexáveis (uma query)"""
+    return indexed_persons().aggregate(
+        count=Count('id'), last_id=Max('id'), updated_at=Max('centroid_updated_at')
+    )
 
-def detect_faces_for_preview(pil_image):
-    """Detecta e identifica rostos para preview (sem salvar no banco)"""
-    global known_face_encodings, known_face_names
 
-    img_array = np.array(pil_image)
-    model_type = "cnn" if img_array.shape[0] * img_array.shape[1] < 4000000 else "hog"
-    face_locations = face_recognition.face_locations(img_array, number_of_times_to_upsample=1, model=model_type)
-    face_encodings = face_recognition.face_encodings(img_array, face_locations, num_jitters=2)
+def load_face_index(state=None):
+    """Carrega os centroides de todas as pessoas do banco para o índice vetorizado"""
+    state = state or face_index_state()  # lido antes: mudanças durante a carga aparecem na próxima verificação
+    with face_index.lock:
+        face_index.load(indexed_persons().values_list('id', 'centroid'))
+        face_index.synced_state = state
 
-    detected_persons = []
-    for idx, (face_encoding, face_location) in enumerate(zip(face_encodings, face_locations)):
-        top, right, bottom, left = face_location
-        face_area = (bottom - top) * (right - left)
-        face_prominence = face_area / (img_array.shape[0] * img_array.shape[1])
 
-        tolerance = 0.5 if face_prominence > 0.1 else 0.55 if face_prominence > 0.05 else 0.6
+def sync_face_index():
+    """Carrega o índice no primeiro uso e acompanha as pessoas alteradas por outros processos
+
+    O worker da fila cria pessoas e atualiza centroides, e as views apagam e juntam
+    pessoas: antes de cada comparação, uma query confere se algo mudou desde a última
+    leitura. Centroides novos ou alterados são relidos; pessoas removidas recarregam tudo.
+    """
+    state = face_index_state()
+    with face_index.lock:
+        previous = face_index.synced_state
+        if face_index.loaded and state == previous:
+            return
+
+        if face_index.loaded and previous and previous['updated_at'] and state['updated_at']:
+            since = previous['updated_at'] - FACE_INDEX_SYNC_OVERLAP
+            for person_id, centroid in indexed_persons().filter(centroid_updated_at__gte=since).values_list(
+                'id', 'centroid'
+            ):
+                face_index.add(person_id, centroid)
+            if len(face_index) == state['count']:
+                face_index.synced_state = state
+                return
+
+        load_face_index(state)
+
+
+
+def face_tolerance(face_prominence):
+    """Tolerância adaptativa baseada no tamanho do rosto"""
+    return 0.5 if face_prominence > 0.1 else 0.55 if face_prominence > 0.05 else 0.6
+
 
-        person_id = None
-        person_name = f"Pessoa Desconhecida {idx + 1}"
+def face_prominences(face_locations, img_shape):
+    """Fração da imagem ocupada por cada rosto"""
+    image_area = img_shape[0] * img_shape[1]
+    return [(bottom - top) * (right - left) / image_area for top, right, bottom, left in face_locations]
 
-        if len(known_face_encodings) > 0:
-            matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=tolerance)
 
-            if True in matches:
-                face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                valid_matches = [(i, d) for i, (m, d) in enumerate(zip(matches, face_distances)) if m and d < tolerance]
+def detect_faces(img_array, tier=None):
+    """Localiza rostos e calcula seus encodings (perfil de detecção do nível, padrão 'full'; ver deteccao_rostos.py)"""
+    return detect_and_encode_faces(img_array, (tier or get_tier()).detection_profile())
 
-                if valid_matches:
-                    best_match_index = min(valid_matches, key=lambda x: x[1])[0]
-                    person_name = known_face_names[best_match_index]
 
-                    try:
-                        person = Person.objects.filter(name=person_name).first()
-                        if person:
-                            person_id = person.id
-                    except:
-                        pass
+def identify_faces_for_preview(face_encodings, face_locations, img_shape):
+    """Identifica rostos já detectados no índice (sem salvar no banco)"""
+    sync_face_index()
+    prominences = face_prominences(face_locations, img_shape)
+    matches = face_index.match(face_encodings, [face_tolerance(p) for p in prominences])
+
+    # Uma única consulta para todas as pessoas reconhecidas
+    known_persons = Person.objects.in_bulk([match[0] for match in matches if match])
+
+    detected_persons = []
+    for idx, (face_encoding, match) in enumerate(zip(face_encodings, matches)):
+        person = known_persons.get(match[0]) if match else None
 
         detected_persons.append({
-            "id": person_id,
-            "name": person_name,
-            "is_known": person_id is not None,
-            "encoding": face_encoding.tolist()  # Adiciona encoding para usar no upload
+            "id": person.id if person else None,
+            "name": person.name if person else f"Pessoa Desconhecida {idx + 1}",
+            "is_known": person is not None,
+            # Só rostos desconhecidos precisam do encoding (para criar a pessoa no upload)
+            "encoding": None if person else np.asarray(face_encoding).tolist()
         })
 
     return detected_persons
 
 
+def detect_faces_for_preview(pil_image):
+    """Detecta e identifica rostos para preview (sem salvar no banco)"""
+    img_array = np.array(pil_image)
+    face_locations, face_encodings = detect_faces(img_array)
+    return identify_faces_for_preview(face_encodings, face_locations, img_array.shape)
+
+
 # ============================================================================
 # ANÁLISE DE IMAGEM
 # ============================================================================
 
-def analyze_image_colors(pil_image):
-    """Analisa cores e características visuais da imagem"""
+def analyze_image_colors(features):
+    """Classifica cores e iluminação a partir das características já extraídas (ImageFeatures)"""
     try:
-        img_sample = pil_image.resize((128, 128))
-        colors = np.array(img_sample)
-
-        avg_color = np.mean(colors, axis=(0, 1))
-        std_color = np.std(colors, axis=(0, 1))
+        avg_color = features.avg_color
+        std_color = features.std_color
 
-        brightness = np.mean(avg_color)
-        contrast = std_color.mean()
+        brightness = features.brightness
+        contrast = features.contrast
 
         r_dominance = avg_color[0] / (avg_color.sum() + 1e-6)
         g_dominance = avg_color[1] / (avg_color.sum() + 1e-6)
@@ -224,7 +266,7 @@ def personalize_caption_with_names(caption, person_names):
     return caption
 
 
-def enhance_description(basic_caption, detected_objects, pil_image, person_names=None):
+def enhance_description(basic_caption, detected_objects, features, person_names=None):
     """Enriquece descrição básica com objetos, cores e composição"""
     # Personaliza caption básica primeiro
     if person_names:
@@ -270,7 +312,7 @@ def enhance_description(basic_caption, detected_objects, pil_image, person_names
         enhanced_parts.append(f"with {' and '.join(secondary)} in the background")
 
     # Análise de cores
-    color_info = analyze_image_colors(pil_image)
+    color_info = analyze_image_colors(features)
     if color_info:
         if color_info['is_high_contrast']:
             enhanced_parts.append("with high contrast and dramatic lighting")
@@ -305,7 +347,7 @@ def enhance_description(basic_caption, detected_objects, pil_image, person_names
 # GERAÇÃO DE TAGS
 # ============================================================================
 
-def generate_smart_tags(detected_objects, pil_image):
+def generate_smart_tags(detected_objects, features):
     """Gera tags inteligentes baseadas em objetos e análise visual"""
     found_tags = set()
     object_counts = Counter()
@@ -330,7 +372,7 @@ def generate_smart_tags(detected_objects, pil_image):
 
     add_contextual_tags(found_tags, list(object_counts.keys()))
     add_count_based_tags(found_tags, object_counts)
-    add_color_tags(found_tags, pil_image)
+    add_color_tags(found_tags, features)
 
     return list(found_tags)
 
@@ -382,16 +424,14 @@ def add_count_based_tags(found_tags, object_counts):
             found_tags.add('crowd')
 
 
-def add_color_tags(found_tags, pil_image):
-    """Tags baseadas em análise de cores"""
+def add_color_tags(found_tags, features):
+    """Tags baseadas em análise de cores (ImageFeatures)"""
     try:
-        img_small = pil_image.resize((100, 100))
-        colors = np.array(img_small)
-        avg_color = colors.mean(axis=(0, 1))
-        std_color = colors.std(axis=(0, 1))
+        avg_color = features.avg_color
+        std_color = features.std_color
 
-        brightness = avg_color.mean()
-        contrast = std_color.mean()
+        brightness = features.brightness
+        contrast = features.contrast
 
         # Luminosidade
         if brightness > 220:
@@ -459,186 +499,809 @@ def add_color_tags(found_tags, pil_image):
 # RECONHECIMENTO FACIAL
 # ============================================================================
 
-def process_face_recognition(img_array, photo):
-    """Detecta e identifica rostos na imagem"""
-    global known_face_encodings, known_face_names
+def batch_face_locations(img_arrays):
+    """Localiza rostos em várias imagens; agrupa imagens CNN de mesmo tamanho numa única chamada"""
+    return batch_locate_faces(img_arrays, get_tier().detection_profile())
+
+
+def process_face_recognition(img_array, photo, face_locations=None, face_encodings=None):
+    """Detecta e identifica rostos na imagem (reaproveita localizações/encodings já calculados)
+
+    Retorna as localizações dos rostos.
+    """
+    if face_locations is None:
+        face_locations, face_encodings = detect_faces(img_array)
+    elif face_encodings is None:
+        face_encodings = encode_faces(img_array, face_locations, get_tier().detection_profile())
+
+    # Calcula proeminência dos rostos
+    prominences = face_prominences(face_locations, img_array.shape)
+    persons = assign_faces_to_persons(face_encodings, prominences)
+
+    for person, face_prominence in zip(persons, prominences):
+        photo.persons.add(person)
+        # Define foto principal se rosto for grande
+        if face_prominence > 0.05 and not person.photo_principal_id:
+            person.photo_principal = photo
+            person.save()
+
+    save_face_observations(photo, face_locations, face_encodings, prominences, persons)
+    return face_locations
+
+
+# Rosto detectado de novo que cobre um rosto guardado acima disto (IoU) é o mesmo rosto
+SAME_FACE_IOU = 0.5
+
+
+def box_iou(box_a, box_b):
+    """Interseção sobre união de duas caixas (top, right, bottom, left)"""
+    height = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    width = min(box_a[1], box_b[1]) - max(box_a[3], box_b[3])
+    intersection = max(0, height) * max(0, width)
+    area_a = (box_a[2] - box_a[0]) * (box_a[1] - box_a[3])
+    area_b = (box_b[2] - box_b[0]) * (box_b[1] - box_b[3])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def reprocess_face_recognition(img_array, photo):
+    """Detecta de novo os rostos de uma foto já processada sem desfazer as escolhas do usuário
+
+    Rosto que coincide com um guardado fica com a pessoa dele (ou sem pessoa, se o usuário
+    a desmarcou) e não muda o centroide; só os rostos novos passam pelo índice. As pessoas
+    ligadas pelos rostos antigos são trocadas pelas dos rostos atuais, e as que o usuário
+    escolheu sem rosto na foto continuam. Retorna as localizações dos rostos.
+    """
+    face_locations, face_encodings = detect_faces(img_array)
+    prominences = face_prominences(face_locations, img_array.shape)
+    previous = list(photo.faces.select_related('person'))
+
+    persons = [None] * len(face_locations)
+    new_faces = []
+    unmatched = list(previous)
+    for i, location in enumerate(face_locations):
+        best = max(unmatched, key=lambda face: box_iou(face.box, location), default=None)
+        if best is not None and box_iou(best.box, location) >= SAME_FACE_IOU:
+            persons[i] = best.person
+            unmatched.remove(best)
+        else:
+            new_faces.append(i)
+
+    assigned = assign_faces_to_persons([face_encodings[i] for i in new_faces], [prominences[i] for i in new_faces])
+    for i, person in zip(new_faces, assigned):
+        persons[i] = person
+        if prominences[i] > 0.05 and not person.photo_principal_id:
+            person.photo_principal = photo
+            person.save()
+
+    automatic = {face.person_id for face in previous if face.person_id}
+    kept = [person_id for person_id in photo.persons.values_list('id', flat=True) if person_id not in automatic]
+    photo.persons.set(kept + [person.id for person in persons if person])
+
+    save_face_observations(photo, face_locations, face_encodings, prominences, persons)
+    return face_locations
+
+
+@timed('db_write')
+def save_face_observations(photo, face_locations, face_encodings, prominences, persons):
+    """Registra cada rosto detectado na foto (substitui os de um processamento anterior)"""
+    photo.faces.all().delete()
+    FaceObservation.objects.bulk_create([
+        FaceObservation(
+            photo=photo, person=person,
+            top=top, right=right, bottom=bottom, left=left,
+            encoding=pack_encoding(face_encoding), prominence=face_prominence,
+        )
+        for (top, right, bottom, left), face_encoding, face_prominence, person
+        in zip(face_locations, face_encodings, prominences, persons)
+    ])
+
+
+@timed('face_match')
+def assign_faces_to_persons(face_encodings, prominences):
+    """Identifica (ou cria) a pessoa de cada rosto com uma única busca vetorizada no índice"""
+    if len(face_encodings) == 0:
+        return []
+
+    sync_face_index()
+    with face_index.lock:
+        matches = face_index.match(face_encodings, [face_tolerance(p) for p in prominences])
+        known_persons = Person.objects.in_bulk([match[0] for match in matches if match])
+
+        persons = []
+        for face_encoding, face_prominence, match in zip(face_encodings, prominences, matches):
+            person = known_persons.get(match[0]) if match else None
+            if person:
+                update_person_encoding(person, face_encoding, face_prominence)
+            else:
+                person = create_person_for_face(face_encoding, face_prominence)
+                known_persons[person.id] = person
+            persons.append(person)
+
+        return persons
+
+
+def update_person_encoding(person, face_encoding, face_prominence):
+    """Atualiza encoding com média ponderada para melhorar precisão"""
+    if face_prominence <= 0.08:
+        return
 
-    # Escolhe modelo baseado no tamanho da imagem
-    model_type = "cnn" if img_array.shape[0] * img_array.shape[1] < 4000000 else "hog"
-    face_locations = face_recognition.face_locations(img_array, number_of_times_to_upsample=1, model=model_type)
-    face_encodings = face_recognition.face_encodings(img_array, face_locations, num_jitters=2)
+    current_encoding = face_index.get(person.id)
+    if current_encoding is None:
+        current_encoding = unpack_encoding(person.centroid)
+    weight_new = min(0.3, face_prominence * 2)
+    weight_old = 1 - weight_new
 
-    for face_encoding, face_location in zip(face_encodings, face_locations):
-        # Calcula proeminência do rosto
-        top, right, bottom, left = face_location
-        face_area = (bottom - top) * (right - left)
-        face_prominence = face_area / (img_array.shape[0] * img_array.shape[1])
+    updated_encoding = (current_encoding * weight_old + face_encoding * weight_new)
+    updated_encoding = updated_encoding / np.linalg.norm(updated_encoding)
 
-        person = identify_or_create_person(face_encoding, face_prominence)
-        if person:
-            photo.persons.add(person)
-            # Define foto principal se rosto for grande
-            if face_prominence > 0.05 and not person.photo_principal:
-                person.photo_principal = photo
-                person.save()
+    person.centroid = pack_encoding(updated_encoding)
+    person.centroid_updated_at = timezone.now()
+    person.save(update_fields=['centroid', 'centroid_updated_at'])
 
+    face_index.update(person.id, updated_encoding)
 
-def identify_or_create_person(face_encoding, face_prominence=0.0):
-    """Identifica pessoa conhecida ou cria nova entrada"""
-    global known_face_encodings, known_face_names
 
-    if len(known_face_encodings) > 0:
-        # Tolerância adaptativa baseada no tamanho do rosto
-        tolerance = 0.5 if face_prominence > 0.1 else 0.55 if face_prominence > 0.05 else 0.6
+def create_person_for_face(face_encoding, face_prominence):
+    """Cria nova pessoa para um rosto desconhecido e a adiciona ao índice"""
+    person_count = Person.objects.count()
+    person_name = f"Pessoa {person_count + 1}"
 
-        matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=tolerance)
+    if face_prominence > 0.1:
+        person_name = f"Pessoa {person_count + 1} (HD)"
+    elif face_prominence < 0.02:
+        person_name = f"Pessoa {person_count + 1} (Distante)"
 
-        if True in matches:
-            face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-            valid_matches = [(i, d) for i, (m, d) in enumerate(zip(matches, face_distances)) if m and d < tolerance]
+    person = Person.objects.create(
+        name=person_name, centroid=pack_encoding(face_encoding), centroid_updated_at=timezone.now()
+    )
+    face_index.add(person.id, face_encoding)
 
-            if valid_matches:
-                best_match_index = min(valid_matches, key=lambda x: x[1])[0]
+    return person
 
-                person_name = known_face_names[best_match_index]
-                person = Person.objects.filter(name=person_name).first()
 
-                if person:
-                    # Atualiza encoding com média ponderada para melhorar precisão
-                    if face_prominence > 0.08:
-                        current_encoding = np.array(person.encoding)
-                        weight_new = min(0.3, face_prominence * 2)
-                        weight_old = 1 - weight_new
+def identify_or_create_person(face_encoding, face_prominence=0.0):
+    """Identifica pessoa conhecida ou cria nova entrada"""
+    return assign_faces_to_persons([face_encoding], [face_prominence])[0]
 
-                        updated_encoding = (current_encoding * weight_old + face_encoding * weight_new)
-                        updated_encoding = updated_encoding / np.linalg.norm(updated_encoding)
 
-                        person.encoding = updated_encoding.tolist()
-                        person.save()
+def observation_weight(prominence):
+    """Peso do rosto no centroide: rostos maiores (encodings mais confiáveis) pesam mais"""
+    return min(0.3, max(0.02, prominence * 2))
 
-                        known_face_encodings[best_match_index] = updated_encoding
 
-                    return person
+def recompute_person_centroids(person_ids=None, chunk_size=5000):
+    """Recalcula o centroide das pessoas a partir das FaceObservation, sem rodar a detecção
 
-    # Cria nova pessoa
-    person_count = Person.objects.count()
-    person_name = f"Pessoa {person_count + 1}"
+    Lê os rostos em ordem de pessoa, em blocos, então a memória usada é a dos rostos de
+    uma pessoa por vez. Pessoas sem nenhum rosto registrado mantêm o centroide atual.
+    Retorna o número de pessoas atualizadas.
+    """
+    observations = FaceObservation.objects.filter(person__isnull=False)
+    if person_ids is not None:
+        observations = observations.filter(person_id__in=person_ids)
+    rows = observations.order_by('person_id', 'id').values_list('person_id', 'encoding', 'prominence')
 
-    if face_prominence > 0.1:
-        person_name = f"Pessoa {person_count + 1} (HD)"
-    elif face_prominence < 0.02:
-        person_name = f"Pessoa {person_count + 1} (Distante)"
+    updated = []
 
-    person = Person.objects.create(name=person_name, encoding=face_encoding.tolist())
+    def flush(person_id, encodings, weights):
+        updated.append(Person(
+            id=person_id, centroid=pack_encoding(face_centroid(encodings, weights)), centroid_updated_at=timezone.now()
+        ))
 
-    known_face_encodings.append(face_encoding)
-    known_face_names.append(person_name)
+    current_id, encodings, weights = None, [], []
+    for person_id, encoding, prominence in rows.iterator(chunk_size=chunk_size):
+        if person_id != current_id:
+            if current_id is not None:
+                flush(current_id, encodings, weights)
+            current_id, encodings, weights = person_id, [], []
+        encodings.append(unpack_encoding(encoding))
+        weights.append(observation_weight(prominence))
+    if current_id is not None:
+        flush(current_id, encodings, weights)
 
-    return person
+    Person.objects.bulk_update(updated, ['centroid', 'centroid_updated_at'], batch_size=500)
+    with face_index.lock:
+        for person in updated:
+            face_index.update(person.id, person.centroid)
+    return len(updated)
 
 
 # ============================================================================
 # PROCESSAMENTO PRINCIPAL
 # ============================================================================
 
-def process_photo_with_ai(photo, image_file):
-    """Processa foto com IA completa: caption, objetos, tags e rostos"""
-    try:
-        pil_image = Image.open(image_file).convert('RGB')
+def decode_for_ai(image_file, max_size=None):
+    """Decodifica a foto uma vez (ver decodificacao.py) limitada a `max_size` (padrão: o do nível 'full', 2048px)"""
+    return decode_image(image_file, max_size or get_tier().max_size)
+
+
+def load_image_for_ai(image_file, max_size=None):
+    """Abre a imagem em RGB, orientada pelo EXIF e limitada a `max_size` (padrão 2048px)"""
+    return decode_for_ai(image_file, max_size).image
 
-        # Redimensiona se muito grande (max 2048px)
-        if pil_image.width > 2048 or pil_image.height > 2048:
-            pil_image.thumbnail((2048, 2048), Image.Resampling.LANCZOS)
 
-        # Ajusta contraste levemente para melhor detecção
-        enhancer = ImageEnhance.Contrast(pil_image)
-        pil_image_enhanced = enhancer.enhance(1.1)
+@timed('enhance')
+def enhance_for_models(pil_image):
+    """Cópia com contraste levemente ajustado, só para a entrada dos modelos de caption e objetos"""
+    return ImageEnhance.Contrast(pil_image).enhance(MODEL_INPUT['contrast'])
 
-        # Gera descrição
-        caption_results = captioner(pil_image_enhanced, max_new_tokens=50)
-        basic_caption = caption_results[0]['generated_text'] if caption_results else "Image processed"
 
-        # Detecta objetos
-        detected_objects = sorted(object_detector(pil_image_enhanced), key=lambda x: x['score'], reverse=True)
+def prepare_image_for_ai(image_file):
+    """Decodifica a imagem (limitada a 2048px) e gera a versão com contraste ajustado para os modelos"""
+    decoded = decode_for_ai(image_file)
+    return decoded, enhance_for_models(decoded.image)
 
-        # Reconhecimento facial ANTES de gerar descrição
-        img_array = np.array(pil_image)
-        process_face_recognition(img_array, photo)
 
-        # Pega nomes das pessoas identificadas para personalizar descrição
+def caption_image(pil_image_enhanced, tier=None):
+    """Legenda básica (em inglês) do modelo de caption do nível (padrão 'full')"""
+    tier = tier or get_tier()
+    caption_results = tier.captioner(pil_image_enhanced, **tier.caption_kwargs())
+    return caption_results[0]['generated_text'] if caption_results else "Image processed"
+
+
+def search_embeddings(pil_images):
+    """Embeddings da busca semântica; [None, ...] se desativada ou se o encoder falhar (a finalização tenta de novo)"""
+    if not semantic_search_enabled():
+        return [None] * len(pil_images)
+    try:
+        return encode_photo_images(pil_images)
+    except Exception as e:
+        print(f"Erro ao gerar embeddings: {e}")
+        return [None] * len(pil_images)
+
+
+def inference_graph(decoded, tier=None):
+    """Etapas de uma foto que só dependem da imagem decodificada (rodam em paralelo, ver grafo_etapas.py)
+
+    Caption e objetos usam a cópia com contraste ajustado; rostos, o array da imagem e
+    características, a cópia reduzida (todas do mesmo DecodedImage, ver decodificacao.py).
+    Modelos e perfil de rostos são os do nível `tier` (padrão 'full').
+    """
+    tier = tier or get_tier()
+    graph = StageGraph()
+    graph.add('enhanced', enhance_for_models, decoded.image)
+    graph.add('basic_caption', caption_image, after=['enhanced'], tier=tier)
+    graph.add('detected_objects', tier.object_detector, after=['enhanced'])
+    graph.add('faces', detect_faces, decoded.array, tier=tier)
+    graph.add('features', extract_image_features, decoded.small)
+    return graph
+
+
+def build_photo_tags(detected_objects, features):
+    """Tags inteligentes + tags de orientação da foto"""
+    smart_tags = generate_smart_tags(detected_objects, features)
+
+    # Adiciona tags de orientação
+    aspect_ratio = features.aspect_ratio
+    if aspect_ratio > 1.5:
+        smart_tags.extend(['landscape orientation', 'wide format'])
+    elif aspect_ratio < 0.67:
+        smart_tags.extend(['portrait orientation', 'vertical format'])
+    elif 0.95 < aspect_ratio < 1.05:
+        smart_tags.append('square format')
+    return smart_tags
+
+
+@timed('tags')
+def save_photo_tags(photo, smart_tags):
+    """Associa as tags à foto (máximo 20, sem duplicatas)"""
+    unique_tags = []
+    seen = set()
+    for tag in smart_tags:
+        tag_lower = tag.lower().strip()
+        if tag_lower not in seen and tag_lower:
+            unique_tags.append(tag_lower)
+            seen.add(tag_lower)
+
+    for tag_name in unique_tags[:20]:
+        tag, _ = Tag.objects.get_or_create(name=tag_name)
+        photo.tags.add(tag)
+
+
+@timed('description')
+def describe_photo(photo, basic_caption, detected_objects, features):
+    """Descrição final (em inglês) a partir das saídas brutas e das pessoas marcadas na foto"""
+    person_names = [person.name for person in photo.persons.all()]
+    return enhance_description(basic_caption, detected_objects, features, person_names)
+
+
+def apply_image_features(photo, features):
+    """Copia as características extraídas para as colunas da foto (sem salvar)"""
+    for field, value in features.model_fields().items():
+        setattr(photo, field, value)
+
+
+def finalize_photo_with_ai(photo, decoded, basic_caption, detected_objects, face_locations=None,
+                           face_encodings=None, known_translation=None, embedding=None,
+                           features=None, model_tier=None):
+    """Etapas por foto após caption e objetos: rostos, descrição, tradução, tags e embedding
+
+    `decoded` é a foto já decodificada (DecodedImage): o array dela vai para os rostos,
+    a cópia reduzida para características, hash perceptual e embedding, e a imagem de
+    trabalho para as miniaturas, sem abrir o arquivo de novo.
+
+    `known_translation` é um par (caption_en, caption_pt) já traduzido (ex: no preview);
+    se a descrição final for a mesma, a tradução é reaproveitada. `embedding` é o vetor
+    da imagem já calculado no lote (senão é calculado aqui) e `features` as
+    características já extraídas.
+    `model_tier` é o nível de qualidade que gerou caption e objetos (padrão 'full'; o
+    'fast' quando vêm do preview, com refinamento agendado).
+
+    As características visuais (ImageFeatures) são extraídas uma vez e usadas pela
+    descrição, pelas tags e pelas colunas de cor/brilho/orientação da foto. As saídas
+    brutas (caption, objetos, rostos) ficam guardadas em StageResult para derivar
+    descrição e tags de novo sem rodar os modelos (ver resultados_etapas.py).
+
+    Legendas fora do cache de traduções viram um job de tradução quando a tradução é
+    adiada (GALLERY_TRANSLATION_DEFERRED): a foto fica pronta sem esperar o tradutor.
+    """
+    detected_objects = sorted(detected_objects, key=lambda x: x['score'], reverse=True)
+
+    # Reconhecimento facial ANTES de gerar descrição
+    face_locations = process_face_recognition(decoded.array, photo, face_locations, face_encodings)
+    provenances = current_provenances()
+    if model_tier is not None and model_tier.name != FULL_TIER:
+        provenances.update(current_provenances(('caption', 'objects'), model_tier))
+    with span('db_write'):
+        save_stage_results(photo, stage_outputs(basic_caption, detected_objects, face_locations), provenances)
+
+    if features is None:
+        features = extract_image_features(decoded.small)
+    apply_image_features(photo, features)
+
+    # Fotos que não passaram pelo upload (ex: reprocessamento) ganham o hash perceptual aqui
+    if photo.perceptual_hash is None:
+        photo.perceptual_hash = perceptual_hash(decoded.small)
+        duplicate_index.add(photo.pk, photo.perceptual_hash)
+
+    with span('db_write'):
         photo.save()
-        detected_person_names = [person.name for person in photo.persons.all()]
 
-        # Enriquece descrição COM nomes das pessoas
-        enhanced_caption_en = enhance_description(basic_caption, detected_objects, pil_image, detected_person_names)
+    # Enriquece descrição COM nomes das pessoas identificadas
+    enhanced_caption_en = describe_photo(photo, basic_caption, detected_objects, features)
+
+    # Salva caption em inglês (original)
+    photo.caption = enhanced_caption_en
+
+    # Traduz e salva caption em português (só se a descrição mudou desde o preview)
+    translation_pending = False
+    if known_translation and known_translation[0] == enhanced_caption_en and known_translation[1]:
+        photo.caption_pt = known_translation[1]
+    else:
+        photo.caption_pt = cached_translation(enhanced_caption_en)
+        if photo.caption_pt is None:
+            if translation_deferred():
+                translation_pending = True
+            else:
+                photo.caption_pt = translate_caption_to_portuguese(enhanced_caption_en)
+
+    with span('db_write'):
+        photo.save()
+    if translation_pending:
+        enqueue_translation(photo)
 
-        # Salva caption em inglês (original)
-        photo.caption = enhanced_caption_en
+    save_photo_tags(photo, build_photo_tags(detected_objects, features))
 
-        # Traduz e salva caption em português
-        photo.caption_pt = translate_caption_to_portuguese(enhanced_caption_en)
+    # Miniaturas para a grade da galeria (falha aqui não invalida a análise de IA)
+    try:
+        generate_derivatives(photo, decoded.image)
+    except Exception as e:
+        print(f"Erro ao gerar miniaturas: {e}")
 
-        # Gera tags
-        smart_tags = generate_smart_tags(detected_objects, pil_image)
+    # Embedding da busca semântica (idem)
+    if semantic_search_enabled():
+        try:
+            store_photo_embedding(photo, decoded.small, embedding)
+        except Exception as e:
+            print(f"Erro ao gerar embedding: {e}")
 
-        # Adiciona tags de orientação
-        width, height = pil_image.size
-        aspect_ratio = width / height
-        if aspect_ratio > 1.5:
-            smart_tags.extend(['landscape orientation', 'wide format'])
-        elif aspect_ratio < 0.67:
-            smart_tags.extend(['portrait orientation', 'vertical format'])
-        elif 0.95 < aspect_ratio < 1.05:
-            smart_tags.append('square format')
+    return photo
 
-        photo.save()
 
-        # Adiciona tags (máximo 20, sem duplicatas)
-        unique_tags = []
-        seen = set()
-        for tag in smart_tags:
-            tag_lower = tag.lower().strip()
-            if tag_lower not in seen and tag_lower:
-                unique_tags.append(tag_lower)
-                seen.add(tag_lower)
+def process_photo_with_ai(photo, image_file, raise_errors=False, precomputed=None, decoded=None):
+    """Processa foto com IA completa: caption, objetos, tags e rostos
 
-        for tag_name in unique_tags[:20]:
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            photo.tags.add(tag)
+    A foto é decodificada uma vez (ou vem já decodificada em `decoded`) e a mesma imagem
+    serve a todas as etapas, inclusive à legenda básica do fallback.
 
-        return photo
+    `precomputed` é uma entrada do cache de inferência do preview: caption, objetos e
+    rostos são reaproveitados e só as etapas que dependem dos nomes são refeitas. Uma
+    entrada de preview do nível 'fast' só é reaproveitada com GALLERY_QUALITY_REFINE_LATER
+    (caption e objetos; o nível 'full' roda depois num job de refinamento).
+    """
+    try:
+        decoded = decoded or decode_for_ai(image_file)
+
+        reused = reusable_inference(precomputed, decoded.image)
+        if reused:
+            return finalize_photo_with_ai(
+                photo, decoded, reused['basic_caption'], reused['detected_objects'],
+                reused['face_locations'], reused['face_encodings'],
+                known_translation=(reused.get('caption'), reused.get('caption_pt')),
+            )
+
+        preview = refinable_preview(precomputed, decoded.image)
+        if preview:
+            # Rostos, características e embedding no nível 'full'; caption e objetos do preview
+            graph = StageGraph()
+            graph.add('faces', detect_faces, decoded.array)
+            graph.add('features', extract_image_features, decoded.small)
+            graph.add('embeddings', search_embeddings, [decoded.small])
+            results = graph.run()
+            face_locations, face_encodings = results['faces']
+            photo = finalize_photo_with_ai(
+                photo, decoded, preview['basic_caption'], preview['detected_objects'],
+                face_locations, face_encodings, known_translation=(preview.get('caption'), preview.get('caption_pt')),
+                embedding=results['embeddings'][0], features=results['features'], model_tier=preview['tier'],
+            )
+            enqueue_refinement(photo)
+            return photo
+
+        # Caption, objetos, rostos, características e embedding ao mesmo tempo; pessoas,
+        # descrição (com os nomes) e tags vêm depois, na finalização
+        graph = inference_graph(decoded)
+        graph.add('embeddings', search_embeddings, [decoded.small])
+        results = graph.run()
+        face_locations, face_encodings = results['faces']
+
+        return finalize_photo_with_ai(
+            photo, decoded, results['basic_caption'], results['detected_objects'],
+            face_locations, face_encodings, embedding=results['embeddings'][0], features=results['features'],
+        )
 
     except Exception as e:
-        # Fallback para análise básica
-        try:
-            pil_image = Image.open(image_file).convert('RGB')
-            caption_result = captioner(pil_image)
-            photo.caption = caption_result[0].get('generated_text', 'Image uploaded') if caption_result else "Image uploaded"
-        except:
-            photo.caption = "Image uploaded"
+        # A fila repassa o erro para agendar nova tentativa
+        if raise_errors:
+            raise
+
+        # Fallback para análise básica (o erro fica no log e na métrica de fallbacks)
+        print(f"Erro ao processar foto {photo.pk} com IA, usando legenda básica: {type(e).__name__}: {e}")
+        FALLBACKS.inc(error=type(e).__name__)
+        # Reaproveita a imagem já decodificada; se a falha foi na decodificação, não há o que legendar
+        photo.caption = "Image uploaded"
+        if decoded is not None:
+            try:
+                caption_result = captioner(decoded.image)
+                if caption_result:
+                    photo.caption = caption_result[0].get('generated_text', 'Image uploaded')
+            except Exception as fallback_error:
+                print(f"Erro na legenda básica da foto {photo.pk}: {fallback_error}")
 
         photo.save()
         return photo
 
 
+def process_photos_batch(photos, image_files, batch_size=8, raise_errors=False, precomputed_list=None):
+    """Processa várias fotos com inferência em lote (caption, objetos e rostos)
+
+    Retorna dict {photo.pk: exceção} com as fotos que falharam.
+    """
+    errors = {}
+    loaded = []
+    precomputed_list = precomputed_list or [None] * len(photos)
+
+    for photo, image_file, precomputed in zip(photos, image_files, precomputed_list):
+        # Fotos com resultado do preview em cache não precisam passar pelos modelos
+        if precomputed:
+            try:
+                process_photo_with_ai(photo, image_file, raise_errors=raise_errors, precomputed=precomputed)
+            except Exception as e:
+                errors[photo.pk] = e
+            continue
+
+        try:
+            decoded, pil_image_enhanced = prepare_image_for_ai(image_file)
+            loaded.append((photo, image_file, decoded, pil_image_enhanced))
+        except Exception as e:
+            errors[photo.pk] = e
+
+    for start in range(0, len(loaded), batch_size):
+        chunk = loaded[start:start + batch_size]
+        enhanced_images = [item[3] for item in chunk]
+
+        try:
+            # Os três modelos e o encoder da busca rodam ao mesmo tempo sobre o lote
+            img_arrays = [item[2].array for item in chunk]
+            graph = StageGraph()
+            graph.add('captions', captioner, enhanced_images, batch_size=len(chunk), **get_tier().caption_kwargs())
+            graph.add('objects', object_detector, enhanced_images, batch_size=len(chunk))
+            graph.add('face_locations', batch_face_locations, img_arrays)
+            graph.add('embeddings', search_embeddings, [item[2].small for item in chunk])
+            results = graph.run()
+            caption_results, object_results = results['captions'], results['objects']
+            face_locations, embeddings = results['face_locations'], results['embeddings']
+        except Exception as e:
+            # Lote falhou inteiro: processa uma a uma para isolar a imagem problemática
+            print(f"Erro no processamento em lote, voltando para foto a foto: {e}")
+            for photo, image_file, decoded, _ in chunk:
+                try:
+                    process_photo_with_ai(photo, image_file, raise_errors=raise_errors, decoded=decoded)
+                except Exception as photo_error:
+                    errors[photo.pk] = photo_error
+            continue
+
+        for (photo, image_file, decoded, _), captions, objects, locations, embedding in zip(
+                chunk, caption_results, object_results, face_locations, embeddings):
+            try:
+                basic_caption = captions[0]['generated_text'] if captions else "Image processed"
+                finalize_photo_with_ai(photo, decoded, basic_caption, objects, locations, embedding=embedding)
+            except Exception as e:
+                if raise_errors:
+                    errors[photo.pk] = e
+                else:
+                    print(f"Erro ao finalizar foto {photo.pk} do lote, processando sozinha: {e}")
+                    process_photo_with_ai(photo, image_file, decoded=decoded)
+
+    # Sem raise_errors, fotos que nem abriram recebem o fallback básico
+    if not raise_errors:
+        for photo in photos:
+            if photo.pk in errors:
+                process_photo_with_ai(photo, photo.image.path)
+        errors = {}
+
+    return errors
+
+
+def apply_person_selection(photo, selected_person_ids=None, custom_person_names=None, new_persons_data=None):
+    """Aplica a seleção de pessoas feita pelo usuário no upload"""
+    custom_person_names = custom_person_names or {}
+
+    # Substitui pessoas detectadas automaticamente pelas selecionadas pelo usuário
+    if selected_person_ids is not None:
+        photo.persons.clear()
+        for person_id in selected_person_ids:
+            if person_id:
+                try:
+                    person = Person.objects.get(id=person_id)
+
+                    # Se houver um nome customizado para esta pessoa, atualiza
+                    custom_name = custom_person_names.get(str(person_id))
+                    if custom_name and custom_name.strip():
+                        person.name = custom_name.strip()
+                        person.save()
+
+                    photo.persons.add(person)
+                except Person.DoesNotExist:
+                    pass
+
+        # Rostos atribuídos a pessoas que o usuário desmarcou ficam sem pessoa
+        photo.faces.exclude(person_id__in=[pid for pid in selected_person_ids if pid]).update(person=None)
+
+    # Cria novas pessoas (Pessoa Desconhecida renomeada)
+    for new_person_data in new_persons_data or []:
+        person_name = new_person_data.get('name', '').strip()
+        try:
+            # Valida o encoding enviado pelo cliente antes de gravar ou indexar
+            person_centroid = pack_encoding(new_person_data.get('encoding') or [])
+        except (TypeError, ValueError):
+            continue
+
+        if person_name:
+            with face_index.lock:
+                # Verifica se já existe pessoa com esse nome
+                existing_person = Person.objects.filter(name=person_name).first()
+
+                if existing_person:
+                    # Se existe, apenas associa à foto
+                    photo.persons.add(existing_person)
+                    link_face_observation(photo, existing_person, person_centroid)
+                else:
+                    # Cria nova pessoa com o encoding fornecido
+                    new_person = Person.objects.create(
+                        name=person_name,
+                        centroid=person_centroid,
+                        centroid_updated_at=timezone.now(),
+                        photo_principal=photo
+                    )
+                    photo.persons.add(new_person)
+                    link_face_observation(photo, new_person, person_centroid)
+
+                    # Atualiza índice de rostos
+                    face_index.add(new_person.id, person_centroid)
+
+
+def link_face_observation(photo, person, encoding):
+    """Atribui à pessoa o rosto sem pessoa da foto mais parecido com o encoding do preview"""
+    faces = list(photo.faces.filter(person__isnull=True).only('id', 'encoding'))
+    if not faces:
+        return
+    target = unpack_encoding(encoding)
+    distances = [np.linalg.norm(unpack_encoding(face.encoding) - target) for face in faces]
+    best = int(np.argmin(distances))
+    if distances[best] < 0.6:
+        FaceObservation.objects.filter(pk=faces[best].pk).update(person=person)
+
+
+def ingest_photo(photo, options=None, raise_errors=False):
+    """Executa a ingestão completa de uma foto já salva (usado pela view e pela fila)"""
+    options = options or {}
+
+    # Numa nova tentativa, descarta associações parciais da tentativa anterior
+    photo.persons.clear()
+    photo.tags.clear()
+    photo.faces.all().delete()
+
+    with tier_budget(get_tier(FULL_TIER), 'ingest'):
+        photo = process_photo_with_ai(
+            photo, photo.image.path, raise_errors=raise_errors, precomputed=options.get('inference')
+        )
+    apply_person_selection(
+        photo,
+        options.get('selected_persons'),
+        options.get('custom_person_names'),
+        options.get('new_persons'),
+    )
+    return photo
+
+
+def ingest_photos_batch(photos, options_list=None, batch_size=8, raise_errors=False):
+    """Ingestão em lote de fotos já salvas; retorna dict {photo.pk: exceção} das que falharam"""
+    options_list = options_list or [{} for _ in photos]
+
+    for photo in photos:
+        photo.persons.clear()
+        photo.tags.clear()
+
+    errors = process_photos_batch(
+        photos, [photo.image.path for photo in photos], batch_size, raise_errors,
+        precomputed_list=[(options or {}).get('inference') for options in options_list],
+    )
+
+    for photo, options in zip(photos, options_list):
+        if photo.pk in errors:
+            continue
+        options = options or {}
+        apply_person_selection(
+            photo,
+            options.get('selected_persons'),
+            options.get('custom_person_names'),
+            options.get('new_persons'),
+        )
+
+    return errors
+
+
+# ============================================================================
+# PREVIEW (com cache de inferência)
+# ============================================================================
+
+def build_inference_entry(pil_image, basic_caption, detected_objects, face_locations, face_encodings,
+                          caption=None, caption_pt=None, tier=FULL_TIER):
+    """Monta a entrada (serializável em JSON) guardada no cache e enviada junto com o job"""
+    return {
+        "tier": tier,
+        "image_size": list(pil_image.size),
+        "basic_caption": basic_caption,
+        "detected_objects": serialize_objects(detected_objects),
+        "face_locations": [list(map(int, location)) for location in face_locations],
+        "face_encodings": [np.asarray(encoding).tolist() for encoding in face_encodings],
+        "caption": caption,
+        "caption_pt": caption_pt,
+    }
+
+
+def reusable_inference(entry, pil_image, tier=None):
+    """Retorna a entrada do cache se ela corresponde a esta imagem e ao nível, convertida para uso nos estágios"""
+    # Entradas de antes dos níveis de qualidade são do nível 'full'
+    if not entry or entry.get('tier', FULL_TIER) != (tier or get_tier()).name:
+        return None
+    if list(pil_image.size) != entry.get('image_size'):
+        return None
+
+    return {
+        **entry,
+        "face_locations": [tuple(location) for location in entry['face_locations']],
+        "face_encodings": [np.asarray(encoding) for encoding in entry['face_encodings']],
+    }
+
+
+def refinable_preview(entry, pil_image):
+    """Caption e objetos de um preview de outro nível, para a ingestão com refinamento posterior
+
+    Só com GALLERY_QUALITY_REFINE_LATER. O preview roda numa resolução menor: as caixas
+    dos objetos voltam para a escala desta imagem (mesma proporção, senão não é a mesma foto).
+    """
+    if not entry or not refine_later() or entry.get('tier', FULL_TIER) == FULL_TIER:
+        return None
+    width, height = entry.get('image_size') or (0, 0)
+    if not width or not height or abs(width / height - pil_image.width / pil_image.height) > 0.01:
+        return None
+
+    scale = pil_image.width / width
+    detected_objects = [
+        {**obj, "box": {key: value * scale for key, value in obj.get('box', {}).items()}}
+        for obj in entry['detected_objects']
+    ]
+    return {**entry, "detected_objects": detected_objects, "tier": get_tier(entry['tier'])}
+
+
+def inference_for_ingest(entry):
+    """Parte da entrada do cache que a ingestão vai aproveitar, para o payload do job (ou None)
+
+    Entradas do nível da ingestão vão inteiras (reusable_inference). De outro nível, só com
+    GALLERY_QUALITY_REFINE_LATER e sem os rostos, que a ingestão recalcula (refinable_preview).
+    """
+    if not entry:
+        return None
+    entry_tier = entry.get('tier', FULL_TIER)
+    if entry_tier == get_tier().name:
+        return entry
+    if refine_later() and entry_tier != FULL_TIER:
+        return {key: value for key, value in entry.items() if key not in ('face_locations', 'face_encodings')}
+    return None
+
+
+def generate_preview(image_file, image_hash=None):
+    """Gera caption e pessoas detectadas sem salvar; guarda os resultados brutos no cache
+
+    Roda no nível de qualidade do preview (GALLERY_QUALITY_PREVIEW_TIER, padrão 'fast'),
+    com o orçamento de latência dele: a tradução só espera o tempo que sobrar.
+    """
+    tier = preview_tier()
+    with tier_budget(tier, 'preview') as clock:
+        return build_preview(image_file, image_hash, tier, clock)
+
+
+def build_preview(image_file, image_hash, tier, clock):
+    # Uma decodificação, já na resolução do nível (ver decodificacao.py)
+    decoded = decode_for_ai(image_file, tier.max_size)
+    pil_image = decoded.image
+
+    cached = reusable_inference(inference_cache.get(image_hash), pil_image, tier) if image_hash else None
+    if cached:
+        basic_caption = cached['basic_caption']
+        detected_objects = cached['detected_objects']
+        face_locations, face_encodings = cached['face_locations'], cached['face_encodings']
+        features = extract_image_features(decoded.small)
+    else:
+        # Caption, objetos, rostos e características ao mesmo tempo (ver grafo_etapas.py)
+        results = inference_graph(decoded, tier).run()
+        basic_caption = results['basic_caption']
+        detected_objects = sorted(results['detected_objects'], key=lambda x: x['score'], reverse=True)
+        face_locations, face_encodings = results['faces']
+        features = results['features']
+
+    detected_persons = identify_faces_for_preview(face_encodings, face_locations, (pil_image.height, pil_image.width))
+
+    # Extrai nomes das pessoas detectadas para personalização
+    person_names = [person['name'] for person in detected_persons]
+
+    # Enriquece descrição COM nomes das pessoas
+    enhanced_caption = enhance_description(basic_caption, detected_objects, features, person_names)
+
+    # Traduz para português (reaproveita se a descrição não mudou). Espera pouco pelo
+    # tradutor: se não der tempo, o preview sai sem tradução e ela termina em segundo plano
+    if cached and cached.get('caption') == enhanced_caption and cached.get('caption_pt'):
+        enhanced_caption_pt = cached['caption_pt']
+    else:
+        timeout = min(translation_setting('PREVIEW_TIMEOUT', 2), clock.remaining())
+        enhanced_caption_pt = translate_text(enhanced_caption, timeout=timeout)
+
+    if image_hash:
+        inference_cache.set(image_hash, build_inference_entry(
+            pil_image, basic_caption, detected_objects, face_locations, face_encodings,
+            enhanced_caption, enhanced_caption_pt, tier.name,
+        ))
+
+    return {
+        "caption": enhanced_caption,
+        "caption_pt": enhanced_caption_pt,
+        "detected_persons": detected_persons
+    }
+
+
 # ============================================================================
 # TRADUÇÃO
 # ============================================================================
 
-def translate_caption_to_portuguese(caption_en):
-    """Traduz caption do inglês para português usando deep-translator"""
+def translate_caption_to_portuguese(caption_en, timeout=None):
+    """Traduz caption do inglês para português (cache + backend configurado; ver traducao.py)"""
     if not caption_en or caption_en.strip() == '':
         return ''
 
-    try:
-        from deep_translator import GoogleTranslator
-        translator = GoogleTranslator(source='en', target='pt')
-        caption_pt = translator.translate(caption_en)
-        return caption_pt
-    except Exception as e:
-        print(f"Erro ao traduzir caption: {e}")
-        # Se falhar, retorna o original em inglês
-        return caption_en
+    # Se falhar ou demorar demais, retorna o original em inglês
+    return translate_text(caption_en, timeout) or caption_en
 
 
 # ============================================================================
@@ -646,7 +1309,8 @@ def translate_caption_to_portuguese(caption_en):
 # ============================================================================
 
 def delete_photo_file(photo):
-    """Deleta arquivo físico da foto"""
+    """Deleta arquivo físico da foto e suas miniaturas"""
+    delete_derivatives(photo)
     if photo.image:
         try:
             if os.path.exists(photo.image.path):
@@ -661,6 +1325,3 @@ def clear_photo_references(photo):
         person.photo_principal = None
         person.save()
 
-
-# Inicializa cache ao importar
-inicializar_cache_rostos()
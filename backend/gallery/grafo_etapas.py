@@ -0,0 +1,112 @@
+"""Etapas independentes de uma foto rodando em paralelo, conforme as dependências declaradas
+
+Com a imagem decodificada, caption, objetos, rostos, características e embedding não
+dependem uns dos outros (caption e objetos só da cópia com contraste ajustado). Um
+StageGraph declara cada etapa e as etapas de que ela precisa; as que já têm as
+dependências prontas rodam ao mesmo tempo num pool de threads compartilhado
+(GALLERY_STAGE_WORKERS), e a latência da foto cai para perto da etapa mais lenta.
+
+Torch e dlib passam a maior parte do tempo fora do GIL, mas cada um abre as próprias
+threads: o torch fica limitado a GALLERY_STAGE_INTRA_OP_THREADS threads (por padrão
+núcleos / workers do pool) para as etapas simultâneas não disputarem os mesmos núcleos.
+
+As etapas do grafo só calculam (modelos, numpy, PIL). O que lê ou grava no banco
+(identificar pessoas, descrição com os nomes, tags) roda depois, na thread de quem
+chamou, na ordem em que depende dos resultados.
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def stage_setting(name, default):
+    """Lê configuração do grafo de etapas no settings (GALLERY_STAGE_*)"""
+    return getattr(settings, f'GALLERY_STAGE_{name}', default)
+
+
+def intra_op_threads(workers):
+    """Threads do torch por etapa: o total (workers x threads) não passa do número de núcleos"""
+    return stage_setting('INTRA_OP_THREADS', None) or max(1, (os.cpu_count() or 1) // workers)
+
+
+def limit_intra_op_threads(threads):
+    # Vale para o processo inteiro (o torch tem um único pool de threads intra-op)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def stage_pool():
+    """Pool compartilhado pelas fotos do processo (None = etapas em sequência, GALLERY_STAGE_WORKERS <= 1)"""
+    global _pool
+    workers = stage_setting('WORKERS', 3)
+    if workers <= 1:
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                limit_intra_op_threads(intra_op_threads(workers))
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gallery-stage')
+    return _pool
+
+
+class StageGraph:
+    """Etapas de uma foto com dependências; `run()` devolve {etapa: resultado}"""
+
+    def __init__(self):
+        self._stages = {}  # etapa -> (função, args, kwargs, dependências)
+
+    def add(self, name, func, *args, after=(), **kwargs):
+        """Etapa `name` = func(*args, *resultados de `after`, **kwargs), depois das etapas `after`
+
+        As dependências precisam ter sido declaradas antes (o grafo nunca tem ciclos).
+        """
+        missing = [dep for dep in after if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Etapa '{name}' depende de etapas não declaradas: {', '.join(missing)}")
+        self._stages[name] = (func, args, kwargs, tuple(after))
+        return self
+
+    def _call(self, name, results):
+        func, args, kwargs, after = self._stages[name]
+        return func(*args, *(results[dep] for dep in after), **kwargs)
+
+    def run(self, pool=None):
+        """Roda as etapas (as prontas em paralelo no pool); a primeira exceção interrompe o grafo"""
+        pool = pool or stage_pool()
+        results = {}
+        if pool is None:
+            # Ordem de declaração já respeita as dependências
+            for name in self._stages:
+                results[name] = self._call(name, results)
+            return results
+
+        pending = dict(self._stages)
+        running = {}  # future -> etapa
+        try:
+            while pending or running:
+                ready = [name for name, stage in pending.items() if all(dep in results for dep in stage[3])]
+                for name in ready:
+                    del pending[name]
+                    # Cópia do contexto: os spans da etapa entram no detalhamento do request (metricas.py)
+                    context = contextvars.copy_context()
+                    running[pool.submit(context.run, self._call, name, results)] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            # Etapas ainda não iniciadas não rodam mais (as em execução terminam sozinhas)
+            for future in running:
+                future.cancel()
+        return results
@@ -0,0 +1,217 @@
+"""Índice vetorizado de rostos conhecidos: matriz float32 contígua + IDs das pessoas
+
+Encodings ficam no banco como float32 em bytes (pack_encoding / unpack_encoding):
+512 bytes por rosto, lidos direto para numpy sem passar por JSON.
+"""
+
+import threading
+
+import numpy as np
+
+ENCODING_SIZE = 128
+
+
+def as_encoding(encoding):
+    """Encoding como vetor float32 de ENCODING_SIZE posições (ValueError se inválido)"""
+    vector = np.asarray(encoding, dtype=np.float32).reshape(-1)
+    if vector.shape[0] != ENCODING_SIZE:
+        raise ValueError(f"Encoding com {vector.shape[0]} dimensões (esperado {ENCODING_SIZE})")
+    if not np.isfinite(vector).all():
+        raise ValueError("Encoding com valores não finitos")
+    return vector
+
+
+def pack_encoding(encoding):
+    """Encoding em bytes (float32) para as colunas binárias"""
+    return as_encoding(encoding).tobytes()
+
+
+def unpack_encoding(blob):
+    """Vetor float32 a partir dos bytes salvos (sem cópia)"""
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def face_centroid(encodings, weights=None):
+    """Média (ponderada) dos encodings, normalizada como os centroides das pessoas"""
+    centroid = np.average(np.asarray(encodings, dtype=np.float32), axis=0, weights=weights)
+    norm = np.linalg.norm(centroid)
+    return (centroid / norm if norm > 0 else centroid).astype(np.float32)
+
+
+class FaceIndex:
+    """Guarda um encoding por pessoa e compara todos os rostos de uma foto numa única operação
+
+    Inserção é O(1) amortizado (a matriz dobra de capacidade quando enche), atualização
+    é O(1) e remoção é O(1) trocando a linha removida pela última.
+    """
+
+    def __init__(self, dim=ENCODING_SIZE, capacity=256):
+        self.dim = dim
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.synced_state = None  # estado das pessoas no banco na última leitura (ver funcoes_ia.sync_face_index)
+        self._encodings = np.empty((capacity, dim), dtype=np.float32)
+        self._sq_norms = np.empty(capacity, dtype=np.float32)
+        self._person_ids = np.empty(capacity, dtype=np.int64)
+        self._rows = {}  # person_id -> linha da matriz
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, person_id):
+        return person_id in self._rows
+
+    @property
+    def person_ids(self):
+        """IDs indexados, na ordem das linhas da matriz"""
+        return self._person_ids[:self._size]
+
+    @property
+    def encodings(self):
+        """Visão (sem cópia) da matriz de encodings"""
+        return self._encodings[:self._size]
+
+    # ------------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------------
+
+    def _as_vector(self, encoding):
+        if isinstance(encoding, (bytes, memoryview)):
+            encoding = unpack_encoding(encoding)
+        vector = np.asarray(encoding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Encoding com {vector.shape[0]} dimensões (esperado {self.dim})")
+        return vector
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, 2 * self._encodings.shape[0])
+        encodings = np.empty((capacity, self.dim), dtype=np.float32)
+        sq_norms = np.empty(capacity, dtype=np.float32)
+        person_ids = np.empty(capacity, dtype=np.int64)
+
+        encodings[:self._size] = self._encodings[:self._size]
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        person_ids[:self._size] = self._person_ids[:self._size]
+
+        self._encodings, self._sq_norms, self._person_ids = encodings, sq_norms, person_ids
+
+    def add(self, person_id, encoding):
+        """Insere (ou substitui) o encoding de uma pessoa"""
+        with self.lock:
+            if person_id in self._rows:
+                self.update(person_id, encoding)
+                return
+
+            vector = self._as_vector(encoding)
+            if self._size == self._encodings.shape[0]:
+                self._grow(self._size + 1)
+
+            row = self._size
+            self._encodings[row] = vector
+            self._sq_norms[row] = vector @ vector
+            self._person_ids[row] = person_id
+            self._rows[person_id] = row
+            self._size += 1
+
+    def update(self, person_id, encoding):
+        """Atualiza o encoding de uma pessoa já indexada"""
+        with self.lock:
+            row = self._rows.get(person_id)
+            if row is None:
+                self.add(person_id, encoding)
+                return
+
+            vector = self._as_vector(encoding)
+            self._encodings[row] = vector
+            self._sq_norms[row] = vector @ vector
+
+    def remove(self, person_id):
+        """Remove a pessoa do índice (ignora IDs desconhecidos)"""
+        with self.lock:
+            row = self._rows.pop(person_id, None)
+            if row is None:
+                return False
+
+            last = self._size - 1
+            if row != last:
+                moved_id = int(self._person_ids[last])
+                self._encodings[row] = self._encodings[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._person_ids[row] = moved_id
+                self._rows[moved_id] = row
+
+            self._size -= 1
+            return True
+
+    def get(self, person_id):
+        """Cópia do encoding indexado da pessoa (ou None)"""
+        with self.lock:
+            row = self._rows.get(person_id)
+            return None if row is None else self._encodings[row].copy()
+
+    def clear(self):
+        with self.lock:
+            self._rows.clear()
+            self._size = 0
+            self.loaded = False
+            self.synced_state = None
+
+    def load(self, items):
+        """Recarrega o índice a partir de pares (person_id, encoding em bytes ou vetor)"""
+        with self.lock:
+            items = list(items)
+            self._rows.clear()
+            self._size = 0
+            if len(items) > self._encodings.shape[0]:
+                self._grow(len(items))
+
+            for person_id, encoding in items:
+                try:
+                    self.add(person_id, encoding)
+                except ValueError as e:
+                    print(f"Encoding inválido para pessoa {person_id}: {e}")
+
+            self.loaded = True
+
+    # ------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------
+
+    def distances(self, face_encodings):
+        """Matriz (rostos x pessoas) de distâncias euclidianas, calculada de uma vez"""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.dim)
+        with self.lock:
+            known = self._encodings[:self._size]
+            sq_known = self._sq_norms[:self._size]
+            sq_queries = np.einsum('ij,ij->i', queries, queries)
+
+            # |a - b|² = |a|² + |b|² - 2 a·b
+            squared = sq_queries[:, None] + sq_known[None, :] - 2.0 * (queries @ known.T)
+            np.maximum(squared, 0.0, out=squared)
+            return np.sqrt(squared, out=squared)
+
+    def match(self, face_encodings, tolerances):
+        """Para cada rosto, retorna (person_id, distância) do vizinho mais próximo abaixo da tolerância, ou None"""
+        face_encodings = list(face_encodings)
+        if not face_encodings:
+            return []
+
+        with self.lock:
+            if self._size == 0:
+                return [None] * len(face_encodings)
+
+            distances = self.distances(face_encodings)
+            best_rows = distances.argmin(axis=1)
+            best_distances = distances[np.arange(len(best_rows)), best_rows]
+            person_ids = self._person_ids[best_rows]
+
+        tolerances = np.broadcast_to(np.asarray(tolerances, dtype=np.float32), best_distances.shape)
+        return [
+            (int(person_id), float(distance)) if distance < tolerance else None
+            for person_id, distance, tolerance in zip(person_ids, best_distances, tolerances)
+        ]
+
+
+# Índice global compartilhado pelo processo (views e workers da fila)
+face_index = FaceIndex()
@@ -0,0 +1,206 @@
+"""Backends de inferência em CPU para o caption (BLIP) e a detecção de objetos (DETR)
+
+- 'torch': pipelines do transformers em fp32 (padrão)
+- 'int8': os mesmos pipelines com as camadas Linear quantizadas dinamicamente para int8
+- 'onnx': a parte pesada do modelo roda no ONNX Runtime, exportada dos mesmos pesos: o
+  DETR inteiro e o encoder de imagem do BLIP (o decoder de texto, autoregressivo, segue
+  no torch). A exportação é feita no primeiro uso e fica em GALLERY_INFERENCE_ONNX_DIR.
+
+Pré e pós-processamento continuam os do pipeline do transformers em todos os backends:
+a saída tem o mesmo formato e só muda pela precisão numérica. O comando
+`evaluate_backends` mede a concordância e a latência de cada backend contra o 'torch'.
+
+O backend vale para os dois modelos (GALLERY_INFERENCE_BACKEND) ou para cada um
+(GALLERY_INFERENCE_CAPTIONER_BACKEND, GALLERY_INFERENCE_OBJECT_DETECTOR_BACKEND).
+"""
+
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from .grafo_etapas import intra_op_threads, stage_setting
+from .modelos_ia import CAPTION_MODEL, OBJECT_DETECTION_MODEL
+
+INFERENCE_BACKENDS = ('torch', 'int8', 'onnx')
+
+# Nome no model_registry -> (tarefa do pipeline, modelo do Hugging Face)
+PIPELINE_MODELS = {
+    'captioner': ("image-to-text", CAPTION_MODEL),
+    'object_detector': ("object-detection", OBJECT_DETECTION_MODEL),
+}
+
+ONNX_OPSET = 17
+
+
+def inference_setting(name, default):
+    """Lê configuração dos backends de inferência no settings (GALLERY_INFERENCE_*)"""
+    return getattr(settings, f'GALLERY_INFERENCE_{name}', default)
+
+
+def inference_backend(model_name):
+    """Backend configurado para o modelo ('captioner' ou 'object_detector')"""
+    backend = inference_setting(f'{model_name.upper()}_BACKEND', None) or inference_setting('BACKEND', 'torch')
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Backend de inferência desconhecido: {backend}")
+    return backend
+
+
+def build_pipeline(model_name, backend=None, model_id=None):
+    """Pipeline do transformers para o modelo, rodando no backend pedido (ou no configurado)
+
+    `model_id` troca os pesos por outro modelo da mesma tarefa (ex: os do nível de
+    qualidade 'fast', ver niveis_qualidade.py).
+    """
+    from transformers import pipeline
+
+    backend = backend or inference_backend(model_name)
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Backend de inferência desconhecido: {backend}")
+
+    task, default_model = PIPELINE_MODELS[model_name]
+    pipe = pipeline(task, model=model_id or default_model)
+    if backend == 'int8':
+        quantize_int8(pipe)
+    elif backend == 'onnx':
+        if model_name == 'captioner':
+            attach_onnx_vision_encoder(pipe)
+        else:
+            attach_onnx_detector(pipe)
+    return pipe
+
+
+# ============================================================================
+# INT8 (QUANTIZAÇÃO DINÂMICA)
+# ============================================================================
+
+def quantize_int8(pipe):
+    """Troca as camadas Linear do modelo por versões int8 (pesos quantizados, ativações em fp32)
+
+    Converte no lugar, sem manter uma cópia fp32 na memória. As convoluções (backbone
+    ResNet do DETR) continuam em fp32.
+    """
+    import torch
+    torch.ao.quantization.quantize_dynamic(pipe.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return pipe
+
+
+# ============================================================================
+# ONNX RUNTIME
+# ============================================================================
+
+def onnx_path(model, component):
+    """Arquivo exportado de um componente, por modelo e revisão dos pesos"""
+    directory = Path(inference_setting('ONNX_DIR', Path(settings.BASE_DIR) / 'onnx_models'))
+    revision = (getattr(model.config, '_commit_hash', None) or 'local')[:12]
+    return directory / slugify(model.name_or_path.replace('/', '-')) / f"{component}-{revision}.onnx"
+
+
+def export_onnx(module, inputs, path, input_names, output_names, dynamic_axes):
+    """Exporta o módulo uma vez; arquivo temporário + rename para outros processos nunca lerem pela metade"""
+    if path.exists():
+        return path
+
+    import torch
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    print(f"Exportando {path.name} para ONNX (só na primeira vez)...")
+    with torch.no_grad():
+        torch.onnx.export(
+            module.eval(), inputs, str(temp_path),
+            input_names=input_names, output_names=output_names,
+            dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET,
+        )
+    os.replace(temp_path, path)
+    return path
+
+
+def onnx_session(path):
+    """Sessão do ONNX Runtime em CPU com o mesmo limite de threads das etapas do torch"""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads(max(1, stage_setting('WORKERS', 3)))
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return onnxruntime.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+
+
+def attach_onnx_vision_encoder(pipe):
+    """Troca o encoder de imagem do BLIP (ViT, a maior parte do custo) por uma sessão do ONNX Runtime"""
+    import torch
+    from transformers.modeling_outputs import BaseModelOutputWithPooling
+
+    class VisionEncoder(torch.nn.Module):
+        def __init__(self, vision_model):
+            super().__init__()
+            self.vision_model = vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values)[0]
+
+    class OnnxVisionModel(torch.nn.Module):
+        """Mesma chamada do vision_model do BLIP; só o last_hidden_state é usado na geração"""
+
+        def __init__(self, session):
+            super().__init__()
+            self.session = session
+
+        def forward(self, pixel_values=None, **kwargs):
+            hidden = self.session.run(None, {'pixel_values': pixel_values.detach().float().cpu().numpy()})[0]
+            return BaseModelOutputWithPooling(last_hidden_state=torch.from_numpy(hidden))
+
+    model = pipe.model
+    size = pipe.image_processor.size
+    path = export_onnx(
+        VisionEncoder(model.vision_model), (torch.zeros(1, 3, size['height'], size['width']),),
+        onnx_path(model, 'vision-encoder'), ['pixel_values'], ['last_hidden_state'],
+        {'pixel_values': {0: 'batch'}, 'last_hidden_state': {0: 'batch'}},
+    )
+    # Os pesos do ViT em torch deixam de ser referenciados e são liberados
+    model.vision_model = OnnxVisionModel(onnx_session(path))
+    return pipe
+
+
+def attach_onnx_detector(pipe):
+    """Roda o DETR inteiro (backbone + transformer + cabeças) no ONNX Runtime"""
+    import torch
+    from transformers.models.detr.modeling_detr import DetrObjectDetectionOutput
+
+    class DetrOutputs(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values, pixel_mask):
+            outputs = self.model(pixel_values=pixel_values, pixel_mask=pixel_mask)
+            return outputs.logits, outputs.pred_boxes
+
+    model = pipe.model
+    path = export_onnx(
+        DetrOutputs(model), (torch.zeros(1, 3, 800, 800), torch.ones(1, 800, 800, dtype=torch.int64)),
+        onnx_path(model, 'detr'), ['pixel_values', 'pixel_mask'], ['logits', 'pred_boxes'],
+        {
+            'pixel_values': {0: 'batch', 2: 'height', 3: 'width'},
+            'pixel_mask': {0: 'batch', 1: 'height', 2: 'width'},
+            'logits': {0: 'batch'},
+            'pred_boxes': {0: 'batch'},
+        },
+    )
+    session = onnx_session(path)
+
+    def forward(pixel_values, pixel_mask=None, **kwargs):
+        if pixel_mask is None:
+            pixel_mask = torch.ones(pixel_values.shape[0], *pixel_values.shape[2:], dtype=torch.int64)
+        logits, pred_boxes = session.run(None, {
+            'pixel_values': pixel_values.detach().float().cpu().numpy(),
+            'pixel_mask': pixel_mask.to(torch.int64).cpu().numpy(),
+        })
+        return DetrObjectDetectionOutput(logits=torch.from_numpy(logits), pred_boxes=torch.from_numpy(pred_boxes))
+
+    # O pipeline só usa a saída do forward; backbone e transformer em torch são liberados
+    # (as cabeças pequenas ficam, para o pipeline continuar lendo dtype e device do modelo)
+    model.forward = forward
+    model.model = None
+    return pipe
@@ -0,0 +1,155 @@
+"""Benchmark dos perfis de detecção de rostos: recall e latência numa pasta de fotos de referência"""
+
+import json
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from gallery.deteccao_rostos import FACE_DETECTION_PROFILES, detect_and_encode_faces
+from gallery.funcoes_ia import load_image_for_ai
+from gallery.management.commands.import_photos import IMAGE_EXTENSIONS
+from gallery.modelos_ia import model_registry
+
+
+def box_iou(a, b):
+    """Interseção sobre união de duas caixas (top, right, bottom, left)"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def matched_faces(found, expected, min_iou):
+    """Rostos esperados encontrados: pareamento guloso por IoU, ou só contagem se não há caixas"""
+    if isinstance(expected, int):
+        return min(len(found), expected)
+
+    candidates = sorted(
+        ((box_iou(f, e), i, j) for i, f in enumerate(found) for j, e in enumerate(expected)),
+        reverse=True,
+    )
+    used_found, used_expected = set(), set()
+    for iou, i, j in candidates:
+        if iou < min_iou:
+            break
+        if i not in used_found and j not in used_expected:
+            used_found.add(i)
+            used_expected.add(j)
+    return len(used_expected)
+
+
+def expected_count(expected):
+    return expected if isinstance(expected, int) else len(expected)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os perfis de detecção de rostos numa pasta de fotos: rostos achados, recall e "
+        "tempo por foto (detecção + encodings)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Pasta com as fotos de referência")
+        parser.add_argument('--ground-truth', default=None,
+                            help="JSON {arquivo: número de rostos ou lista de caixas [top, right, bottom, left] "
+                                 "na imagem original} (padrão: faces.json na pasta; sem ele o perfil "
+                                 "'accurate' é a referência)")
+        parser.add_argument('--profiles', default=','.join(FACE_DETECTION_PROFILES),
+                            help="Perfis a comparar, separados por vírgula")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Execuções por foto (o tempo reportado é a mediana)")
+        parser.add_argument('--iou', type=float, default=0.3,
+                            help="Sobreposição mínima para um rosto contar como encontrado")
+        parser.add_argument('--limit', type=int, default=None)
+
+    def handle(self, *args, **options):
+        root = Path(options['path'])
+        if not root.is_dir():
+            raise CommandError(f"Pasta não encontrada: {root}")
+
+        profiles = [name.strip() for name in options['profiles'].split(',') if name.strip()]
+        unknown = [name for name in profiles if name not in FACE_DETECTION_PROFILES]
+        if unknown:
+            raise CommandError(f"Perfil desconhecido: {', '.join(unknown)}")
+
+        paths = sorted(p for p in root.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+        if options['limit']:
+            paths = paths[:options['limit']]
+        if not paths:
+            raise CommandError("Nenhuma imagem encontrada")
+
+        # Carrega o dlib fora da medição
+        model_registry.get('face_recognition')
+
+        images = [self.load(path) for path in paths]
+        ground_truth = self.load_ground_truth(root, options['ground_truth'], paths, images)
+
+        results = []
+        for name in profiles:
+            results.append(self.run_profile(name, images, ground_truth, options['repeat'], options['iou']))
+
+        self.report(results, len(images), sum(map(expected_count, ground_truth)))
+
+    def load(self, path):
+        """Imagem como o pipeline de ingestão a vê (máx. 2048px) e a escala em relação ao arquivo"""
+        with Image.open(path) as original:
+            original_width = original.width
+        pil_image = load_image_for_ai(path)
+        return np.array(pil_image), pil_image.width / original_width
+
+    def load_ground_truth(self, root, ground_truth_path, paths, images):
+        path = Path(ground_truth_path) if ground_truth_path else root / 'faces.json'
+        if not path.exists():
+            if ground_truth_path:
+                raise CommandError(f"Arquivo não encontrado: {path}")
+            self.stdout.write("Sem faces.json: usando o perfil 'accurate' como referência")
+            return [detect_and_encode_faces(img_array, FACE_DETECTION_PROFILES['accurate'])[0]
+                    for img_array, _ in images]
+
+        data = json.loads(path.read_text(encoding='utf-8'))
+        ground_truth = []
+        for image_path, (_, scale) in zip(paths, images):
+            expected = data.get(str(image_path.relative_to(root)), data.get(image_path.name, 0))
+            if not isinstance(expected, int):
+                expected = [tuple(int(value * scale) for value in box) for box in expected]
+            ground_truth.append(expected)
+        return ground_truth
+
+    def run_profile(self, name, images, ground_truth, repeat, min_iou):
+        profile = FACE_DETECTION_PROFILES[name]
+        timings = []
+        found = matched = 0
+
+        for (img_array, _), expected in zip(images, ground_truth):
+            locations = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                locations, _ = detect_and_encode_faces(img_array, profile)
+                timings.append((time.perf_counter() - start) * 1000)
+            found += len(locations)
+            matched += matched_faces(locations, expected, min_iou)
+
+        timings.sort()
+        return {
+            "name": name,
+            "found": found,
+            "matched": matched,
+            "median_ms": statistics.median(timings),
+            "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        }
+
+    def report(self, results, image_count, expected_total):
+        self.stdout.write(f"\n{image_count} foto(s), {expected_total} rosto(s) de referência")
+        self.stdout.write(f"\n{'perfil':<12}{'achados':>9}{'recall':>9}{'mediana':>11}{'p95':>10}")
+        for r in results:
+            recall = r['matched'] / expected_total if expected_total else 1.0
+            self.stdout.write(
+                f"{r['name']:<12}{r['found']:>9}{recall:>8.1%}{r['median_ms']:>9.1f}ms{r['p95_ms']:>8.1f}ms"
+            )
@@ -0,0 +1,328 @@
+"""Benchmark do pipeline de IA (ingestão, preview e busca) com modelos falsos de latência controlada"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from gallery.bench import VOCABULARY, StageTimer, TimedModel, throwaway_database, timed_runs
+from gallery.modelos_falsos import DEFAULT_LATENCIES, Latency, build_fake_models, synthetic_jpeg
+from gallery.modelos_ia import model_registry
+from gallery.models import Photo
+from gallery.niveis_qualidade import ingest_model_names, register_tier_models
+from gallery.traducao import translation_setting
+
+# Modelos do preview (níveis de qualidade) entram no registro junto com os da ingestão
+register_tier_models()
+
+# Etapa medida de cada modelo do registro
+MODEL_STAGES = {
+    'captioner': 'caption',
+    'object_detector': 'objects',
+    'captioner_fast': 'caption_fast',
+    'object_detector_fast': 'objects_fast',
+    'face_recognition': 'faces',
+    'translator': 'translation',
+    'query_translator': 'query_translation',
+    'semantic_encoder': 'embedding',
+}
+
+# Folga absoluta antes de uma diferença contar como regressão (ruído em valores pequenos)
+ABSOLUTE_SLACK = {'ms': 5.0, 'mb': 20.0}
+
+
+class QueryCounter:
+    """Conta as queries da conexão sem guardá-las (CaptureQueriesContext guarda no máximo 9000)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def peak_rss_mb():
+    """Pico de memória do processo (None onde o módulo resource não existe, ex: Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def metric_unit(name):
+    if name.endswith('_per_s'):
+        return 'fotos/s'
+    if 'queries' in name:
+        return 'queries'
+    return 'mb' if name.endswith('_mb') else 'ms'
+
+
+def is_regression(name, value, baseline, tolerance):
+    """Pior que o baseline além da tolerância? (queries não têm folga)"""
+    if value is None or baseline is None:
+        return False
+    unit = metric_unit(name)
+    if unit == 'fotos/s':
+        return value < baseline * (1 - tolerance)
+    if unit == 'queries':
+        return value > baseline + 1e-9
+    return value > baseline * (1 + tolerance) and value - baseline > ABSOLUTE_SLACK[unit]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o pipeline de IA num banco descartável com fotos sintéticas e modelos falsos "
+        "(latência configurável): tempo por etapa, fotos/s, queries e pico de memória; "
+        "falha se piorar em relação ao baseline salvo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=48, help="Fotos ingeridas em lote")
+        parser.add_argument('--batch-size', type=int, default=8)
+        parser.add_argument('--size', type=int, default=1024, help="Largura das fotos sintéticas")
+        parser.add_argument('--single', type=int, default=4,
+                            help="Fotos processadas uma a uma (process_photo_with_ai)")
+        parser.add_argument('--repeat', type=int, default=5,
+                            help="Requests de preview e de busca (o tempo reportado é a mediana)")
+        parser.add_argument('--latency', action='append', default=[], metavar='MODELO=MS',
+                            help="Latência de um modelo falso: 'captioner=120' (por imagem) ou "
+                                 "'captioner=20:120' (por chamada:por imagem); pode repetir")
+        parser.add_argument('--real', action='store_true',
+                            help="Usa os modelos reais já baixados (sem download; tradução do Google vira falsa)")
+        parser.add_argument('--baseline', default=None,
+                            help="Arquivo do baseline (padrão: benchmarks/pipeline_<fake|real>.json)")
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Grava o resultado como novo baseline em vez de comparar")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Piora relativa aceita nos tempos e na memória (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        latencies = self.parse_latencies(options['latency'])
+        mode = 'real' if options['real'] else 'fake'
+        timer = StageTimer()
+        self.install_models(mode, latencies, timer)
+
+        config = {
+            "mode": mode,
+            "photos": options['photos'],
+            "batch_size": options['batch_size'],
+            "size": options['size'],
+            "single": options['single'],
+            "latencies": {name: repr(latency) for name, latency in latencies.items()} if mode == 'fake' else None,
+        }
+
+        try:
+            metrics, stages = self.run(options, timer)
+        finally:
+            for name in MODEL_STAGES:
+                model_registry.unload(name)
+        metrics['peak_rss_mb'] = peak_rss_mb()
+
+        path = Path(options['baseline'] or settings.BASE_DIR / 'benchmarks' / f'pipeline_{mode}.json')
+        baseline = None
+        if not options['save_baseline'] and path.exists():
+            baseline = json.loads(path.read_text(encoding='utf-8'))
+            if baseline.get('config') != config:
+                raise CommandError(
+                    f"O baseline {path} foi gerado com outros parâmetros ({baseline.get('config')}); "
+                    "rode com os mesmos parâmetros ou grave um novo com --save-baseline"
+                )
+
+        self.report_stages(stages, options['photos'])
+        failures = self.report_metrics(metrics, baseline and baseline['metrics'], options['tolerance'])
+
+        if options['save_baseline']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({"config": config, "metrics": metrics}, indent=2), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"\nBaseline salvo em {path}"))
+        elif failures:
+            raise CommandError("Regressão no benchmark do pipeline:\n  " + "\n  ".join(failures))
+        elif baseline:
+            self.stdout.write(self.style.SUCCESS(f"\nSem regressões em relação a {path}"))
+        else:
+            self.stdout.write(f"\nSem baseline em {path} (grave um com --save-baseline)")
+
+    def parse_latencies(self, values):
+        latencies = dict(DEFAULT_LATENCIES)
+        for value in values:
+            name, _, spec = value.partition('=')
+            if name not in MODEL_STAGES or not spec:
+                raise CommandError(f"Latência inválida: {value} (modelos: {', '.join(MODEL_STAGES)})")
+            try:
+                latencies[name] = Latency.parse(spec)
+            except ValueError:
+                raise CommandError(f"Latência inválida: {value}")
+        return latencies
+
+    def install_models(self, mode, latencies, timer):
+        """Registra os modelos (falsos ou reais) envoltos no medidor de tempo por etapa"""
+        if mode == 'fake':
+            models = build_fake_models(latencies)
+        else:
+            # Só o que já está no cache local do Hugging Face: nada é baixado
+            os.environ.setdefault('HF_HUB_OFFLINE', '1')
+            os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+            models = {}
+            for name in MODEL_STAGES:
+                # Níveis configurados com os mesmos modelos da ingestão não registram cópias
+                if name not in model_registry.names:
+                    continue
+                if name in ('translator', 'query_translator') and translation_setting('BACKEND', 'google') == 'google':
+                    self.stdout.write("Tradução pelo Google (rede) substituída pelo tradutor falso")
+                    models[name] = build_fake_models(latencies)[name]
+                    continue
+                try:
+                    models[name] = model_registry.get(name)
+                except Exception as e:
+                    raise CommandError(f"Modelo '{name}' indisponível sem download: {e}")
+
+        for name, model in models.items():
+            model_registry.override(name, TimedModel(model, MODEL_STAGES[name], timer))
+
+    def run(self, options, timer):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            GALLERY_EMBEDDINGS_DIR=Path(media_root) / 'embeddings',
+            GALLERY_ASYNC_INGESTION=False,
+            GALLERY_TRANSLATION_DEFERRED=False,
+        ), throwaway_database():
+            seeds = iter(range(10 ** 6))
+            metrics = {}
+
+            stages = self.bench_ingest(options, seeds, timer, metrics)
+            self.bench_single(options, seeds, metrics)
+            client = APIClient()
+            self.bench_preview(client, options, seeds, metrics)
+            self.bench_search(client, options, metrics)
+            return metrics, stages
+
+    def count_queries(self, func):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            result = func()
+        return counter.count, result
+
+    def create_photos(self, count, size, seeds):
+        return [
+            Photo.objects.create(image=ContentFile(synthetic_jpeg(seed, size), name=f"bench_{seed}.jpg"))
+            for seed in (next(seeds) for _ in range(count))
+        ]
+
+    def bench_ingest(self, options, seeds, timer, metrics):
+        """Ingestão em lote (mesmo caminho do import_photos e da fila)"""
+        from gallery.funcoes_ia import ingest_photos_batch
+
+        photos = self.create_photos(options['photos'], options['size'], seeds)
+        batch_size = options['batch_size']
+
+        def ingest():
+            errors = {}
+            for start in range(0, len(photos), batch_size):
+                errors.update(ingest_photos_batch(photos[start:start + batch_size], batch_size=batch_size,
+                                                  raise_errors=True))
+            return errors
+
+        timer.reset()
+        start = time.perf_counter()
+        queries, errors = self.count_queries(ingest)
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise CommandError(f"{len(errors)} foto(s) falharam na ingestão: {next(iter(errors.values()))}")
+
+        # Modelos só do preview (nível 'fast') não rodam na ingestão
+        stages = {
+            MODEL_STAGES[name]: (timer.seconds.get(MODEL_STAGES[name], 0.0), timer.calls.get(MODEL_STAGES[name], 0))
+            for name in ingest_model_names() if name in MODEL_STAGES
+        }
+        metrics['ingest_photos_per_s'] = len(photos) / elapsed
+        metrics['ingest_queries_per_photo'] = round(queries / len(photos), 2)
+        for stage, (seconds, _) in stages.items():
+            metrics[f'stage_{stage}_ms_per_photo'] = seconds * 1000 / len(photos)
+        # Tempo de relógio sem nenhum modelo rodando (as etapas se sobrepõem entre threads)
+        metrics['stage_other_ms_per_photo'] = (elapsed - timer.busy_seconds) * 1000 / len(photos)
+        return stages
+
+    def bench_single(self, options, seeds, metrics):
+        """Uma foto por vez, sem lote (upload síncrono e reprocessamento foto a foto)"""
+        from gallery.funcoes_ia import ingest_photo
+
+        photos = self.create_photos(options['single'], options['size'], seeds)
+        timings = []
+        for photo in photos:
+            start = time.perf_counter()
+            ingest_photo(photo, raise_errors=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        if timings:
+            metrics['single_photo_ms'] = statistics.median(timings)
+
+    def bench_preview(self, client, options, seeds, metrics):
+        """POST /api/photos/preview/ com imagens novas (sem acerto no cache de inferência)"""
+        timings, queries = [], 0
+        for _ in range(options['repeat']):
+            upload = SimpleUploadedFile('preview.jpg', synthetic_jpeg(next(seeds), options['size']), 'image/jpeg')
+            start = time.perf_counter()
+            queries, response = self.count_queries(
+                lambda: client.post('/api/photos/preview/', {'image': upload}, format='multipart')
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"Preview retornou {response.status_code}: {response.content[:200]}")
+        metrics['preview_ms'] = statistics.median(timings)
+        metrics['preview_queries'] = queries
+
+    def bench_search(self, client, options, metrics):
+        """Busca textual (FTS5) e semântica sobre as fotos ingeridas"""
+        from gallery.busca_semantica import semantic_search_enabled
+
+        # As legendas sintéticas usam as palavras em inglês de VOCABULARY
+        endpoints = {'search': f"/api/search/?q={VOCABULARY[0][0]}"}
+        if semantic_search_enabled():
+            endpoints['semantic_search'] = f"/api/search/semantic/?q={VOCABULARY[0][1]}"
+
+        for name, url in endpoints.items():
+            client.get(url)  # aquecimento (índices carregados uma vez por processo)
+            queries, response = self.count_queries(lambda: client.get(url))
+            if response.status_code != 200:
+                raise CommandError(f"{url} retornou {response.status_code}")
+            metrics[f'{name}_ms'], _, _ = timed_runs(lambda: client.get(url), options['repeat'])
+            metrics[f'{name}_queries'] = queries
+
+    def report_stages(self, stages, photo_count):
+        self.stdout.write(f"\nIngestão em lote de {photo_count} foto(s), tempo por etapa:")
+        self.stdout.write(f"{'etapa':<14}{'chamadas':>10}{'total':>11}{'por foto':>12}")
+        for stage, (seconds, calls) in stages.items():
+            self.stdout.write(f"{stage:<14}{calls:>10}{seconds:>10.2f}s{seconds * 1000 / photo_count:>10.1f}ms")
+
+    def report_metrics(self, metrics, baseline, tolerance):
+        """Tabela das métricas (com o baseline ao lado); retorna as regressões"""
+        self.stdout.write(f"\n{'métrica':<32}{'valor':>12}{'baseline':>12}{'variação':>10}")
+        failures = []
+        for name, value in metrics.items():
+            base = (baseline or {}).get(name)
+            if value is None:
+                self.stdout.write(f"{name:<32}{'n/d':>12}")
+                continue
+            base_text = f"{base:.2f}" if base is not None else ""
+            change = f"{(value - base) / base:+.0%}" if base else ""
+            line = f"{name:<32}{value:>12.2f}{base_text:>12}{change:>10}"
+            if is_regression(name, value, base, tolerance):
+                failures.append(f"{name}: {value:.2f} {metric_unit(name)} (baseline {base:.2f})")
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return failures
@@ -0,0 +1,107 @@
+"""Benchmark de queries SQL e tempo de resposta dos endpoints de listagem"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from gallery.bench import build_synthetic_library, throwaway_database, timed_runs
+
+# Máximo de queries por request: não pode depender do número de resultados
+QUERY_BUDGETS = {
+    'photos': 3,          # fotos + tags + pessoas
+    'favorites': 3,
+    'search': 4,          # ranking FTS5 + fotos + tags + pessoas
+    'person-photos': 4,   # pessoa + fotos + tags + pessoas
+    'persons': 2,         # pessoas (com foto principal e contagem) + primeira foto
+    'persons-hidden': 2,
+    'person-detail': 2,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede queries e tempo dos endpoints de listagem num banco descartável com dados sintéticos; "
+        "falha se algum endpoint passar do orçamento de queries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=500)
+        parser.add_argument('--persons', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help="Requests por endpoint (o tempo reportado é a mediana)")
+        parser.add_argument('--max-ms', type=float, default=None,
+                            help="Falha também se a mediana de algum endpoint passar deste tempo")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            photos, persons, tags = build_synthetic_library(options['photos'], options['persons'])
+            self.stdout.write(f"Biblioteca sintética: {len(photos)} fotos, {len(persons)} pessoas, {len(tags)} tags")
+            results = self.run_benchmarks(persons, options['repeat'])
+
+        self.report(results, options['max_ms'])
+
+    def run_benchmarks(self, persons, repeat):
+        client = APIClient()
+        page_size = getattr(settings, 'GALLERY_MAX_PAGE_SIZE', 200)
+        person = persons[-1]
+
+        endpoints = {
+            'photos': f"/api/photos/?page_size={page_size}",
+            'favorites': f"/api/favorites/?page_size={page_size}",
+            'search': f"/api/search/?q=synthetic&page_size={page_size}",
+            'person-photos': f"/api/persons/{person.pk}/photos/?page_size={page_size}",
+            'persons': "/api/persons/",
+            'persons-hidden': "/api/persons/hidden/",
+            'person-detail': f"/api/persons/{person.pk}/",
+        }
+
+        results = []
+        for name, url in endpoints.items():
+            client.get(url)  # aquecimento: verificações feitas uma vez por processo não entram na conta
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url)
+            # Lido já aqui: cada request seguinte zera o log de queries da conexão
+            query_count = len(ctx.captured_queries)
+            if response.status_code != 200:
+                raise CommandError(f"{url} retornou {response.status_code}")
+
+            data = response.json()
+            items = data.get('results', data) if isinstance(data, dict) else data
+            count = len(items) if isinstance(items, list) else 1
+
+            median_ms, max_ms, _ = timed_runs(lambda: client.get(url), repeat)
+            results.append({
+                "name": name,
+                "url": url,
+                "items": count,
+                "queries": query_count,
+                "budget": QUERY_BUDGETS[name],
+                "median_ms": median_ms,
+                "max_ms": max_ms,
+            })
+        return results
+
+    def report(self, results, max_ms_budget):
+        self.stdout.write(f"\n{'endpoint':<16}{'itens':>7}{'queries':>9}{'limite':>8}{'mediana':>11}{'máx':>10}")
+        failures = []
+        for r in results:
+            line = (f"{r['name']:<16}{r['items']:>7}{r['queries']:>9}{r['budget']:>8}"
+                    f"{r['median_ms']:>9.1f}ms{r['max_ms']:>8.1f}ms")
+            over_queries = r['queries'] > r['budget']
+            over_time = max_ms_budget is not None and r['median_ms'] > max_ms_budget
+
+            if over_queries or over_time:
+                self.stdout.write(self.style.ERROR(line))
+                if over_queries:
+                    failures.append(f"{r['name']}: {r['queries']} queries (limite {r['budget']})")
+                if over_time:
+                    failures.append(f"{r['name']}: {r['median_ms']:.1f}ms (limite {max_ms_budget}ms)")
+            else:
+                self.stdout.write(line)
+
+        if failures:
+            raise CommandError("Regressão no benchmark de queries:\n  " + "\n  ".join(failures))
+
+        self.stdout.write(self.style.SUCCESS("\nTodos os endpoints dentro do orçamento de queries"))
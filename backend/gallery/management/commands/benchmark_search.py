@@ -0,0 +1,106 @@
+"""Benchmark da busca textual: índice FTS5 (bm25) x busca antiga por icontains"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from gallery.bench import build_synthetic_library, throwaway_database, timed_runs
+from gallery.busca_texto import (
+    FTS_TABLE,
+    build_match_query,
+    fts_available,
+    legacy_search_queryset,
+    rebuild_index,
+    search_page,
+)
+
+QUERIES = [
+    "praia",              # palavra em português
+    "familia",            # sem acento, deve achar "família"
+    "aniv",               # prefixo
+    "cachorro praia",     # várias palavras
+    "sunset",             # caption em inglês
+    "Pessoa 7",           # nome de pessoa
+    "tag12",              # nome de tag
+    "xícara",             # nenhuma foto (icontains percorre a tabela inteira)
+]
+
+
+class Command(BaseCommand):
+    help = "Compara a busca FTS5 com a busca por icontains numa biblioteca sintética (banco descartável)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=100000)
+        parser.add_argument('--persons', type=int, default=1000)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--skip-legacy', action='store_true',
+                            help="Não mede a busca por icontains (lenta em bibliotecas grandes)")
+        parser.add_argument('--max-ms', type=float, default=None,
+                            help="Falha se a mediana da busca FTS5 de alguma consulta passar deste tempo")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            if not fts_available():
+                raise CommandError("SQLite sem FTS5: nada a comparar")
+
+            start = time.perf_counter()
+            build_synthetic_library(options['photos'], options['persons'])
+            self.stdout.write(
+                f"Biblioteca sintética com {options['photos']} fotos criada em "
+                f"{time.perf_counter() - start:.1f}s (índice mantido pelos triggers)"
+            )
+
+            start = time.perf_counter()
+            rebuild_index()
+            self.stdout.write(f"Reconstrução completa do índice: {time.perf_counter() - start:.1f}s\n")
+
+            rows = [self.measure(query, options) for query in QUERIES]
+
+        self.report(rows, options['max_ms'])
+
+    def count_matches(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [build_match_query(query)])
+            return cursor.fetchone()[0]
+
+    def measure(self, query, options):
+        page_size, repeat = options['page_size'], options['repeat']
+        fts_ms, _, (photos, _) = timed_runs(lambda: search_page(query, page_size), repeat)
+
+        row = {
+            "query": query,
+            "matches": self.count_matches(query),
+            "first_page": len(photos),
+            "fts_ms": fts_ms,
+            "legacy_ms": None,
+            "legacy_matches": None,
+        }
+
+        if not options['skip_legacy']:
+            legacy = legacy_search_queryset(query)
+            row["legacy_ms"], _, _ = timed_runs(
+                lambda: list(legacy.for_listing().order_by('-created_at', '-id')[:page_size]), repeat
+            )
+            row["legacy_matches"] = legacy.count()
+        return row
+
+    def report(self, rows, max_ms):
+        self.stdout.write(f"{'consulta':<18}{'FTS5':>10}{'icontains':>12}{'ganho':>8}{'achadas':>10}{'antes':>9}")
+        failures = []
+        for row in rows:
+            legacy = f"{row['legacy_ms']:.1f}ms" if row['legacy_ms'] is not None else "-"
+            speedup = f"{row['legacy_ms'] / row['fts_ms']:.1f}x" if row['legacy_ms'] and row['fts_ms'] else "-"
+            before = row['legacy_matches'] if row['legacy_matches'] is not None else "-"
+            line = (f"{row['query']:<18}{row['fts_ms']:>8.1f}ms{legacy:>12}{speedup:>8}"
+                    f"{row['matches']:>10}{before:>9}")
+
+            if max_ms is not None and row['fts_ms'] > max_ms:
+                failures.append(f"'{row['query']}': {row['fts_ms']:.1f}ms (limite {max_ms}ms)")
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if failures:
+            raise CommandError("Busca FTS5 acima do limite:\n  " + "\n  ".join(failures))
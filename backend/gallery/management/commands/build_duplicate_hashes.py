@@ -0,0 +1,54 @@
+"""Calcula SHA-256 e hash perceptual das fotos existentes e lista os grupos de duplicatas"""
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from gallery.duplicatas import duplicate_clusters, duplicate_index, fingerprint
+from gallery.models import Photo
+
+
+class Command(BaseCommand):
+    help = "Gera os hashes de detecção de duplicatas das fotos que ainda não têm e mostra os grupos encontrados"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Recalcula os hashes de todas as fotos")
+        parser.add_argument('--distance', type=int, default=None,
+                            help="Distância máxima (bits) entre fotos do mesmo grupo")
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.order_by('id').only('id', 'image')
+        if not options['force']:
+            photos = photos.filter(Q(content_hash__isnull=True) | Q(perceptual_hash__isnull=True))
+
+        total = photos.count()
+        done = failed = 0
+        pending = []
+
+        for photo in photos.iterator(chunk_size=200):
+            try:
+                with default_storage.open(photo.image.name, 'rb') as fh:
+                    photo.content_hash, photo.perceptual_hash = fingerprint(fh)
+                pending.append(photo)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Foto {photo.id}: {e}")
+
+            if len(pending) >= 200:
+                Photo.objects.bulk_update(pending, ['content_hash', 'perceptual_hash'])
+                done += len(pending)
+                pending = []
+                self.stdout.write(f"  {done + failed}/{total}")
+
+        if pending:
+            Photo.objects.bulk_update(pending, ['content_hash', 'perceptual_hash'])
+            done += len(pending)
+
+        self.stdout.write(self.style.SUCCESS(f"{done} foto(s) com hashes calculados, {failed} erro(s)"))
+
+        duplicate_index.loaded = False
+        clusters = duplicate_clusters(options['distance'])
+        self.stdout.write(f"{len(clusters)} grupo(s) de duplicatas, {sum(map(len, clusters))} foto(s)")
+        for cluster in clusters[:20]:
+            self.stdout.write(f"  {', '.join(map(str, cluster))}")
@@ -0,0 +1,68 @@
+"""Calcula os embeddings da busca semântica das fotos existentes e reconstrói o índice em disco"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from gallery.busca_semantica import encode_photo_images, get_index, load_image_for_embedding, store_photo_embedding
+from gallery.modelos_ia import model_registry
+from gallery.models import Photo
+
+
+class Command(BaseCommand):
+    help = "Gera o embedding de imagem das fotos que ainda não têm (para o encoder atual) e reconstrói o índice"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=16)
+        parser.add_argument('--force', action='store_true',
+                            help="Recalcula o embedding de todas as fotos")
+        parser.add_argument('--index-only', action='store_true',
+                            help="Só reconstrói o índice em disco a partir do banco")
+
+    def handle(self, *args, **options):
+        encoder = model_registry.get('semantic_encoder')
+        self.stdout.write(f"Encoder: {encoder.name} ({encoder.dim} dimensões)")
+
+        if not options['index_only']:
+            self.encode_photos(encoder, options['batch_size'], options['force'])
+
+        index = get_index(encoder.name)
+        start = time.perf_counter()
+        index.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice com {len(index)} foto(s) reconstruído em {time.perf_counter() - start:.1f}s ({index.directory})"
+        ))
+
+    def encode_photos(self, encoder, batch_size, force):
+        photos = Photo.objects.order_by('id')
+        if not force:
+            photos = photos.exclude(embedding__model=encoder.name)
+
+        total = photos.count()
+        done = failed = 0
+        start = time.perf_counter()
+
+        batch = []
+        for photo in photos.iterator(chunk_size=200):
+            try:
+                batch.append((photo, load_image_for_embedding(photo)))
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Foto {photo.id}: {e}")
+
+            if len(batch) >= batch_size:
+                done += self.encode_batch(batch)
+                batch = []
+                self.stdout.write(f"  {done + failed}/{total}")
+        if batch:
+            done += self.encode_batch(batch)
+
+        elapsed = time.perf_counter() - start
+        rate = f" ({done / elapsed:.1f} fotos/s)" if elapsed > 0 and done else ""
+        self.stdout.write(f"{done} embedding(s) calculado(s), {failed} erro(s){rate}")
+
+    def encode_batch(self, batch):
+        vectors = encode_photo_images([image for _, image in batch])
+        for (photo, _), vector in zip(batch, vectors):
+            store_photo_embedding(photo, vector=vector)
+        return len(batch)
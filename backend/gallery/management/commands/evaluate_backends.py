@@ -0,0 +1,198 @@
+"""Avaliação dos backends de inferência (torch fp32, int8, ONNX) do caption e da detecção de objetos"""
+
+import gc
+import os
+import statistics
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery.funcoes_ia import enhance_for_models, load_image_for_ai
+from gallery.inferencia import INFERENCE_BACKENDS, PIPELINE_MODELS, build_pipeline
+from gallery.management.commands.import_photos import IMAGE_EXTENSIONS
+from gallery.resultados_etapas import CAPTION_MAX_NEW_TOKENS
+
+REFERENCE_BACKEND = 'torch'
+
+
+def current_rss_mb():
+    """Memória residente atual do processo (Linux; None em outros sistemas)"""
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def caption_overlap(a, b):
+    """Palavras em comum entre duas legendas (interseção sobre união)"""
+    words_a, words_b = set(a.lower().split()), set(b.lower().split())
+    union = words_a | words_b
+    return len(words_a & words_b) / len(union) if union else 1.0
+
+
+def object_iou(a, b):
+    """Interseção sobre união de duas caixas do pipeline de objetos ({xmin, ymin, xmax, ymax})"""
+    left, right = max(a['xmin'], b['xmin']), min(a['xmax'], b['xmax'])
+    top, bottom = max(a['ymin'], b['ymin']), min(a['ymax'], b['ymax'])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    area_a = (a['xmax'] - a['xmin']) * (a['ymax'] - a['ymin'])
+    area_b = (b['xmax'] - b['xmin']) * (b['ymax'] - b['ymin'])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def matched_objects(reference, candidate, min_iou):
+    """Pares (referência, candidato) com o mesmo rótulo, pareados de forma gulosa por IoU"""
+    candidates = sorted(
+        ((object_iou(r['box'], c['box']), i, j)
+         for i, r in enumerate(reference) for j, c in enumerate(candidate) if r['label'] == c['label']),
+        key=lambda item: item[0], reverse=True,
+    )
+    used_reference, used_candidate, pairs = set(), set(), []
+    for iou, i, j in candidates:
+        if iou < min_iou:
+            break
+        if i not in used_reference and j not in used_candidate:
+            used_reference.add(i)
+            used_candidate.add(j)
+            pairs.append((reference[i], candidate[j]))
+    return pairs
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os backends de inferência do caption e da detecção de objetos numa pasta de fotos: "
+        "concordância com o torch fp32 (legendas, rótulos e scores), latência por foto e memória"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Pasta com as fotos de referência")
+        parser.add_argument('--backends', default='int8,onnx',
+                            help="Backends comparados com o 'torch' (referência), separados por vírgula")
+        parser.add_argument('--models', default=','.join(PIPELINE_MODELS),
+                            help="Modelos avaliados, separados por vírgula")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Execuções por foto (o tempo reportado é a mediana)")
+        parser.add_argument('--min-score', type=float, default=0.7,
+                            help="Score mínimo para um objeto contar (as tags usam objetos acima de 0.7)")
+        parser.add_argument('--iou', type=float, default=0.5,
+                            help="Sobreposição mínima para dois objetos de mesmo rótulo serem o mesmo")
+        parser.add_argument('--limit', type=int, default=None)
+
+    def handle(self, *args, **options):
+        root = Path(options['path'])
+        if not root.is_dir():
+            raise CommandError(f"Pasta não encontrada: {root}")
+
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        models = [name.strip() for name in options['models'].split(',') if name.strip()]
+        unknown = [name for name in backends if name not in INFERENCE_BACKENDS]
+        unknown += [name for name in models if name not in PIPELINE_MODELS]
+        if unknown:
+            raise CommandError(f"Backend ou modelo desconhecido: {', '.join(unknown)}")
+        backends = [REFERENCE_BACKEND] + [name for name in backends if name != REFERENCE_BACKEND]
+
+        paths = sorted(p for p in root.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+        if options['limit']:
+            paths = paths[:options['limit']]
+        if not paths:
+            raise CommandError("Nenhuma imagem encontrada")
+
+        # Mesma entrada dos modelos na ingestão (máx. 2048px, contraste ajustado)
+        images = [enhance_for_models(load_image_for_ai(path)) for path in paths]
+        self.stdout.write(f"{len(images)} foto(s); referência: {REFERENCE_BACKEND} (fp32)")
+
+        for model_name in models:
+            results = [self.run_backend(model_name, backend, images, options['repeat']) for backend in backends]
+            if model_name == 'captioner':
+                self.report_captions(results)
+            else:
+                self.report_objects(results, options['min_score'], options['iou'])
+
+    def run_backend(self, model_name, backend, images, repeat):
+        """Carrega o pipeline no backend, mede carga, memória e tempo por foto e devolve as saídas"""
+        gc.collect()
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        pipe = build_pipeline(model_name, backend)
+        load_seconds = time.perf_counter() - start
+        rss_after = current_rss_mb()
+
+        if model_name == 'captioner':
+            def call(image):
+                result = pipe(image, max_new_tokens=CAPTION_MAX_NEW_TOKENS)
+                return result[0]['generated_text'] if result else ''
+        else:
+            call = pipe
+
+        # Primeira chamada fora da medição (alocações e otimizações do grafo)
+        call(images[0])
+        outputs, timings = [], []
+        for image in images:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output = call(image)
+                timings.append((time.perf_counter() - start) * 1000)
+            outputs.append(output)
+
+        del pipe, call
+        gc.collect()
+
+        timings.sort()
+        return {
+            "backend": backend,
+            "outputs": outputs,
+            "median_ms": statistics.median(timings),
+            "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            "load_s": load_seconds,
+            # Aproximada: memória liberada pelo backend anterior pode ser reaproveitada
+            "memory_mb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        }
+
+    def format_cost(self, r):
+        memory = f"{r['memory_mb']:>8.0f}MB" if r['memory_mb'] is not None else f"{'-':>10}"
+        return f"{r['median_ms']:>9.1f}ms{r['p95_ms']:>8.1f}ms{r['load_s']:>8.1f}s{memory}"
+
+    def report_captions(self, results):
+        reference = results[0]['outputs']
+        self.stdout.write(f"\nCaption ({PIPELINE_MODELS['captioner'][1]})")
+        self.stdout.write(
+            f"{'backend':<10}{'iguais':>9}{'palavras':>10}{'mediana':>11}{'p95':>10}{'carga':>9}{'memória':>10}"
+        )
+        for r in results:
+            same = sum(a == b for a, b in zip(reference, r['outputs'])) / len(reference)
+            overlap = statistics.mean(caption_overlap(a, b) for a, b in zip(reference, r['outputs']))
+            self.stdout.write(f"{r['backend']:<10}{same:>8.1%}{overlap:>9.1%}{self.format_cost(r)}")
+
+        # Algumas legendas diferentes, para julgar se a diferença importa
+        for r in results[1:]:
+            different = [(a, b) for a, b in zip(reference, r['outputs']) if a != b][:3]
+            for a, b in different:
+                self.stdout.write(f"  {r['backend']}: \"{b}\" (torch: \"{a}\")")
+
+    def report_objects(self, results, min_score, min_iou):
+        def confident(objects):
+            return [obj for obj in objects if obj['score'] >= min_score]
+
+        reference = [confident(objects) for objects in results[0]['outputs']]
+        reference_count = sum(map(len, reference))
+        self.stdout.write(f"\nObjetos ({PIPELINE_MODELS['object_detector'][1]}), score >= {min_score}")
+        self.stdout.write(
+            f"{'backend':<10}{'objetos':>9}{'rótulos F1':>12}{'Δscore':>9}{'mediana':>11}{'p95':>10}"
+            f"{'carga':>9}{'memória':>10}"
+        )
+        for r in results:
+            candidate = [confident(objects) for objects in r['outputs']]
+            candidate_count = sum(map(len, candidate))
+            pairs = [pair for ref, cand in zip(reference, candidate) for pair in matched_objects(ref, cand, min_iou)]
+
+            precision = len(pairs) / candidate_count if candidate_count else 1.0
+            recall = len(pairs) / reference_count if reference_count else 1.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            score_diff = statistics.mean(abs(a['score'] - b['score']) for a, b in pairs) if pairs else 0.0
+            self.stdout.write(
+                f"{r['backend']:<10}{candidate_count:>9}{f1:>11.1%}{score_diff:>9.3f}{self.format_cost(r)}"
+            )
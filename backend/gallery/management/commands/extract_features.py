@@ -0,0 +1,59 @@
+"""Extrai as características visuais (cores, brilho, orientação) das fotos já existentes"""
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from gallery.caracteristicas import FEATURE_SIZE, extract_image_features
+from gallery.funcoes_ia import apply_image_features
+from gallery.miniaturas import open_original
+from gallery.models import Photo
+
+FEATURE_FIELDS = ['aspect_ratio', 'orientation', 'brightness', 'contrast', 'saturation',
+                  'dominant_color', 'color_histogram']
+
+
+def load_image_for_features(photo):
+    """Menor miniatura com pelo menos FEATURE_SIZE px (bem mais barata de abrir) ou a imagem original"""
+    for width in sorted(int(width) for width in (photo.derivatives or {})):
+        if width >= FEATURE_SIZE:
+            with default_storage.open(photo.derivatives[str(width)], 'rb') as fh:
+                return Image.open(fh).convert('RGB')
+    return open_original(photo)
+
+
+class Command(BaseCommand):
+    help = "Calcula as características visuais das fotos que ainda não têm (usadas nos filtros de cor e orientação)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Recalcula para todas as fotos")
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.order_by('id').only('id', 'image', 'derivatives')
+        if not options['force']:
+            photos = photos.filter(brightness__isnull=True)
+
+        total = photos.count()
+        done = failed = 0
+        pending = []
+
+        for photo in photos.iterator(chunk_size=200):
+            try:
+                apply_image_features(photo, extract_image_features(load_image_for_features(photo)))
+                pending.append(photo)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Foto {photo.id}: {e}")
+
+            if len(pending) >= 200:
+                Photo.objects.bulk_update(pending, FEATURE_FIELDS)
+                done += len(pending)
+                pending = []
+                self.stdout.write(f"  {done + failed}/{total}")
+
+        if pending:
+            Photo.objects.bulk_update(pending, FEATURE_FIELDS)
+            done += len(pending)
+
+        self.stdout.write(self.style.SUCCESS(f"{done} foto(s) com características extraídas, {failed} erro(s)"))
@@ -0,0 +1,35 @@
+"""Gera miniaturas para as fotos já existentes na galeria"""
+
+from django.core.management.base import BaseCommand
+
+from gallery.miniaturas import generate_derivatives
+from gallery.models import Photo
+
+
+class Command(BaseCommand):
+    help = "Gera (ou regenera) as miniaturas WebP/JPEG e o placeholder das fotos existentes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Regenera mesmo para fotos que já têm miniaturas")
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.order_by('id')
+        if not options['force']:
+            photos = photos.filter(placeholder='')
+
+        total = photos.count()
+        generated = failed = 0
+
+        for photo in photos.iterator(chunk_size=200):
+            try:
+                generate_derivatives(photo, force=options['force'])
+                generated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Foto {photo.id}: {e}")
+
+            if (generated + failed) % 100 == 0:
+                self.stdout.write(f"  {generated + failed}/{total}")
+
+        self.stdout.write(self.style.SUCCESS(f"{generated} foto(s) com miniaturas geradas, {failed} erro(s)"))
@@ -0,0 +1,78 @@
+"""Importa uma pasta de fotos (ex: backup do celular) com inferência em lote"""
+
+import time
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery.duplicatas import duplicate_index, find_duplicate, fingerprint
+from gallery.funcoes_ia import ingest_photo, ingest_photos_batch
+from gallery.models import Photo
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+
+class Command(BaseCommand):
+    help = "Importa todas as imagens de uma pasta, processando a IA em lotes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Pasta com as imagens")
+        parser.add_argument('--batch-size', type=int, default=8,
+                            help="Imagens por lote de inferência")
+        parser.add_argument('--single', action='store_true',
+                            help="Processa foto a foto (caminho antigo), para comparar o desempenho")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Importa no máximo N imagens")
+        parser.add_argument('--allow-duplicates', action='store_true',
+                            help="Importa também imagens que já estão na galeria")
+
+    def handle(self, *args, **options):
+        root = Path(options['path'])
+        if not root.is_dir():
+            raise CommandError(f"Pasta não encontrada: {root}")
+
+        paths = sorted(p for p in root.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+        if options['limit']:
+            paths = paths[:options['limit']]
+        if not paths:
+            self.stdout.write("Nenhuma imagem encontrada")
+            return
+
+        batch_size = 1 if options['single'] else options['batch_size']
+        mode = "foto a foto" if options['single'] else f"lotes de {batch_size}"
+        self.stdout.write(f"Importando {len(paths)} imagem(ns) em {mode}...")
+
+        imported = skipped = 0
+        start = time.perf_counter()
+
+        for chunk_start in range(0, len(paths), batch_size):
+            photos = []
+            for path in paths[chunk_start:chunk_start + batch_size]:
+                with path.open('rb') as fh:
+                    sha256, phash = fingerprint(fh)
+                    if not options['allow_duplicates'] and find_duplicate(sha256, phash):
+                        skipped += 1
+                        continue
+
+                    photo = Photo(image=File(fh, name=path.name), content_hash=sha256, perceptual_hash=phash)
+                    photo.save()
+                    duplicate_index.add(photo.id, phash)
+                photos.append(photo)
+
+            if options['single']:
+                for photo in photos:
+                    ingest_photo(photo)
+            else:
+                ingest_photos_batch(photos, batch_size=batch_size)
+
+            imported += len(photos)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"  {imported + skipped}/{len(paths)} - {imported / elapsed:.2f} imagens/s")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} imagem(ns) em {elapsed:.1f}s ({imported / elapsed:.2f} imagens/s, {mode})"
+        ))
+        if skipped:
+            self.stdout.write(f"{skipped} imagem(ns) repetida(s) ignorada(s) (use --allow-duplicates para importar)")
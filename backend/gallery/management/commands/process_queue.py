@@ -0,0 +1,51 @@
+"""Worker da fila de processamento de fotos"""
+
+from django.core.management.base import BaseCommand
+
+from gallery.fila import queue_setting, retry_failed_jobs, run_worker_pool
+from gallery.metricas import metrics_setting, serve_metrics
+from gallery.modelos_ia import model_registry
+from gallery.niveis_qualidade import ingest_model_names
+
+
+class Command(BaseCommand):
+    help = "Processa a fila de fotos enviadas (IA fora do ciclo da requisição)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=queue_setting('WORKERS', 2),
+                            help="Número de workers (threads) consumindo a fila")
+        parser.add_argument('--batch-size', type=int, default=queue_setting('BATCH_SIZE', 4),
+                            help="Jobs reservados por vez; as imagens do lote passam juntas pelos modelos")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Segundos de espera quando a fila está vazia")
+        parser.add_argument('--drain', action='store_true',
+                            help="Processa os jobs disponíveis e encerra")
+        parser.add_argument('--no-warmup', action='store_true',
+                            help="Não carrega os modelos antes de começar (carrega no primeiro job)")
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Recoloca na fila os jobs que falharam antes de iniciar")
+        parser.add_argument('--metrics-port', type=int, default=metrics_setting('PORT', None),
+                            help="Expõe as métricas do worker (texto do Prometheus) em 127.0.0.1:<porta>")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            count = retry_failed_jobs()
+            self.stdout.write(f"{count} job(s) recolocado(s) na fila")
+
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+            self.stdout.write(f"Métricas em http://127.0.0.1:{options['metrics_port']}/metrics")
+
+        if not options['no_warmup']:
+            self.stdout.write("Carregando modelos de IA...")
+            # Os modelos do preview (nível 'fast') ficam de fora: o worker só ingere e refina
+            model_registry.warm_up(ingest_model_names())
+
+        self.stdout.write(f"Iniciando {options['workers']} worker(s)... (Ctrl+C para parar)")
+        processed = run_worker_pool(
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            drain=options['drain'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{processed} job(s) processado(s)"))
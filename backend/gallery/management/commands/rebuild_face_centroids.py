@@ -0,0 +1,94 @@
+"""Recalcula os centroides das pessoas a partir dos rostos registrados (FaceObservation)"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from gallery.funcoes_ia import (
+    detect_faces,
+    face_prominences,
+    load_image_for_ai,
+    recompute_person_centroids,
+)
+from gallery.indice_rostos import pack_encoding, unpack_encoding
+from gallery.models import FaceObservation, Photo
+
+# Distância máxima para um rosto antigo ser atribuído a uma das pessoas já marcadas na foto
+BACKFILL_TOLERANCE = 0.6
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o centroide de cada pessoa como a média dos seus rostos; com --backfill, "
+        "registra antes os rostos das fotos processadas antes da tabela de rostos existir"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help="Detecta os rostos das fotos com pessoas e sem rostos registrados")
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill()
+
+        start = time.perf_counter()
+        updated = recompute_person_centroids()
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} centroide(s) recalculado(s) em {time.perf_counter() - start:.1f}s"
+        ))
+
+    def backfill(self):
+        photos = (
+            Photo.objects.filter(persons__isnull=False, faces__isnull=True)
+            .distinct().order_by('id').only('id', 'image')
+        )
+        total = photos.count()
+        done = failed = 0
+
+        for photo in photos.iterator(chunk_size=100):
+            try:
+                pil_image = load_image_for_ai(photo.image.path)
+                img_array = np.array(pil_image)
+                face_locations, face_encodings = detect_faces(img_array)
+                prominences = face_prominences(face_locations, img_array.shape)
+                persons = self.match_photo_persons(photo, face_encodings)
+
+                FaceObservation.objects.bulk_create([
+                    FaceObservation(
+                        photo=photo, person_id=person_id,
+                        top=top, right=right, bottom=bottom, left=left,
+                        encoding=pack_encoding(face_encoding), prominence=face_prominence,
+                    )
+                    for (top, right, bottom, left), face_encoding, face_prominence, person_id
+                    in zip(face_locations, face_encodings, prominences, persons)
+                ])
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Foto {photo.id}: {e}")
+
+            if (done + failed) % 50 == 0:
+                self.stdout.write(f"  {done + failed}/{total}")
+
+        self.stdout.write(f"Rostos registrados para {done} foto(s), {failed} erro(s)")
+
+    def match_photo_persons(self, photo, face_encodings):
+        """Pessoa (entre as já marcadas na foto) de cada rosto, pelo centroide mais próximo"""
+        candidates = [(pid, centroid) for pid, centroid in photo.persons.values_list('id', 'centroid') if centroid]
+        if not candidates or not face_encodings:
+            return [None] * len(face_encodings)
+
+        centroids = np.stack([unpack_encoding(centroid) for _, centroid in candidates])
+        distances = np.linalg.norm(np.asarray(face_encodings, dtype=np.float32)[:, None] - centroids[None], axis=2)
+
+        # Cada pessoa fica com no máximo um rosto da foto (pares mais próximos primeiro)
+        assigned = [None] * len(face_encodings)
+        used = set()
+        for face, column in sorted(np.ndindex(distances.shape), key=lambda idx: distances[idx]):
+            if distances[face, column] > BACKFILL_TOLERANCE:
+                break
+            if assigned[face] is None and column not in used:
+                assigned[face] = candidates[column][0]
+                used.add(column)
+        return assigned
@@ -0,0 +1,16 @@
+"""Recria o índice de busca textual (FTS5) a partir das fotos, tags e pessoas"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery.busca_texto import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Recria todos os documentos do índice FTS5 da busca (o índice normal é mantido por triggers)"
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError("Índice FTS5 indisponível neste banco (rode `migrate` num SQLite com FTS5)")
+
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Índice de busca recriado com {count} foto(s)"))
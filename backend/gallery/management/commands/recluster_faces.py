@@ -0,0 +1,48 @@
+"""Reagrupa todos os rostos da biblioteca e funde as pessoas fragmentadas"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from gallery.agrupamento_rostos import apply_proposals, cluster_faces, merge_proposals
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrupa todos os encodings de rostos de uma vez (chinese whispers) e propõe fundir as "
+        "pessoas automáticas de cada grupo; com --apply, aplica as fusões"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=None,
+                            help="Distância máxima entre rostos vizinhos (padrão: GALLERY_FACE_CLUSTER_THRESHOLD)")
+        parser.add_argument('--neighbors', type=int, default=None,
+                            help="Vizinhos guardados por rosto (padrão: GALLERY_FACE_CLUSTER_NEIGHBORS)")
+        parser.add_argument('--min-share', type=float, default=None,
+                            help="Fração mínima dos rostos de uma pessoa no grupo para ela ser fundida")
+        parser.add_argument('--apply', action='store_true',
+                            help="Aplica as fusões (sem isso só mostra as propostas)")
+        parser.add_argument('--show', type=int, default=20,
+                            help="Quantas propostas listar")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ids, person_ids, labels = cluster_faces(options['threshold'], options['neighbors'])
+        clustered = time.perf_counter()
+
+        proposals = merge_proposals(person_ids, labels, options['min_share'])
+        groups = len(set(labels.tolist()))
+        self.stdout.write(
+            f"{len(ids)} rosto(s) em {groups} grupo(s) em {clustered - start:.1f}s; "
+            f"{len(proposals)} proposta(s) de fusão"
+        )
+
+        for proposal in proposals[:options['show']]:
+            sources = ", ".join(f"{person.name} ({faces})" for person, faces in proposal.sources)
+            self.stdout.write(f"  {proposal.target.name} <- {sources}")
+
+        if options['apply'] and proposals:
+            merged = apply_proposals(proposals)
+            self.stdout.write(self.style.SUCCESS(
+                f"{merged} pessoa(s) fundida(s) em {time.perf_counter() - clustered:.1f}s"
+            ))
@@ -0,0 +1,110 @@
+"""Reprocessa as fotos existentes com os modelos e regras atuais (em paralelo e retomável)"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery.models import Photo
+from gallery.reprocessamento import STAGES, ReprocessCheckpoint, expand_stages, reprocess_photos
+from gallery.resultados_etapas import RAW_STAGES, delete_outdated_results, stale_photos
+
+
+class Command(BaseCommand):
+    help = (
+        "Refaz etapas da IA (caption, objects, faces, tags, translation) das fotos já na galeria, "
+        "em blocos distribuídos num pool de processos, salvando o progresso para retomar após uma queda. "
+        "Os modelos só rodam nas fotos com resultado guardado desatualizado (ou com --force)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', default=','.join(STAGES),
+                            help=f"Etapas separadas por vírgula ({', '.join(STAGES)})")
+        parser.add_argument('--workers', type=int, default=2,
+                            help="Processos em paralelo (0 = no próprio processo); cada um carrega os modelos")
+        parser.add_argument('--torch-threads', type=int, default=1,
+                            help="Threads do torch por processo")
+        parser.add_argument('--chunk-size', type=int, default=16,
+                            help="Fotos por bloco (as imagens do bloco passam juntas pelos modelos)")
+        parser.add_argument('--nice', type=int, default=10,
+                            help="Prioridade reduzida dos processos (nice; ignorado no Windows)")
+        parser.add_argument('--checkpoint', default=None,
+                            help="Arquivo de progresso (padrão: reprocess_<etapas>.json ao lado do banco)")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignora o progresso salvo e começa do início")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Reprocessa no máximo N fotos nesta execução")
+        parser.add_argument('--force', action='store_true',
+                            help="Roda os modelos das etapas pedidas mesmo com resultado guardado atual")
+        parser.add_argument('--only-stale', action='store_true',
+                            help="Só as fotos com alguma das etapas pedidas desatualizada")
+        parser.add_argument('--prune', action='store_true',
+                            help="No fim, apaga os resultados guardados substituídos por um atual")
+
+    def handle(self, *args, **options):
+        requested = {s.strip() for s in options['stages'].split(',') if s.strip()}
+        try:
+            stages = expand_stages(requested)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not stages:
+            raise CommandError("Nenhuma etapa escolhida")
+        raw_stages = [stage for stage in RAW_STAGES if stage in requested]
+        forced = raw_stages if options['force'] else []
+
+        path = options['checkpoint'] or settings.BASE_DIR / f"reprocess_{'-'.join(sorted(stages))}.json"
+        checkpoint = ReprocessCheckpoint(path, stages)
+        if not options['restart'] and checkpoint.load():
+            self.stdout.write(
+                f"Retomando após a foto {checkpoint.last_id} ({checkpoint.done} já reprocessada(s), "
+                f"{len(checkpoint.failed)} com erro para tentar de novo)"
+            )
+
+        # Fotos que falharam antes vão primeiro (saem do checkpoint quando derem certo); depois as
+        # que faltam, em ordem de ID
+        retry_ids = sorted(checkpoint.failed)
+        # Lista carregada antes de abrir o pool: o processo principal não usa o banco enquanto os
+        # filhos trabalham (só os IDs, poucos MB mesmo com centenas de milhares de fotos)
+        remaining = Photo.objects.filter(id__gt=checkpoint.last_id)
+        if options['only_stale'] and raw_stages and not forced:
+            remaining = stale_photos(remaining, raw_stages)
+        remaining = remaining.order_by('id').values_list('id', flat=True)
+        photo_ids = retry_ids + list(remaining)
+        if options['limit'] is not None:
+            photo_ids = photo_ids[:options['limit']]
+        total = len(photo_ids)
+
+        self.stdout.write(
+            f"Reprocessando {total} foto(s) [{', '.join(sorted(stages))}] com "
+            f"{options['workers']} processo(s)..."
+        )
+        start = time.perf_counter()
+        initial_done = checkpoint.done
+
+        def progress(state):
+            elapsed = time.perf_counter() - start
+            rate = state.processed / elapsed if elapsed > 0 else 0
+            self.stdout.write(f"  {state.processed}/{total} ({rate:.2f} fotos/s, até a foto {state.last_id})")
+
+        reprocess_photos(
+            photo_ids, stages, checkpoint,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            torch_threads=options['torch_threads'],
+            niceness=options['nice'],
+            progress=progress,
+            forced=forced,
+        )
+
+        for photo_id, error in sorted(checkpoint.failed.items())[:20]:
+            self.stderr.write(f"Foto {photo_id}: {error}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{checkpoint.done - initial_done} foto(s) reprocessada(s), {len(checkpoint.failed)} com erro, "
+            f"em {time.perf_counter() - start:.1f}s"
+        ))
+        if not checkpoint.failed and options['limit'] is None:
+            checkpoint.clear()
+
+        if options['prune']:
+            self.stdout.write(f"{delete_outdated_results()} resultado(s) antigo(s) apagado(s)")
@@ -0,0 +1,74 @@
+"""Servidor de modelos compartilhado pelos workers web e da fila (ver gallery/servidor_modelos.py)"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery.modelos_ia import model_registry
+from gallery.niveis_qualidade import register_tier_models
+from gallery.servidor_modelos import DEFAULT_URL, ModelServer, check_transport, model_server_setting
+
+# Modelos do preview (níveis de qualidade) também podem ser servidos
+register_tier_models()
+
+
+class Command(BaseCommand):
+    help = (
+        "Carrega os modelos de IA uma vez e os serve aos outros processos (GALLERY_MODEL_SERVER_URL), "
+        "com fila limitada e lotes por modelo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=model_server_setting('URL', None) or DEFAULT_URL,
+                            help="unix:///caminho/do.sock ou http://127.0.0.1:<porta> (ambos exigem GALLERY_MODEL_SERVER_TOKEN)")
+        parser.add_argument('--models', default=None,
+                            help=f"Modelos servidos, separados por vírgula (padrão: {', '.join(model_registry.names)})")
+        parser.add_argument('--queue-size', type=int, default=model_server_setting('QUEUE_SIZE', 64),
+                            help="Chamadas esperando por modelo; acima disso o servidor responde 503")
+        parser.add_argument('--batch-size', type=int, default=model_server_setting('BATCH_SIZE', 8),
+                            help="Máximo de chamadas compatíveis executadas juntas")
+        parser.add_argument('--batch-wait-ms', type=float, default=model_server_setting('BATCH_WAIT_MS', 5),
+                            help="Espera máxima pelas outras chamadas de um lote")
+        parser.add_argument('--workers', type=int, default=model_server_setting('WORKERS', 2),
+                            help="Threads executando lotes de cada modelo")
+        parser.add_argument('--fake', action='store_true',
+                            help="Modelos falsos (gallery/modelos_falsos.py), para medir transporte e lotes sem os pesos")
+
+    def handle(self, *args, **options):
+        try:
+            check_transport(options['url'], model_server_setting('TOKEN', None))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Este processo é o servidor: carrega os modelos aqui mesmo, mesmo com GALLERY_MODEL_SERVER_URL
+        model_registry.remote = None
+
+        models = options['models'] or model_server_setting('MODELS', None)
+        if isinstance(models, str):
+            models = [name.strip() for name in models.split(',') if name.strip()]
+        names = models or model_registry.names
+        unknown = set(names) - set(model_registry.names)
+        if unknown:
+            raise CommandError(f"Modelo(s) desconhecido(s): {', '.join(sorted(unknown))}")
+
+        if options['fake']:
+            from gallery.modelos_falsos import build_fake_models
+            fake_models = build_fake_models()
+            for name in names:
+                model_registry.override(name, fake_models[name])
+        else:
+            self.stdout.write("Carregando modelos de IA...")
+            model_registry.warm_up(names)
+
+        server = ModelServer(
+            names,
+            queue_size=options['queue_size'],
+            batch_size=options['batch_size'],
+            batch_wait_ms=options['batch_wait_ms'],
+            workers=options['workers'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Servindo {', '.join(names)} em {options['url']} (saúde em /health) - Ctrl+C para parar"
+        ))
+        try:
+            server.serve_forever(options['url'])
+        except KeyboardInterrupt:
+            self.stdout.write("Servidor de modelos encerrado")
@@ -0,0 +1,60 @@
+"""Traduz em lote as legendas das fotos ainda sem tradução (ou que ficaram em inglês por falha do tradutor)"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from gallery.models import Photo
+from gallery.traducao import translate_texts, translation_setting
+
+
+class Command(BaseCommand):
+    help = "Traduz as legendas sem versão em português usando o backend e o cache de traduções"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Legendas por chamada ao backend (padrão: GALLERY_TRANSLATION_BATCH_SIZE)")
+        parser.add_argument('--timeout', type=float, default=60,
+                            help="Segundos de espera por lote")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or translation_setting('BATCH_SIZE', 32)
+        photos = (
+            Photo.objects
+            .filter(caption__isnull=False)
+            .filter(Q(caption_pt__isnull=True) | Q(caption_pt=F('caption')))
+            .exclude(caption='')
+            .values_list('id', 'caption')
+            .order_by('id')
+        )
+
+        total = photos.count()
+        done = failed = 0
+        start = time.perf_counter()
+
+        batch = []
+        for row in photos.iterator(chunk_size=500):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                translated, missing = self.translate_batch(batch, options['timeout'])
+                done, failed = done + translated, failed + missing
+                batch = []
+                self.stdout.write(f"  {done + failed}/{total}")
+        if batch:
+            translated, missing = self.translate_batch(batch, options['timeout'])
+            done, failed = done + translated, failed + missing
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{done} legenda(s) traduzida(s), {failed} sem tradução, em {time.perf_counter() - start:.1f}s"
+        ))
+
+    def translate_batch(self, batch, timeout):
+        translations = translate_texts([caption for _, caption in batch], timeout)
+        translated = 0
+        for photo_id, caption in batch:
+            caption_pt = translations.get(caption)
+            if caption_pt:
+                Photo.objects.filter(pk=photo_id, caption=caption).update(caption_pt=caption_pt)
+                translated += 1
+        return translated, len(batch) - translated
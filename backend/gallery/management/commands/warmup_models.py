@@ -0,0 +1,28 @@
+"""Carrega (e baixa, se preciso) os modelos de IA e mostra o tempo de cada um"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery.modelos_ia import model_registry
+from gallery.niveis_qualidade import register_tier_models
+
+# Modelos do preview (níveis de qualidade) também aparecem na lista
+register_tier_models()
+
+
+class Command(BaseCommand):
+    help = "Carrega os modelos de IA registrados e informa o tempo de carga"
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help=f"Modelos a carregar (padrão: todos - {', '.join(model_registry.names)})")
+
+    def handle(self, *args, **options):
+        names = options['models'] or model_registry.names
+        unknown = set(names) - set(model_registry.names)
+        if unknown:
+            raise CommandError(f"Modelo(s) desconhecido(s): {', '.join(sorted(unknown))}")
+
+        model_registry.warm_up(names)
+        for name, status in model_registry.status().items():
+            if name in names:
+                self.stdout.write(f"  {name}: {status['load_seconds']}s ({status['description']})")
+        self.stdout.write(self.style.SUCCESS("Modelos prontos"))
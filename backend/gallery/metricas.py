@@ -0,0 +1,272 @@
+"""Métricas de desempenho: tempo de cada etapa do pipeline e dos requests, no formato do Prometheus
+
+Cada etapa (decodificação, caption, objetos, rostos, gravação no banco, tradução...)
+roda dentro de um `span(etapa)`, que alimenta o histograma gallery_stage_seconds e
+conta os erros por tipo de exceção. Os valores ficam em memória no processo e são
+expostos em texto do Prometheus em /metrics (servidor web) ou numa porta local do
+worker da fila (`process_queue --metrics-port`).
+
+Os spans de um mesmo request também são guardados para o detalhamento por request:
+o cabeçalho Server-Timing (aparece na aba Network do navegador) e, para requests
+lentos, uma linha no log.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites dos buckets em segundos (de 1 ms a 1 minuto)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def metrics_setting(name, default):
+    """Lê configuração das métricas no settings (GALLERY_METRICS_*)"""
+    return getattr(settings, f'GALLERY_METRICS_{name}', default)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+# ============================================================================
+# TIPOS DE MÉTRICA
+# ============================================================================
+
+class Counter:
+    """Contador por combinação de labels (só aumenta)"""
+
+    kind = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[label] for label in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in values]
+
+
+class Histogram:
+    """Histograma com buckets fixos por combinação de labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [contagem por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        # Primeiro bucket que comporta o valor (os cumulativos são montados na exportação)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(tuple(labels[label] for label in self.labels))
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+
+        lines = []
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts[:-1]):
+                cumulative += count
+                bucket_labels = format_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Métricas do processo, exportadas juntas em texto do Prometheus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, description, labels, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, description, labels, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, description, labels=()):
+        return self._register(Counter, name, description, labels)
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, description, labels, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'gallery_stage_seconds', "Tempo de cada etapa do pipeline de IA (por chamada)", ('stage',)
+)
+STAGE_ITEMS = metrics.counter(
+    'gallery_stage_items_total', "Imagens (ou textos) processados por etapa", ('stage',)
+)
+STAGE_ERRORS = metrics.counter(
+    'gallery_stage_errors_total', "Exceções por etapa e tipo de erro", ('stage', 'error')
+)
+FALLBACKS = metrics.counter(
+    'gallery_ingest_fallbacks_total', "Fotos que caíram na legenda básica depois de um erro na IA", ('error',)
+)
+REQUEST_SECONDS = metrics.histogram(
+    'gallery_request_seconds', "Tempo total dos requests", ('view', 'method', 'status')
+)
+TIER_SECONDS = metrics.histogram(
+    'gallery_tier_seconds', "Tempo por nível de qualidade e operação (preview, ingestão, refinamento)",
+    ('tier', 'operation')
+)
+TIER_OVER_BUDGET = metrics.counter(
+    'gallery_tier_over_budget_total', "Operações acima do orçamento de latência do nível", ('tier', 'operation')
+)
+MODEL_SERVER_BATCH_SIZE = metrics.histogram(
+    'gallery_model_server_batch_size', "Chamadas executadas juntas por lote no servidor de modelos", ('model',),
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+MODEL_SERVER_QUEUE_SECONDS = metrics.histogram(
+    'gallery_model_server_queue_seconds', "Espera na fila do servidor de modelos até a execução", ('model',)
+)
+MODEL_SERVER_REJECTED = metrics.counter(
+    'gallery_model_server_rejected_total', "Chamadas recusadas pelo servidor de modelos com a fila cheia", ('model',)
+)
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+# Spans do request (ou job) atual: lista de (etapa, segundos), ou None fora de um request
+_current_spans = contextvars.ContextVar('gallery_spans', default=None)
+
+
+@contextmanager
+def span(stage, items=1):
+    """Mede o bloco como uma execução da etapa `stage` (com `items` imagens ou textos)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        STAGE_ITEMS.inc(items, stage=stage)
+        spans = _current_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def timed(stage):
+    """Decorador: cada chamada da função é um span da etapa `stage`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect_spans():
+    """Guarda os spans executados dentro do bloco (nesta thread) na lista retornada"""
+    spans = []
+    token = _current_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_spans.reset(token)
+
+
+def summarize_spans(spans):
+    """{etapa: (segundos, chamadas)} na ordem da primeira execução de cada etapa
+
+    Spans aninhados (ex: rostos dentro da finalização) são somados nas duas etapas.
+    """
+    summary = {}
+    for stage, seconds in spans:
+        total, calls = summary.get(stage, (0.0, 0))
+        summary[stage] = (total + seconds, calls + 1)
+    return summary
+
+
+def server_timing(spans, total_seconds):
+    """Valor do cabeçalho Server-Timing (milissegundos por etapa e total)"""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, (seconds, _) in summarize_spans(spans).items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ', '.join(entries)
+
+
+# ============================================================================
+# EXPORTAÇÃO FORA DO SERVIDOR WEB
+# ============================================================================
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Sem uma linha no console a cada coleta
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Servidor HTTP mínimo (thread daemon) com as métricas deste processo, ex: worker da fila"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='gallery-metrics', daemon=True)
+    thread.start()
+    return server
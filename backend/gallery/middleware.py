@@ -0,0 +1,45 @@
+"""Middleware de tempo dos requests: histograma por view e detalhamento por etapa"""
+
+import time
+
+from django.conf import settings
+
+from .metricas import REQUEST_SECONDS, collect_spans, metrics_setting, server_timing, summarize_spans
+
+
+class RequestTimingMiddleware:
+    """Mede cada request e as etapas (spans) executadas dentro dele
+
+    O tempo total vai para gallery_request_seconds (por view, método e status). O
+    detalhamento por etapa sai no cabeçalho Server-Timing (GALLERY_METRICS_SERVER_TIMING,
+    ligado com DEBUG por padrão) e, para requests acima de
+    GALLERY_METRICS_SLOW_REQUEST_SECONDS, numa linha do log.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = metrics_setting('SERVER_TIMING', settings.DEBUG)
+        self.slow_request_seconds = metrics_setting('SLOW_REQUEST_SECONDS', 2.0)
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with collect_spans() as spans:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, view=view, method=request.method, status=response.status_code)
+
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(spans, elapsed)
+            # O frontend roda em outra origem: sem isso o navegador esconde os tempos
+            response['Timing-Allow-Origin'] = '*'
+
+        if self.slow_request_seconds is not None and elapsed >= self.slow_request_seconds:
+            breakdown = ', '.join(
+                f"{stage} {seconds * 1000:.0f}ms x{calls}" for stage, (seconds, calls) in summarize_spans(spans).items()
+            )
+            print(f"Request lento: {request.method} {request.path} {elapsed * 1000:.0f}ms ({breakdown or 'sem etapas'})")
+
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0003_person_is_manually_added'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='caption_pt',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Na fila'), ('processing', 'Processando'), ('done', 'Processada'), ('failed', 'Falhou')], default='done', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em execução'), ('done', 'Concluído'), ('failed', 'Falhou')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='gallery.photo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='gallery_pro_status_8c123a_idx')],
+            },
+        ),
+    ]
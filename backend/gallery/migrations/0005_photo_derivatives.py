@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0004_processing_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='placeholder',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0005_photo_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['-created_at', '-id'], name='photo_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['is_favorite', '-created_at', '-id'], name='photo_fav_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Índice de busca textual (SQLite FTS5) mantido por triggers
+
+from django.db import migrations
+
+FTS_TABLE = 'gallery_photo_fts'
+
+CREATE_TABLE = f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        text, caption, caption_pt, tags, persons,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+DOCUMENT_SELECT = """
+    SELECT p.id,
+           COALESCE(p.text, ''),
+           COALESCE(p.caption, ''),
+           COALESCE(p.caption_pt, ''),
+           COALESCE((SELECT group_concat(t.name, ' ') FROM gallery_photo_tags pt
+                     JOIN gallery_tag t ON t.id = pt.tag_id WHERE pt.photo_id = p.id), ''),
+           COALESCE((SELECT group_concat(pe.name, ' ') FROM gallery_photo_persons pp
+                     JOIN gallery_person pe ON pe.id = pp.person_id WHERE pp.photo_id = p.id), '')
+    FROM gallery_photo p
+"""
+
+
+def reindex(photo_ids):
+    """Corpo de trigger que refaz os documentos das fotos em `photo_ids` (expressão SQL)"""
+    return f"""
+        DELETE FROM {FTS_TABLE} WHERE rowid IN ({photo_ids});
+        INSERT INTO {FTS_TABLE}(rowid, text, caption, caption_pt, tags, persons)
+            {DOCUMENT_SELECT} WHERE p.id IN ({photo_ids});
+    """
+
+
+TRIGGERS = {
+    'gallery_photo_fts_insert': f"AFTER INSERT ON gallery_photo BEGIN {reindex('NEW.id')} END",
+    'gallery_photo_fts_update': (
+        f"AFTER UPDATE OF text, caption, caption_pt ON gallery_photo BEGIN {reindex('NEW.id')} END"
+    ),
+    'gallery_photo_fts_delete': f"AFTER DELETE ON gallery_photo BEGIN DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id; END",
+    'gallery_photo_tags_fts_insert': f"AFTER INSERT ON gallery_photo_tags BEGIN {reindex('NEW.photo_id')} END",
+    'gallery_photo_tags_fts_delete': f"AFTER DELETE ON gallery_photo_tags BEGIN {reindex('OLD.photo_id')} END",
+    'gallery_photo_persons_fts_insert': f"AFTER INSERT ON gallery_photo_persons BEGIN {reindex('NEW.photo_id')} END",
+    'gallery_photo_persons_fts_delete': f"AFTER DELETE ON gallery_photo_persons BEGIN {reindex('OLD.photo_id')} END",
+    'gallery_tag_fts_rename': (
+        "AFTER UPDATE OF name ON gallery_tag BEGIN "
+        f"{reindex('SELECT photo_id FROM gallery_photo_tags WHERE tag_id = NEW.id')} END"
+    ),
+    'gallery_person_fts_rename': (
+        "AFTER UPDATE OF name ON gallery_person BEGIN "
+        f"{reindex('SELECT photo_id FROM gallery_photo_persons WHERE person_id = NEW.id')} END"
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+            print("SQLite sem FTS5: a busca continuará usando icontains")
+            return
+
+        cursor.execute(CREATE_TABLE)
+        for name, body in TRIGGERS.items():
+            cursor.execute(f"CREATE TRIGGER {name} {body}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}(rowid, text, caption, caption_pt, tags, persons) {DOCUMENT_SELECT}")
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0006_photo_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0007_photo_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoEmbedding',
+            fields=[
+                ('photo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='gallery.photo')),
+                ('model', models.CharField(max_length=200)),
+                ('dim', models.PositiveSmallIntegerField()),
+                ('vector', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'updated_at'], name='gallery_pho_model_d2994f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0008_photo_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationCache',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('source_text', models.TextField()),
+                ('translated_text', models.TextField()),
+                ('backend', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingestão'), ('translate', 'Tradução')], default='ingest', max_length=20),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0009_translation_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='aspect_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='brightness',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='color_histogram',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='contrast',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='dominant_color',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='orientation',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='saturation',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0010_photo_image_features'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=16, null=True),
+        ),
+    ]
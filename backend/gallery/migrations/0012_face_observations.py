@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:14
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+
+def pack_person_encodings(apps, schema_editor):
+    """Converte o encoding JSON (lista de floats) de cada pessoa em float32 binário"""
+    Person = apps.get_model('gallery', 'Person')
+    updated = []
+    for person in Person.objects.only('id', 'encoding').iterator(chunk_size=500):
+        try:
+            vector = np.asarray(person.encoding, dtype=np.float32).reshape(-1)
+        except (TypeError, ValueError):
+            continue
+        if vector.shape[0] == 128:
+            person.centroid = vector.tobytes()
+            updated.append(person)
+    Person.objects.bulk_update(updated, ['centroid'], batch_size=500)
+
+
+def unpack_person_encodings(apps, schema_editor):
+    Person = apps.get_model('gallery', 'Person')
+    updated = []
+    for person in Person.objects.only('id', 'centroid').iterator(chunk_size=500):
+        person.encoding = np.frombuffer(person.centroid, dtype=np.float32).tolist() if person.centroid else []
+        updated.append(person)
+    Person.objects.bulk_update(updated, ['encoding'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0011_photo_duplicate_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='centroid',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_person_encodings, unpack_person_encodings),
+        migrations.RemoveField(
+            model_name='person',
+            name='encoding',
+        ),
+        migrations.CreateModel(
+            name='FaceObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('top', models.PositiveIntegerField()),
+                ('right', models.PositiveIntegerField()),
+                ('bottom', models.PositiveIntegerField()),
+                ('left', models.PositiveIntegerField()),
+                ('encoding', models.BinaryField()),
+                ('prominence', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('person', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='faces', to='gallery.person')),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='faces', to='gallery.photo')),
+            ],
+        ),
+    ]
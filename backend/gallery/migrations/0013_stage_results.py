@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0012_face_observations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('caption', 'Legenda'), ('objects', 'Objetos'), ('faces', 'Rostos')], max_length=20)),
+                ('model', models.CharField(max_length=200)),
+                ('version', models.CharField(max_length=50)),
+                ('config_hash', models.CharField(max_length=64)),
+                ('output', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_results', to='gallery.photo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stage', 'model', 'version', 'config_hash'], name='gallery_sta_stage_120756_idx')],
+                'constraints': [models.UniqueConstraint(fields=('photo', 'stage', 'model', 'version', 'config_hash'), name='stage_result_provenance_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0013_stage_results'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingestão'), ('translate', 'Tradução'), ('refine', 'Refinamento')], default='ingest', max_length=20),
+        ),
+    ]
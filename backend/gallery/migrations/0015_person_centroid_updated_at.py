@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0014_processingjob_refine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='centroid_updated_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
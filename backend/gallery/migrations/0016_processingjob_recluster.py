@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0015_person_centroid_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingestão'), ('translate', 'Tradução'), ('refine', 'Refinamento'), ('recluster', 'Reagrupamento de rostos')], default='ingest', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='photo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='gallery.photo'),
+        ),
+    ]
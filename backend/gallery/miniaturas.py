@@ -0,0 +1,112 @@
+"""Geração de miniaturas (derivadas) das fotos e do placeholder de baixa qualidade (LQIP)"""
+
+import base64
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .metricas import timed
+
+DERIVATIVES_DIR = 'photos/derivatives'
+PLACEHOLDER_SIZE = 16
+
+
+def thumbnail_widths():
+    """Larguras geradas para cada foto (GALLERY_THUMBNAIL_WIDTHS)"""
+    return sorted(getattr(settings, 'GALLERY_THUMBNAIL_WIDTHS', (200, 400, 800)), reverse=True)
+
+
+def derivative_format():
+    """WebP quando o Pillow tem suporte, senão JPEG"""
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def open_original(photo):
+    """Abre a imagem original já com a orientação do EXIF aplicada"""
+    with photo.image.open('rb') as fh:
+        image = Image.open(fh)
+        image = ImageOps.exif_transpose(image)
+        return image.convert('RGB')
+
+
+def build_placeholder(pil_image):
+    """Miniatura de 16px em JPEG embutida como data URI (exibida enquanto a imagem carrega)"""
+    tiny = pil_image.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+
+    buffer = io.BytesIO()
+    tiny.save(buffer, format='JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+@timed('thumbnails')
+def generate_derivatives(photo, pil_image=None, force=False):
+    """Gera as miniaturas da foto (da maior para a menor, cada uma a partir da anterior)
+
+    O placeholder marca a foto como já processada: uma foto mais estreita que todas as
+    larguras configuradas fica sem miniaturas (derivatives vazio) e não é refeita.
+    """
+    if photo.placeholder and not force:
+        return photo.derivatives
+
+    if pil_image is None:
+        pil_image = open_original(photo)
+
+    delete_derivatives(photo)
+
+    image_format, extension = derivative_format()
+    stem = os.path.splitext(os.path.basename(photo.image.name))[0]
+    quality = getattr(settings, 'GALLERY_THUMBNAIL_QUALITY', 80)
+
+    derivatives = {}
+    current = pil_image
+    for width in thumbnail_widths():
+        if width >= current.width:
+            continue
+
+        height = max(1, round(current.height * width / current.width))
+        current = current.resize((width, height), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        current.save(buffer, format=image_format, quality=quality)
+        name = default_storage.save(f"{DERIVATIVES_DIR}/{photo.pk}_{stem}_{width}.{extension}", ContentFile(buffer.getvalue()))
+        derivatives[str(width)] = name
+
+    photo.derivatives = derivatives
+    photo.placeholder = build_placeholder(current)
+    photo.save(update_fields=['derivatives', 'placeholder'])
+    return derivatives
+
+
+def delete_derivatives(photo):
+    """Remove os arquivos de miniatura da foto"""
+    for name in (photo.derivatives or {}).values():
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            print(f"Erro ao deletar miniatura: {e}")
+
+
+def derivative_urls(photo, request=None):
+    """Dict {largura: URL} das miniaturas da foto"""
+    urls = {}
+    for width, name in (photo.derivatives or {}).items():
+        url = default_storage.url(name)
+        urls[width] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def best_derivative_url(photo, target_width, request=None):
+    """URL da menor miniatura com largura >= target_width (ou a original, se não houver)"""
+    urls = derivative_urls(photo, request)
+    candidates = sorted((int(width), url) for width, url in urls.items())
+    for width, url in candidates:
+        if width >= target_width:
+            return url
+    if photo.image:
+        return request.build_absolute_uri(photo.image.url) if request else photo.image.url
+    return None
@@ -0,0 +1,285 @@
+"""Modelos falsos determinísticos e imagens sintéticas para benchmarks sem download nem rede
+
+Os modelos falsos têm a mesma interface dos reais (pipelines do transformers,
+módulo face_recognition, backend de tradução e encoder da busca semântica) e uma
+latência controlável por chamada e por item, então o restante do pipeline (banco,
+miniaturas, índices, serialização) roda como em produção.
+
+As imagens sintéticas têm "rostos": quadrados de cores saturadas da paleta
+FACE_COLORS, uma cor por pessoa. O detector falso acha esses quadrados e o encoding
+de cada rosto depende só da cor, então a mesma pessoa é reconhecida entre fotos.
+"""
+
+import colorsys
+import io
+import random
+import time
+import zlib
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .bench import VOCABULARY
+from .busca_semantica import StubEncoder
+from .indice_rostos import ENCODING_SIZE
+from .traducao import QUERY_SOURCE_LANGUAGE, QUERY_TARGET_LANGUAGE, StubTranslationBackend
+
+# Uma cor saturada por pessoa sintética (matizes espaçados, longe do fundo acinzentado)
+FACE_COLORS = [
+    tuple(int(channel * 255) for channel in colorsys.hsv_to_rgb(i / 12, 1.0, 1.0)) for i in range(12)
+]
+PALETTE = np.array(FACE_COLORS, dtype=np.int16)
+COLOR_TOLERANCE = 60  # Diferença máxima por canal (JPEG e redimensionamento alteram as cores)
+
+OBJECT_LABELS = ['dog', 'cat', 'car', 'bicycle', 'cup', 'chair', 'boat', 'umbrella', 'cake', 'bench']
+
+
+class Latency:
+    """Espera `call_ms` por chamada + `item_ms` por item (imagem, rosto ou texto)"""
+
+    def __init__(self, call_ms=0.0, item_ms=0.0):
+        self.call_ms = call_ms
+        self.item_ms = item_ms
+
+    @classmethod
+    def parse(cls, value):
+        """'40' (por item) ou '20:40' (por chamada : por item)"""
+        call_ms, _, item_ms = value.rpartition(':')
+        return cls(float(call_ms or 0), float(item_ms))
+
+    def wait(self, items=1):
+        seconds = (self.call_ms + self.item_ms * items) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def __repr__(self):
+        return f"{self.call_ms:g}:{self.item_ms:g}ms"
+
+
+# Latências padrão (ordem de grandeza de uma CPU comum; só a proporção importa)
+DEFAULT_LATENCIES = {
+    'captioner': Latency(20, 120),
+    'object_detector': Latency(20, 80),
+    # Modelos menores do preview (nível 'fast', ver niveis_qualidade.py)
+    'captioner_fast': Latency(10, 40),
+    'object_detector_fast': Latency(10, 30),
+    'face_recognition': Latency(0, 15),
+    'translator': Latency(50, 5),
+    'semantic_encoder': Latency(5, 20),
+}
+
+
+def as_list(images):
+    return (list(images), False) if isinstance(images, (list, tuple)) else ([images], True)
+
+
+def image_seed(pil_image):
+    """Semente estável derivada do conteúdo (miniatura 8x8) da imagem"""
+    return zlib.crc32(np.asarray(pil_image.convert('RGB').resize((8, 8))).tobytes())
+
+
+# ============================================================================
+# ROSTOS SINTÉTICOS
+# ============================================================================
+
+def find_face_boxes(img_array):
+    """Caixas (top, right, bottom, left, índice da cor) dos quadrados da paleta na imagem
+
+    Procura numa grade de ~256 pixels de lado (a precisão da caixa é o passo da grade),
+    para o detector falso custar pouco perto da latência simulada.
+    """
+    step = max(1, min(img_array.shape[:2]) // 256)
+    pixels = img_array[::step, ::step, :3].astype(np.int16)
+
+    # Só os pixels saturados podem ser rosto (o fundo é acinzentado)
+    rows, columns = np.nonzero(pixels.max(axis=2) - pixels.min(axis=2) > 128)
+    if len(rows) == 0:
+        return []
+    candidates = pixels[rows, columns]
+    differences = np.abs(candidates[:, None, :] - PALETTE[None, :, :])
+    nearest = differences.sum(axis=2).argmin(axis=1)
+    close = differences[np.arange(len(candidates)), nearest].max(axis=1) <= COLOR_TOLERANCE
+
+    boxes = []
+    for index in np.unique(nearest[close]):
+        selected = close & (nearest == index)
+        # Ignora pixels soltos (bordas de outros quadrados com cor parecida)
+        if selected.sum() < 4:
+            continue
+        face_rows, face_columns = rows[selected], columns[selected]
+        boxes.append((
+            int(face_rows.min()) * step, (int(face_columns.max()) + 1) * step,
+            (int(face_rows.max()) + 1) * step, int(face_columns.min()) * step, int(index),
+        ))
+    return boxes
+
+
+def face_color_index(img_array, location):
+    """Cor da paleta mais próxima do centro do rosto"""
+    top, right, bottom, left = location
+    center = img_array[(top + bottom) // 2, (left + right) // 2, :3].astype(np.int16)
+    return int(np.abs(PALETTE - center).sum(axis=1).argmin())
+
+
+class FakeFaceRecognition:
+    """Substituto do módulo face_recognition (mesmas funções usadas em deteccao_rostos.py)"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or DEFAULT_LATENCIES['face_recognition']
+        # Encoding de referência de cada pessoa sintética (distantes entre si ~1.6)
+        rng = np.random.default_rng(7)
+        self._identities = rng.normal(0, 0.1, (len(FACE_COLORS), ENCODING_SIZE))
+
+    def face_locations(self, img, number_of_times_to_upsample=1, model='hog'):
+        self.latency.wait(1)
+        return [box[:4] for box in find_face_boxes(img)]
+
+    def batch_face_locations(self, images, number_of_times_to_upsample=1, batch_size=128):
+        self.latency.wait(len(images))
+        return [[box[:4] for box in find_face_boxes(img)] for img in images]
+
+    def face_encodings(self, face_image, known_face_locations=None, num_jitters=1, model='small'):
+        locations = known_face_locations
+        if locations is None:
+            locations = [box[:4] for box in find_face_boxes(face_image)]
+        self.latency.wait(len(locations) * num_jitters)
+
+        encodings = []
+        for location in locations:
+            index = face_color_index(face_image, location)
+            # Pequena variação por foto, bem abaixo da tolerância do reconhecimento
+            noise = np.random.default_rng(zlib.crc32(np.ascontiguousarray(face_image[::16, ::16]).tobytes()))
+            encodings.append(self._identities[index] + noise.normal(0, 0.005, ENCODING_SIZE))
+        return encodings
+
+
+# ============================================================================
+# CAPTION, OBJETOS, TRADUÇÃO E EMBEDDINGS
+# ============================================================================
+
+class FakeCaptioner:
+    """Pipeline "image-to-text" falso: legenda com palavras de VOCABULARY sorteadas pela imagem"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or DEFAULT_LATENCIES['captioner']
+
+    def __call__(self, images, batch_size=None, max_new_tokens=None, generate_kwargs=None):
+        images, single = as_list(images)
+        self.latency.wait(len(images))
+        results = []
+        for image in images:
+            words = random.Random(image_seed(image)).sample(VOCABULARY, 2)
+            results.append([{'generated_text': f"a photo of a {words[0][0]} and a {words[1][0]}"}])
+        return results[0] if single else results
+
+
+class FakeObjectDetector:
+    """Pipeline "object-detection" falso: uma pessoa por rosto sintético + objetos sorteados"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or DEFAULT_LATENCIES['object_detector']
+
+    def __call__(self, images, batch_size=None):
+        images, single = as_list(images)
+        self.latency.wait(len(images))
+        results = []
+        for image in images:
+            rng = random.Random(image_seed(image))
+            objects = [
+                {'label': 'person', 'score': 0.98,
+                 'box': {'xmin': left, 'ymin': top, 'xmax': right, 'ymax': bottom}}
+                for top, right, bottom, left, _ in find_face_boxes(np.asarray(image))
+            ]
+            for label in rng.sample(OBJECT_LABELS, rng.randint(0, 3)):
+                xmin, ymin = rng.randint(0, image.width // 2), rng.randint(0, image.height // 2)
+                objects.append({
+                    'label': label, 'score': round(rng.uniform(0.7, 0.99), 3),
+                    'box': {'xmin': xmin, 'ymin': ymin, 'xmax': xmin + image.width // 4,
+                            'ymax': ymin + image.height // 4},
+                })
+            results.append(objects)
+        return results[0] if single else results
+
+
+class FakeTranslationBackend(StubTranslationBackend):
+    """Tradução falsa (prefixo com o idioma de destino) com a latência de um backend real"""
+
+    name = 'fake'
+
+    def __init__(self, latency=None, **languages):
+        super().__init__(**languages)
+        self.latency = latency or DEFAULT_LATENCIES['translator']
+
+    def translate_batch(self, texts):
+        self.latency.wait(len(texts))
+        return super().translate_batch(texts)
+
+
+class FakeEncoder(StubEncoder):
+    """Encoder determinístico da busca semântica com latência"""
+
+    def __init__(self, latency=None, dim=64):
+        super().__init__(dim)
+        self.latency = latency or DEFAULT_LATENCIES['semantic_encoder']
+
+    def encode_images(self, pil_images):
+        self.latency.wait(len(pil_images))
+        return super().encode_images(pil_images)
+
+    def encode_texts(self, texts):
+        self.latency.wait(len(texts))
+        return super().encode_texts(texts)
+
+
+def build_fake_models(latencies=None):
+    """{nome no model_registry: modelo falso}"""
+    latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+    return {
+        'captioner': FakeCaptioner(latencies['captioner']),
+        'object_detector': FakeObjectDetector(latencies['object_detector']),
+        'captioner_fast': FakeCaptioner(latencies['captioner_fast']),
+        'object_detector_fast': FakeObjectDetector(latencies['object_detector_fast']),
+        'face_recognition': FakeFaceRecognition(latencies['face_recognition']),
+        'translator': FakeTranslationBackend(latencies['translator']),
+        'query_translator': FakeTranslationBackend(
+            latencies['translator'], source=QUERY_SOURCE_LANGUAGE, target=QUERY_TARGET_LANGUAGE
+        ),
+        'semantic_encoder': FakeEncoder(latencies['semantic_encoder']),
+    }
+
+
+# ============================================================================
+# IMAGENS SINTÉTICAS
+# ============================================================================
+
+def synthetic_image(seed, size=1024, max_faces=3):
+    """Foto sintética: fundo em degradê acinzentado com ruído e até `max_faces` rostos da paleta"""
+    rng = np.random.default_rng(seed)
+    width, height = size, int(size * rng.choice([0.75, 1.0, 1.33]))
+
+    # Fundo pouco saturado (os canais variam juntos), para não ser confundido com um rosto
+    base = rng.uniform(40, 200)
+    gradient = np.linspace(0, rng.uniform(20, 50), width, dtype=np.float32)[None, :, None]
+    tint = rng.uniform(-15, 15, 3).astype(np.float32)[None, None, :]
+    noise = rng.normal(0, 6, (height, width, 1)).astype(np.float32)
+    pixels = np.clip(base + gradient + tint + noise, 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels, 'RGB')
+
+    draw = ImageDraw.Draw(image)
+    face_count = int(rng.integers(0, max_faces + 1))
+    colors = rng.choice(len(FACE_COLORS), size=face_count, replace=False)
+    slots = rng.permutation(4)[:face_count]  # Quadrantes distintos: rostos não se sobrepõem
+    for color, slot in zip(colors, slots):
+        side = int(min(width, height) * rng.uniform(0.08, 0.2))
+        quadrant_x, quadrant_y = (slot % 2) * width // 2, (slot // 2) * height // 2
+        left = quadrant_x + int(rng.integers(0, max(1, width // 2 - side)))
+        top = quadrant_y + int(rng.integers(0, max(1, height // 2 - side)))
+        draw.rectangle([left, top, left + side, top + side], fill=FACE_COLORS[color])
+    return image
+
+
+def synthetic_jpeg(seed, size=1024, max_faces=3, quality=90):
+    """Bytes JPEG de `synthetic_image`"""
+    buffer = io.BytesIO()
+    synthetic_image(seed, size, max_faces).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
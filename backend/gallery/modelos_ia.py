@@ -0,0 +1,201 @@
+"""Registro de modelos de IA com carregamento preguiçoso (lazy) e pré-carga opcional"""
+
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .metricas import span
+
+
+class ModelRegistry:
+    """Carrega cada modelo só no primeiro uso (ou num warm-up explícito), uma única vez por processo"""
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._status = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        # Cliente do servidor de modelos (servidor_modelos.py): os modelos que ele serve viram proxies
+        self.remote = None
+
+    def register(self, name, loader, description=''):
+        """Registra a função que constrói o modelo `name`"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            self._status.setdefault(name, {
+                "description": description,
+                "loaded": False,
+                "loading": False,
+                "load_seconds": None,
+                "error": None,
+            })
+
+    @property
+    def names(self):
+        return list(self._loaders)
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        """Retorna o modelo, carregando-o se necessário (seguro entre threads)"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Modelo não registrado: {name}")
+
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            status = self._status[name]
+            status.update(loading=True, error=None)
+            start = time.perf_counter()
+            remote = self.remote if self.remote is not None and self.remote.serves(name) else None
+            try:
+                model = remote.model(name) if remote is not None else self._loaders[name]()
+            except Exception as e:
+                status.update(loading=False, error=str(e))
+                raise
+
+            self._models[name] = model
+            status.update(loaded=True, loading=False, load_seconds=round(time.perf_counter() - start, 2))
+            if remote is not None:
+                status.update(remote=remote.url)
+                print(f"Modelo '{name}' servido por {remote.url}")
+            else:
+                print(f"Modelo '{name}' carregado em {status['load_seconds']}s")
+            return model
+
+    def override(self, name, model):
+        """Substitui o modelo já carregado (ex: modelos falsos em benchmarks)"""
+        self._models[name] = model
+        if name in self._status:
+            self._status[name].update(loaded=True, loading=False, error=None)
+
+    def unload(self, name):
+        self._models.pop(name, None)
+        if name in self._status:
+            self._status[name].update(loaded=False, load_seconds=None)
+
+    def warm_up(self, names=None):
+        """Carrega os modelos informados (ou todos) de forma síncrona"""
+        for name in names or self.names:
+            self.get(name)
+
+    def preload_in_background(self, names=None):
+        """Carrega os modelos numa thread daemon, sem bloquear o processo"""
+        def target():
+            for name in names or self.names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Erro ao pré-carregar modelo '{name}': {e}")
+
+        thread = threading.Thread(target=target, name="gallery-model-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        return {name: dict(status) for name, status in self._status.items()}
+
+
+class LazyModel:
+    """Proxy que resolve o modelo no registro na primeira chamada ou acesso a atributo
+
+    Com `stage`, cada chamada ao modelo (sem o carregamento) é medida como um span dessa
+    etapa, contando as imagens quando a entrada é uma lista (ver metricas.py).
+    """
+
+    def __init__(self, registry, name, stage=None):
+        self._registry = registry
+        self._name = name
+        self._stage = stage
+
+    def __call__(self, *args, **kwargs):
+        model = self._registry.get(self._name)
+        if self._stage is None:
+            return model(*args, **kwargs)
+        items = len(args[0]) if args and isinstance(args[0], (list, tuple)) else 1
+        with span(self._stage, items):
+            return model(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        state = "carregado" if self._registry.is_loaded(self._name) else "não carregado"
+        return f"<LazyModel {self._name} ({state})>"
+
+
+# ============================================================================
+# MODELOS DA GALERIA
+# ============================================================================
+
+# Modelos do Hugging Face (também registrados na proveniência dos resultados, ver resultados_etapas.py)
+CAPTION_MODEL = "Salesforce/blip-image-captioning-large"
+OBJECT_DETECTION_MODEL = "facebook/detr-resnet-101"
+
+
+def _load_captioner():
+    # torch fp32, int8 ou ONNX Runtime conforme GALLERY_INFERENCE_* (ver inferencia.py)
+    from .inferencia import build_pipeline
+    return build_pipeline('captioner')
+
+
+def _load_object_detector():
+    from .inferencia import build_pipeline
+    return build_pipeline('object_detector')
+
+
+def _load_face_recognition():
+    # Importar face_recognition já carrega os modelos do dlib
+    import face_recognition
+    return face_recognition
+
+
+def _load_semantic_encoder():
+    from .busca_semantica import build_encoder
+    return build_encoder()
+
+
+def _load_translator():
+    from .traducao import build_translation_backend
+    return build_translation_backend()
+
+
+def _load_query_translator():
+    from .traducao import QUERY_SOURCE_LANGUAGE, QUERY_TARGET_LANGUAGE, build_translation_backend
+    return build_translation_backend(QUERY_SOURCE_LANGUAGE, QUERY_TARGET_LANGUAGE)
+
+
+model_registry = ModelRegistry()
+model_registry.register('captioner', _load_captioner, CAPTION_MODEL)
+model_registry.register('object_detector', _load_object_detector, OBJECT_DETECTION_MODEL)
+model_registry.register('face_recognition', _load_face_recognition, "dlib (face_recognition)")
+model_registry.register('semantic_encoder', _load_semantic_encoder, "CLIP (busca semântica)")
+model_registry.register('translator', _load_translator, "Tradutor de legendas (MarianMT / Google)")
+model_registry.register('query_translator', _load_query_translator, "Tradutor das consultas da busca (pt -> en)")
+
+
+def preload_models_if_configured():
+    """Dispara a pré-carga em segundo plano se GALLERY_PRELOAD_MODELS estiver ativo"""
+    env_value = os.environ.get('GALLERY_PRELOAD_MODELS')
+    if env_value is not None:
+        enabled = env_value.lower() in ('1', 'true', 'yes', 'sim')
+    else:
+        enabled = getattr(settings, 'GALLERY_PRELOAD_MODELS', False)
+
+    if enabled:
+        # Inclui os modelos dos níveis de qualidade (ex: os do preview, ver niveis_qualidade.py)
+        from .niveis_qualidade import register_tier_models
+        register_tier_models()
+        return model_registry.preload_in_background()
+    return None
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, Prefetch
+from django.utils import timezone
 
 
 class Tag(models.Model):
@@ -6,9 +8,34 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+class PersonQuerySet(models.QuerySet):
+    def with_photo_stats(self):
+        """Contagem de fotos, foto principal e primeira foto em número fixo de queries (sem N+1)"""
+        first_photo = Photo.objects.only('id', 'image', 'derivatives').order_by('pk')[:1]
+        # O centroide (binário) só interessa ao reconhecimento facial, não às listagens
+        return self.defer('centroid').select_related('photo_principal').annotate(
+            num_photos=Count('photo', distinct=True)
+        ).prefetch_related(
+            Prefetch('photo_set', queryset=first_photo, to_attr='first_photos')
+        )
+
+
+class PhotoQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Pré-carrega tags e nomes das pessoas usados pelo PhotoSerializer"""
+        return self.prefetch_related(
+            'tags',
+            Prefetch('persons', queryset=Person.objects.only('id', 'name')),
+        )
+
+
 class Person(models.Model):
     name = models.CharField(max_length=100)
-    encoding = models.JSONField()
+    # Encoding médio dos rostos da pessoa (float32 em bytes, ver indice_rostos.pack_encoding).
+    # É derivado das FaceObservation: rebuild_face_centroids recalcula a partir delas
+    centroid = models.BinaryField(null=True, blank=True)
+    # Última alteração do centroide: os outros processos recarregam o índice de rostos a partir dela
+    centroid_updated_at = models.DateTimeField(null=True, blank=True, db_index=True)
     photo_principal = models.ForeignKey(
         'Photo',
         on_delete=models.SET_NULL,
@@ -18,10 +45,18 @@ class Person(models.Model):
     )
     is_manually_added = models.BooleanField(default=False)
 
+    objects = PersonQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
 class Photo(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Na fila'
+        PROCESSING = 'processing', 'Processando'
+        DONE = 'done', 'Processada'
+        FAILED = 'failed', 'Falhou'
+
     text = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='photos/')
     caption = models.TextField(blank=True, null=True)  # Caption em inglês (original)
@@ -30,3 +65,156 @@ class Photo(models.Model):
     tags = models.ManyToManyField(Tag, blank=True)
     persons = models.ManyToManyField(Person, blank=True)
     is_favorite = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.DONE)
+    derivatives = models.JSONField(default=dict, blank=True)  # {largura: caminho da miniatura}
+    placeholder = models.TextField(blank=True)  # Miniatura minúscula em data URI (LQIP)
+
+    # Características visuais extraídas na ingestão (ver caracteristicas.py); nulas = ainda não extraídas.
+    # Colunas novas de Photo são nulas e sem default: assim o SQLite faz ALTER TABLE ADD COLUMN
+    # em vez de recriar a tabela (lento e incompatível com os triggers da busca textual)
+    aspect_ratio = models.FloatField(null=True, blank=True)
+    orientation = models.CharField(max_length=10, null=True, blank=True)  # landscape, portrait ou square
+    brightness = models.FloatField(null=True, blank=True)  # 0 a 255
+    contrast = models.FloatField(null=True, blank=True)
+    saturation = models.FloatField(null=True, blank=True)  # 0 a 1
+    dominant_color = models.CharField(max_length=10, null=True, blank=True)
+    color_histogram = models.JSONField(null=True, blank=True)  # {cor: fração dos pixels}
+
+    # Detecção de duplicatas (ver duplicatas.py)
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # SHA-256 do arquivo
+    perceptual_hash = models.CharField(max_length=16, null=True, blank=True, db_index=True)  # dHash em hex
+
+    objects = PhotoQuerySet.as_manager()
+
+    class Meta:
+        # Índices da paginação por cursor (keyset em created_at, id)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='photo_created_id_idx'),
+            models.Index(fields=['is_favorite', '-created_at', '-id'], name='photo_fav_created_id_idx'),
+        ]
+
+
+class PhotoEmbedding(models.Model):
+    """Embedding da imagem usado na busca semântica (um por foto, do encoder atual)"""
+
+    photo = models.OneToOneField(Photo, on_delete=models.CASCADE, primary_key=True, related_name='embedding')
+    model = models.CharField(max_length=200)  # Encoder que gerou o vetor
+    dim = models.PositiveSmallIntegerField()
+    vector = models.BinaryField()  # float16 (ou float32) em bytes
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'updated_at'])]
+
+    def __str__(self):
+        return f"Embedding da foto {self.photo_id} ({self.model})"
+
+
+class TranslationCache(models.Model):
+    """Tradução (inglês -> português) de uma legenda, indexada pelo hash do texto"""
+
+    key = models.CharField(max_length=64, primary_key=True)  # sha256 do texto original
+    source_text = models.TextField()
+    translated_text = models.TextField()
+    backend = models.CharField(max_length=20)  # Backend que traduziu
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.source_text[:40]} -> {self.translated_text[:40]}"
+
+
+class ProcessingJob(models.Model):
+    """Job da fila de processamento de IA (ingestão da foto, tradução da legenda ou reagrupamento dos rostos)"""
+
+    class Kind(models.TextChoices):
+        INGEST = 'ingest', 'Ingestão'
+        TRANSLATE = 'translate', 'Tradução'
+        REFINE = 'refine', 'Refinamento'
+        RECLUSTER = 'recluster', 'Reagrupamento de rostos'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pendente'
+        RUNNING = 'running', 'Em execução'
+        DONE = 'done', 'Concluído'
+        FAILED = 'failed', 'Falhou'
+
+    # Sem foto nos jobs da biblioteca inteira (reagrupamento)
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    kind = models.CharField(max_length=20, choices=Kind.choices, default=Kind.INGEST)
+    payload = models.JSONField(default=dict, blank=True)  # Seleção de pessoas feita no upload
+    result = models.JSONField(null=True, blank=True)  # Resultado dos jobs que respondem algo (reagrupamento)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)  # Backoff entre tentativas
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.kind}, foto {self.photo_id}): {self.status}"
+
+
+class FaceObservation(models.Model):
+    """Um rosto detectado numa foto: caixa, encoding e pessoa atribuída
+
+    Guardar cada rosto permite recalcular os centroides das pessoas (e reagrupar os
+    rostos) sem rodar a detecção de novo.
+    """
+
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='faces')
+    person = models.ForeignKey(Person, on_delete=models.SET_NULL, null=True, blank=True, related_name='faces')
+    # Caixa (top, right, bottom, left) na imagem analisada pela IA (máx. 2048px)
+    top = models.PositiveIntegerField()
+    right = models.PositiveIntegerField()
+    bottom = models.PositiveIntegerField()
+    left = models.PositiveIntegerField()
+    encoding = models.BinaryField()  # float32 em bytes
+    prominence = models.FloatField()  # Fração da imagem ocupada pelo rosto
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def box(self):
+        return (self.top, self.right, self.bottom, self.left)
+
+    def __str__(self):
+        return f"Rosto {self.pk} da foto {self.photo_id} ({self.person_id or 'sem pessoa'})"
+
+
+class StageResult(models.Model):
+    """Saída bruta de uma etapa da IA numa foto, com o modelo e a configuração que a geraram
+
+    A descrição final, as tags e a tradução são derivadas destas saídas: mudar as regras
+    de derivação não exige rodar os modelos de novo, e mudar um modelo ou a configuração
+    de uma etapa só deixa essa etapa desatualizada (ver resultados_etapas.py).
+    """
+
+    class Stage(models.TextChoices):
+        CAPTION = 'caption', 'Legenda'
+        OBJECTS = 'objects', 'Objetos'
+        FACES = 'faces', 'Rostos'
+
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='stage_results')
+    stage = models.CharField(max_length=20, choices=Stage.choices)
+    model = models.CharField(max_length=200)  # Modelo que gerou a saída
+    version = models.CharField(max_length=50)  # Versão do código da etapa
+    config_hash = models.CharField(max_length=64)  # Hash dos parâmetros que afetam a saída
+    output = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['photo', 'stage', 'model', 'version', 'config_hash'], name='stage_result_provenance_uniq'
+            ),
+        ]
+        indexes = [models.Index(fields=['stage', 'model', 'version', 'config_hash'])]
+
+    def __str__(self):
+        return f"{self.stage} da foto {self.photo_id} ({self.model} v{self.version})"
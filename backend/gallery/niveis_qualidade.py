@@ -0,0 +1,197 @@
+"""Níveis de qualidade da IA: 'fast' para o preview, 'full' para a ingestão
+
+O preview do upload precisa responder em poucos segundos; a ingestão pode levar mais e
+é o que fica guardado na galeria. Cada nível define os modelos de caption e objetos, a
+resolução da entrada, a decodificação da legenda (beams e tokens), o perfil de
+detecção de rostos e um orçamento de latência:
+
+- 'fast': BLIP base e DETR-50 com decodificação gulosa, entrada de 1024px e rostos só
+  com HOG (perfil 'fast' de deteccao_rostos.py). Serve o PhotoPreviewAPIView.
+- 'full': os modelos e a configuração de sempre (mesma proveniência dos resultados já
+  guardados). Roda na ingestão e no refinamento.
+
+Com GALLERY_QUALITY_REFINE_LATER a ingestão reaproveita a legenda e os objetos do
+preview 'fast' (a foto fica pronta antes) e agenda um job de refinamento, em que o
+worker da fila roda o nível 'full' e refaz descrição, tags e tradução.
+
+O tempo de cada operação vai para gallery_tier_seconds e as que passam do orçamento
+do nível contam em gallery_tier_over_budget_total (ver metricas.py).
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .deteccao_rostos import get_profile
+from .inferencia import build_pipeline
+from .metricas import TIER_OVER_BUDGET, TIER_SECONDS
+from .modelos_ia import CAPTION_MODEL, OBJECT_DETECTION_MODEL, LazyModel, model_registry
+from .resultados_etapas import CAPTION_MAX_NEW_TOKENS, MODEL_INPUT
+
+FULL_TIER = 'full'
+
+DEFAULT_TIERS = {
+    'fast': {
+        'caption_model': "Salesforce/blip-image-captioning-base",
+        'detection_model': "facebook/detr-resnet-50",
+        'max_size': 1024,
+        'max_new_tokens': 30,
+        'num_beams': 1,
+        'face_profile': 'fast',
+        'budget_ms': 2000,
+    },
+    FULL_TIER: {
+        'caption_model': CAPTION_MODEL,
+        'detection_model': OBJECT_DETECTION_MODEL,
+        'max_size': MODEL_INPUT['max_size'],
+        'max_new_tokens': CAPTION_MAX_NEW_TOKENS,
+        'num_beams': None,  # padrão do modelo
+        'face_profile': None,  # GALLERY_FACE_PROFILE
+        'budget_ms': 30000,
+    },
+}
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def quality_setting(name, default):
+    """Lê configuração dos níveis de qualidade no settings (GALLERY_QUALITY_*)"""
+    return getattr(settings, f'GALLERY_QUALITY_{name}', default)
+
+
+def tier_configs():
+    """Configuração de cada nível: padrões + GALLERY_QUALITY_TIERS (só as chaves alteradas)"""
+    overrides = quality_setting('TIERS', {})
+    return {
+        name: {**DEFAULT_TIERS[FULL_TIER], **DEFAULT_TIERS.get(name, {}), **overrides.get(name, {})}
+        for name in {*DEFAULT_TIERS, *overrides}
+    }
+
+
+class QualityTier:
+    """Modelos e parâmetros de um nível de qualidade"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.caption_model = config['caption_model']
+        self.detection_model = config['detection_model']
+        self.max_size = config['max_size']
+        self.max_new_tokens = config['max_new_tokens']
+        self.num_beams = config['num_beams']
+        self.face_profile = config['face_profile']
+        self.budget_ms = config['budget_ms']
+
+        # Etapas à parte nas métricas para o preview não se misturar com a ingestão
+        suffix = '' if name == FULL_TIER else f'_{name}'
+        self.model_names = [
+            self.register_model('captioner', self.caption_model),
+            self.register_model('object_detector', self.detection_model),
+        ]
+        self.captioner = LazyModel(model_registry, self.model_names[0], stage=f'caption{suffix}')
+        self.object_detector = LazyModel(model_registry, self.model_names[1], stage=f'objects{suffix}')
+
+    def register_model(self, base_name, model_id):
+        """Nome do modelo no registro; modelos iguais aos da ingestão são compartilhados (uma cópia só)"""
+        default_id = DEFAULT_TIERS[FULL_TIER]['caption_model' if base_name == 'captioner' else 'detection_model']
+        if model_id == default_id:
+            return base_name
+
+        name = f'{base_name}_{self.name}'
+        if name not in model_registry.names:
+            model_registry.register(name, functools.partial(build_pipeline, base_name, model_id=model_id), model_id)
+        return name
+
+    @property
+    def model_input(self):
+        """Entrada dos modelos de caption e objetos (também vai para a proveniência)"""
+        return {**MODEL_INPUT, "max_size": self.max_size}
+
+    def detection_profile(self):
+        """Perfil de detecção de rostos do nível (None = GALLERY_FACE_PROFILE)"""
+        return get_profile(self.face_profile)
+
+    def caption_kwargs(self):
+        """Parâmetros da geração da legenda"""
+        kwargs = {"max_new_tokens": self.max_new_tokens}
+        if self.num_beams is not None:
+            kwargs["generate_kwargs"] = {"num_beams": self.num_beams}
+        return kwargs
+
+    def __repr__(self):
+        return f"<QualityTier {self.name}>"
+
+
+def get_tier(name=None):
+    """Nível pelo nome (padrão: 'full'); criado uma vez por processo"""
+    name = name or FULL_TIER
+    tier = _tiers.get(name)
+    if tier is not None:
+        return tier
+
+    with _tiers_lock:
+        if name not in _tiers:
+            configs = tier_configs()
+            if name not in configs:
+                raise ValueError(f"Nível de qualidade desconhecido: {name}")
+            _tiers[name] = QualityTier(name, configs[name])
+        return _tiers[name]
+
+
+def register_tier_models():
+    """Registra os modelos de todos os níveis (pré-carga e warm-up enxergam os do preview)"""
+    return [get_tier(name) for name in tier_configs()]
+
+
+def preview_tier():
+    """Nível do preview do upload (GALLERY_QUALITY_PREVIEW_TIER, padrão 'fast')"""
+    return get_tier(quality_setting('PREVIEW_TIER', 'fast'))
+
+
+def refine_later():
+    """Ingestão reaproveita o preview e o nível 'full' roda depois, num job de refinamento"""
+    return quality_setting('REFINE_LATER', False)
+
+
+def ingest_model_names():
+    """Modelos que a ingestão usa (o worker da fila não precisa carregar os do preview nem o tradutor das consultas)"""
+    skipped = {'query_translator'}
+    for tier in register_tier_models():
+        if tier.name != FULL_TIER:
+            skipped.update(tier.model_names)
+    full_models = set(get_tier(FULL_TIER).model_names)
+    return [name for name in model_registry.names if name not in skipped or name in full_models]
+
+
+class BudgetClock:
+    """Tempo restante do orçamento de uma operação"""
+
+    def __init__(self, budget_ms):
+        self.start = time.perf_counter()
+        self.budget = budget_ms / 1000
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        return max(0.0, self.budget - self.elapsed())
+
+
+@contextmanager
+def tier_budget(tier, operation):
+    """Mede a operação no nível; acima do orçamento conta em gallery_tier_over_budget_total e avisa no log"""
+    clock = BudgetClock(tier.budget_ms)
+    try:
+        yield clock
+    finally:
+        elapsed = clock.elapsed()
+        TIER_SECONDS.observe(elapsed, tier=tier.name, operation=operation)
+        if elapsed > clock.budget:
+            TIER_OVER_BUDGET.inc(tier=tier.name, operation=operation)
+            print(
+                f"Orçamento estourado: {operation} no nível '{tier.name}' levou {elapsed * 1000:.0f}ms "
+                f"(orçamento {tier.budget_ms}ms)"
+            )
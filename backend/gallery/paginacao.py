@@ -0,0 +1,88 @@
+"""Paginação por cursor (keyset) das listagens de fotos, ordenadas por (created_at, id) decrescente"""
+
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado ou adulterado"""
+
+
+def page_size_from(request):
+    """Tamanho da página pedido em ?page_size=, limitado por GALLERY_MAX_PAGE_SIZE"""
+    default = getattr(settings, 'GALLERY_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'GALLERY_MAX_PAGE_SIZE', 200)
+
+    try:
+        size = int(request.query_params.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def encode_token(values):
+    """Serializa a chave de ordenação do último item num token opaco (base64 de uma lista JSON)"""
+    raw = json.dumps(list(values), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token, size):
+    """Lista de `size` valores do token ou InvalidCursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor(token)
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(token)
+    return values
+
+
+def encode_cursor(photo):
+    """Cursor opaco apontando para depois da foto informada"""
+    return encode_token([photo.created_at.isoformat(), photo.pk])
+
+
+def decode_cursor(token):
+    """Retorna (created_at, id) do cursor ou levanta InvalidCursor"""
+    created_at, pk = decode_token(token, 2)
+    try:
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor(token)
+
+    if created_at is None:
+        raise InvalidCursor(token)
+    return created_at, pk
+
+
+def paginate_photos(queryset, request):
+    """Aplica o keyset à queryset e retorna (fotos da página, próximo cursor ou None)
+
+    O filtro "anterior ao cursor" usa o índice (created_at, id), então o custo por página
+    não depende do tamanho da biblioteca; fotos novas entram antes do cursor e não
+    deslocam as páginas seguintes.
+    """
+    size = page_size_from(request)
+    queryset = queryset.order_by(*ORDERING)
+
+    token = request.query_params.get('cursor')
+    if token:
+        created_at, pk = decode_cursor(token)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # Um item a mais indica se existe próxima página sem precisar de COUNT
+    photos = list(queryset[:size + 1])
+    has_more = len(photos) > size
+    photos = photos[:size]
+
+    next_cursor = encode_cursor(photos[-1]) if has_more else None
+    return photos, next_cursor
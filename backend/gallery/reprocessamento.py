@@ -0,0 +1,288 @@
+"""Reprocessamento em lote das fotos já na galeria (novos modelos, limiares ou regras de tags)
+
+As fotos são percorridas em ordem de ID, em blocos, e os blocos vão para um pool de
+processos (cada processo carrega os seus modelos e usa `torch_threads` threads). Um
+arquivo de checkpoint guarda o maior ID até o qual todos os blocos terminaram e as
+fotos que falharam: se o comando cair, a próxima execução com as mesmas etapas
+continua dali.
+
+As etapas com modelo (caption, objects, faces) só rodam numa foto quando o resultado
+guardado dela está desatualizado (ver resultados_etapas.py) ou quando forçadas; a
+descrição, as tags e a tradução são sempre refeitas a partir das saídas guardadas.
+
+Este módulo é importado pelos processos do pool antes do Django estar configurado
+(no Windows e no macOS os processos não herdam o estado do pai), por isso os imports
+da galeria ficam dentro das funções.
+"""
+
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+STAGES = ('caption', 'objects', 'faces', 'tags', 'translation')
+
+# Etapas que mudam a descrição (legenda, objetos e nomes das pessoas citados nela)
+DESCRIPTION_STAGES = {'caption', 'objects', 'faces'}
+
+
+def expand_stages(stages):
+    """Etapas pedidas + as derivadas que dependem delas
+
+    Objetos novos refazem as tags; qualquer etapa que muda a descrição refaz a tradução.
+    """
+    stages = set(stages)
+    unknown = stages - set(STAGES)
+    if unknown:
+        raise ValueError(f"Etapa desconhecida: {', '.join(sorted(unknown))}")
+    if 'objects' in stages:
+        stages.add('tags')
+    if stages & DESCRIPTION_STAGES:
+        stages.add('translation')
+    return stages
+
+
+# ============================================================================
+# CHECKPOINT
+# ============================================================================
+
+class ReprocessCheckpoint:
+    """Progresso salvo em JSON: último ID concluído (sem lacunas) e fotos com erro"""
+
+    def __init__(self, path, stages):
+        self.path = str(path)
+        self.stages = sorted(stages)
+        self.last_id = 0
+        self.failed = {}  # photo_id -> erro
+        self.done = 0
+        self.processed = 0  # fotos tentadas nesta execução (não vai para o arquivo)
+
+    def load(self):
+        """Retoma o progresso salvo se foi para as mesmas etapas; retorna True se retomou"""
+        try:
+            with open(self.path, encoding='utf-8') as fh:
+                state = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return False
+        if state.get('stages') != self.stages:
+            return False
+        self.last_id = state.get('last_id', 0)
+        self.failed = {int(photo_id): error for photo_id, error in state.get('failed', {}).items()}
+        self.done = state.get('done', 0)
+        return True
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as fh:
+            json.dump({
+                'stages': self.stages,
+                'last_id': self.last_id,
+                'done': self.done,
+                'failed': self.failed,
+            }, fh)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+def init_worker(torch_threads=1, niceness=0):
+    """Prepara um processo do pool: prioridade baixa, threads do torch e Django"""
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+
+    # Antes de importar o torch, para valer também para as bibliotecas numéricas
+    os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+    os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    import django
+    django.setup()
+
+
+def reprocess_chunk(photo_ids, stages, forced=()):
+    """Reprocessa as fotos `photo_ids` (no processo atual); retorna (concluídas, {photo_id: erro})
+
+    Uma etapa com modelo roda na foto se foi pedida e está desatualizada (ou está em
+    `forced`), ou se a derivação precisa da saída dela e não há nenhuma guardada.
+    """
+    from django.db import close_old_connections
+
+    from .caracteristicas import extract_image_features
+    from .funcoes_ia import (
+        build_photo_tags,
+        captioner,
+        decode_for_ai,
+        describe_photo,
+        enhance_for_models,
+        object_detector,
+        reprocess_face_recognition,
+        save_photo_tags,
+    )
+    from .models import Photo
+    from .niveis_qualidade import get_tier
+    from .resultados_etapas import (
+        load_stage_results,
+        save_stage_results,
+        stage_outputs,
+    )
+    from .traducao import translate_texts, translation_setting
+
+    close_old_connections()
+    stages, forced = set(stages), set(forced)
+    photos = list(Photo.objects.filter(id__in=photo_ids).order_by('id'))
+    stored = load_stage_results(photo_ids)
+    errors = {}
+
+    # Saídas que a derivação usa: legenda e objetos para a descrição, objetos para as tags
+    describe = bool(stages & DESCRIPTION_STAGES)
+    inputs = ({'caption', 'objects'} if describe else set()) | ({'objects'} if 'tags' in stages else set())
+
+    def must_run(photo, stage):
+        output, is_current = stored.get(photo.id, {}).get(stage, (None, False))
+        if stage in stages:
+            return stage in forced or not is_current
+        return stage in inputs and output is None
+
+    loaded = []
+    for photo in photos:
+        try:
+            loaded.append((photo, decode_for_ai(photo.image.path)))
+        except Exception as e:
+            errors[photo.id] = f"{type(e).__name__}: {e}"
+
+    # Modelos de caption e objetos rodam uma vez para as fotos do bloco que precisam deles
+    outputs = {photo.id: {} for photo, _ in loaded}
+    try:
+        for stage, model in (('caption', captioner), ('objects', object_detector)):
+            pending = [(photo, decoded) for photo, decoded in loaded if must_run(photo, stage)]
+            if not pending:
+                continue
+            images = [enhance_for_models(decoded.image) for _, decoded in pending]
+            if stage == 'caption':
+                results = model(images, batch_size=len(images), **get_tier().caption_kwargs())
+                for (photo, _), result in zip(pending, results):
+                    outputs[photo.id].update(stage_outputs(
+                        basic_caption=result[0]['generated_text'] if result else "Image processed"
+                    ))
+            else:
+                results = model(images, batch_size=len(images))
+                for (photo, _), result in zip(pending, results):
+                    outputs[photo.id].update(stage_outputs(detected_objects=result))
+    except Exception as e:
+        for photo, _ in loaded:
+            errors[photo.id] = f"{type(e).__name__}: {e}"
+        loaded = []
+
+    for photo, decoded in loaded:
+        try:
+            if must_run(photo, 'faces'):
+                face_locations = reprocess_face_recognition(decoded.array, photo)
+                outputs[photo.id].update(stage_outputs(face_locations=face_locations))
+            save_stage_results(photo, outputs[photo.id])
+
+            # Saídas novas ou, para as etapas que não rodaram, as guardadas
+            current = {stage: output for stage, (output, _) in stored.get(photo.id, {}).items()}
+            current.update(outputs[photo.id])
+            if not describe and 'tags' not in stages:
+                continue
+
+            features = extract_image_features(decoded.small)
+            detected_objects = current['objects']['objects']
+            if describe:
+                photo.caption = describe_photo(photo, current['caption']['text'], detected_objects, features)
+                photo.save(update_fields=['caption'])
+
+            if 'tags' in stages:
+                photo.tags.clear()
+                save_photo_tags(photo, build_photo_tags(detected_objects, features))
+        except Exception as e:
+            errors[photo.id] = f"{type(e).__name__}: {e}"
+
+    # Traduções do bloco numa chamada só ao backend (e ao cache)
+    if 'translation' in stages:
+        pending = [photo for photo, _ in loaded if photo.id not in errors and photo.caption]
+        translations = translate_texts([photo.caption for photo in pending], translation_setting('TIMEOUT', 10))
+        for photo in pending:
+            caption_pt = translations.get(photo.caption)
+            if caption_pt:
+                Photo.objects.filter(pk=photo.pk, caption=photo.caption).update(caption_pt=caption_pt)
+            else:
+                errors[photo.id] = "Tradução indisponível no momento"
+
+    return len(photos) - len(errors), errors
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def reprocess_photos(photo_ids, stages, checkpoint, workers=2, chunk_size=16, torch_threads=1,
+                     niceness=10, progress=None, forced=()):
+    """Reprocessa as fotos em blocos, em `workers` processos (0 = no próprio processo)
+
+    `forced` são as etapas com modelo que rodam mesmo com o resultado guardado atual.
+
+    Depois das fotos a tentar de novo, `photo_ids` vem em ordem crescente: o checkpoint
+    só avança até o fim do bloco mais antigo ainda não concluído, então uma queda nunca
+    pula fotos. Uma foto sai de `checkpoint.failed` só quando o bloco dela termina sem
+    erro nela. `progress(checkpoint)` é chamado a cada bloco concluído.
+    """
+    from django.db import connections
+
+    stages, forced = sorted(stages), sorted(forced)
+
+    def finish(chunk, result):
+        done, errors = result
+        checkpoint.done += done
+        checkpoint.processed += len(chunk)
+        for photo_id in chunk:
+            checkpoint.failed.pop(photo_id, None)
+        checkpoint.failed.update(errors)
+        checkpoint.last_id = max(checkpoint.last_id, chunk[-1])
+        checkpoint.save()
+        if progress:
+            progress(checkpoint)
+
+    if workers <= 0:
+        for chunk in chunked(photo_ids, chunk_size):
+            finish(chunk, reprocess_chunk(chunk, stages, forced))
+        return checkpoint
+
+    # Os processos filhos abrem as próprias conexões com o banco
+    connections.close_all()
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(torch_threads, niceness)) as pool:
+        for chunk in chunked(photo_ids, chunk_size):
+            in_flight.append((chunk, pool.submit(reprocess_chunk, chunk, stages, forced)))
+            # Poucos blocos na fila: o checkpoint acompanha o que já terminou
+            while len(in_flight) >= 2 * workers:
+                chunk, future = in_flight.popleft()
+                finish(chunk, future.result())
+
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            finish(chunk, future.result())
+
+    return checkpoint
@@ -0,0 +1,166 @@
+"""Saídas brutas das etapas da IA por foto, com proveniência (modelo, versão e configuração)
+
+Cada etapa que roda um modelo (caption, objetos, rostos) guarda a sua saída bruta num
+StageResult identificado por (foto, etapa, modelo, versão, hash da configuração). A
+descrição final, as tags e a tradução são derivadas dessas saídas sem carregar modelo
+algum, e uma etapa só precisa rodar de novo quando a proveniência atual (ver
+`stage_provenance`) difere da guardada: outro modelo, código da etapa com nova versão
+em STAGE_VERSIONS ou parâmetros diferentes (ex: outro perfil de detecção de rostos).
+"""
+
+import hashlib
+import json
+
+from django.db.models import Exists, OuterRef, Q
+
+from .inferencia import inference_backend
+from .models import StageResult
+
+# Etapas com saída bruta guardada (as demais são derivadas delas)
+RAW_STAGES = ('caption', 'objects', 'faces')
+
+# Versão do código de cada etapa: incrementar quando mudar a forma de chamar o modelo
+# ou de ler a saída dele (os resultados guardados dessa etapa ficam desatualizados)
+STAGE_VERSIONS = {'caption': '1', 'objects': '1', 'faces': '1'}
+
+# Entrada dos modelos de caption e objetos (ver funcoes_ia.load_image_for_ai e enhance_for_models)
+MODEL_INPUT = {"max_size": 2048, "contrast": 1.1}
+CAPTION_MAX_NEW_TOKENS = 50
+
+
+def config_hash(config):
+    """Hash estável (ordem das chaves não importa) dos parâmetros de uma etapa"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def stage_provenance(stage, tier=None):
+    """(modelo, versão, hash da configuração) com que a etapa rodaria agora no nível `tier` (padrão 'full')"""
+    # Import tardio: niveis_qualidade importa as constantes deste módulo
+    from .niveis_qualidade import get_tier
+
+    tier = tier or get_tier()
+    if stage == 'caption':
+        config = {"input": tier.model_input, "max_new_tokens": tier.max_new_tokens}
+        # Só entra no hash quando definido, para não invalidar os resultados de antes dos níveis
+        if tier.num_beams is not None:
+            config["num_beams"] = tier.num_beams
+        model, backend = tier.caption_model, inference_backend('captioner')
+    elif stage == 'objects':
+        model, config = tier.detection_model, {"input": tier.model_input}
+        backend = inference_backend('object_detector')
+    elif stage == 'faces':
+        config = {"max_size": tier.max_size, "profile": tier.detection_profile()}
+        model, backend = 'dlib', 'torch'
+    else:
+        raise ValueError(f"Etapa sem resultado guardado: {stage}")
+
+    # int8 e ONNX mudam levemente as saídas; o padrão (torch) fica fora do hash para não
+    # invalidar os resultados guardados antes de existir a opção
+    if backend != 'torch':
+        config["backend"] = backend
+    return model, STAGE_VERSIONS[stage], config_hash(config)
+
+
+def current_provenances(stages=RAW_STAGES, tier=None):
+    return {stage: stage_provenance(stage, tier) for stage in stages}
+
+
+# ============================================================================
+# SAÍDAS
+# ============================================================================
+
+def serialize_objects(detected_objects):
+    """Objetos do DETR em JSON (rótulo, score e caixa), do mais ao menos provável"""
+    return [
+        {"label": obj['label'], "score": float(obj['score']),
+         "box": {key: float(value) for key, value in obj.get('box', {}).items()}}
+        for obj in sorted(detected_objects, key=lambda obj: obj['score'], reverse=True)
+    ]
+
+
+def stage_outputs(basic_caption=None, detected_objects=None, face_locations=None):
+    """Saídas brutas no formato guardado ({etapa: saída}); etapas com None ficam de fora"""
+    outputs = {}
+    if basic_caption is not None:
+        outputs['caption'] = {"text": basic_caption}
+    if detected_objects is not None:
+        outputs['objects'] = {"objects": serialize_objects(detected_objects)}
+    if face_locations is not None:
+        outputs['faces'] = {"locations": [list(map(int, location)) for location in face_locations]}
+    return outputs
+
+
+def save_stage_results(photo, outputs, provenances=None):
+    """Guarda as saídas {etapa: saída} da foto com a proveniência atual (uma query)
+
+    Resultados de outras proveniências continuam guardados: voltar a um modelo ou
+    configuração anterior não exige rodar a etapa de novo.
+    """
+    if not outputs:
+        return
+    provenances = provenances or current_provenances(outputs)
+    StageResult.objects.bulk_create(
+        [
+            StageResult(photo_id=photo.pk, stage=stage, model=provenances[stage][0],
+                        version=provenances[stage][1], config_hash=provenances[stage][2], output=output)
+            for stage, output in outputs.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['photo', 'stage', 'model', 'version', 'config_hash'],
+        update_fields=['output', 'updated_at'],
+    )
+
+
+# ============================================================================
+# CONSULTAS
+# ============================================================================
+
+def provenance_filter(stage, provenance):
+    model, version, config = provenance
+    return Q(stage=stage, model=model, version=version, config_hash=config)
+
+
+def load_stage_results(photo_ids, stages=RAW_STAGES, provenances=None):
+    """Saídas guardadas das fotos: {photo_id: {etapa: (saída, atual?)}}
+
+    Para cada etapa vem o resultado da proveniência atual ou, se não houver, o mais
+    recente (marcado como desatualizado), que ainda serve para derivar descrição e tags.
+    """
+    provenances = provenances or current_provenances(stages)
+    results = {}
+    rows = (
+        StageResult.objects.filter(photo_id__in=photo_ids, stage__in=stages)
+        .order_by('photo_id', 'stage', 'updated_at')
+        .values_list('photo_id', 'stage', 'model', 'version', 'config_hash', 'output')
+    )
+    for photo_id, stage, model, version, config, output in rows:
+        is_current = (model, version, config) == provenances[stage]
+        stored = results.setdefault(photo_id, {})
+        # Em ordem de updated_at: o atual prevalece, senão fica o mais recente
+        if is_current or not stored.get(stage, (None, False))[1]:
+            stored[stage] = (output, is_current)
+    return results
+
+
+def stale_photos(queryset, stages=RAW_STAGES):
+    """Fotos do queryset sem resultado atual para alguma das etapas"""
+    provenances = current_provenances(stages)
+    condition = Q()
+    for stage in stages:
+        current = StageResult.objects.filter(provenance_filter(stage, provenances[stage]), photo=OuterRef('pk'))
+        condition |= ~Exists(current)
+    return queryset.filter(condition)
+
+
+def delete_outdated_results(stages=RAW_STAGES):
+    """Apaga os resultados de proveniências antigas que já têm substituto atual na mesma foto"""
+    provenances = current_provenances(stages)
+    deleted = 0
+    for stage in stages:
+        current = provenance_filter(stage, provenances[stage])
+        replaced = StageResult.objects.filter(current, photo=OuterRef('photo'))
+        deleted += (
+            StageResult.objects.filter(stage=stage).exclude(current)
+            .filter(Exists(replaced)).delete()[0]
+        )
+    return deleted
@@ -1,15 +1,18 @@
 from rest_framework import serializers
 from .models import Photo, Tag, Person
+from .miniaturas import best_derivative_url, derivative_urls
 
 
 class PhotoSerializer(serializers.ModelSerializer):
     tags = serializers.StringRelatedField(many=True, read_only=True)
     persons = serializers.StringRelatedField(many=True, read_only=True)
     image = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Photo
-        fields = ['id', 'text', 'image', 'caption', 'caption_pt', 'created_at', 'tags', 'persons', 'is_favorite']
+        fields = ['id', 'text', 'image', 'thumbnails', 'placeholder', 'caption', 'caption_pt', 'created_at', 'tags', 'persons', 'is_favorite', 'status',
+                  'aspect_ratio', 'orientation', 'dominant_color']
     
     def get_image(self, obj):
         request = self.context.get('request')
@@ -19,17 +22,20 @@ class PhotoSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_thumbnails(self, obj):
+        return derivative_urls(obj, self.context.get('request'))
+
 
 class PersonSerializer(serializers.ModelSerializer):
     representative_photo = serializers.SerializerMethodField()
+    representative_thumbnail = serializers.SerializerMethodField()
     photo_count = serializers.SerializerMethodField()
     first_photo = serializers.SerializerMethodField()
     photo_principal = serializers.SerializerMethodField()
 
     class Meta:
         model = Person
-        fields = ['id', 'name', 'encoding', 'representative_photo', 'photo_count', 'first_photo', 'photo_principal']
-        read_only_fields = ['encoding']
+        fields = ['id', 'name', 'representative_photo', 'representative_thumbnail', 'photo_count', 'first_photo', 'photo_principal']
 
     def get_representative_photo(self, person_obj):
         request = self.context.get('request')
@@ -38,6 +44,13 @@ class PersonSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(person_obj.photo_principal.image.url)
             return person_obj.photo_principal.image.url
         return self.get_first_photo(person_obj)
+
+    def get_representative_thumbnail(self, person_obj):
+        """Miniatura (~400px) da foto representativa, para avatares e cards"""
+        photo = person_obj.photo_principal or self._first_photo(person_obj)
+        if photo:
+            return best_derivative_url(photo, 400, self.context.get('request'))
+        return None
     
     def get_photo_principal(self, person_obj):
         request = self.context.get('request')
@@ -47,9 +60,15 @@ class PersonSerializer(serializers.ModelSerializer):
             return person_obj.photo_principal.image.url
         return None
     
+    def _first_photo(self, person_obj):
+        # Pré-carregada por Person.objects.with_photo_stats(); senão consulta o banco
+        if hasattr(person_obj, 'first_photos'):
+            return person_obj.first_photos[0] if person_obj.first_photos else None
+        return person_obj.photo_set.order_by('pk').first()
+
     def get_first_photo(self, person_obj):
         request = self.context.get('request')
-        first_photo = person_obj.photo_set.first()
+        first_photo = self._first_photo(person_obj)
         if first_photo:
             if request:
                 return request.build_absolute_uri(first_photo.image.url)
@@ -57,4 +76,6 @@ class PersonSerializer(serializers.ModelSerializer):
         return None
     
     def get_photo_count(self, person_obj):
+        if hasattr(person_obj, 'num_photos'):
+            return person_obj.num_photos
         return person_obj.photo_set.count()
\ No newline at end of file
@@ -0,0 +1,828 @@
+"""Servidor de modelos fora do processo: uma cópia dos modelos para todos os workers
+
+Cada processo do gunicorn (e cada worker da fila) carregando BLIP, DETR, CLIP e dlib
+multiplica a memória pelos workers e paga a carga em cada um. Com
+GALLERY_MODEL_SERVER_URL configurado, o model_registry desses processos entrega
+proxies (RemoteModel) no lugar dos modelos e as chamadas vão para um processo local
+que é o único a carregá-los (python manage.py serve_models):
+
+- Transporte: socket Unix (o padrão, num diretório 0700 do usuário em
+  $XDG_RUNTIME_DIR/gallery ou <tmp>/gallery-<uid>, com o socket em 0600) ou HTTP em
+  127.0.0.1 ('http://127.0.0.1:8765'). Argumentos e resultados vão em JSON (arrays
+  numpy, imagens e tuplas com marcadores próprios): nenhum lado executa pickle.
+- Autenticação: GALLERY_MODEL_SERVER_TOKEN é obrigatório nos dois transportes e nunca
+  vai pela conexão. Cada chamada leva um HMAC do token sobre método, caminho e corpo
+  (conferido antes de decodificar o corpo) e cada resposta um HMAC sobre a chamada e o
+  corpo: o cliente só aceita respostas de quem tem o token. No socket Unix o cliente
+  confere ainda o dono do arquivo e o usuário do processo do outro lado (SO_PEERCRED)
+  antes de enviar qualquer coisa.
+- Imagens: os pixels de imagens PIL e de arrays numpy grandes não passam pelo socket.
+  O cliente os copia num segmento de memória compartilhada e envia só o nome; o
+  servidor lê o segmento no lugar (os arrays dos rostos são usados sem cópia) e o
+  cliente remove o segmento depois da resposta.
+- Lotes: cada modelo tem uma fila limitada (GALLERY_MODEL_SERVER_QUEUE_SIZE; cheia, a
+  chamada é recusada com 503). Chamadas compatíveis que chegam juntas (mesmo método e
+  mesmos parâmetros, ex: legendas de vários workers) viram uma chamada só do modelo,
+  com até GALLERY_MODEL_SERVER_BATCH_SIZE chamadas esperando no máximo
+  GALLERY_MODEL_SERVER_BATCH_WAIT_MS pelas outras.
+- Saúde: GET /health (modelos carregados, fila e lotes de cada modelo) e GET /metrics.
+
+Sem GALLERY_MODEL_SERVER_URL nada muda: cada processo carrega os modelos que usar. Com
+o servidor configurado e fora do ar, as chamadas falham (e /api/health/models/ mostra o
+servidor indisponível) em vez de cada worker carregar os modelos por conta própria.
+"""
+
+import base64
+import hmac
+import http.client
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .metricas import (
+    CONTENT_TYPE, MODEL_SERVER_BATCH_SIZE, MODEL_SERVER_QUEUE_SECONDS, MODEL_SERVER_REJECTED, metrics, span,
+)
+from .modelos_ia import model_registry
+
+SIGNATURE_HEADER = 'X-Model-Server-Signature'
+
+# Métodos que aceitam uma lista de entradas e devolvem um resultado por entrada
+BATCH_METHODS = ('__call__', 'encode_images', 'encode_texts')
+
+# Modos de imagem reconstruídos a partir dos pixels; os demais (ex: 'P') vão como TIFF no JSON
+SHARED_IMAGE_MODES = ('RGB', 'RGBA', 'L')
+
+
+def model_server_setting(name, default):
+    """Lê configuração do servidor de modelos no settings (GALLERY_MODEL_SERVER_*)"""
+    return getattr(settings, f'GALLERY_MODEL_SERVER_{name}', default)
+
+
+def default_socket_path():
+    """Socket num diretório só do usuário: $XDG_RUNTIME_DIR/gallery ou <tmp>/gallery-<uid>"""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'gallery', 'models.sock')
+    return os.path.join(tempfile.gettempdir(), f'gallery-{os.getuid()}', 'models.sock')
+
+
+# Socket Unix onde existir (sem AF_UNIX, HTTP local)
+if hasattr(socket, 'AF_UNIX') and hasattr(os, 'getuid'):
+    DEFAULT_URL = f'unix://{default_socket_path()}'
+else:
+    DEFAULT_URL = 'http://127.0.0.1:8765'
+
+
+def parse_url(url):
+    """('unix', caminho do socket) ou ('tcp', (host, porta))"""
+    parts = urlsplit(url)
+    if parts.scheme == 'unix':
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("Socket Unix não disponível neste sistema; use http://127.0.0.1:<porta>")
+        return 'unix', parts.path
+    if parts.scheme == 'http':
+        return 'tcp', (parts.hostname or '127.0.0.1', parts.port or 80)
+    raise ValueError(f"Endereço do servidor de modelos inválido: {url}")
+
+
+def check_transport(url, token):
+    """Erro (ValueError) se o endereço for inválido ou faltar o token (obrigatório em qualquer transporte)"""
+    parse_url(url)
+    if not token:
+        raise ValueError("Servidor de modelos exige GALLERY_MODEL_SERVER_TOKEN (o mesmo no servidor e nos clientes)")
+
+
+def sign(token, *parts):
+    """HMAC-SHA256 (hex) do token sobre as partes (texto ou bytes)"""
+    mac = hmac.new(token.encode('utf-8'), digestmod='sha256')
+    for part in parts:
+        part = part if isinstance(part, bytes) else str(part).encode('utf-8')
+        mac.update(len(part).to_bytes(8, 'big'))
+        mac.update(part)
+    return mac.hexdigest()
+
+
+def check_socket_owner(path):
+    """PermissionError se o arquivo do socket não for do usuário deste processo"""
+    owner = os.stat(path).st_uid
+    if owner != os.getuid():
+        raise PermissionError(f"Socket {path} pertence a outro usuário (uid {owner})")
+
+
+def check_socket_peer(sock):
+    """PermissionError se o processo do outro lado do socket Unix for de outro usuário (onde houver SO_PEERCRED)"""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', credentials)
+    if uid != os.getuid():
+        raise PermissionError(f"Servidor de modelos rodando como outro usuário (uid {uid})")
+
+
+def prepare_socket_dir(path):
+    """Cria o diretório do socket; o diretório padrão precisa ser do usuário e fechado (0700)"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid') and directory == os.path.dirname(default_socket_path()):
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise ValueError(f"Diretório do socket {directory} precisa ser do usuário e ter permissão 0700")
+
+
+# ============================================================================
+# CODIFICAÇÃO (JSON)
+# ============================================================================
+
+def to_json(value):
+    """Valor dos argumentos/resultados em tipos do JSON (TypeError para o que não tiver marcador)"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, SharedArray):
+        return {"__shared__": [value.segment_name, list(value.shape), value.dtype, value.image_mode]}
+    if isinstance(value, (np.ndarray, np.generic)):
+        array = np.ascontiguousarray(value)
+        if array.dtype.hasobject:
+            raise TypeError("Arrays de objetos não vão para o servidor de modelos")
+        data = base64.b64encode(array.tobytes()).decode('ascii')
+        return {"__ndarray__": [array.dtype.str, list(array.shape), data, isinstance(value, np.generic)]}
+    if isinstance(value, Image.Image):
+        buffer = io.BytesIO()
+        value.save(buffer, 'TIFF')
+        return {"__image__": base64.b64encode(buffer.getvalue()).decode('ascii')}
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode('ascii')}
+    if isinstance(value, tuple):
+        return {"__tuple__": [to_json(item) for item in value]}
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError("Chaves de dicionário precisam ser texto")
+        encoded = {key: to_json(item) for key, item in value.items()}
+        # Chaves com '__' poderiam ser lidas como marcador na volta
+        return {"__dict__": encoded} if any(key.startswith('__') for key in value) else encoded
+    raise TypeError(f"Tipo não suportado pelo servidor de modelos: {type(value).__name__}")
+
+
+def checked_dtype(name):
+    dtype = np.dtype(name)
+    if dtype.hasobject:
+        raise ValueError("Arrays de objetos não vão para o servidor de modelos")
+    return dtype
+
+
+def from_json(value):
+    """Inverso de to_json (arrays e imagens vêm dos bytes, nunca de pickle)"""
+    if isinstance(value, list):
+        return [from_json(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        (marker, data), = value.items()
+        if marker == '__tuple__':
+            return tuple(from_json(item) for item in data)
+        if marker == '__ndarray__':
+            dtype, shape, data, scalar = data
+            array = np.frombuffer(base64.b64decode(data), dtype=checked_dtype(dtype)).reshape(shape).copy()
+            return array[()] if scalar else array
+        if marker == '__shared__':
+            segment_name, shape, dtype, image_mode = data
+            return SharedArray(str(segment_name), tuple(int(size) for size in shape), checked_dtype(dtype).str,
+                               image_mode)
+        if marker == '__image__':
+            image = Image.open(io.BytesIO(base64.b64decode(data)))
+            image.load()
+            return image
+        if marker == '__bytes__':
+            return base64.b64decode(data)
+        if marker == '__dict__':
+            return {key: from_json(item) for key, item in data.items()}
+    return {key: from_json(item) for key, item in value.items()}
+
+
+def encode_message(value):
+    return json.dumps(to_json(value), separators=(',', ':')).encode('utf-8')
+
+
+def decode_message(body):
+    return from_json(json.loads(body))
+
+
+# ============================================================================
+# MEMÓRIA COMPARTILHADA
+# ============================================================================
+
+# Segmentos criados por clientes deste processo (servidor e cliente juntos, ex: testes)
+LOCAL_SEGMENTS = set()
+
+class SharedArray:
+    """Pixels num segmento de memória compartilhada (vai no JSON no lugar dos bytes)"""
+
+    def __init__(self, segment_name, shape, dtype, image_mode=None):
+        self.segment_name = segment_name
+        self.shape = shape
+        self.dtype = dtype
+        self.image_mode = image_mode  # None = array numpy
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+
+class SharedArgs:
+    """Lado do cliente: troca imagens e arrays grandes por SharedArray e remove os segmentos no fim"""
+
+    def __init__(self, min_bytes):
+        self.min_bytes = min_bytes
+        self.segments = []
+
+    def share(self, value):
+        if isinstance(value, Image.Image) and value.mode in SHARED_IMAGE_MODES:
+            return self.copy_to_segment(np.asarray(value), value.mode)
+        if isinstance(value, np.ndarray) and not value.dtype.hasobject and value.nbytes >= self.min_bytes:
+            return self.copy_to_segment(value)
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.share(item) for item in value)
+        if isinstance(value, dict):
+            return {key: self.share(item) for key, item in value.items()}
+        return value
+
+    def copy_to_segment(self, array, image_mode=None):
+        segment = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.segments.append(segment)
+        LOCAL_SEGMENTS.add(segment.name)
+        np.copyto(np.ndarray(array.shape, array.dtype, buffer=segment.buf), array)
+        return SharedArray(segment.name, array.shape, array.dtype.str, image_mode)
+
+    def release(self):
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+            LOCAL_SEGMENTS.discard(segment.name)
+        self.segments = []
+
+
+def attach_segment(name):
+    """Abre um segmento criado pelo cliente sem registrá-lo no resource_tracker deste processo
+
+    Quem cria (o cliente) é quem remove: registrado também aqui, o tracker do servidor
+    apagaria o segmento (e avisaria de "vazamento") ao encerrar.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix' and name not in LOCAL_SEGMENTS:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+class OpenedArgs:
+    """Lado do servidor: resolve os SharedArray dos argumentos e fecha os segmentos no fim"""
+
+    def __init__(self):
+        self.segments = []
+
+    def open(self, value):
+        if isinstance(value, SharedArray):
+            return self.open_shared(value)
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.open(item) for item in value)
+        if isinstance(value, dict):
+            return {key: self.open(item) for key, item in value.items()}
+        return value
+
+    def open_shared(self, shared):
+        segment = attach_segment(shared.segment_name)
+        self.segments.append(segment)
+        if shared.image_mode is not None:
+            # A imagem PIL tem memória própria: copia os pixels e não segura o segmento
+            height, width = shared.shape[:2]
+            with segment.buf[:shared.nbytes] as view:
+                return Image.frombytes(shared.image_mode, (width, height), view)
+        # Arrays (ex: imagem dos rostos) são lidos direto do segmento, sem cópia
+        array = np.ndarray(shared.shape, np.dtype(shared.dtype), buffer=segment.buf)
+        array.flags.writeable = False
+        return array
+
+    def close(self):
+        for segment in self.segments:
+            try:
+                segment.close()
+            except BufferError:
+                # Algum array do segmento ainda é referenciado; o mapeamento sai com ele
+                print(f"Segmento {segment.name} ainda em uso; liberado pelo coletor de lixo")
+        self.segments = []
+
+
+# ============================================================================
+# SERVIDOR
+# ============================================================================
+
+def batch_key(method, args, kwargs):
+    """Chave das chamadas que podem ir juntas num lote (None = chamada sozinha)"""
+    if method not in BATCH_METHODS or len(args) != 1:
+        return None
+    if method != '__call__' and not isinstance(args[0], (list, tuple)):
+        return None
+    options = sorted((key, value) for key, value in kwargs.items() if key != 'batch_size')
+    return method, repr(options)
+
+
+class ModelCall:
+    """Chamada recebida pelo servidor, esperando na fila do modelo"""
+
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.batch_key = batch_key(method, args, kwargs)
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def inputs(self):
+        """(entradas, chamada com uma entrada só?) para montar o lote"""
+        first = self.args[0]
+        return (list(first), False) if isinstance(first, (list, tuple)) else ([first], True)
+
+    def finish(self, result=None, error=None):
+        # Solta as entradas antes de acordar o request, que em seguida fecha os segmentos delas
+        self.args = self.kwargs = None
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class ModelQueue:
+    """Fila limitada de um modelo, consumida por threads que juntam chamadas compatíveis em lotes"""
+
+    def __init__(self, name, model, queue_size, batch_size, batch_wait_ms, workers):
+        self.name = name
+        self.model = model
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self.calls = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+        self.threads = [
+            threading.Thread(target=self.work, name=f'gallery-model-{name}-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, call):
+        """Coloca a chamada na fila; queue.Full com a fila cheia"""
+        try:
+            self.queue.put_nowait(call)
+        except queue.Full:
+            self.rejected += 1
+            MODEL_SERVER_REJECTED.inc(model=self.name)
+            raise
+
+    def work(self):
+        pending = deque()  # chamadas retiradas da fila que não cabiam no lote atual
+        while True:
+            call = pending.popleft() if pending else self.queue.get()
+            self.run(self.collect_batch(call, pending))
+
+    def collect_batch(self, call, pending):
+        """Lote com a chamada e as compatíveis que chegarem em até BATCH_WAIT_MS"""
+        batch = [call]
+        if call.batch_key is None or self.batch_size == 1:
+            return batch
+
+        for other in list(pending):
+            if len(batch) < self.batch_size and other.batch_key == call.batch_key:
+                pending.remove(other)
+                batch.append(other)
+
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                other = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if other.batch_key == call.batch_key:
+                batch.append(other)
+            else:
+                pending.append(other)
+        return batch
+
+    def invoke(self, method, args, kwargs):
+        target = self.model if method == '__call__' else getattr(self.model, method)
+        return target(*args, **kwargs)
+
+    def run_single(self, call):
+        try:
+            with span(f'server_{self.name}'):
+                call.finish(result=self.invoke(call.method, call.args, call.kwargs))
+        except Exception as e:
+            self.errors += 1
+            call.finish(error=e)
+
+    def run(self, batch):
+        now = time.perf_counter()
+        for call in batch:
+            MODEL_SERVER_QUEUE_SECONDS.observe(now - call.enqueued, model=self.name)
+        MODEL_SERVER_BATCH_SIZE.observe(len(batch), model=self.name)
+        self.calls += len(batch)
+        self.batches += 1
+
+        if len(batch) == 1:
+            self.run_single(batch[0])
+            return
+
+        inputs, slices = [], []
+        for call in batch:
+            call_inputs, single = call.inputs()
+            slices.append((len(inputs), len(call_inputs), single))
+            inputs.extend(call_inputs)
+
+        first = batch[0]
+        kwargs = dict(first.kwargs)
+        if first.method == '__call__':
+            kwargs['batch_size'] = len(inputs)
+        try:
+            with span(f'server_{self.name}', len(inputs)):
+                results = self.invoke(first.method, (inputs,), kwargs)
+        except Exception as e:
+            # Uma entrada ruim não derruba o lote inteiro: cada chamada roda sozinha
+            print(f"Erro no lote de {self.name} ({len(batch)} chamadas), repetindo uma a uma: {e}")
+            for call in batch:
+                self.run_single(call)
+            return
+
+        inputs = None
+        for call, (start, count, single) in zip(batch, slices):
+            call.finish(result=results[start] if single else results[start:start + count])
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "calls": self.calls,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def describe_model(model):
+    """Métodos e atributos simples do modelo (o proxy do cliente expõe os mesmos)"""
+    attributes, methods = {}, []
+    for attr in dir(model):
+        if attr.startswith('_'):
+            continue
+        try:
+            value = getattr(model, attr)
+        except Exception:
+            continue
+        if callable(value):
+            methods.append(attr)
+        elif isinstance(value, (str, int, float, bool, type(None))):
+            attributes[attr] = value
+    return {"callable": callable(model), "attributes": attributes, "methods": methods}
+
+
+class ModelServerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # conexão mantida entre as chamadas de cada thread do cliente
+
+    request_signature = None  # assinatura da chamada em andamento (assina a resposta)
+
+    def reply(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if self.request_signature is not None:
+            signature = sign(self.server.model_server.token, self.request_signature, status, body)
+            self.send_header(SIGNATURE_HEADER, signature)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_error(self, status, error, message):
+        self.reply(status, encode_message({"error": error, "message": message}))
+
+    def authorized(self, body=b''):
+        """Confere a assinatura da chamada antes de decodificar o corpo; responde 403 se não bater"""
+        expected = sign(self.server.model_server.token, self.command, self.path, body)
+        if hmac.compare_digest(self.headers.get(SIGNATURE_HEADER, ''), expected):
+            self.request_signature = expected
+            return True
+        self.close_connection = True
+        self.reply_error(403, 'PermissionError', "Assinatura do servidor de modelos inválida (token diferente?)")
+        return False
+
+    def do_GET(self):
+        server = self.server.model_server
+        self.request_signature = None
+        if self.path == '/health':
+            health = server.health()
+            body = json.dumps(health).encode('utf-8')
+            self.reply(200 if health['ready'] else 503, body, 'application/json')
+        elif self.path == '/metrics':
+            self.reply(200, metrics.render().encode('utf-8'), CONTENT_TYPE)
+        elif self.path.startswith('/describe/'):
+            if not self.authorized():
+                return
+            model_queue = server.queues.get(self.path[len('/describe/'):])
+            if model_queue is None:
+                self.reply_error(404, 'KeyError', f"Modelo não servido: {self.path}")
+            else:
+                self.reply(200, encode_message(describe_model(model_queue.model)))
+        else:
+            self.reply_error(404, 'NotFound', self.path)
+
+    def do_POST(self):
+        server = self.server.model_server
+        self.request_signature = None
+        payload = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.authorized(payload):
+            return
+
+        _, prefix, name, method = (self.path.split('/') + ['', '', ''])[:4]
+        model_queue = server.queues.get(name)
+        if prefix != 'call' or model_queue is None:
+            self.reply_error(404, 'KeyError', f"Modelo não servido: {name}")
+            return
+
+        opened = OpenedArgs()
+        try:
+            args, kwargs = decode_message(payload)
+            call = ModelCall(method, opened.open(args), opened.open(kwargs))
+            try:
+                model_queue.submit(call)
+            except queue.Full:
+                self.reply_error(503, 'QueueFull', f"Fila do modelo {name} cheia")
+                return
+
+            if not call.done.wait(server.timeout):
+                self.reply_error(504, 'TimeoutError', f"{name}.{method} sem resposta em {server.timeout}s")
+                return
+            if call.error is not None:
+                self.reply_error(500, type(call.error).__name__, str(call.error))
+                return
+            body = encode_message(call.result)
+            call = None  # solta as referências aos arrays do segmento antes de fechá-lo
+        except Exception as e:
+            self.reply_error(500, type(e).__name__, str(e))
+            return
+        finally:
+            opened.close()
+        self.reply(200, body)
+
+    def log_message(self, format, *args):
+        pass  # Sem uma linha no console a cada chamada
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer num socket Unix"""
+
+    address_family = getattr(socket, 'AF_UNIX', None)
+
+    def server_bind(self):
+        # Socket criado já com permissão 0600: outros usuários não conectam
+        umask = os.umask(0o177)
+        try:
+            socketserver.TCPServer.server_bind(self)
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, 0o600)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+class ModelServer:
+    """Modelos já carregados neste processo, servidos pelas filas com lotes"""
+
+    def __init__(self, names, queue_size=None, batch_size=None, batch_wait_ms=None, workers=None, timeout=None,
+                 token=None):
+        queue_size = queue_size or model_server_setting('QUEUE_SIZE', 64)
+        batch_size = batch_size or model_server_setting('BATCH_SIZE', 8)
+        batch_wait_ms = batch_wait_ms if batch_wait_ms is not None else model_server_setting('BATCH_WAIT_MS', 5)
+        workers = workers or model_server_setting('WORKERS', 2)
+        self.timeout = timeout or model_server_setting('TIMEOUT', 120)
+        self.token = token or model_server_setting('TOKEN', None)
+        if not self.token:
+            raise ValueError("Servidor de modelos exige GALLERY_MODEL_SERVER_TOKEN")
+        self.started = time.time()
+        self.queues = {
+            name: ModelQueue(name, model_registry.get(name), queue_size, batch_size, batch_wait_ms, workers)
+            for name in names
+        }
+
+    def health(self):
+        statuses = model_registry.status()
+        models = {name: {**statuses.get(name, {}), **q.stats()} for name, q in self.queues.items()}
+        return {
+            "ready": all(model.get('loaded') for model in models.values()),
+            "uptime_seconds": round(time.time() - self.started),
+            "models": models,
+        }
+
+    def make_http_server(self, url):
+        check_transport(url, self.token)
+        kind, address = parse_url(url)
+        if kind == 'unix':
+            prepare_socket_dir(address)
+            if os.path.exists(address):
+                os.unlink(address)  # socket de uma execução anterior
+            server = UnixHTTPServer(address, ModelServerHandler)
+        else:
+            server = ThreadingHTTPServer(address, ModelServerHandler)
+        server.daemon_threads = True
+        server.model_server = self
+        return server
+
+    def serve_forever(self, url):
+        server = self.make_http_server(url)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            kind, address = parse_url(url)
+            if kind == 'unix' and os.path.exists(address):
+                os.unlink(address)
+
+
+# ============================================================================
+# CLIENTE
+# ============================================================================
+
+class RemoteModelError(RuntimeError):
+    """Chamada ao servidor de modelos que falhou (servidor fora do ar, fila cheia ou erro no modelo)"""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection num socket Unix"""
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        # Nada é enviado a um socket (ou processo) de outro usuário
+        check_socket_owner(self.socket_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+        check_socket_peer(self.sock)
+
+
+class ModelServerClient:
+    """Cliente do servidor de modelos (uma conexão mantida por thread)"""
+
+    def __init__(self, url, models=None, timeout=None, shared_min_bytes=None, token=None):
+        self.url = url
+        self.kind, self.address = parse_url(url)
+        self.models = set(models) if models else None
+        self.timeout = timeout or model_server_setting('TIMEOUT', 120)
+        self.token = token or model_server_setting('TOKEN', None)
+        check_transport(url, self.token)
+        self.shared_min_bytes = shared_min_bytes or model_server_setting('SHARED_MIN_BYTES', 64 * 1024)
+        self._local = threading.local()
+        self._descriptions = {}
+
+    def serves(self, name):
+        return self.models is None or name in self.models
+
+    def model(self, name):
+        return RemoteModel(self, name)
+
+    def new_connection(self, timeout):
+        if self.kind == 'unix':
+            return UnixHTTPConnection(self.address, timeout=timeout)
+        host, port = self.address
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method, path, body=b''):
+        """(status, corpo) de uma resposta assinada; reconecta uma vez se a conexão mantida tiver caído"""
+        signature = sign(self.token, method, path, body)
+        connection = getattr(self._local, 'connection', None)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self._local.connection = self.new_connection(self.timeout)
+            try:
+                connection.request(method, path, body=body, headers={SIGNATURE_HEADER: signature})
+                response = connection.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                connection = self._local.connection = None
+                if not reused or isinstance(e, TimeoutError):
+                    raise RemoteModelError(f"Servidor de modelos indisponível em {self.url}: {e}") from e
+                reused = False
+
+        expected = sign(self.token, signature, response.status, payload)
+        if not hmac.compare_digest(response.getheader(SIGNATURE_HEADER, ''), expected):
+            connection.close()
+            self._local.connection = None
+            raise RemoteModelError(
+                f"Resposta sem assinatura válida de {self.url} (status {response.status}): token diferente?"
+            )
+        return response.status, payload
+
+    def call(self, name, method, args, kwargs):
+        shared = SharedArgs(self.shared_min_bytes)
+        try:
+            body = encode_message((shared.share(args), shared.share(kwargs)))
+            status, payload = self.request('POST', f'/call/{name}/{method}', body)
+        finally:
+            shared.release()
+
+        result = decode_message(payload)
+        if status != 200:
+            raise RemoteModelError(f"{name}.{method}: {result['error']}: {result['message']}")
+        return result
+
+    def describe(self, name):
+        """Métodos e atributos do modelo no servidor (consultados uma vez por processo)"""
+        description = self._descriptions.get(name)
+        if description is None:
+            status, payload = self.request('GET', f'/describe/{name}')
+            description = decode_message(payload)
+            if status != 200:
+                raise RemoteModelError(f"{name}: {description['error']}: {description['message']}")
+            self._descriptions[name] = description
+        return description
+
+    def health(self, timeout=2):
+        """Resposta do /health do servidor ({"ready": False, "error": ...} se não responder)"""
+        connection = self.new_connection(timeout)
+        try:
+            connection.request('GET', '/health')
+            return json.loads(connection.getresponse().read())
+        except (http.client.HTTPException, OSError, ValueError) as e:
+            return {"ready": False, "error": str(e), "models": {}}
+        finally:
+            connection.close()
+
+    def merge_status(self, models_status):
+        """Atualiza o status dos modelos servidos com o do servidor; devolve a saúde do servidor"""
+        health = self.health()
+        server_models = health.pop('models', {})
+        for name, status in models_status.items():
+            if self.serves(name):
+                status.update(server_models.get(name, {"loaded": False}), remote=True)
+        health['url'] = self.url
+        return health
+
+
+class RemoteModel:
+    """Proxy de um modelo do servidor: chamadas e métodos vão pelo cliente, atributos simples vêm da descrição"""
+
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return self._client.call(self._name, '__call__', args, kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        description = self._client.describe(self._name)
+        if attr in description['attributes']:
+            return description['attributes'][attr]
+        if attr not in description['methods']:
+            raise AttributeError(f"Modelo remoto '{self._name}' não tem '{attr}'")
+
+        def method(*args, **kwargs):
+            return self._client.call(self._name, attr, args, kwargs)
+        return method
+
+    def __repr__(self):
+        return f"<RemoteModel {self._name} em {self._client.url}>"
+
+
+def connect_model_server():
+    """Faz o model_registry usar o servidor de modelos se GALLERY_MODEL_SERVER_URL estiver configurado"""
+    url = model_server_setting('URL', None)
+    if not url:
+        return None
+    model_registry.remote = ModelServerClient(url, models=model_server_setting('MODELS', None))
+    return model_registry.remote
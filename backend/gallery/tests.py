@@ -1,3 +1,849 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import busca_semantica, resultados_etapas, traducao
+from .agrupamento_rostos import apply_proposals, cluster_faces, merge_proposals
+from .bench import build_synthetic_library
+from .busca_semantica import EmbeddingIndex, get_index, store_photo_embedding
+from .cache_resultados import inference_cache
+from .duplicatas import PerceptualHashIndex, hash_to_hex
+from .funcoes_ia import assign_faces_to_persons, identify_faces_for_preview, process_face_recognition
+from .indice_rostos import ENCODING_SIZE, FaceIndex, face_index, pack_encoding
+from .fila import (
+    claim_jobs, enqueue_photo, enqueue_translation, fail_job, run_recluster_job, run_translation_jobs,
+)
+from .management.commands.benchmark_queries import QUERY_BUDGETS
+from .miniaturas import generate_derivatives
+from .modelos_falsos import build_fake_models, synthetic_image
+from .modelos_ia import model_registry
+from .niveis_qualidade import ingest_model_names
+from .models import FaceObservation, Person, Photo, PhotoEmbedding, ProcessingJob, Tag
+from .reprocessamento import ReprocessCheckpoint, expand_stages, reprocess_chunk, reprocess_photos
+from .resultados_etapas import (
+    delete_outdated_results, load_stage_results, save_stage_results, stage_outputs, stale_photos,
+)
+from .servidor_modelos import ModelServerClient, ModelServer, RemoteModelError, encode_message
+
+
+def create_photo(**fields):
+    """Foto sem arquivo de imagem (as listagens e a busca só leem os campos do banco)"""
+    fields.setdefault('image', 'photos/teste.jpg')
+    return Photo.objects.create(**fields)
+
+
+def collect_pages(client, url, page_size, cursor=None, **params):
+    """IDs de todas as páginas seguindo o next_cursor (a partir de `cursor`, se informado)"""
+    ids = []
+    while True:
+        page_params = {**params, 'page_size': page_size}
+        if cursor:
+            page_params['cursor'] = cursor
+        response = client.get(url, page_params)
+        assert response.status_code == 200, response.content
+        data = response.json()
+        ids.extend(photo['id'] for photo in data['results'])
+        cursor = data['next_cursor']
+        if not cursor:
+            return ids
+
+
+# ============================================================================
+# QUERIES DAS LISTAGENS
+# ============================================================================
+
+class ListingQueryCountTests(TestCase):
+    """O número de queries das listagens não pode depender do número de resultados (N+1)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        build_synthetic_library(photos=40, persons=10, tags=8)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assert_query_budget(self, url, budget):
+        self.client.get(url)  # verificações feitas uma vez por processo não entram na conta
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_photo_list_queries_do_not_grow_with_page_size(self):
+        for page_size in (1, 10, 40):
+            data = self.assert_query_budget(f'/api/photos/?page_size={page_size}', QUERY_BUDGETS['photos'])
+            self.assertEqual(len(data['results']), page_size)
+            self.assertTrue(all(photo['tags'] and photo['persons'] for photo in data['results']))
+
+    def test_person_list_queries_do_not_grow_with_persons(self):
+        data = self.assert_query_budget('/api/persons/', QUERY_BUDGETS['persons'])
+        self.assertGreater(len(data), 1)
+
+        Person.objects.bulk_create([Person(name=f"Nova {i}", is_manually_added=True) for i in range(20)])
+        more = self.assert_query_budget('/api/persons/', QUERY_BUDGETS['persons'])
+        self.assertEqual(len(more), len(data) + 20)
+
+
+# ============================================================================
+# PAGINAÇÃO POR CURSOR
+# ============================================================================
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.photos = [create_photo(text=f"foto {i}") for i in range(7)]
+        # Mesmo created_at em todas: a ordem e o cursor dependem do desempate por id
+        Photo.objects.update(created_at=timezone.now())
+
+    def test_pages_cover_every_photo_once_in_order(self):
+        ids = collect_pages(self.client, '/api/photos/', page_size=3)
+        self.assertEqual(ids, sorted((photo.pk for photo in self.photos), reverse=True))
+
+    def test_new_photo_does_not_shift_following_pages(self):
+        first = self.client.get('/api/photos/', {'page_size': 3}).json()
+        create_photo(text="enviada durante a paginação")
+
+        rest = collect_pages(self.client, '/api/photos/', page_size=3, cursor=first['next_cursor'])
+        ids = [photo['id'] for photo in first['results']] + rest
+        self.assertEqual(ids, sorted((photo.pk for photo in self.photos), reverse=True))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/photos/', {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# FILA DE PROCESSAMENTO
+# ============================================================================
+
+@override_settings(GALLERY_QUEUE_MAX_ATTEMPTS=3, GALLERY_QUEUE_RETRY_DELAY=10)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.photo = create_photo()
+        self.job = enqueue_photo(self.photo)
+
+    def test_claim_reserves_job_once(self):
+        jobs = claim_jobs('worker-1', limit=5)
+
+        self.assertEqual([job.pk for job in jobs], [self.job.pk])
+        self.job.refresh_from_db()
+        self.photo.refresh_from_db()
+        self.assertEqual(self.job.status, ProcessingJob.Status.RUNNING)
+        self.assertEqual(self.job.locked_by, 'worker-1')
+        self.assertEqual(self.job.attempts, 1)
+        self.assertEqual(self.photo.status, Photo.Status.PROCESSING)
+        self.assertEqual(claim_jobs('worker-2', limit=5), [])
+
+    def test_claim_skips_jobs_waiting_for_backoff(self):
+        ProcessingJob.objects.filter(pk=self.job.pk).update(available_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(claim_jobs('worker-1'), [])
+
+    def test_failure_reschedules_with_exponential_backoff(self):
+        for attempt, delay in ((1, 10), (2, 20)):
+            (job,) = claim_jobs('worker-1')
+            self.assertEqual(job.attempts, attempt)
+
+            before = timezone.now()
+            fail_job(job, RuntimeError("modelo indisponível"))
+            job.refresh_from_db()
+            self.assertEqual(job.status, ProcessingJob.Status.PENDING)
+            self.assertIn("modelo indisponível", job.last_error)
+            self.assertAlmostEqual((job.available_at - before).total_seconds(), delay, delta=1)
+
+            # Libera o job já, sem esperar o backoff
+            ProcessingJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.status, Photo.Status.PENDING)
+
+    def test_failure_after_last_attempt_gives_up(self):
+        ProcessingJob.objects.filter(pk=self.job.pk).update(attempts=2)
+        (job,) = claim_jobs('worker-1')
+
+        fail_job(job, RuntimeError("arquivo corrompido"))
+        job.refresh_from_db()
+        self.photo.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.Status.FAILED)
+        self.assertEqual(self.photo.status, Photo.Status.FAILED)
+        self.assertEqual(self.photo.caption, "Image uploaded")
+        self.assertEqual(claim_jobs('worker-1'), [])
+
+    def test_translation_error_fails_jobs_instead_of_raising(self):
+        photo = create_photo(caption="a dog on the beach")
+        job = enqueue_translation(photo)
+        jobs = claim_jobs('worker-1', kind=ProcessingJob.Kind.TRANSLATE)
+
+        with mock.patch.object(traducao, 'cached_translations', side_effect=DatabaseError("database is locked")):
+            self.assertEqual(run_translation_jobs(jobs), 0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.Status.PENDING)
+        self.assertIn("database is locked", job.last_error)
+
+    def test_recluster_runs_in_the_queue(self):
+        for name in ("Pessoa 1", "Pessoa 2"):
+            person = Person.objects.create(name=name, centroid=pack_encoding(unit_encoding(1.0)))
+            FaceObservation.objects.create(photo=create_photo(), person=person, top=0, right=10, bottom=10, left=0,
+                                           prominence=0.1, encoding=pack_encoding(unit_encoding(1.0)))
+
+        client = APIClient()
+        response = client.post('/api/persons/recluster/', {'apply': True}, format='json')
+        self.assertEqual((response.status_code, response.json()['status']), (202, ProcessingJob.Status.PENDING))
+        job_id = response.json()['job']
+        self.assertEqual(client.post('/api/persons/recluster/', {}, format='json').json()['job'], job_id)
+        self.assertEqual(Person.objects.count(), 2)  # nada muda antes do worker
+
+        (job,) = claim_jobs('worker-1', kind=ProcessingJob.Kind.RECLUSTER)
+        self.assertTrue(run_recluster_job(job))
+
+        data = client.get(f'/api/persons/recluster/{job_id}/').json()
+        self.assertEqual((data['status'], data['result']['merged']), (ProcessingJob.Status.DONE, 1))
+        self.assertEqual(Person.objects.count(), 1)
+
+
+# ============================================================================
+# ÍNDICE DE ROSTOS ENTRE PROCESSOS
+# ============================================================================
+
+def unit_encoding(*weights):
+    """Encoding normalizado com os pesos informados nas primeiras posições"""
+    vector = np.zeros(ENCODING_SIZE, dtype=np.float32)
+    vector[:len(weights)] = weights
+    return vector / np.linalg.norm(vector)
+
+
+class FaceIndexSyncTests(TestCase):
+    """Pessoas criadas, alteradas ou apagadas em outro processo (só pelo banco) entram na comparação"""
+
+    def setUp(self):
+        face_index.clear()
+        self.addCleanup(face_index.clear)
+
+    def create_person(self, name, encoding):
+        # Como o worker da fila: direto no banco, sem passar pelo índice deste processo
+        return Person.objects.create(name=name, centroid=pack_encoding(encoding), centroid_updated_at=timezone.now())
+
+    def preview_match(self, encoding):
+        (detected,) = identify_faces_for_preview([encoding], [(0, 50, 50, 0)], (100, 100))
+        return detected['id']
+
+    def test_person_created_elsewhere_is_recognized(self):
+        self.assertIsNone(self.preview_match(unit_encoding(1)))  # índice carregado (vazio)
+
+        person = self.create_person("Ana", unit_encoding(1))
+        self.assertEqual(self.preview_match(unit_encoding(1)), person.pk)
+
+    def test_centroid_updated_elsewhere_is_used(self):
+        person = self.create_person("Ana", unit_encoding(1))
+        self.assertIsNone(self.preview_match(unit_encoding(0, 1)))
+
+        Person.objects.filter(pk=person.pk).update(
+            centroid=pack_encoding(unit_encoding(0, 1)), centroid_updated_at=timezone.now()
+        )
+        self.assertEqual(self.preview_match(unit_encoding(0, 1)), person.pk)
+
+    def test_deleted_person_is_not_matched(self):
+        closest = self.create_person("Ana", unit_encoding(1))
+        other = self.create_person("Bia", unit_encoding(1, 0.3))
+        self.assertEqual(self.preview_match(unit_encoding(1)), closest.pk)
+
+        Person.objects.filter(pk=closest.pk).delete()
+        (person,) = assign_faces_to_persons([unit_encoding(1)], [0.05])
+        self.assertEqual(person.pk, other.pk)
+        self.assertEqual(Person.objects.count(), 1)
+
+
+class FaceIndexTests(SimpleTestCase):
+    """Inserções (com a matriz crescendo), atualizações e remoções pela última linha contra força bruta"""
+
+    def test_match_agrees_with_brute_force(self):
+        rng = np.random.default_rng(0)
+        index = FaceIndex(capacity=2)
+        encodings = {}
+        for person_id in range(1, 41):
+            encodings[person_id] = rng.normal(size=ENCODING_SIZE).astype(np.float32)
+            index.add(person_id, encodings[person_id])
+        for person_id in range(1, 41, 3):
+            encodings[person_id] = rng.normal(size=ENCODING_SIZE).astype(np.float32)
+            index.update(person_id, pack_encoding(encodings[person_id]))
+        for person_id in range(2, 41, 4):
+            self.assertTrue(index.remove(person_id))
+            del encodings[person_id]
+        self.assertFalse(index.remove(2))
+
+        self.assertEqual(len(index), len(encodings))
+        self.assertEqual(sorted(index.person_ids.tolist()), sorted(encodings))
+        for person_id, encoding in encodings.items():
+            np.testing.assert_array_equal(index.get(person_id), encoding)
+
+        known = list(encodings)[:10]
+        queries = [encodings[person_id] + rng.normal(scale=0.01, size=ENCODING_SIZE) for person_id in known]
+        queries += [rng.normal(size=ENCODING_SIZE) for _ in range(5)]
+        matches = index.match(queries, 1.0)
+
+        for query, match in zip(queries, matches):
+            distances = {person_id: np.linalg.norm(encoding - query) for person_id, encoding in encodings.items()}
+            closest = min(distances, key=distances.get)
+            if distances[closest] < 1.0:
+                self.assertEqual(match[0], closest)
+                self.assertAlmostEqual(match[1], distances[closest], delta=1e-3)  # float32
+            else:
+                self.assertIsNone(match)
+        self.assertEqual([match[0] for match in matches[:10]], known)
+
+    def test_wrong_dimension_is_rejected(self):
+        with self.assertRaises(ValueError):
+            FaceIndex().add(1, np.zeros(64))
+
+
+# ============================================================================
+# REAGRUPAMENTO DE ROSTOS
+# ============================================================================
+
+class ReclusterTests(TestCase):
+    """Grupos de rostos viram fusões só das pessoas automáticas com a maioria dos rostos no grupo"""
+
+    def setUp(self):
+        face_index.clear()
+        self.addCleanup(face_index.clear)
+
+    def add_faces(self, person, direction, count):
+        photo = create_photo()
+        photo.persons.add(person)
+        for i in range(count):
+            FaceObservation.objects.create(
+                photo=photo, person=person, top=0, right=10, bottom=10, left=0, prominence=0.1,
+                encoding=pack_encoding(unit_encoding(*direction, 0.01 * (i + 1))),
+            )
+        return photo
+
+    def test_auto_named_persons_are_merged_into_the_group_target(self):
+        ana = Person.objects.create(name="Ana", is_manually_added=True)
+        bia = Person.objects.create(name="Bia", is_manually_added=True)
+        auto_ana = Person.objects.create(name="Pessoa 1")
+        largest = Person.objects.create(name="Pessoa 2")
+        small = Person.objects.create(name="Pessoa 3")
+        spread = Person.objects.create(name="Pessoa 4")
+
+        self.add_faces(ana, (1, 0, 0), 2)
+        self.add_faces(bia, (1, 0, 0), 1)
+        auto_photo = self.add_faces(auto_ana, (1, 0, 0), 2)
+        self.add_faces(largest, (0, 1, 0), 2)
+        small_photo = self.add_faces(small, (0, 1, 0), 1)
+        Person.objects.filter(pk=small.pk).update(photo_principal=small_photo)
+        self.add_faces(spread, (1, 0, 0), 1)
+        self.add_faces(spread, (0, 0, 1), 3)
+
+        _, person_ids, labels = cluster_faces(threshold=0.5)
+        proposals = merge_proposals(person_ids, labels)
+        self.assertEqual(
+            [(p.target, [person for person, _ in p.sources], p.faces) for p in proposals],
+            [(ana, [auto_ana], 6), (largest, [small], 3)],
+        )
+
+        self.assertEqual(apply_proposals(proposals), 2)
+        self.assertFalse(Person.objects.filter(pk__in=[auto_ana.pk, small.pk]).exists())
+        self.assertEqual(FaceObservation.objects.filter(person=ana).count(), 4)
+        self.assertEqual(set(auto_photo.persons.all()), {ana})
+        self.assertEqual(Person.objects.get(pk=largest.pk).photo_principal, small_photo)
+        self.assertEqual(FaceObservation.objects.filter(person=bia).count(), 1)
+        self.assertEqual(FaceObservation.objects.filter(person=spread).count(), 4)
+
+
+# ============================================================================
+# UPLOAD DEPOIS DO PREVIEW
+# ============================================================================
+
+@override_settings(GALLERY_ASYNC_INGESTION=True)
+class UploadInferencePayloadTests(TestCase):
+    """O job só leva a inferência do preview que a ingestão vai aproveitar"""
+
+    def setUp(self):
+        self.client = APIClient()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.addCleanup(inference_cache.clear)
+
+    def upload_after_preview(self, tier):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), (200, 120, 40)).save(buffer, 'JPEG')
+        content = buffer.getvalue()
+        inference_cache.set(hashlib.sha256(content).hexdigest(), {
+            "tier": tier, "image_size": [64, 48], "basic_caption": "a dog", "detected_objects": [],
+            "face_locations": [[1, 2, 3, 4]], "face_encodings": [[0.5] * 128],
+            "caption": "a dog", "caption_pt": "um cachorro",
+        })
+
+        response = self.client.post(
+            '/api/photos/', {'image': SimpleUploadedFile('foto.jpg', content, 'image/jpeg')}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 202)
+        return ProcessingJob.objects.get(photo_id=response.json()['id']).payload
+
+    def test_preview_at_ingest_tier_is_attached(self):
+        payload = self.upload_after_preview('full')
+        self.assertEqual(payload['inference']['face_encodings'], [[0.5] * 128])
+
+    def test_preview_at_other_tier_is_not_attached(self):
+        self.assertIsNone(self.upload_after_preview('fast')['inference'])
+
+    @override_settings(GALLERY_QUALITY_REFINE_LATER=True)
+    def test_refine_later_attaches_preview_without_faces(self):
+        inference = self.upload_after_preview('fast')['inference']
+        self.assertEqual(inference['basic_caption'], "a dog")
+        self.assertNotIn('face_encodings', inference)
+
+
+@override_settings(GALLERY_ASYNC_INGESTION=True)
+class PhotoBatchStatusTests(TestCase):
+    """A vazão de um lote na fila sai dos tempos dos jobs dele"""
+
+    def setUp(self):
+        self.client = APIClient()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def upload_batch(self, count):
+        images = []
+        rng = np.random.default_rng(0)
+        for i in range(count):
+            buffer = io.BytesIO()
+            Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)).save(buffer, 'JPEG')
+            images.append(SimpleUploadedFile(f'foto{i}.jpg', buffer.getvalue(), 'image/jpeg'))
+        response = self.client.post('/api/photos/batch/', {'images': images}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        return response.json()['batch']
+
+    def test_images_per_second_from_job_timings(self):
+        batch = self.upload_batch(3)
+        status_url = f'/api/photos/batch/{batch}/'
+        data = self.client.get(status_url).json()
+        self.assertEqual((data['count'], data['pending'], data['finished']), (3, 3, False))
+        self.assertIsNone(data['images_per_second'])
+
+        jobs = ProcessingJob.objects.filter(payload__batch=batch)
+        start = min(job.created_at for job in jobs)
+        jobs.update(status=ProcessingJob.Status.DONE, updated_at=start + timedelta(seconds=2))
+        ProcessingJob.objects.filter(pk=jobs.first().pk).update(status=ProcessingJob.Status.FAILED)
+
+        data = self.client.get(status_url).json()
+        self.assertEqual((data['done'], data['failed'], data['pending'], data['finished']), (2, 1, 0, True))
+        self.assertEqual(data['elapsed_seconds'], 2.0)
+        self.assertEqual(data['images_per_second'], 1.0)
+
+    def test_unknown_batch(self):
+        self.assertEqual(self.client.get('/api/photos/batch/nao-existe/').status_code, 404)
+
+
+# ============================================================================
+# DUPLICATAS
+# ============================================================================
+
+class PerceptualHashIndexTests(SimpleTestCase):
+    """Busca por segmentos (tabelas, delta e removidas) contra a comparação de todos os pares"""
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.hashes = {}
+        photo_id = 0
+        for _ in range(40):
+            base = rng.getrandbits(64)
+            for _ in range(rng.randint(1, 4)):
+                photo_id += 1
+                self.hashes[photo_id] = base ^ sum(1 << bit for bit in rng.sample(range(64), rng.randint(0, 8)))
+
+        ids = sorted(self.hashes)
+        loaded, added = ids[:len(ids) * 2 // 3], ids[len(ids) * 2 // 3:]
+        self.index = PerceptualHashIndex(max_distance=6)
+        self.index.load([(photo_id, hash_to_hex(self.hashes[photo_id])) for photo_id in loaded])
+        for photo_id in added:
+            self.index.add(photo_id, hash_to_hex(self.hashes[photo_id]))
+        for photo_id in loaded[::7] + added[::5]:
+            self.index.remove(photo_id)
+            del self.hashes[photo_id]
+
+    def brute_force(self, value, max_distance):
+        distances = ((photo_id, bin(value ^ other).count('1')) for photo_id, other in self.hashes.items())
+        return sorted(
+            ((photo_id, distance) for photo_id, distance in distances if distance <= max_distance),
+            key=lambda match: (match[1], match[0]),
+        )
+
+    def test_query_matches_brute_force(self):
+        self.assertEqual(len(self.index), len(self.hashes))
+        for max_distance in (0, 3, 6):
+            for value in list(self.hashes.values())[::3]:
+                self.assertEqual(self.index.query(hash_to_hex(value), max_distance), self.brute_force(value, max_distance))
+        with self.assertRaises(ValueError):
+            self.index.query(hash_to_hex(0), 7)
+
+    def test_pairs_within_matches_brute_force(self):
+        ids = sorted(self.hashes)
+        for max_distance in (2, 6):
+            expected = {
+                (a, b) for i, a in enumerate(ids) for b in ids[i + 1:]
+                if bin(self.hashes[a] ^ self.hashes[b]).count('1') <= max_distance
+            }
+            self.assertTrue(expected)
+            self.assertEqual(self.index.pairs_within(max_distance), expected)
+
+
+# ============================================================================
+# BUSCA TEXTUAL (FTS5)
+# ============================================================================
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def search_ids(self, query, **params):
+        response = self.client.get('/api/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [photo['id'] for photo in response.json()['results']]
+
+    def test_matches_without_accents_and_by_prefix(self):
+        family = create_photo(text="Almoço em família")
+        beach = create_photo(caption_pt="um dia na praia")
+        create_photo(text="reunião de trabalho")
+
+        self.assertEqual(self.search_ids("familia"), [family.pk])
+        self.assertEqual(self.search_ids("prai"), [beach.pk])
+
+    def test_index_follows_tags_and_persons(self):
+        photo = create_photo(text="sem palavras em comum")
+        photo.tags.add(Tag.objects.create(name="aniversario"))
+        photo.persons.add(Person.objects.create(name="Marina"))
+        self.assertEqual(self.search_ids("aniversario"), [photo.pk])
+        self.assertEqual(self.search_ids("marina"), [photo.pk])
+
+        Person.objects.filter(name="Marina").update(name="Helena")
+        self.assertEqual(self.search_ids("marina"), [])
+        self.assertEqual(self.search_ids("helena"), [photo.pk])
+
+    def test_person_name_ranks_above_caption(self):
+        caption_only = create_photo(caption="a dog named lucas on the grass")
+        person = create_photo(caption="a dog on the grass")
+        person.persons.add(Person.objects.create(name="Lucas"))
+
+        self.assertEqual(self.search_ids("lucas"), [person.pk, caption_only.pk])
+
+    def test_pages_follow_the_ranking_without_repeats(self):
+        photos = [create_photo(caption=f"beach photo {i}") for i in range(7)]
+        everything = self.search_ids("beach", page_size=50)
+
+        paged = collect_pages(self.client, '/api/search/', page_size=3, q="beach")
+        self.assertEqual(paged, everything)
+        self.assertEqual(sorted(paged), sorted(photo.pk for photo in photos))
+
+    def test_new_photo_does_not_repeat_seen_results(self):
+        photos = [create_photo(caption=f"beach photo {i}") for i in range(7)]
+        first = self.client.get('/api/search/', {'q': "beach", 'page_size': 3}).json()
+
+        # Foto nova muda o bm25 de todas (estatísticas do índice) e fica no topo do ranking
+        create_photo(caption="beach")
+        rest = collect_pages(self.client, '/api/search/', page_size=3, cursor=first['next_cursor'], q="beach")
+
+        seen = [photo['id'] for photo in first['results']] + rest
+        self.assertEqual(sorted(seen), sorted(photo.pk for photo in photos))
+
+
+# ============================================================================
+# SERVIDOR DE MODELOS
+# ============================================================================
+
+class ModelServerTests(TestCase):
+    """Chamadas pelo socket Unix com modelos falsos: ida e volta em JSON e recusa sem o token"""
+
+    served = ('captioner', 'face_recognition', 'semantic_encoder')
+
+    def setUp(self):
+        socket_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(socket_dir.cleanup)
+        self.url = f"unix://{os.path.join(socket_dir.name, 'models.sock')}"
+
+        self.fakes = build_fake_models()
+        for name in self.served:
+            model_registry.override(name, self.fakes[name])
+            self.addCleanup(model_registry.unload, name)
+
+        server = ModelServer(self.served, workers=1, token='segredo').make_http_server(self.url)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def test_round_trip_matches_local_models(self):
+        client = ModelServerClient(self.url, token='segredo')
+        image = synthetic_image(4)  # com rostos
+        pixels = np.asarray(image)
+
+        self.assertEqual(client.model('captioner')(image), self.fakes['captioner'](image))
+        locations = client.model('face_recognition').face_locations(pixels)
+        self.assertEqual(locations, self.fakes['face_recognition'].face_locations(pixels))
+        self.assertIsInstance(locations[0], tuple)
+        encodings = client.model('semantic_encoder').encode_texts(['um cachorro'])
+        np.testing.assert_array_equal(encodings, self.fakes['semantic_encoder'].encode_texts(['um cachorro']))
+        self.assertEqual(client.model('semantic_encoder').dim, self.fakes['semantic_encoder'].dim)
+
+    def test_wrong_token_is_rejected(self):
+        client = ModelServerClient(self.url, token='outro')
+        with self.assertRaises(RemoteModelError):
+            client.model('captioner')(synthetic_image(1))
+        with self.assertRaises(ValueError):
+            ModelServerClient(self.url, token=None)
+
+    def test_unsigned_call_is_refused_before_decoding(self):
+        connection = ModelServerClient(self.url, token='segredo').new_connection(5)
+        self.addCleanup(connection.close)
+        with mock.patch('gallery.servidor_modelos.decode_message') as decode:
+            connection.request('POST', '/call/captioner/__call__', body=encode_message(((), {})))
+            response = connection.getresponse()
+            response.read()
+        self.assertEqual(response.status, 403)
+        decode.assert_not_called()
+
+    def test_socket_of_another_user_is_not_used(self):
+        client = ModelServerClient(self.url, token='segredo')
+        with mock.patch('gallery.servidor_modelos.os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(RemoteModelError):
+                client.model('captioner')(synthetic_image(1))
+
+
+# ============================================================================
+# REPROCESSAMENTO
+# ============================================================================
+
+class ReprocessTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.checkpoint_path = os.path.join(media_root.name, 'checkpoint.json')
+
+        fakes = build_fake_models()
+        for name in ('captioner', 'object_detector', 'face_recognition'):
+            model_registry.override(name, fakes[name])
+            self.addCleanup(model_registry.unload, name)
+        face_index.clear()
+        self.addCleanup(face_index.clear)
+
+    def test_faces_stage_keeps_user_choices(self):
+        image = synthetic_image(4)  # três rostos
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        photo = Photo.objects.create(image=SimpleUploadedFile('rostos.png', buffer.getvalue(), 'image/png'))
+        process_face_recognition(np.asarray(image), photo)
+        first, second, removed = [face.person for face in photo.faces.order_by('left')]
+
+        # O usuário desmarca uma pessoa detectada e escolhe outra que não tem rosto na foto
+        photo.faces.filter(person=removed).update(person=None)
+        photo.persons.remove(removed)
+        chosen = Person.objects.create(name="Escolhida")
+        photo.persons.add(chosen)
+        centroid = Person.objects.get(pk=first.pk).centroid
+
+        for _ in range(2):
+            self.assertEqual(reprocess_chunk([photo.id], {'faces'}, forced={'faces'}), (1, {}))
+
+        self.assertEqual(set(photo.persons.all()), {first, second, chosen})
+        self.assertEqual(FaceObservation.objects.filter(photo=photo, person__isnull=True).count(), 1)
+        self.assertEqual(Person.objects.count(), 4)
+        self.assertEqual(Person.objects.get(pk=first.pk).centroid, centroid)
+
+    def test_failed_photos_stay_in_checkpoint_until_retried(self):
+        checkpoint = ReprocessCheckpoint(self.checkpoint_path, ['tags'])
+        checkpoint.failed = {5: "erro antigo"}
+        checkpoint.save()
+
+        # A execução cai antes de tentar a foto 5 de novo: ela continua no checkpoint
+        resumed = ReprocessCheckpoint(self.checkpoint_path, ['tags'])
+        self.assertTrue(resumed.load())
+        with mock.patch('gallery.reprocessamento.reprocess_chunk', side_effect=RuntimeError("queda")):
+            with self.assertRaises(RuntimeError):
+                reprocess_photos(sorted(resumed.failed) + [10], ['tags'], resumed, workers=0, chunk_size=1)
+        resumed = ReprocessCheckpoint(self.checkpoint_path, ['tags'])
+        resumed.load()
+        self.assertEqual(resumed.failed, {5: "erro antigo"})
+
+        results = {5: (1, {}), 10: (0, {10: "erro novo"}), 11: (1, {})}
+        with mock.patch('gallery.reprocessamento.reprocess_chunk', side_effect=lambda ids, *_: results[ids[0]]):
+            reprocess_photos(sorted(resumed.failed) + [10, 11], ['tags'], resumed, workers=0, chunk_size=1)
+        resumed = ReprocessCheckpoint(self.checkpoint_path, ['tags'])
+        resumed.load()
+        self.assertEqual((resumed.failed, resumed.last_id, resumed.done), ({10: "erro novo"}, 11, 2))
+
+    def test_interrupted_run_resumes_after_last_photo(self):
+        photo_ids = [create_photo().id for _ in range(4)]
+        seen = []
+
+        def run_chunk(ids, *_):
+            seen.extend(ids)
+            return len(ids), {}
+
+        options = {'stages': 'tags', 'workers': 0, 'chunk_size': 1, 'checkpoint': self.checkpoint_path,
+                   'stdout': io.StringIO()}
+        with mock.patch('gallery.reprocessamento.reprocess_chunk', side_effect=run_chunk):
+            call_command('reprocess', limit=2, **options)
+            checkpoint = ReprocessCheckpoint(self.checkpoint_path, expand_stages({'tags'}))
+            self.assertTrue(checkpoint.load())
+            self.assertEqual((checkpoint.last_id, checkpoint.done), (photo_ids[1], 2))
+
+            call_command('reprocess', **options)
+
+        self.assertEqual(seen, photo_ids)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+
+# ============================================================================
+# RESULTADOS DAS ETAPAS
+# ============================================================================
+
+class StageResultTests(TestCase):
+    """Uma etapa com outra proveniência fica desatualizada sem afetar as demais"""
+
+    def test_new_stage_version_makes_only_that_stage_stale(self):
+        photo, partial = create_photo(), create_photo()
+        save_stage_results(photo, stage_outputs("a dog", [], [[1, 2, 3, 4]]))
+        save_stage_results(partial, stage_outputs("a cat"))
+        self.assertEqual(list(stale_photos(Photo.objects.all())), [partial])
+
+        with mock.patch.dict(resultados_etapas.STAGE_VERSIONS, {'caption': '2'}):
+            self.assertEqual(set(stale_photos(Photo.objects.all())), {photo, partial})
+            self.assertEqual(list(stale_photos(Photo.objects.all(), ('objects', 'faces'))), [partial])
+
+            stored = load_stage_results([photo.id])[photo.id]
+            self.assertEqual(stored['caption'], ({"text": "a dog"}, False))
+            self.assertEqual(stored['faces'], ({"locations": [[1, 2, 3, 4]]}, True))
+
+            save_stage_results(photo, stage_outputs("a big dog"))
+            self.assertEqual(load_stage_results([photo.id])[photo.id]['caption'], ({"text": "a big dog"}, True))
+            self.assertEqual(list(stale_photos(Photo.objects.all())), [partial])
+            self.assertEqual(delete_outdated_results(), 1)
+
+        # O resultado da versão antiga foi apagado: voltar a ela deixa a legenda desatualizada
+        self.assertEqual(load_stage_results([photo.id])[photo.id]['caption'], ({"text": "a big dog"}, False))
+
+
+# ============================================================================
+# ÍNDICE DA BUSCA SEMÂNTICA
+# ============================================================================
+
+def one_hot(position, dim=4):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[position] = 1.0
+    return vector
+
+
+class SemanticIndexTests(TestCase):
+    """Delta do índice em disco: consulta sem leituras quando nada mudou, linhas novas na hora e reconstrução"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.index = EmbeddingIndex('teste', os.path.join(self.directory, 'teste'))
+
+    def add_embedding(self, vector, model='teste'):
+        photo = create_photo()
+        PhotoEmbedding.objects.create(photo=photo, model=model, dim=len(vector),
+                                      vector=np.asarray(vector, dtype=np.float16).tobytes())
+        return photo.pk
+
+    def test_search_reads_only_new_rows(self):
+        ids = [self.add_embedding(one_hot(i)) for i in range(3)]
+        self.assertEqual(self.index.search(one_hot(1), k=1)[0][0], ids[1])
+
+        with self.assertNumQueries(1):  # só o max(updated_at)
+            self.index.search(one_hot(2), k=1)
+
+        added = self.add_embedding(one_hot(3))
+        self.assertEqual(self.index.search(one_hot(3), k=1)[0][0], added)
+        self.assertEqual(len(self.index._delta_ids), 4)
+
+    @mock.patch.object(EmbeddingIndex, 'REBUILD_MIN_ROWS', 2)
+    def test_rebuild_moves_delta_to_disk(self):
+        ids = [self.add_embedding(one_hot(i)) for i in range(3)]
+        self.index.rebuild()
+        self.index.refresh(full=True)
+        self.assertEqual((len(self.index), len(self.index._delta_ids)), (3, 0))
+        self.assertFalse(self.index.needs_rebuild())
+        self.assertEqual(self.index.search(one_hot(0), k=1)[0][0], ids[0])
+
+        for i in range(3):
+            self.add_embedding(one_hot(i % 4))
+        self.index.refresh(full=True)
+        self.assertTrue(self.index.needs_rebuild())
+
+    @mock.patch.object(EmbeddingIndex, 'REBUILD_MIN_ROWS', 2)
+    def test_sync_ingestion_rebuilds_inline(self):
+        encoder = build_fake_models()['semantic_encoder']
+        model_registry.override('semantic_encoder', encoder)
+        self.addCleanup(model_registry.unload, 'semantic_encoder')
+
+        with override_settings(GALLERY_ASYNC_INGESTION=False, GALLERY_EMBEDDINGS_DIR=self.directory,
+                               GALLERY_SEMANTIC_INLINE_CHECK_INTERVAL=0), \
+                mock.patch.dict(busca_semantica._indexes, clear=True):
+            for i in range(4):
+                store_photo_embedding(create_photo(), vector=one_hot(i % 4, encoder.dim))
+            index = get_index(encoder.name)
+            self.assertEqual((len(index), len(index._delta_ids)), (4, 0))
+
+
+# ============================================================================
+# SAÚDE DOS MODELOS
+# ============================================================================
+
+class ModelsHealthTests(TestCase):
+    def test_lazy_models_do_not_block_readiness(self):
+        for name in ingest_model_names():
+            model_registry.override(name, object())
+            self.addCleanup(model_registry.unload, name)
+        model_registry.unload('query_translator')
+
+        response = APIClient().get('/api/health/models/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('query_translator', response.json()['models'])
+        self.assertFalse(response.json()['lazy_models']['query_translator']['loaded'])
+
+    def test_missing_ingest_model_is_not_ready(self):
+        model_registry.unload('captioner')
+        response = APIClient().get('/api/health/models/')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['models']['captioner']['loaded'])
+
+
+# ============================================================================
+# MINIATURAS
+# ============================================================================
+
+class DerivativeTests(TestCase):
+    def test_photo_smaller_than_every_width_is_not_regenerated(self):
+        photo = create_photo()
+        self.assertEqual(generate_derivatives(photo, Image.new('RGB', (64, 48), (10, 120, 200))), {})
+        self.assertTrue(photo.placeholder)
+
+        with mock.patch('gallery.miniaturas.open_original') as open_original:
+            self.assertEqual(generate_derivatives(Photo.objects.get(pk=photo.pk)), {})
+        open_original.assert_not_called()
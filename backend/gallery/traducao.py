@@ -0,0 +1,236 @@
+"""Tradução das legendas (inglês -> português): backends plugáveis, cache persistente e lotes
+
+As consultas da busca semântica usam a mesma camada no sentido contrário (português ->
+inglês, para o CLIP), com um modelo próprio no registro ('query_translator').
+
+Backends (GALLERY_TRANSLATION_BACKEND):
+- 'marian': modelo MarianMT local (transformers), funciona offline
+- 'google': Google Tradutor via deep-translator (o comportamento antigo)
+- 'stub': tradução falsa e determinística, para testes
+
+As traduções ficam na tabela TranslationCache, indexada pelo hash do texto e do par de
+idiomas, então cada legenda (ou consulta) é traduzida uma única vez. Chamadas ao backend rodam num pool de threads com
+tempo máximo de espera: se estourar, quem chamou segue sem a tradução e a thread termina
+em segundo plano, gravando o resultado no cache para a próxima vez.
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.db import connection
+
+from .metricas import span
+from .modelos_ia import model_registry
+from .models import TranslationCache
+
+SOURCE_LANGUAGE = 'en'
+TARGET_LANGUAGE = 'pt'
+
+# Consultas da busca semântica: português -> inglês (idioma do encoder)
+QUERY_SOURCE_LANGUAGE = 'pt'
+QUERY_TARGET_LANGUAGE = 'en'
+
+# Modelo do model_registry que traduz cada par de idiomas
+TRANSLATOR_MODELS = {
+    (SOURCE_LANGUAGE, TARGET_LANGUAGE): 'translator',
+    (QUERY_SOURCE_LANGUAGE, QUERY_TARGET_LANGUAGE): 'query_translator',
+}
+
+# Limite de caracteres por requisição ao Google Tradutor (o serviço aceita até 5000)
+GOOGLE_MAX_CHARS = 4500
+
+
+def translation_setting(name, default):
+    """Lê configuração da tradução no settings (GALLERY_TRANSLATION_*)"""
+    return getattr(settings, f'GALLERY_TRANSLATION_{name}', default)
+
+
+def translation_deferred():
+    """Traduções que não estão no cache viram jobs da fila (padrão quando a ingestão é assíncrona)"""
+    return translation_setting('DEFERRED', getattr(settings, 'GALLERY_ASYNC_INGESTION', True))
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class GoogleTranslationBackend:
+    """Google Tradutor: várias legendas por requisição, separadas por quebra de linha"""
+
+    name = 'google'
+
+    def __init__(self, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+        from deep_translator import GoogleTranslator
+        self._translator_class = GoogleTranslator
+        self.source, self.target = source, target
+
+    def translate_batch(self, texts):
+        results = []
+        chunk, size = [], 0
+        for text in texts:
+            if chunk and size + len(text) + 1 > GOOGLE_MAX_CHARS:
+                results.extend(self._translate_joined(chunk))
+                chunk, size = [], 0
+            chunk.append(text)
+            size += len(text) + 1
+        if chunk:
+            results.extend(self._translate_joined(chunk))
+        return results
+
+    def _translate_joined(self, texts):
+        # Um GoogleTranslator por chamada: translate() altera o estado do objeto, que não
+        # pode ser dividido entre as threads do pool
+        translator = self._translator_class(source=self.source, target=self.target)
+        single_line = [' '.join(text.split()) for text in texts]
+        translated = (translator.translate('\n'.join(single_line)) or '').split('\n')
+        if len(translated) == len(texts):
+            return [line.strip() for line in translated]
+
+        # O serviço juntou ou quebrou linhas: traduz uma a uma
+        return [translator.translate(text) for text in single_line]
+
+
+class MarianTranslationBackend:
+    """MarianMT local (Helsinki-NLP), em lote e sem rede"""
+
+    name = 'marian'
+
+    def __init__(self, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+        from transformers import pipeline
+        if (source, target) == (SOURCE_LANGUAGE, TARGET_LANGUAGE):
+            model = translation_setting('MARIAN_MODEL', 'Helsinki-NLP/opus-mt-tc-big-en-pt')
+            # Modelos multilíngues do opus-mt escolhem o idioma de saída por um token no início
+            self._prefix = translation_setting('MARIAN_PREFIX', '>>por<< ')
+        elif (source, target) == (QUERY_SOURCE_LANGUAGE, QUERY_TARGET_LANGUAGE):
+            # Um único idioma de saída (inglês): sem token de idioma
+            model = translation_setting('MARIAN_QUERY_MODEL', 'Helsinki-NLP/opus-mt-ROMANCE-en')
+            self._prefix = ''
+        else:
+            raise ValueError(f"Par de idiomas sem modelo MarianMT: {source} -> {target}")
+        self._pipeline = pipeline("translation", model=model)
+
+    def translate_batch(self, texts):
+        results = self._pipeline([self._prefix + text for text in texts], batch_size=len(texts), max_length=256)
+        return [result['translation_text'] for result in results]
+
+
+class StubTranslationBackend:
+    """Tradução falsa (prefixo com o idioma de destino, ex: [pt]), para testes e benchmarks sem rede nem modelo"""
+
+    name = 'stub'
+
+    def __init__(self, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+        self.target = target
+
+    def translate_batch(self, texts):
+        return [f"[{self.target}] {text}" for text in texts]
+
+
+TRANSLATION_BACKENDS = {
+    'google': GoogleTranslationBackend,
+    'marian': MarianTranslationBackend,
+    'stub': StubTranslationBackend,
+}
+
+
+def build_translation_backend(source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+    name = translation_setting('BACKEND', 'google')
+    if name not in TRANSLATION_BACKENDS:
+        raise ValueError(f"Backend de tradução desconhecido: {name}")
+    return TRANSLATION_BACKENDS[name](source, target)
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+def cache_key(text, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+    """Hash do texto (e do par de idiomas) usado como chave do cache"""
+    return hashlib.sha256(f"{source}>{target}:{text}".encode('utf-8')).hexdigest()
+
+
+def cached_translations(texts, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+    """Dict {texto: tradução} com os textos já traduzidos (uma query)"""
+    keys = {cache_key(text, source, target): text for text in texts}
+    entries = TranslationCache.objects.filter(key__in=list(keys)).values_list('key', 'translated_text')
+    return {keys[key]: translated for key, translated in entries}
+
+
+def cached_translation(text):
+    """Tradução em cache da legenda, sem chamar o backend (ou None)"""
+    if not text or not text.strip():
+        return None
+    return cached_translations([text]).get(text)
+
+
+def _store(translations, backend_name, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+    # Só traduções de verdade: textos sem resposta do backend voltam a ser tentados
+    TranslationCache.objects.bulk_create(
+        [
+            TranslationCache(key=cache_key(text, source, target), source_text=text, translated_text=translated, backend=backend_name)
+            for text, translated in translations.items() if translated
+        ],
+        ignore_conflicts=True,
+    )
+
+
+# ============================================================================
+# TRADUÇÃO
+# ============================================================================
+
+_executor = ThreadPoolExecutor(
+    max_workers=translation_setting('WORKERS', 2), thread_name_prefix='gallery-translation'
+)
+
+
+def _translate_and_store(texts, source, target):
+    """Traduz em lotes e grava no cache; roda nas threads do pool"""
+    try:
+        backend = model_registry.get(TRANSLATOR_MODELS[(source, target)])
+        batch_size = translation_setting('BATCH_SIZE', 32)
+
+        translations = {}
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            translations.update(zip(chunk, backend.translate_batch(chunk)))
+
+        _store(translations, backend.name, source, target)
+        return translations
+    finally:
+        # Conexão própria da thread do pool: não deixa aberta entre tarefas
+        connection.close()
+
+
+def translate_texts(texts, timeout=None, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+    """Dict {texto: tradução ou None}; consulta o cache e traduz o resto em lote
+
+    Espera no máximo `timeout` segundos (GALLERY_TRANSLATION_TIMEOUT por padrão) pelo
+    backend. Textos sem tradução a tempo (ou com erro no backend) voltam como None.
+    O par de idiomas precisa estar em TRANSLATOR_MODELS (padrão: legendas, inglês -> português).
+    """
+    texts = [text for text in dict.fromkeys(texts) if text and text.strip()]
+    if not texts:
+        return {}
+
+    translations = cached_translations(texts, source, target)
+    missing = [text for text in texts if text not in translations]
+
+    if missing:
+        timeout = timeout if timeout is not None else translation_setting('TIMEOUT', 10)
+        future = _executor.submit(_translate_and_store, missing, source, target)
+        try:
+            # Mede a espera de quem pediu (o backend roda na thread do pool)
+            with span('translation', len(missing)):
+                translations.update(future.result(timeout=timeout))
+        except FutureTimeout:
+            print(f"Tradução de {len(missing)} texto(s) passou de {timeout}s; continua em segundo plano")
+        except Exception as e:
+            print(f"Erro ao traduzir ({source} -> {target}): {e}")
+
+    return {text: translations.get(text) for text in texts}
+
+
+def translate_text(text, timeout=None, source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE):
+    """Tradução de um texto (ou None se não ficou pronta a tempo)"""
+    return translate_texts([text], timeout, source, target).get(text)
@@ -1,32 +1,52 @@
 from django.urls import path
 from .views import (
     PhotoListAPIView,
+    PhotoBatchUploadAPIView,
+    PhotoBatchStatusAPIView,
     PhotoPreviewAPIView,
+    PhotoStatusAPIView,
     PhotoDetailAPIView,
+    PhotoDuplicatesAPIView,
     PersonDetailAPIView,
     PersonListAPIView,
+    PersonMergeAPIView,
     PersonPhotoListAPIView,
+    PersonReclusterAPIView,
+    PersonReclusterStatusAPIView,
     UpdatePersonPhotoAPIView,
     SearchView,
+    SemanticSearchView,
     ToggleFavoriteAPIView,
     FavoritePhotosAPIView,
     HiddenPersonsAPIView,
-    AddPersonManuallyAPIView
+    AddPersonManuallyAPIView,
+    ModelsHealthAPIView,
+    MetricsView
 )
 
 app_name = 'gallery'
 
 urlpatterns = [
     path('api/photos/', PhotoListAPIView.as_view(), name='photo-list'),
+    path('api/photos/batch/', PhotoBatchUploadAPIView.as_view(), name='photo-batch-upload'),
+    path('api/photos/batch/<str:batch_id>/', PhotoBatchStatusAPIView.as_view(), name='photo-batch-status'),
     path('api/photos/preview/', PhotoPreviewAPIView.as_view(), name='photo-preview'),
+    path('api/photos/duplicates/', PhotoDuplicatesAPIView.as_view(), name='photo-duplicates'),
     path('api/photos/<int:pk>/', PhotoDetailAPIView.as_view(), name='photo-detail'),
+    path('api/photos/<int:pk>/status/', PhotoStatusAPIView.as_view(), name='photo-status'),
     path('api/photos/<int:pk>/toggle-favorite/', ToggleFavoriteAPIView.as_view(), name='photo-toggle-favorite'),
     path('api/favorites/', FavoritePhotosAPIView.as_view(), name='photo-favorites'),
     path('api/persons/', PersonListAPIView.as_view(), name='person-list'),
     path('api/persons/hidden/', HiddenPersonsAPIView.as_view(), name='person-hidden'),
+    path('api/persons/recluster/', PersonReclusterAPIView.as_view(), name='person-recluster'),
+    path('api/persons/recluster/<int:pk>/', PersonReclusterStatusAPIView.as_view(), name='person-recluster-status'),
     path('api/persons/<int:pk>/', PersonDetailAPIView.as_view(), name='person-detail'),
+    path('api/persons/<int:pk>/merge/', PersonMergeAPIView.as_view(), name='person-merge'),
     path('api/persons/<int:pk>/add-manually/', AddPersonManuallyAPIView.as_view(), name='person-add-manually'),
     path('api/persons/<int:pk>/update-photo/', UpdatePersonPhotoAPIView.as_view(), name='person-update-photo'),
     path('api/persons/<int:pk>/photos/', PersonPhotoListAPIView.as_view(), name='person-photo-list'),
     path('api/search/', SearchView.as_view(), name='photo-search'),
+    path('api/search/semantic/', SemanticSearchView.as_view(), name='photo-semantic-search'),
+    path('api/health/models/', ModelsHealthAPIView.as_view(), name='health-models'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -1,40 +1,118 @@
 """Views da aplicação Gallery - Endpoints da API REST"""
 
 import json
-from PIL import Image, ImageEnhance
-
-from django.http import Http404
-from django.db.models import Q, Count
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import Photo, Person
+from .models import Photo, Person, ProcessingJob
 from .serializers import PhotoSerializer, PersonSerializer
+from .agrupamento_rostos import merge_persons
+from .busca_semantica import semantic_search, semantic_search_enabled
+from .busca_texto import fts_available, legacy_search_queryset, search_page
+from .cache_resultados import inference_cache
+from .caracteristicas import BRIGHT_THRESHOLD, COLOR_NAMES, DARK_THRESHOLD, ORIENTATIONS
+from .duplicatas import (
+    duplicate_clusters,
+    duplicate_detection_enabled,
+    duplicate_index,
+    duplicate_setting,
+    find_duplicate,
+    fingerprint,
+)
+from .fila import claim_jobs, enqueue_photo, enqueue_recluster, latest_job_for, make_worker_id, run_recluster_job
+from .indice_rostos import face_index
+from .metricas import CONTENT_TYPE, metrics, metrics_setting, span
+from .miniaturas import generate_derivatives
+from .modelos_ia import model_registry
+from .niveis_qualidade import ingest_model_names
+from .paginacao import InvalidCursor, page_size_from, paginate_photos
 from .funcoes_ia import (
-    captioner,
-    object_detector,
-    enhance_description,
-    detect_faces_for_preview,
-    process_photo_with_ai,
+    generate_preview,
+    inference_for_ingest,
+    ingest_photo,
+    ingest_photos_batch,
     delete_photo_file,
-    clear_photo_references,
-    update_face_cache_after_delete,
-    translate_caption_to_portuguese
+    clear_photo_references
 )
 
 
+def apply_feature_filters(queryset, request):
+    """Filtros ?color=, ?orientation= e ?light= pelas características salvas na ingestão"""
+    color = request.query_params.get('color')
+    if color:
+        if color not in COLOR_NAMES:
+            raise ValueError('color')
+        min_share = getattr(settings, 'GALLERY_COLOR_FILTER_MIN_SHARE', 0.2)
+        queryset = queryset.filter(**{f'color_histogram__{color}__gte': min_share})
+
+    orientation = request.query_params.get('orientation')
+    if orientation:
+        if orientation not in ORIENTATIONS:
+            raise ValueError('orientation')
+        queryset = queryset.filter(orientation=orientation)
+
+    light = request.query_params.get('light')
+    if light == 'bright':
+        queryset = queryset.filter(brightness__gt=BRIGHT_THRESHOLD)
+    elif light == 'dark':
+        queryset = queryset.filter(brightness__lt=DARK_THRESHOLD)
+    elif light:
+        raise ValueError('light')
+
+    return queryset
+
+
+def paginated_photos_response(queryset, request):
+    """Página de fotos serializada no formato {results, next_cursor}"""
+    try:
+        queryset = apply_feature_filters(queryset, request)
+    except ValueError as e:
+        return Response({"error": f"Filtro inválido: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        photos, next_cursor = paginate_photos(queryset.for_listing(), request)
+    except InvalidCursor:
+        return Response({"error": "Cursor inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = PhotoSerializer(photos, many=True, context={'request': request})
+    return Response({"results": serializer.data, "next_cursor": next_cursor})
+
+
+def check_duplicate(request, sha256, phash):
+    """Foto já existente igual à enviada: (foto, {of, kind, distance}) ou None
+
+    A verificação é pulada com allow_duplicates=1 (ou GALLERY_DUPLICATE_DETECTION = False).
+    """
+    allow = request.query_params.get('allow_duplicates') or request.data.get('allow_duplicates') or ''
+    if not duplicate_detection_enabled() or str(allow).lower() in ('1', 'true', 'yes', 'sim'):
+        return None
+
+    duplicate = find_duplicate(sha256, phash)
+    if not duplicate:
+        return None
+
+    photo, kind, distance = duplicate
+    return photo, {"of": photo.id, "kind": kind, "distance": distance}
+
+
 # ============================================================================
 # FOTOS - Upload e gerenciamento
 # ============================================================================
 
 class PhotoListAPIView(APIView):
-    """GET: Lista fotos | POST: Upload com IA"""
+    """GET: Lista fotos (paginada por cursor) | POST: Upload com IA"""
 
     def get(self, request):
-        photos = Photo.objects.all().order_by('-created_at')
-        serializer = PhotoSerializer(photos, many=True, context={'request': request})
-        return Response(serializer.data)
+        return paginated_photos_response(Photo.objects.all(), request)
 
     def post(self, request):
         """Upload de foto com processamento IA e seleção de pessoas"""
@@ -62,108 +140,171 @@ class PhotoListAPIView(APIView):
         except:
             new_persons_data = []
 
-        photo = Photo(image=image_file)
+        # Foto repetida (ou cópia redimensionada/recomprimida): devolve a existente sem salvar nem rodar a IA
+        sha256, phash = fingerprint(image_file)
+        duplicate = check_duplicate(request, sha256, phash)
+        if duplicate:
+            existing, info = duplicate
+            serializer = PhotoSerializer(existing, context={'request': request})
+            return Response({**serializer.data, "duplicate": info}, status=status.HTTP_200_OK)
+
+        photo = Photo(image=image_file, content_hash=sha256, perceptual_hash=phash)
         if user_description:
             photo.text = user_description
+        photo.save()
+        duplicate_index.add(photo.id, phash)
+
+        options = {
+            "selected_persons": selected_person_ids,
+            "custom_person_names": custom_person_names,
+            "new_persons": new_persons_data,
+            # Caption, objetos e rostos já calculados no preview desta mesma imagem (se a ingestão for usá-los)
+            "inference": inference_for_ingest(inference_cache.get(sha256)),
+        }
+
+        # Processamento assíncrono: a IA roda nos workers da fila (manage.py process_queue)
+        if getattr(settings, 'GALLERY_ASYNC_INGESTION', True):
+            enqueue_photo(photo, options)
+            serializer = PhotoSerializer(photo, context={'request': request})
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-        photo = process_photo_with_ai(photo, image_file)
-
-        # Substitui pessoas detectadas automaticamente pelas selecionadas pelo usuário
-        if selected_person_ids is not None:
-            photo.persons.clear()
-            for person_id in selected_person_ids:
-                if person_id:
-                    try:
-                        person = Person.objects.get(id=person_id)
-
-                        # Se houver um nome customizado para esta pessoa, atualiza
-                        custom_name = custom_person_names.get(str(person_id))
-                        if custom_name and custom_name.strip():
-                            person.name = custom_name.strip()
-                            person.save()
-
-                        photo.persons.add(person)
-                    except Person.DoesNotExist:
-                        pass
-
-        # Cria novas pessoas (Pessoa Desconhecida renomeada)
-        if new_persons_data:
-            from .funcoes_ia import known_face_encodings, known_face_names
-
-            for new_person_data in new_persons_data:
-                person_name = new_person_data.get('name', '').strip()
-                person_encoding = new_person_data.get('encoding')
-
-                if person_name and person_encoding:
-                    # Verifica se já existe pessoa com esse nome
-                    existing_person = Person.objects.filter(name=person_name).first()
-
-                    if existing_person:
-                        # Se existe, apenas associa à foto
-                        photo.persons.add(existing_person)
-                    else:
-                        # Cria nova pessoa com o encoding fornecido
-                        new_person = Person.objects.create(
-                            name=person_name,
-                            encoding=person_encoding,
-                            photo_principal=photo
-                        )
-                        photo.persons.add(new_person)
-
-                        # Atualiza cache global
-                        known_face_encodings.append(person_encoding)
-                        known_face_names.append(person_name)
+        photo = ingest_photo(photo, options)
 
         serializer = PhotoSerializer(photo, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class PhotoPreviewAPIView(APIView):
-    """POST: Gera preview de IA sem salvar (caption + pessoas detectadas)"""
+class PhotoBatchUploadAPIView(APIView):
+    """POST: Upload de várias fotos com inferência em lote (importação de backups)"""
 
     def post(self, request):
-        image_file = request.FILES.get('image')
-        if not image_file:
+        image_files = request.FILES.getlist('images')
+        if not image_files:
             return Response({"error": "Nenhuma imagem foi enviada"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            pil_image = Image.open(image_file).convert('RGB')
+        user_description = request.data.get('text', '')
+        photos = []
+        duplicates = []  # Arquivos repetidos (inclusive dentro do mesmo lote) não são salvos
+        for image_file in image_files:
+            sha256, phash = fingerprint(image_file)
+            duplicate = check_duplicate(request, sha256, phash)
+            if duplicate:
+                duplicates.append({"name": image_file.name, **duplicate[1]})
+                continue
+
+            photo = Photo(image=image_file, content_hash=sha256, perceptual_hash=phash)
+            if user_description:
+                photo.text = user_description
+            photo.save()
+            duplicate_index.add(photo.id, phash)
+            photos.append(photo)
+
+        if getattr(settings, 'GALLERY_ASYNC_INGESTION', True):
+            # Os jobs do lote levam o mesmo ID: a vazão sai dos tempos deles (PhotoBatchStatusAPIView)
+            batch_id = uuid.uuid4().hex
+            for photo in photos:
+                enqueue_photo(photo, {"batch": batch_id})
+            serializer = PhotoSerializer(photos, many=True, context={'request': request})
+            return Response({"count": len(photos), "batch": batch_id, "photos": serializer.data,
+                             "duplicates": duplicates}, status=status.HTTP_202_ACCEPTED)
 
-            # Redimensiona se necessário (max 2048px)
-            if pil_image.width > 2048 or pil_image.height > 2048:
-                pil_image.thumbnail((2048, 2048), Image.Resampling.LANCZOS)
+        batch_size = getattr(settings, 'GALLERY_QUEUE_BATCH_SIZE', 4)
+        start = time.perf_counter()
+        ingest_photos_batch(photos, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
 
-            # Ajusta contraste para melhor detecção
-            enhancer = ImageEnhance.Contrast(pil_image)
-            pil_image_enhanced = enhancer.enhance(1.1)
+        serializer = PhotoSerializer(photos, many=True, context={'request': request})
+        return Response({
+            "count": len(photos),
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(len(photos) / elapsed, 3) if elapsed > 0 and photos else None,
+            "photos": serializer.data,
+            "duplicates": duplicates,
+        }, status=status.HTTP_201_CREATED)
+
+
+class PhotoBatchStatusAPIView(APIView):
+    """GET: Progresso e vazão (imagens/s, do envio até o último job terminar) de um lote enviado para a fila"""
+
+    def get(self, request, batch_id):
+        jobs = list(
+            ProcessingJob.objects
+            .filter(kind=ProcessingJob.Kind.INGEST, payload__batch=batch_id)
+            .values_list('status', 'created_at', 'updated_at')
+        )
+        if not jobs:
+            return Response({"error": "Lote não encontrado"}, status=status.HTTP_404_NOT_FOUND)
+
+        statuses = Counter(job_status for job_status, _, _ in jobs)
+        done, failed = statuses[ProcessingJob.Status.DONE], statuses[ProcessingJob.Status.FAILED]
+        finished = done + failed == len(jobs)
+        start = min(created_at for _, created_at, _ in jobs)
+        end = max(updated_at for _, _, updated_at in jobs) if finished else timezone.now()
+        elapsed = (end - start).total_seconds()
+
+        return Response({
+            "batch": batch_id,
+            "count": len(jobs),
+            "done": done,
+            "failed": failed,
+            "pending": len(jobs) - done - failed,
+            "finished": finished,
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(done / elapsed, 3) if elapsed > 0 and done else None,
+        })
 
-            # Gera caption
-            caption_results = captioner(pil_image_enhanced, max_new_tokens=50)
-            basic_caption = caption_results[0]['generated_text'] if caption_results else "Image processed"
 
-            # Detecta objetos
-            detected_objects = sorted(object_detector(pil_image_enhanced), key=lambda x: x['score'], reverse=True)
+class PhotoPreviewAPIView(APIView):
+    """POST: Gera preview de IA sem salvar (caption + pessoas detectadas)"""
 
-            # Detecta rostos ANTES de enriquecer a descrição
-            detected_persons = detect_faces_for_preview(pil_image)
+    def post(self, request):
+        image_file = request.FILES.get('image')
+        if not image_file:
+            return Response({"error": "Nenhuma imagem foi enviada"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Extrai nomes das pessoas detectadas para personalização
-            person_names = [person['name'] for person in detected_persons]
+        try:
+            sha256, phash = fingerprint(image_file)
+
+            # Foto já na galeria: devolve a análise existente sem rodar os modelos
+            duplicate = check_duplicate(request, sha256, phash)
+            if duplicate:
+                existing, info = duplicate
+                return Response({
+                    "caption": existing.caption,
+                    "caption_pt": existing.caption_pt,
+                    "detected_persons": [
+                        {"id": person.id, "name": person.name, "is_known": True, "encoding": None}
+                        for person in existing.persons.all()
+                    ],
+                    "duplicate": info,
+                })
+
+            # Resultados brutos ficam em cache pelo hash do conteúdo e são reaproveitados no upload
+            preview = generate_preview(image_file, sha256)
+            preview["duplicate"] = None
+            return Response(preview)
 
-            # Enriquece descrição COM nomes das pessoas
-            enhanced_caption = enhance_description(basic_caption, detected_objects, pil_image, person_names)
+        except Exception as e:
+            return Response({"error": "Erro ao processar imagem", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            # Traduz para português
-            enhanced_caption_pt = translate_caption_to_portuguese(enhanced_caption)
 
-            return Response({
-                "caption": enhanced_caption,
-                "caption_pt": enhanced_caption_pt,
-                "detected_persons": detected_persons
-            })
+class PhotoStatusAPIView(APIView):
+    """GET: Status do processamento de IA da foto (para polling do frontend)"""
 
-        except Exception as e:
-            return Response({"error": "Erro ao processar imagem", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    def get(self, request, pk):
+        try:
+            photo = Photo.objects.get(pk=pk)
+        except Photo.DoesNotExist:
+            return Response({"error": "Foto não encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        job = latest_job_for(photo)
+        return Response({
+            "id": photo.id,
+            "status": photo.status,
+            "attempts": job.attempts if job else 0,
+            "max_attempts": job.max_attempts if job else 0,
+            "error": job.last_error.strip().splitlines()[-1] if job and job.last_error else None,
+        })
 
 
 class PhotoDetailAPIView(APIView):
@@ -185,36 +326,88 @@ class PhotoDetailAPIView(APIView):
         clear_photo_references(photo)
         delete_photo_file(photo)
         photo.delete()
+        duplicate_index.remove(pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class PhotoDuplicatesAPIView(APIView):
+    """GET: Grupos de fotos quase iguais na galeria (mesmo arquivo, redimensionado ou recomprimido)"""
+
+    def get(self, request):
+        try:
+            max_distance = int(request.query_params.get('distance', duplicate_setting('MAX_DISTANCE', 6)))
+            clusters = duplicate_clusters(max_distance)
+        except ValueError as e:
+            return Response({"error": f"Distância inválida: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        clusters = clusters[:page_size_from(request)]
+        photos = Photo.objects.for_listing().in_bulk([photo_id for cluster in clusters for photo_id in cluster])
+        results = []
+        for cluster in clusters:
+            cluster_photos = [photos[photo_id] for photo_id in cluster if photo_id in photos]
+            if len(cluster_photos) > 1:
+                serializer = PhotoSerializer(cluster_photos, many=True, context={'request': request})
+                results.append({"size": len(cluster_photos), "photos": serializer.data})
+
+        return Response({"max_distance": max_distance, "clusters": results})
+
+
 # ============================================================================
 # BUSCA
 # ============================================================================
 
 class SearchView(APIView):
-    """GET: Busca fotos por texto (text, caption, tags, pessoas)"""
+    """GET: Busca fotos por texto (text, captions, tags, pessoas), ordenadas por relevância"""
 
     def get(self, request):
         query = request.query_params.get('q', '')
         if not query:
-            return Response({"results": []})
+            return Response({"results": [], "next_cursor": None})
 
-        # Busca por palavras separadas
-        query_words = query.lower().split()
-        q_objects = Q()
+        # Sem FTS5 (ex: outro banco), mantém a busca por icontains ordenada por data
+        if not fts_available():
+            return paginated_photos_response(legacy_search_queryset(query), request)
 
-        for word in query_words:
-            q_objects |= (
-                Q(text__icontains=word) |
-                Q(caption__icontains=word) |
-                Q(tags__name__icontains=word) |
-                Q(persons__name__icontains=word)
-            )
+        try:
+            with span('search'):
+                photos, next_cursor = search_page(query, page_size_from(request), request.query_params.get('cursor'))
+        except InvalidCursor:
+            return Response({"error": "Cursor inválido"}, status=status.HTTP_400_BAD_REQUEST)
 
-        photos = Photo.objects.filter(q_objects).distinct().order_by('-created_at')
         serializer = PhotoSerializer(photos, many=True, context={'request': request})
-        return Response({"results": serializer.data})
+        return Response({"results": serializer.data, "next_cursor": next_cursor})
+
+
+class SemanticSearchView(APIView):
+    """GET: Busca por significado (embeddings das imagens), ex: festa na praia"""
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"results": []})
+
+        if not semantic_search_enabled():
+            return Response({"error": "Busca semântica desativada"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        try:
+            k = int(request.query_params.get('k', 20))
+        except ValueError:
+            k = 20
+        k = max(1, min(k, getattr(settings, 'GALLERY_MAX_PAGE_SIZE', 200)))
+
+        try:
+            matches = semantic_search(query, k)
+        except Exception as e:
+            print(f"Erro na busca semântica: {e}")
+            return Response({"error": "Busca semântica indisponível"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # Descarta fotos removidas depois da última reconstrução do índice
+        photos_by_id = Photo.objects.for_listing().in_bulk([photo_id for photo_id, _ in matches])
+        ranked = [(photos_by_id[photo_id], score) for photo_id, score in matches if photo_id in photos_by_id][:k]
+
+        serializer = PhotoSerializer([photo for photo, _ in ranked], many=True, context={'request': request})
+        results = [dict(data, score=round(score, 4)) for data, (_, score) in zip(serializer.data, ranked)]
+        return Response({"results": results})
 
 
 # ============================================================================
@@ -225,7 +418,7 @@ class PersonListAPIView(APIView):
     """GET: Lista pessoas (2+ fotos ou adicionadas manualmente)"""
 
     def get(self, request):
-        persons = Person.objects.annotate(num_photos=Count('photo')).filter(
+        persons = Person.objects.with_photo_stats().filter(
             Q(num_photos__gte=2) | Q(is_manually_added=True)
         )
         serializer = PersonSerializer(persons, many=True, context={'request': request})
@@ -236,7 +429,7 @@ class HiddenPersonsAPIView(APIView):
     """GET: Lista pessoas com apenas 1 foto (ocultas)"""
 
     def get(self, request):
-        persons = Person.objects.annotate(num_photos=Count('photo')).filter(
+        persons = Person.objects.with_photo_stats().filter(
             num_photos=1,
             is_manually_added=False
         )
@@ -249,7 +442,7 @@ class PersonDetailAPIView(APIView):
 
     def get_object(self, pk):
         try:
-            return Person.objects.get(pk=pk)
+            return Person.objects.with_photo_stats().get(pk=pk)
         except Person.DoesNotExist:
             raise Http404
 
@@ -271,7 +464,7 @@ class PersonDetailAPIView(APIView):
 
     def delete(self, request, pk):
         person = self.get_object(pk)
-        person_name = person.name
+        person_id = person.id
 
         person.photo_set.clear()
         if person.photo_principal:
@@ -279,20 +472,88 @@ class PersonDetailAPIView(APIView):
             person.save()
 
         person.delete()
-        update_face_cache_after_delete(person_name)
+        face_index.remove(person_id)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+def recluster_job_data(job):
+    return {
+        "job": job.pk,
+        "status": job.status,
+        "attempts": job.attempts,
+        "result": job.result,
+        "error": job.last_error.strip().splitlines()[-1] if job.last_error else None,
+    }
+
+
+class PersonReclusterAPIView(APIView):
+    """POST: Agenda o reagrupamento de todos os rostos, que propõe (ou aplica, com apply=true) fusões de pessoas"""
+
+    def post(self, request):
+        try:
+            threshold = request.data.get('threshold')
+            threshold = float(threshold) if threshold is not None else None
+            min_share = request.data.get('min_share')
+            min_share = float(min_share) if min_share is not None else None
+        except (TypeError, ValueError):
+            return Response({"error": "Parâmetros inválidos"}, status=status.HTTP_400_BAD_REQUEST)
+
+        apply = str(request.data.get('apply', '')).lower() in ('1', 'true')
+        job = enqueue_recluster({"threshold": threshold, "min_share": min_share, "apply": apply})
+
+        # Sem workers da fila (ingestão síncrona), roda aqui mesmo
+        if not getattr(settings, 'GALLERY_ASYNC_INGESTION', True):
+            for claimed in claim_jobs(make_worker_id('web'), kind=ProcessingJob.Kind.RECLUSTER):
+                run_recluster_job(claimed)
+            job.refresh_from_db()
+
+        done = job.status == ProcessingJob.Status.DONE
+        return Response(recluster_job_data(job), status=status.HTTP_200_OK if done else status.HTTP_202_ACCEPTED)
+
+
+class PersonReclusterStatusAPIView(APIView):
+    """GET: Status e resultado de um reagrupamento (para polling do frontend)"""
+
+    def get(self, request, pk):
+        try:
+            job = ProcessingJob.objects.get(pk=pk, kind=ProcessingJob.Kind.RECLUSTER)
+        except ProcessingJob.DoesNotExist:
+            return Response({"error": "Reagrupamento não encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(recluster_job_data(job))
+
+
+class PersonMergeAPIView(APIView):
+    """POST: Funde as pessoas `sources` nesta pessoa (rostos, fotos e foto principal)"""
+
+    def post(self, request, pk):
+        try:
+            target = Person.objects.get(pk=pk)
+        except Person.DoesNotExist:
+            return Response({"error": "Pessoa não encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            source_ids = [int(person_id) for person_id in request.data.get('sources') or []]
+        except (TypeError, ValueError):
+            return Response({"error": "Lista de pessoas inválida"}, status=status.HTTP_400_BAD_REQUEST)
+
+        source_ids = list(Person.objects.filter(id__in=source_ids).exclude(pk=pk).values_list('id', flat=True))
+        if not source_ids:
+            return Response({"error": "Nenhuma pessoa para fundir"}, status=status.HTTP_400_BAD_REQUEST)
+
+        merged = merge_persons(target, source_ids)
+        person = Person.objects.with_photo_stats().get(pk=pk)
+        serializer = PersonSerializer(person, context={'request': request})
+        return Response({"merged": merged, "person": serializer.data})
+
+
 class PersonPhotoListAPIView(APIView):
-    """GET: Lista todas as fotos de uma pessoa"""
+    """GET: Lista as fotos de uma pessoa (paginada por cursor)"""
 
     def get(self, request, pk):
         try:
             person = Person.objects.get(pk=pk)
-            photos = person.photo_set.all().order_by('-created_at')
-            serializer = PhotoSerializer(photos, many=True, context={'request': request})
-            return Response(serializer.data)
+            return paginated_photos_response(person.photo_set.all(), request)
         except Person.DoesNotExist:
             return Response({"error": "Pessoa não encontrada"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -327,6 +588,7 @@ class UpdatePersonPhotoAPIView(APIView):
             image_file = request.FILES['photo_principal']
             new_photo = Photo.objects.create(image=image_file, caption=f"Foto de perfil de {person.name}")
             new_photo.persons.add(person)
+            generate_derivatives(new_photo)
 
             person.photo_principal = new_photo
             person.save()
@@ -356,9 +618,52 @@ class ToggleFavoriteAPIView(APIView):
 
 
 class FavoritePhotosAPIView(APIView):
-    """GET: Lista todas as fotos favoritas"""
+    """GET: Lista as fotos favoritas (paginada por cursor)"""
 
     def get(self, request):
-        photos = Photo.objects.filter(is_favorite=True).order_by('-created_at')
-        serializer = PhotoSerializer(photos, many=True, context={'request': request})
-        return Response(serializer.data)
+        return paginated_photos_response(Photo.objects.filter(is_favorite=True), request)
+
+
+# ============================================================================
+# SAÚDE
+# ============================================================================
+
+class ModelsHealthAPIView(APIView):
+    """GET: Prontidão dos modelos de IA (quais já estão carregados)
+
+    Só os modelos da ingestão (nível 'full') contam para a prontidão; os do preview e o
+    tradutor das consultas carregam no primeiro uso e aparecem à parte, em lazy_models.
+    """
+
+    def get(self, request):
+        models_status = model_registry.status()
+        # Modelos servidos pelo servidor de modelos: o status (e a prontidão) vem do /health dele
+        model_server = model_registry.remote.merge_status(models_status) if model_registry.remote else None
+        required = set(ingest_model_names())
+        models = {name: model for name, model in models_status.items() if name in required}
+        lazy_models = {name: model for name, model in models_status.items() if name not in required}
+        ready = all(model['loaded'] for model in models.values())
+
+        data = {
+            "ready": ready,
+            "models": models,
+            "lazy_models": lazy_models,
+            "face_index": {"loaded": face_index.loaded, "size": len(face_index)},
+        }
+        if model_server is not None:
+            data["model_server"] = model_server
+        return Response(data, status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class MetricsView(APIView):
+    """GET: Métricas do servidor (tempos por etapa e por request) em texto do Prometheus
+
+    Só responde a requests locais, a não ser com GALLERY_METRICS_ALLOW_REMOTE = True.
+    """
+
+    def get(self, request):
+        local = request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1')
+        if not local and not metrics_setting('ALLOW_REMOTE', False):
+            return Response({"error": "Métricas disponíveis só localmente"}, status=status.HTTP_403_FORBIDDEN)
+
+        return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
@@ -17,6 +17,11 @@ function PhotoCard({ photo, photos = [], currentIndex = 0, onDelete, onFavoriteT
       ? `http://127.0.0.1:8000${photo.image}`
       : '/placeholder.jpg';
 
+  // Miniaturas geradas no backend ({largura: url}) para não baixar o original na grade
+  const thumbnailSrcSet = Object.entries(photo.thumbnails || {})
+    .map(([width, url]) => `${url} ${width}w`)
+    .join(', ');
+
   const handleImageError = () => {
     setImageError(true);
   };
@@ -119,9 +124,12 @@ function PhotoCard({ photo, photos = [], currentIndex = 0, onDelete, onFavoriteT
         <div className="card-image-container">
           <img
             src={imageError ? '/placeholder.jpg' : imageUrl}
+            srcSet={!imageError && thumbnailSrcSet ? thumbnailSrcSet : undefined}
+            sizes="(max-width: 600px) 100vw, 300px"
             alt={photo.text || "Foto"}
             className="card-image"
             loading="lazy"
+            style={photo.placeholder ? { backgroundImage: `url(${photo.placeholder})`, backgroundSize: 'cover' } : undefined}
             onError={handleImageError}
           />
         </div>
@@ -9,6 +9,8 @@ function FavoritosPage() {
   const [photos, setPhotos] = useState([]);
   const [loading, setLoading] = useState(true);
   const [removingIds, setRemovingIds] = useState(new Set());
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchFavoritePhotos();
@@ -18,7 +20,8 @@ function FavoritosPage() {
     try {
       setLoading(true);
       const response = await axios.get('http://127.0.0.1:8000/api/favorites/');
-      setPhotos(response.data);
+      setPhotos(response.data.results);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Erro ao buscar fotos favoritas:', error);
     } finally {
@@ -26,6 +29,21 @@ function FavoritosPage() {
     }
   };
 
+  const fetchMoreFavorites = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await axios.get('http://127.0.0.1:8000/api/favorites/', {
+        params: { cursor: nextCursor }
+      });
+      setPhotos(prev => [...prev, ...response.data.results]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Erro ao buscar mais fotos favoritas:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleFavoriteToggle = (photoId, isFavorite) => {
     if (!isFavorite) {
       // Adiciona o ID à lista de remoção para animação
@@ -97,6 +115,14 @@ function FavoritosPage() {
           </div>
         ))}
       </div>
+
+      {nextCursor && (
+        <div className="load-more-container">
+          <button className="load-more-button" onClick={fetchMoreFavorites} disabled={loadingMore}>
+            {loadingMore ? 'Carregando...' : 'Carregar mais favoritas'}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
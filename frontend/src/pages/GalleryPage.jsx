@@ -8,22 +8,31 @@ const GalleryPage = () => {
   const [loading, setLoading] = useState(true);
   const [filter, setFilter] = useState('all');
   const [sortBy, setSortBy] = useState('recent');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchPhotos();
   }, []);
 
-  const fetchPhotos = async () => {
+  // A API é paginada por cursor: cada chamada traz uma página e o cursor da próxima
+  const fetchPhotos = async (cursor = null) => {
+    if (cursor) setLoadingMore(true);
     try {
-      const response = await fetch('http://127.0.0.1:8000/api/photos/');
+      const url = cursor
+        ? `http://127.0.0.1:8000/api/photos/?cursor=${encodeURIComponent(cursor)}`
+        : 'http://127.0.0.1:8000/api/photos/';
+      const response = await fetch(url);
       if (response.ok) {
         const data = await response.json();
-        setPhotos(data);
+        setPhotos(prev => (cursor ? [...prev, ...data.results] : data.results));
+        setNextCursor(data.next_cursor);
       }
     } catch (error) {
       console.error('Erro ao buscar fotos:', error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -167,6 +176,14 @@ const GalleryPage = () => {
           <p>Nenhuma foto encontrada com os filtros selecionados</p>
         </div>
       )}
+
+      {nextCursor && (
+        <div className="load-more-container">
+          <button className="load-more-button" onClick={() => fetchPhotos(nextCursor)} disabled={loadingMore}>
+            {loadingMore ? 'Carregando...' : 'Carregar mais fotos'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -9,12 +9,12 @@ function HomePage() {
   const navigate = useNavigate();
   const [posts, setPosts] = useState([]);
   const [loading, setLoading] = useState(true);
-  const [page, setPage] = useState(1);
+  const [nextCursor, setNextCursor] = useState(null);
   const [hasMore, setHasMore] = useState(true);
   const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   useEffect(() => {
-    fetchPosts(1, true);
+    fetchPosts(null, true);
   }, []);
 
   useEffect(() => {
@@ -23,15 +23,15 @@ function HomePage() {
         return;
       }
       if (hasMore && !isLoadingMore) {
-        fetchPosts(page + 1);
+        fetchPosts(nextCursor);
       }
     };
 
     window.addEventListener('scroll', handleScroll);
     return () => window.removeEventListener('scroll', handleScroll);
-  }, [page, hasMore, isLoadingMore]);
+  }, [nextCursor, hasMore, isLoadingMore]);
 
-  const fetchPosts = async (pageNum, isInitial = false) => {
+  const fetchPosts = async (cursor, isInitial = false) => {
     if (isInitial) {
       setLoading(true);
     } else {
@@ -39,24 +39,22 @@ function HomePage() {
     }
 
     try {
-      const response = await fetch(`http://127.0.0.1:8000/api/photos/?page=${pageNum}&limit=10`);
+      // Paginação por cursor: a API devolve {results, next_cursor}
+      const params = new URLSearchParams({ page_size: 10 });
+      if (cursor) params.set('cursor', cursor);
+
+      const response = await fetch(`http://127.0.0.1:8000/api/photos/?${params}`);
       if (response.ok) {
         const data = await response.json();
         
-        // Se a API não tiver paginação, simula com slice
-        const allPhotos = Array.isArray(data) ? data : data.results;
-        const startIndex = (pageNum - 1) * 10;
-        const endIndex = startIndex + 10;
-        const paginatedData = allPhotos.slice(startIndex, endIndex);
-        
         if (isInitial) {
-          setPosts(paginatedData);
+          setPosts(data.results);
         } else {
-          setPosts(prev => [...prev, ...paginatedData]);
+          setPosts(prev => [...prev, ...data.results]);
         }
         
-        setPage(pageNum);
-        setHasMore(paginatedData.length === 10);
+        setNextCursor(data.next_cursor);
+        setHasMore(Boolean(data.next_cursor));
       }
     } catch (error) {
       console.error('Erro ao buscar posts:', error);
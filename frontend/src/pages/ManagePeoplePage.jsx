@@ -225,7 +225,7 @@ function ManagePeoplePage() {
         {people.map((person) => {
           const isEditing = person.id === editingPersonId;
           const photoCount = person.photo_count || 0;
-          const photoUrl = person.representative_photo || person.first_photo;
+          const photoUrl = person.representative_thumbnail || person.representative_photo || person.first_photo;
           const isUploading = uploadingPhotoFor === person.id;
 
           return (
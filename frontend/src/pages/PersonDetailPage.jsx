@@ -9,6 +9,8 @@ function PersonDetailPage() {
   const { personId } = useParams();
   const [person, setPerson] = useState(null);
   const [photos, setPhotos] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [showUploadModal, setShowUploadModal] = useState(false);
   const [selectedFile, setSelectedFile] = useState(null);
@@ -29,7 +31,8 @@ function PersonDetailPage() {
       
       // Busca as fotos daquela pessoa
       const photosRes = await axios.get(`http://127.0.0.1:8000/api/persons/${personId}/photos/`);
-      setPhotos(photosRes.data);
+      setPhotos(photosRes.data.results);
+      setNextCursor(photosRes.data.next_cursor);
     } catch (err) {
       console.error("Erro ao buscar dados:", err);
     } finally {
@@ -37,6 +40,21 @@ function PersonDetailPage() {
     }
   };
 
+  const fetchMorePhotos = async () => {
+    setLoadingMore(true);
+    try {
+      const photosRes = await axios.get(`http://127.0.0.1:8000/api/persons/${personId}/photos/`, {
+        params: { cursor: nextCursor }
+      });
+      setPhotos(prev => [...prev, ...photosRes.data.results]);
+      setNextCursor(photosRes.data.next_cursor);
+    } catch (err) {
+      console.error("Erro ao buscar mais fotos:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleFileSelect = (e) => {
     const file = e.target.files[0];
     if (file && file.type.startsWith('image/')) {
@@ -284,6 +302,14 @@ function PersonDetailPage() {
               </Link>
             </div>
           )}
+
+          {nextCursor && (
+            <div className="load-more-container">
+              <button className="load-more-button" onClick={fetchMorePhotos} disabled={loadingMore}>
+                {loadingMore ? 'Carregando...' : 'Carregar mais fotos'}
+              </button>
+            </div>
+          )}
         </div>
       </div>
     </div>
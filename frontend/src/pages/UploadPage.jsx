@@ -332,6 +332,11 @@ function UploadPage() {
       setUploadProgress(100);
       setUploadSuccess(true);
 
+      // Foto repetida: o backend devolve a que já estava na galeria em vez de salvar outra cópia
+      if (response.data.duplicate) {
+        alert('Esta foto já está na galeria. Nenhuma cópia nova foi salva.');
+      }
+
       setTimeout(() => {
         navigate('/');
       }, 2000);